@@ -1137,6 +1137,22 @@ def add_config(
     add_external("btag_sf_corr", (localizePOGSF(getfromyear, "BTV", "btagging.json.gz"), "v1"))
     add_external("tau_sf", (localizePOGSF(getfromyear, "TAU", f"{tauPOGJsonFile}"), "v1"))
     add_external("pu_sf", (localizePOGSF(getfromyear, "LUM", "puWeights.json.gz"), "v1"))
+    # custom muon lepton mva, converted into a native xgboost model on first use (see selection/muon_mva.py),
+    # with the location normalized so that it does not depend on the launch directory, and only registered when
+    # the checkout exists so that setups using the nano muon mva score do not depend on it
+    muon_mva_path = os.path.realpath(os.path.expandvars(analysis_data["external_files"]["muon_mva"]))
+    if os.path.isdir(muon_mva_path):
+        add_external("muon_mva", Ext(
+            muon_mva_path,
+            subpaths=DotDict(
+                model="mu_xgb_clf.pkl",
+                scaler="mu_scaler.pkl",
+                features="mu_features.pkl",
+            ),
+            version="v1",
+        ))
+    else:
+        logger.debug(f"custom muon mva not found at {muon_mva_path}, only the nano muon mva score is available")
     add_external("trigger_sf", Ext(
         f"{os.path.dirname(os.path.abspath(__file__))}/../data/TriggerScaleFactors/{getfromyear}{tau_pog_suffix}",
         subpaths=DotDict(
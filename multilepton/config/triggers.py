@@ -139,6 +139,101 @@ trigger_bits = DotDict.wrap({
 })
 
 
+# trigger ids following the convention in get_triggerID, and their fixed positions in per-event trigger
+# bitsets, bits must never be changed or reused as they are stored in selection outputs, new triggers take
+# the next free bit
+trigger_ids = {
+    # single muon triggers
+    "HLT_IsoMu22": (101, 0),
+    "HLT_IsoMu22_eta2p1": (102, 1),
+    "HLT_IsoTkMu22": (103, 2),
+    "HLT_IsoTkMu22_eta2p1": (104, 3),
+    "HLT_IsoMu24": (105, 4),
+    "HLT_IsoMu27": (106, 5),
+    # double muon triggers
+    "HLT_Mu17_TrkIsoVVL_Mu8_TrkIsoVVL_DZ_Mass3p8": (1001, 6),
+    "HLT_DoubleMu3_DZ_PFMET50_PFMHT60": (1002, 7),
+    "HLT_Mu18_Mu9_SameSign": (1003, 8),
+    # triple muon triggers
+    "HLT_TripleMu_5_3_3_Mass3p8_DZ": (10001, 9),
+    # single electron triggers
+    "HLT_Ele25_eta2p1_WPTight_Gsf": (201, 10),
+    "HLT_Ele32_WPTight_Gsf": (202, 11),
+    "HLT_Ele32_WPTight_Gsf_L1DoubleEG": (203, 12),
+    "HLT_Ele35_WPTight_Gsf": (204, 13),
+    "HLT_Ele30_WPTight_Gsf": (205, 14),
+    "HLT_Ele28_eta2p1_WPTight_Gsf_HT150": (206, 15),
+    # double electron triggers
+    "HLT_Ele23_Ele12_CaloIdL_TrackIdL_IsoVL": (2001, 16),
+    "HLT_DoubleEle8_CaloIdM_TrackIdM_Mass8_PFHT350": (2002, 17),
+    # triple electron triggers
+    "HLT_Ele16_Ele12_Ele8_CaloIdL_TrackIdL": (20001, 18),
+    # mu–tau triggers
+    "HLT_IsoMu19_eta2p1_LooseIsoPFTau20": (301, 19),
+    "HLT_IsoMu19_eta2p1_LooseIsoPFTau20_SingleL1": (302, 20),
+    "HLT_IsoMu20_eta2p1_LooseChargedIsoPFTau27_eta2p1_CrossL1": (303, 21),
+    "HLT_IsoMu20_eta2p1_LooseDeepTauPFTauHPS27_eta2p1_CrossL1": (304, 22),
+    # new pnet trigger
+    "HLT_IsoMu20_eta2p1_PNetTauhPFJet27_Loose_eta2p3_CrossL1": (305, 23),
+    # e–tau triggers
+    "HLT_Ele24_eta2p1_WPLoose_Gsf_LooseIsoPFTau20_SingleL1": (401, 24),
+    "HLT_Ele24_eta2p1_WPLoose_Gsf_LooseIsoPFTau20": (402, 25),
+    "HLT_Ele24_eta2p1_WPLoose_Gsf_LooseIsoPFTau30": (403, 26),
+    "HLT_Ele24_eta2p1_WPTight_Gsf_LooseChargedIsoPFTau30_eta2p1_CrossL1": (404, 27),
+    "HLT_Ele24_eta2p1_WPTight_Gsf_LooseDeepTauPFTauHPS30_eta2p1_CrossL1": (405, 28),
+    # new pnet trigger
+    "HLT_Ele24_eta2p1_WPTight_Gsf_PNetTauhPFJet30_Loose_eta2p3_CrossL1": (406, 29),
+    # tau-tau triggers
+    "HLT_DoubleMediumIsoPFTau35_Trk1_eta2p1_Reg": (501, 30),
+    "HLT_DoubleMediumCombinedIsoPFTau35_Trk1_eta2p1_Reg": (502, 31),
+    "HLT_DoubleMediumChargedIsoPFTau35_Trk1_eta2p1_Reg": (503, 32),
+    "HLT_DoubleTightChargedIsoPFTau35_Trk1_TightID_eta2p1_Reg": (504, 33),
+    "HLT_DoubleMediumChargedIsoPFTau40_Trk1_TightID_eta2p1_Reg": (505, 34),
+    "HLT_DoubleTightChargedIsoPFTau40_Trk1_eta2p1_Reg": (506, 35),
+    "HLT_DoubleMediumDeepTauPFTauHPS35_L2NN_eta2p1": (507, 36),
+    "HLT_DoubleMediumChargedIsoPFTauHPS40_Trk1_eta2p1": (508, 37),
+    "HLT_DoubleMediumChargedIsoDisplacedPFTauHPS32_Trk1_eta2p1": (509, 38),
+    # new pnet triggers
+    "HLT_DoublePNetTauhPFJet30_Medium_L2NN_eta2p3": (510, 39),
+    # VBF di-tau triggers
+    "HLT_VBF_DoubleLooseChargedIsoPFTau20_Trk1_eta2p1_Reg": (601, 40),
+    "HLT_VBF_DoubleMediumDeepTauPFTauHPS20_eta2p1": (602, 41),
+    "HLT_VBF_DoubleLooseChargedIsoPFTauHPS20_Trk1_eta2p1": (603, 42),
+    "HLT_DoublePFJets40_Mass500_MediumDeepTauPFTauHPS45_L2NN_MediumDeepTauPFTauHPS20_eta2p1": (604, 43),
+    # new pnet triggers
+    "HLT_VBF_DoublePNetTauhPFJet20_eta2p2": (605, 44),
+    "HLT_VBF_DiPFJet115_40_Mjj850_DoublePNetTauhPFJet20_eta2p3": (606, 45),
+    # tau+jet triggers
+    "HLT_DoubleMediumDeepTauPFTauHPS30_L2NN_eta2p1_PFJet60": (701, 46),
+    "HLT_DoubleMediumDeepTauPFTauHPS30_L2NN_eta2p1_PFJet75": (702, 47),
+    # new pnet triggers
+    "HLT_DoublePNetTauhPFJet26_L2NN_eta2p3_PFJet60": (703, 48),
+    # cross-e-mu-double/triple triggers
+    "HLT_Mu8_TrkIsoVVL_Ele23_CaloIdL_TrackIdL_IsoVL_DZ": (901, 49),
+    "HLT_DiMu4_Ele9_CaloIdL_TrackIdL_DZ_Mass3p8": (902, 50),
+    "HLT_Mu8_DiEle12_CaloIdL_TrackIdL": (903, 51),
+    # MET triggers
+    "HLT_PFMETNoMu120_PFMHTNoMu120_IDTight": (1, 52),
+}
+
+
+def check_trigger_ids(trigger_ids):
+    """
+    Raises a *ValueError* when the ids or bitset positions in *trigger_ids* are not unique.
+    """
+    ids = [trig_id for trig_id, _ in trigger_ids.values()]
+    bits = [bit for _, bit in trigger_ids.values()]
+    duplicates = sorted(
+        name for name, (trig_id, bit) in trigger_ids.items()
+        if ids.count(trig_id) > 1 or bits.count(bit) > 1
+    )
+    if duplicates:
+        raise ValueError(f"trigger ids and bitset positions must be unique, duplicates: {', '.join(duplicates)}")
+
+
+check_trigger_ids(trigger_ids)
+
+
 def get_triggerID(name):
     """
     General requirement from the lepton selection:
@@ -161,82 +256,19 @@ def get_triggerID(name):
     - x: MET triggers
     Starting from xx = 01 and with a unique name for each path across all years.
     """
-    ids = {
-        # single muon triggers
-        "HLT_IsoMu22": 101,
-        "HLT_IsoMu22_eta2p1": 102,
-        "HLT_IsoTkMu22": 103,
-        "HLT_IsoTkMu22_eta2p1": 104,
-        "HLT_IsoMu24": 105,
-        "HLT_IsoMu27": 106,
-        # double muon triggers
-        "HLT_Mu17_TrkIsoVVL_Mu8_TrkIsoVVL_DZ_Mass3p8": 1001,
-        "HLT_DoubleMu3_DZ_PFMET50_PFMHT60": 1002,
-        "HLT_Mu18_Mu9_SameSign": 1003,
-        # triple muon triggers
-        "HLT_TripleMu_5_3_3_Mass3p8_DZ": 10001,
-        # single electron triggers
-        "HLT_Ele25_eta2p1_WPTight_Gsf": 201,
-        "HLT_Ele32_WPTight_Gsf": 202,
-        "HLT_Ele32_WPTight_Gsf_L1DoubleEG": 203,
-        "HLT_Ele35_WPTight_Gsf": 204,
-        "HLT_Ele30_WPTight_Gsf": 205,
-        "HLT_Ele28_eta2p1_WPTight_Gsf_HT150": 206,
-        # double electron triggers
-        "HLT_Ele23_Ele12_CaloIdL_TrackIdL_IsoVL": 2001,
-        "HLT_DoubleEle8_CaloIdM_TrackIdM_Mass8_PFHT350": 2002,
-        # triple electron triggers
-        "HLT_Ele16_Ele12_Ele8_CaloIdL_TrackIdL": 20001,
-        # mu–tau triggers
-        "HLT_IsoMu19_eta2p1_LooseIsoPFTau20": 301,
-        "HLT_IsoMu19_eta2p1_LooseIsoPFTau20_SingleL1": 302,
-        "HLT_IsoMu20_eta2p1_LooseChargedIsoPFTau27_eta2p1_CrossL1": 303,
-        "HLT_IsoMu20_eta2p1_LooseDeepTauPFTauHPS27_eta2p1_CrossL1": 304,
-        # new pnet trigger
-        "HLT_IsoMu20_eta2p1_PNetTauhPFJet27_Loose_eta2p3_CrossL1": 305,
-        # e–tau triggers
-        "HLT_Ele24_eta2p1_WPLoose_Gsf_LooseIsoPFTau20_SingleL1": 401,
-        "HLT_Ele24_eta2p1_WPLoose_Gsf_LooseIsoPFTau20": 402,
-        "HLT_Ele24_eta2p1_WPLoose_Gsf_LooseIsoPFTau30": 403,
-        "HLT_Ele24_eta2p1_WPTight_Gsf_LooseChargedIsoPFTau30_eta2p1_CrossL1": 404,
-        "HLT_Ele24_eta2p1_WPTight_Gsf_LooseDeepTauPFTauHPS30_eta2p1_CrossL1": 405,
-        # new pnet trigger
-        "HLT_Ele24_eta2p1_WPTight_Gsf_PNetTauhPFJet30_Loose_eta2p3_CrossL1": 406,
-        # tau-tau triggers
-        "HLT_DoubleMediumIsoPFTau35_Trk1_eta2p1_Reg": 501,
-        "HLT_DoubleMediumCombinedIsoPFTau35_Trk1_eta2p1_Reg": 502,
-        "HLT_DoubleMediumChargedIsoPFTau35_Trk1_eta2p1_Reg": 503,
-        "HLT_DoubleTightChargedIsoPFTau35_Trk1_TightID_eta2p1_Reg": 504,
-        "HLT_DoubleMediumChargedIsoPFTau40_Trk1_TightID_eta2p1_Reg": 505,
-        "HLT_DoubleTightChargedIsoPFTau40_Trk1_eta2p1_Reg": 506,
-        "HLT_DoubleMediumDeepTauPFTauHPS35_L2NN_eta2p1": 507,
-        "HLT_DoubleMediumChargedIsoPFTauHPS40_Trk1_eta2p1": 508,
-        "HLT_DoubleMediumChargedIsoDisplacedPFTauHPS32_Trk1_eta2p1": 509,
-        # new pnet triggers
-        "HLT_DoublePNetTauhPFJet30_Medium_L2NN_eta2p3": 510,
-        # VBF di-tau triggers
-        "HLT_VBF_DoubleLooseChargedIsoPFTau20_Trk1_eta2p1_Reg": 601,
-        "HLT_VBF_DoubleMediumDeepTauPFTauHPS20_eta2p1": 602,
-        "HLT_VBF_DoubleLooseChargedIsoPFTauHPS20_Trk1_eta2p1": 603,
-        "HLT_DoublePFJets40_Mass500_MediumDeepTauPFTauHPS45_L2NN_MediumDeepTauPFTauHPS20_eta2p1": 604,
-        # new pnet triggers
-        "HLT_VBF_DoublePNetTauhPFJet20_eta2p2": 605,
-        "HLT_VBF_DiPFJet115_40_Mjj850_DoublePNetTauhPFJet20_eta2p3": 606,
-        # tau+jet triggers
-        "HLT_DoubleMediumDeepTauPFTauHPS30_L2NN_eta2p1_PFJet60": 701,
-        "HLT_DoubleMediumDeepTauPFTauHPS30_L2NN_eta2p1_PFJet75": 702,
-        # new pnet triggers
-        "HLT_DoublePNetTauhPFJet26_L2NN_eta2p3_PFJet60": 703,
-        # cross-e-mu-double/triple triggers
-        "HLT_Mu8_TrkIsoVVL_Ele23_CaloIdL_TrackIdL_IsoVL_DZ": 901,
-        "HLT_DiMu4_Ele9_CaloIdL_TrackIdL_DZ_Mass3p8": 902,
-        "HLT_Mu8_DiEle12_CaloIdL_TrackIdL": 903,
-        # MET triggers
-        "HLT_PFMETNoMu120_PFMHTNoMu120_IDTight": 1,
-    }
-    if name not in ids:
+    if name not in trigger_ids:
+        raise KeyError(f"Trigger name '{name}' not found in trigger ID list.")
+    return trigger_ids[name][0]
+
+
+def get_trigger_bit(name):
+    """
+    Returns the position of the trigger *name* in per-event trigger bitsets (see
+    :py:class:`multilepton.selection.trigger.TriggerBitset`), which is the same in all configs.
+    """
+    if name not in trigger_ids:
         raise KeyError(f"Trigger name '{name}' not found in trigger ID list.")
-    return ids[name]
+    return trigger_ids[name][1]
 
 
 def get_bit_sum(nano_version: int, obj_name: str, names: list[str | None]) -> int | None:
@@ -683,6 +715,7 @@ def add_triggers(config: od.Config) -> None:
         kwargs = dict(
             name=name,
             id=get_triggerID(name),
+            bit=get_trigger_bit(name),
             legs=triginfo["legs"],
             tags=triginfo["tags"],
         )
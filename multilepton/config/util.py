@@ -99,6 +99,8 @@ class Trigger(UniqueObject, TagMixin):
           additional information and constraints of particular trigger legs.
         - *applies_to_dataset*: A function that obtains an ``order.Dataset`` instance to decide
           whether the trigger applies to that dataset. Defaults to *True*.
+        - *bit*: The fixed position of the trigger in per-event trigger bitsets, which must not
+          depend on the config. Defaults to *None*.
     For accepted types and conversions, see the *typed* setters implemented in this class.
     In addition, a base class from *order* provides additional functionality via mixins:
         - *tags*: Trigger objects can be assigned *tags* that can be checked later on, e.g. to
@@ -113,6 +115,7 @@ class Trigger(UniqueObject, TagMixin):
         legs: dict[Hashable, TriggerLeg] | Sequence[TriggerLeg] | None = None,
         applies_to_dataset: Callable | bool | Any = True,
         tags: Any = None,
+        bit: int | None = None,
     ):
         UniqueObject.__init__(self, name, id)
         TagMixin.__init__(self, tags=tags)
@@ -125,10 +128,12 @@ class Trigger(UniqueObject, TagMixin):
         self._run_range = None
         self._leg = None
         self._applies_to_dataset = None
+        self._bit = None
         # set initial values
         self.run_range = run_range
         self.legs = legs
         self.applies_to_dataset = applies_to_dataset
+        self.bit = bit
 
     def __repr__(self):
         return (
@@ -192,6 +197,16 @@ class Trigger(UniqueObject, TagMixin):
             func = lambda dataset_inst: decision
         return func
 
+    @typed
+    def bit(self, bit: int | None) -> int | None:
+        if bit is None:
+            return None
+        if not isinstance(bit, int):
+            raise TypeError(f"invalid bit: {bit}")
+        if bit < 0:
+            raise ValueError(f"bit must be positive, but found {bit}")
+        return bit
+
     @property
     def has_legs(self):
         return bool(self._legs)
@@ -0,0 +1,153 @@
+# coding: utf-8
+
+"""
+Base classes for ML models of the analysis.
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+from typing import Any, Iterator
+
+import law
+
+from columnflow.ml import MLModel
+from columnflow.util import maybe_import
+from columnflow.columnar_util import Route, set_ak_column
+
+
+np = maybe_import("numpy")
+ak = maybe_import("awkward")
+
+
+class PrefetchMLModel(MLModel):
+    """
+    ML model whose evaluation is split into the preparation of input features in
+    :py:meth:`prepare_features` and the inference in :py:meth:`predict`, both called per batch of
+    :py:attr:`prefetch_batch_size` events of a chunk. Features of the next batches are prepared on a
+    background thread while the current batch is evaluated, so that awkward and NumPy operations
+    overlap with inference. At most :py:attr:`prefetch_queue_depth` prepared batches are held at a
+    time to bound memory, and a depth of zero disables the background thread.
+
+    Subclasses implement the two hooks instead of :py:meth:`evaluate`.
+    """
+
+    # number of events per batch
+    prefetch_batch_size: int = 10_000
+
+    # number of batches whose features are prepared ahead of the evaluation
+    prefetch_queue_depth: int = 2
+
+    init_attributes: list[str] = MLModel.init_attributes + ["prefetch_batch_size", "prefetch_queue_depth"]
+
+    def prepare_features(
+        self,
+        task: law.Task,
+        events: ak.Array,
+        fold_indices: np.ndarray,
+    ) -> Any:
+        """
+        Returns the input features of the batch of *events*, possibly called on a background
+        thread.
+        """
+        raise NotImplementedError
+
+    def predict(
+        self,
+        task: law.Task,
+        features: Any,
+        models: list[Any],
+        fold_indices: np.ndarray,
+        events_used_in_training: bool = False,
+    ) -> dict[Route | str, np.ndarray]:
+        """
+        Returns the values of produced columns for the batch with *features*, mapped to their
+        routes.
+        """
+        raise NotImplementedError
+
+    def _batches(self, events: ak.Array) -> list[slice]:
+        n = len(events)
+        size = max(int(self.prefetch_batch_size), 1)
+        return [slice(start, start + size) for start in range(0, n, size)] or [slice(0, 0)]
+
+    def _iter_features(
+        self,
+        task: law.Task,
+        events: ak.Array,
+        fold_indices: np.ndarray,
+    ) -> Iterator[tuple[slice, Any]]:
+        batches = self._batches(events)
+
+        # synchronous preparation
+        if self.prefetch_queue_depth <= 0 or len(batches) == 1:
+            for s in batches:
+                yield s, self.prepare_features(task, events[s], fold_indices[s])
+            return
+
+        # prepare features on a background thread, bounded by the queue depth
+        q: queue.Queue = queue.Queue(maxsize=self.prefetch_queue_depth)
+        stop = threading.Event()
+
+        def put(item: Any) -> bool:
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def prefetch() -> None:
+            try:
+                for s in batches:
+                    if not put((s, self.prepare_features(task, events[s], fold_indices[s]), None)):
+                        return
+            except BaseException as e:
+                put((None, None, e))
+
+        thread = threading.Thread(target=prefetch, name=f"{self.cls_name}_prefetch", daemon=True)
+        thread.start()
+        try:
+            for _ in batches:
+                s, features, error = q.get()
+                if error is not None:
+                    raise error
+                yield s, features
+        finally:
+            stop.set()
+            thread.join()
+
+    def evaluate(
+        self,
+        task: law.Task,
+        events: ak.Array,
+        models: list[Any],
+        fold_indices: ak.Array,
+        events_used_in_training: bool = False,
+    ) -> ak.Array:
+        fold_indices = np.asarray(fold_indices)
+
+        # evaluate batches while the features of the next ones are prepared
+        outputs: dict[Route | str, list[np.ndarray]] = {}
+        for s, features in self._iter_features(task, events, fold_indices):
+            values = self.predict(
+                task,
+                features,
+                models,
+                fold_indices[s],
+                events_used_in_training=events_used_in_training,
+            )
+            for route, arr in values.items():
+                outputs.setdefault(route, []).append(arr)
+
+        # store produced columns
+        for route, arrs in outputs.items():
+            if all(isinstance(arr, np.ndarray) for arr in arrs):
+                values = np.concatenate(arrs, axis=0)
+            else:
+                values = ak.concatenate(arrs, axis=0)
+            events = set_ak_column(events, route, values)
+
+        return events
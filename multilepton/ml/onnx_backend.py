@@ -0,0 +1,354 @@
+# coding: utf-8
+
+"""
+TensorFlow-free inference backend for models that were exported from SavedModels to ONNX and are
+evaluated in-process with ONNX Runtime. The export needs ``tensorflow`` and ``tf2onnx`` and is
+done once, e.g. in the dev sandbox, into a content-addressed cache keyed by the SavedModel files,
+from where jobs without TensorFlow load it:
+
+.. code-block:: bash
+
+    python -m multilepton.ml.onnx_backend export /path/to/saved_model
+    python -m multilepton.ml.onnx_backend check /path/to/saved_model --batch-size 1000
+    python -m multilepton.ml.onnx_backend benchmark /path/to/saved_model --batch-size 1000
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+from typing import Any
+
+import numpy as np
+
+
+# bump when the export changes in a way that invalidates cached models
+_CONVERSION_VERSION = 1
+
+
+def model_cache_dir() -> str:
+    """
+    Returns the directory of converted models, configurable through ``MULTILEPTON_MODEL_CACHE``
+    and defaulting to a node-local directory.
+    """
+    cache_dir = os.getenv("MULTILEPTON_MODEL_CACHE") or os.path.join(
+        tempfile.gettempdir(),
+        f"multilepton_models_{os.getuid()}",
+    )
+    return os.path.expandvars(os.path.expanduser(cache_dir))
+
+
+def saved_model_hash(path: str, signature_key: str = "") -> str:
+    """
+    Returns a hash of all files of the SavedModel at *path*, the *signature_key* and the export
+    version.
+    """
+    h = hashlib.sha256(f"v{_CONVERSION_VERSION}:{signature_key}".encode())
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            h.update(os.path.relpath(file_path, path).encode())
+            with open(file_path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    h.update(block)
+    return h.hexdigest()
+
+
+def onnx_model_path(path: str, signature_key: str = "", cache_dir: str | None = None) -> str:
+    """
+    Returns the path of the ONNX export of the SavedModel at *path* in the cache.
+    """
+    return os.path.join(
+        cache_dir or model_cache_dir(),
+        "onnx",
+        saved_model_hash(path, signature_key),
+        "model.onnx",
+    )
+
+
+def flatten_arrays(obj: Any) -> list[np.ndarray]:
+    """
+    Returns all arrays in nested tuples, lists and dicts of *obj*, with dicts ordered by key as
+    done by ``tf.nest.flatten``, which defines the order of the inputs of exported models.
+    """
+    if isinstance(obj, (tuple, list)):
+        return [arr for item in obj for arr in flatten_arrays(item)]
+    if isinstance(obj, dict):
+        return [arr for key in sorted(obj) for arr in flatten_arrays(obj[key])]
+    if isinstance(obj, np.ndarray):
+        return [obj]
+    return []
+
+
+def export_onnx(
+    path: str,
+    signature_key: str = "",
+    cache_dir: str | None = None,
+    opset: int = 17,
+) -> str:
+    """
+    Exports the SavedModel at *path* to ONNX into the cache and returns the path of the exported
+    model. Without *signature_key*, the traced inference call of the model is exported. Its tensor
+    inputs, including categorical inputs of embedding layers, become the ONNX inputs in the order
+    of :py:func:`flatten_arrays`, or in the positional order of the signature arguments.
+    """
+    import tensorflow as tf  # type: ignore[import-not-found,import-untyped]
+    import tf2onnx  # type: ignore[import-not-found,import-untyped]
+
+    from multilepton.ml.tf_evaluator import signature_input_names
+
+    out_path = onnx_model_path(path, signature_key, cache_dir=cache_dir)
+    if os.path.exists(out_path):
+        return out_path
+
+    # pick the concrete function to export, preferring the one traced for inference
+    model = tf.saved_model.load(path)
+    if signature_key:
+        concrete = model.signatures[signature_key]
+    else:
+        # keras models trace the training flag as a positional or keyword argument
+        def training(func):
+            args, kwargs = func.structured_input_signature
+            return kwargs.get("training") is True or any(arg is True for arg in args[1:])
+        candidates = model.__call__.concrete_functions
+        concrete = next((f for f in candidates if not training(f)), candidates[0])
+    input_structure = concrete.structured_input_signature
+    if signature_key:
+        names = signature_input_names(concrete)
+        specs = [input_structure[1][name] for name in names]
+    else:
+        specs = [
+            spec for spec in tf.nest.flatten(input_structure)
+            if isinstance(spec, tf.TensorSpec)
+        ]
+    input_signature = [
+        tf.TensorSpec(spec.shape, spec.dtype, name=f"input_{i}")
+        for i, spec in enumerate(specs)
+    ]
+
+    @tf.function(input_signature=input_signature)
+    def call(*tensors):
+        if signature_key:
+            args, kwargs = (), dict(zip(names, tensors))
+        else:
+            tensors_iter = iter(tensors)
+            args, kwargs = tf.nest.map_structure(
+                lambda leaf: next(tensors_iter) if isinstance(leaf, tf.TensorSpec) else leaf,
+                input_structure,
+            )
+        output = concrete(*args, **kwargs)
+        # signatures return a dict of outputs, of which only single ones are supported
+        if isinstance(output, dict):
+            if len(output) != 1:
+                raise ValueError(f"cannot export signature '{signature_key}' with outputs {list(output)}")
+            output = next(iter(output.values()))
+        return tf.identity(output, name="output")
+
+    # export into a temporary directory next to the target and move it into place atomically
+    out_dir = os.path.dirname(out_path)
+    os.makedirs(os.path.dirname(out_dir), exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(out_dir), prefix=".tmp_")
+    try:
+        tf2onnx.convert.from_function(
+            call,
+            input_signature=input_signature,
+            opset=opset,
+            output_path=os.path.join(tmp_dir, "model.onnx"),
+        )
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump({
+                "source": os.path.abspath(path),
+                "signature_key": signature_key,
+                "opset": opset,
+                "conversion_version": _CONVERSION_VERSION,
+                "tensorflow": tf.__version__,
+                "tf2onnx": tf2onnx.__version__,
+            }, f, indent=4)
+        try:
+            os.rename(tmp_dir, out_dir)
+        except OSError:
+            # exported concurrently by another process
+            if not os.path.exists(out_path):
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return out_path
+
+
+class ONNXModel:
+    """
+    ONNX Runtime session of an exported model at *path* that is called like the TensorFlow model
+    it was exported from and returns the first output as a NumPy array.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        intra_op_threads: int | None = None,
+        inter_op_threads: int | None = None,
+    ) -> None:
+        super().__init__()
+
+        import onnxruntime as ort  # type: ignore[import-not-found,import-untyped]
+
+        options = ort.SessionOptions()
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads:
+            options.inter_op_num_threads = inter_op_threads
+
+        self.path = path
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.inputs = self.session.get_inputs()
+        self.output_name = self.session.get_outputs()[0].name
+
+        # numpy dtypes of inputs
+        self._dtypes = [
+            np.dtype({"tensor(float)": np.float32, "tensor(double)": np.float64}.get(inp.type, inp.type[7:-1]))
+            for inp in self.inputs
+        ]
+
+    def __call__(self, *args, **kwargs) -> np.ndarray:
+        arrays = flatten_arrays((args, kwargs))
+        if len(arrays) != len(self.inputs):
+            raise ValueError(f"model {self.path} expects {len(self.inputs)} input arrays, got {len(arrays)}")
+        feeds = {
+            inp.name: np.ascontiguousarray(arr, dtype=dtype)
+            for inp, arr, dtype in zip(self.inputs, arrays, self._dtypes)
+        }
+        return self.session.run([self.output_name], feeds)[0]
+
+
+def _example_inputs(onnx_path: str, batch_size: int, seed: int = 0) -> list[np.ndarray]:
+    # random floats and zero integers with the shapes of the model inputs
+    model = ONNXModel(onnx_path)
+    rng = np.random.default_rng(seed)
+    arrays = []
+    for inp, dtype in zip(model.inputs, model._dtypes):
+        shape = [batch_size if i == 0 else dim for i, dim in enumerate(inp.shape)]
+        if not all(isinstance(dim, int) for dim in shape):
+            raise ValueError(f"cannot build example inputs for dynamic shape {inp.shape} of {inp.name}")
+        arrays.append(
+            rng.normal(size=shape).astype(dtype)
+            if np.issubdtype(dtype, np.floating)
+            else np.zeros(shape, dtype=dtype),
+        )
+    return arrays
+
+
+def check_onnx_equivalence(
+    path: str,
+    *args,
+    signature_key: str = "",
+    cache_dir: str | None = None,
+    rtol: float = 1e-5,
+    atol: float = 1e-5,
+    **kwargs,
+) -> dict[str, Any]:
+    """
+    Evaluates the SavedModel at *path*, or its signature *signature_key*, with TensorFlow and its
+    ONNX export on the same inputs *args* and *kwargs* and returns the maximum absolute and
+    relative deviations, and whether all outputs agree within *rtol* and *atol*.
+    """
+    import tensorflow as tf  # type: ignore[import-not-found,import-untyped]
+
+    from multilepton.ml.tf_evaluator import call_signature
+
+    model = tf.saved_model.load(path)
+    if signature_key:
+        tf_output = call_signature(model.signatures[signature_key], *args, **kwargs).numpy()
+    else:
+        tf_output = model(*args, **kwargs).numpy()
+    onnx_output = ONNXModel(onnx_model_path(path, signature_key, cache_dir=cache_dir))(*args, **kwargs)
+
+    diff = np.abs(onnx_output.astype(np.float64) - tf_output.astype(np.float64))
+    return {
+        "shape": tuple(tf_output.shape),
+        "max_abs_diff": float(np.max(diff, initial=0.0)),
+        "max_rel_diff": float(np.max(diff / np.maximum(np.abs(tf_output), 1e-12), initial=0.0)),
+        "equivalent": tf_output.shape == onnx_output.shape and bool(
+            np.allclose(onnx_output, tf_output, rtol=rtol, atol=atol),
+        ),
+    }
+
+
+def benchmark_backends(
+    path: str,
+    *args,
+    signature_key: str = "",
+    cache_dir: str | None = None,
+    repeat: int = 5,
+    **kwargs,
+) -> dict[str, float]:
+    """
+    Startup and throughput benchmark of the TensorFlow evaluator process and the in-process ONNX
+    backend for the SavedModel at *path* on the inputs *args* and *kwargs*. The startup time is
+    measured until the first result is available.
+    """
+    from multilepton.ml.tf_evaluator import TFEvaluator
+    from multilepton.util import benchmark
+
+    rows = len(flatten_arrays((args, kwargs))[0])
+    results = {}
+
+    t0 = time.perf_counter()
+    tf_evaluator = TFEvaluator()
+    tf_evaluator.silent = True
+    tf_evaluator.use_server = False
+    tf_evaluator.add_model("model", path, signature_key=signature_key)
+    with tf_evaluator:
+        tf_evaluator("model", *args, **kwargs)
+        results["tf_startup_seconds"] = time.perf_counter() - t0
+        _, t_tf = benchmark(tf_evaluator, "model", *args, repeat=repeat, **kwargs)
+    results["tf_rows_per_second"] = rows / max(t_tf, 1e-12)
+
+    t0 = time.perf_counter()
+    onnx_model = ONNXModel(onnx_model_path(path, signature_key, cache_dir=cache_dir))
+    onnx_model(*args, **kwargs)
+    results["onnx_startup_seconds"] = time.perf_counter() - t0
+    _, t_onnx = benchmark(onnx_model, *args, repeat=repeat, **kwargs)
+    results["onnx_rows_per_second"] = rows / max(t_onnx, 1e-12)
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="export SavedModels to ONNX and validate the export")
+    parser.add_argument("command", choices=("export", "check", "benchmark"))
+    parser.add_argument("path", help="path of the SavedModel")
+    parser.add_argument("--signature-key", default="", help="signature to export instead of the model call")
+    parser.add_argument("--cache-dir", default=None, help="cache directory, defaults to $MULTILEPTON_MODEL_CACHE")
+    parser.add_argument("--opset", type=int, default=17, help="ONNX opset for the export")
+    parser.add_argument("--inputs", default=None, help="npz file with input arrays in model input order")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows of example inputs if --inputs is not set")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print(export_onnx(args.path, signature_key=args.signature_key, cache_dir=args.cache_dir, opset=args.opset))
+        return
+
+    # inputs from file or examples matching the exported model
+    if args.inputs:
+        with np.load(args.inputs) as f:
+            inputs = [f[key] for key in f.files]
+    else:
+        onnx_path = onnx_model_path(args.path, args.signature_key, cache_dir=args.cache_dir)
+        inputs = _example_inputs(onnx_path, args.batch_size)
+
+    # models with multiple inputs receive them as a list
+    model_args = (inputs,) if len(inputs) > 1 else tuple(inputs)
+
+    func = check_onnx_equivalence if args.command == "check" else benchmark_backends
+    result = func(args.path, *model_args, signature_key=args.signature_key, cache_dir=args.cache_dir)
+    print(json.dumps(result, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# coding: utf-8
+
+"""
+Node-local cache of model outputs, keyed by a hash of the exact model inputs and of the model
+artifacts, so that reprocessing unchanged chunks does not evaluate the same model again. Outputs
+are stored as npy files and returned memory-mapped and read-only on a hit.
+"""
+
+from __future__ import annotations
+
+import os
+import hashlib
+import tempfile
+from concurrent.futures import Future
+from typing import Any, Callable
+
+import numpy as np
+
+from multilepton.ml.onnx_backend import model_cache_dir, saved_model_hash, flatten_arrays
+
+
+# bump when the key or storage format changes in a way that invalidates cached results
+_CACHE_VERSION = 1
+
+
+def result_cache_dir() -> str:
+    """
+    Returns the directory of cached model outputs, configurable through
+    ``MULTILEPTON_RESULT_CACHE`` and defaulting to a subdirectory of the model cache.
+    """
+    cache_dir = os.getenv("MULTILEPTON_RESULT_CACHE") or os.path.join(model_cache_dir(), "results")
+    return os.path.expandvars(os.path.expanduser(cache_dir))
+
+
+def artifact_hash(path: str, signature_key: str = "") -> str:
+    """
+    Returns a hash of the model at *path*, which is either a single file or a SavedModel
+    directory, and the *signature_key*.
+    """
+    if os.path.isdir(path):
+        return saved_model_hash(path, signature_key)
+
+    h = hashlib.sha256(f"{signature_key}:".encode())
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def inputs_hash(inputs: Any) -> str:
+    """
+    Returns a hash of dtype, shape and content of all arrays in the nested *inputs*.
+    """
+    h = hashlib.blake2b(digest_size=32)
+    for arr in flatten_arrays(inputs):
+        arr = np.ascontiguousarray(arr)
+        h.update(f"{arr.dtype.str}{arr.shape}".encode())
+        h.update(memoryview(arr).cast("B"))
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    Cache of the outputs of models registered with :py:meth:`add_model`. Keys combine the hash of
+    the model artifact, the evaluation *backend* and the hash of the inputs, so that any change in
+    the model or in a single input value results in a miss.
+    """
+
+    def __init__(self, cache_dir: str | None = None) -> None:
+        super().__init__()
+
+        self.cache_dir = cache_dir or result_cache_dir()
+        self.model_hashes: dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def add_model(self, name: str, path: str, signature_key: str = "", backend: str = "tf") -> None:
+        self.model_hashes[name] = f"{backend}:{artifact_hash(path, signature_key)}"
+
+    def key(self, name: str, inputs: Any) -> str:
+        h = hashlib.sha256(f"v{_CACHE_VERSION}:{self.model_hashes[name]}:{inputs_hash(inputs)}".encode())
+        return h.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.npy")
+
+    def get(self, key: str) -> np.ndarray | None:
+        """
+        Returns the read-only, memory-mapped output stored for *key*, or *None* if there is none.
+        """
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            return np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            # incomplete or corrupted file, treated as a miss and overwritten
+            return None
+
+    def put(self, key: str, values: np.ndarray) -> None:
+        """
+        Stores *values* for *key*, writing to a temporary file first so that concurrent readers
+        never see partial outputs.
+        """
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.asarray(values))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def evaluate_async(self, name: str, inputs: Any, submit: Callable[[], Future]) -> Future:
+        """
+        Returns a future for the output of model *name* for *inputs*, resolved immediately from the
+        cache on a hit, and obtained from *submit* and stored once done on a miss.
+        """
+        key = self.key(name, inputs)
+        if (values := self.get(key)) is not None:
+            self.hits += 1
+            future: Future = Future()
+            future.set_result(values)
+            return future
+
+        self.misses += 1
+
+        def store(future: Future) -> None:
+            if future.exception() is None:
+                self.put(key, future.result())
+
+        future = submit()
+        future.add_done_callback(store)
+        return future
+
+    def evaluate(self, name: str, inputs: Any, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        """
+        Returns the output of model *name* for *inputs*, taken from the cache on a hit, and obtained
+        from *compute* and stored on a miss.
+        """
+        key = self.key(name, inputs)
+        if (values := self.get(key)) is not None:
+            self.hits += 1
+            return values
+
+        self.misses += 1
+        values = compute()
+        self.put(key, values)
+        return values
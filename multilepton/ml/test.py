@@ -11,9 +11,10 @@ from typing import Any
 import law
 import order as od
 
-from columnflow.ml import MLModel
 from columnflow.util import maybe_import, dev_sandbox
-from columnflow.columnar_util import Route, set_ak_column
+from columnflow.columnar_util import Route
+
+from multilepton.ml.base import PrefetchMLModel
 
 
 np = maybe_import("numpy")
@@ -21,7 +22,7 @@ ak = maybe_import("awkward")
 law.contrib.load("tensorflow")
 
 
-class TestModel(MLModel):
+class TestModel(PrefetchMLModel):
     def setup(self):
         # dynamically add variables for the quantities produced by this model
         if f"{self.cls_name}.kl" not in self.config_inst.variables:
@@ -91,17 +92,29 @@ class TestModel(MLModel):
         # the output is just a single directory target
         output.dump(model, formatter="tf_keras_model")
 
-    def evaluate(
+    def prepare_features(
         self,
         task: law.Task,
         events: ak.Array,
+        fold_indices: np.ndarray,
+    ) -> np.ndarray:
+        # pt and eta of the leading jet, matching the inputs of the dummy NN
+        jet = ak.firsts(events.Jet[ak.argsort(events.Jet.pt, ascending=False)])
+        return np.stack([
+            ak.to_numpy(ak.fill_none(jet.pt, 0.0)),
+            ak.to_numpy(ak.fill_none(jet.eta, 0.0)),
+        ], axis=1).astype(np.float32)
+
+    def predict(
+        self,
+        task: law.Task,
+        features: np.ndarray,
         models: list[Any],
-        fold_indices: ak.Array,
+        fold_indices: np.ndarray,
         events_used_in_training: bool = False,
-    ) -> ak.Array:
+    ) -> dict[str, np.ndarray]:
         # fake evaluation
-        events = set_ak_column(events, f"{self.cls_name}.kl", 0.5, value_type=np.float32)
-        return events
+        return {f"{self.cls_name}.kl": np.full(len(features), 0.5, dtype=np.float32)}
 
 
 test_model = TestModel.derive("test_model", cls_dict={"folds": 2})
@@ -1,27 +1,272 @@
 # coding: utf-8
 
 """
-Generic interface for loading and evaluating TensorFlow models in a separate process.
-Data exchange is handled through multiprocessing pipes.
+Generic interface for loading and evaluating TensorFlow models in a separate process, or in a
+node-level model server (see :py:mod:`multilepton.ml.tf_server`).
+Data exchange is handled through multiprocessing pipes, with arrays optionally passed through
+shared memory buffers. Models exported to ONNX (see :py:mod:`multilepton.ml.onnx_backend`) can be
+evaluated in-process instead.
 """
 
 from __future__ import annotations
 
 import os
+import sys
 import time
 import pathlib
-from multiprocessing import Process, Pipe
-from multiprocessing.connection import Connection
-from dataclasses import dataclass
-from typing import Any
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing import Process, Pipe, resource_tracker
+from multiprocessing.connection import Connection, wait
+from multiprocessing.shared_memory import SharedMemory
+from dataclasses import dataclass, field
+from typing import Any, Callable
 
+import law
+import numpy as np
+
+from multilepton.ml.onnx_backend import ONNXModel, onnx_model_path
+
+
+logger = law.logger.get_logger(__name__)
 
 STOP_SIGNAL = "STOP"
 
+TRANSPORTS = ("pipe", "shm")
+
+BACKENDS = ("tf", "onnx")
+
+
+@dataclass
+class SharedArray:
+    """
+    Placeholder for an array stored at *offset* in a :py:class:`SharedBuffer`, which is pickled
+    instead of the array itself.
+    """
+
+    shape: tuple[int, ...]
+    dtype: str
+    offset: int
+
+
+def _map_arrays(obj: Any, func: Callable[[Any], Any], cls: type = np.ndarray) -> Any:
+    """
+    Applies *func* to all instances of *cls* in the (nested) tuples, lists and dicts of *obj*.
+    """
+    if isinstance(obj, cls) and (cls is not np.ndarray or not obj.dtype.hasobject):
+        return func(obj)
+    if isinstance(obj, (tuple, list)):
+        return type(obj)(_map_arrays(item, func, cls) for item in obj)
+    if isinstance(obj, dict):
+        return {key: _map_arrays(value, func, cls) for key, value in obj.items()}
+    return obj
+
+
+def signature_input_names(func: Any) -> list[str]:
+    """
+    Returns the names of the keyword arguments of the SavedModel signature *func* in the order in
+    which the model receives them, e.g. ``["inputs", "inputs_1"]`` for a list of two inputs.
+    """
+    n = len(func.structured_input_signature[1])
+    return [tensor.name.split(":")[0] for tensor in func.inputs[:n]]
+
+
+def call_signature(func: Any, /, *args, **kwargs) -> Any:
+    """
+    Calls the SavedModel signature *func* with arrays in *args* and *kwargs* that are structured
+    as for the call of the model itself and returns the single output tensor.
+    """
+    names = signature_input_names(func)
+    if args or set(kwargs) != set(names):
+        arrays: list[np.ndarray] = []
+        _map_arrays((args, kwargs), arrays.append)
+        if len(arrays) != len(names):
+            raise ValueError(f"signature expects {len(names)} input arrays {names}, got {len(arrays)}")
+        kwargs = dict(zip(names, arrays))
+
+    outputs = func(**kwargs)
+    if len(outputs) != 1:
+        raise ValueError(f"signature has {len(outputs)} outputs {list(outputs)}, expected one")
+    return next(iter(outputs.values()))
+
+
+class SharedBuffer:
+    """
+    Growable shared memory buffer that is owned by one process and attached to by another one, used
+    to exchange arrays while only pickling their shapes and dtypes. *untrack_attached* should be
+    *True* when the owner does not share the resource tracker of this process, so that attached
+    buffers are not unlinked by it.
+    """
+
+    alignment = 64
+
+    def __init__(self, untrack_attached: bool = False) -> None:
+        super().__init__()
+
+        self.shm: SharedMemory | None = None
+        self.owner = False
+        self.untrack_attached = untrack_attached
+
+    @property
+    def name(self) -> str | None:
+        return None if self.shm is None else self.shm.name
+
+    def reserve(self, size: int) -> None:
+        """
+        Makes sure the buffer, owned by this process, has at least *size* bytes.
+        """
+        if self.owner and self.shm is not None and self.shm.size >= size:
+            return
+        self.close()
+        self.shm = SharedMemory(create=True, size=max(self.alignment, 1 << (size - 1).bit_length()))
+        self.owner = True
+
+    def attach(self, name: str) -> None:
+        """
+        Attaches to the buffer *name* owned by another process, unless already attached.
+        """
+        if self.name == name:
+            return
+        self.close()
+        # only the owner should track and eventually unlink the memory
+        if sys.version_info >= (3, 13):
+            self.shm = SharedMemory(name=name, track=False)
+        else:
+            self.shm = SharedMemory(name=name)
+            if self.untrack_attached:
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.owner = False
+
+    def close(self) -> None:
+        if self.shm is None:
+            return
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+        self.shm = None
+        self.owner = False
+
+    def pack(self, obj: Any) -> Any:
+        """
+        Copies all arrays in *obj* into the buffer and returns *obj* with :py:class:`SharedArray`
+        placeholders in their place.
+        """
+        offsets: list[int] = []
+        size = 0
+
+        def add(arr: np.ndarray) -> None:
+            nonlocal size
+            offsets.append(size)
+            size += -(-arr.nbytes // self.alignment) * self.alignment
+
+        _map_arrays(obj, add)
+        self.reserve(size)
+
+        offsets_iter = iter(offsets)
+
+        def put(arr: np.ndarray) -> SharedArray:
+            offset = next(offsets_iter)
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=self.shm.buf, offset=offset)[...] = arr
+            return SharedArray(shape=arr.shape, dtype=arr.dtype.str, offset=offset)
+
+        return _map_arrays(obj, put)
+
+    def unpack(self, obj: Any, copy: bool = False) -> Any:
+        """
+        Replaces all :py:class:`SharedArray` placeholders in *obj* by arrays viewing the buffer, or
+        by copies when *copy* is *True*.
+        """
+        def get(placeholder: SharedArray) -> np.ndarray:
+            arr = np.ndarray(
+                placeholder.shape,
+                dtype=np.dtype(placeholder.dtype),
+                buffer=self.shm.buf,
+                offset=placeholder.offset,
+            )
+            return arr.copy() if copy else arr
+
+        return _map_arrays(obj, get, cls=SharedArray)
+
+
+@dataclass
+class EvaluationStats:
+    """
+    Latency and throughput counters of a single model. *busy_time* is the time spent in forward
+    passes including the data transport, *total_latency* the summed time from submission to
+    result of all calls.
+    """
+
+    calls: int = 0
+    forward_passes: int = 0
+    rows: int = 0
+    busy_time: float = 0.0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+
+    def add_call(self, latency: float) -> None:
+        self.calls += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def add_forward_pass(self, rows: int, duration: float) -> None:
+        self.forward_passes += 1
+        self.rows += rows
+        self.busy_time += duration
+
+    @property
+    def mean_latency(self) -> float:
+        return self.total_latency / self.calls if self.calls else 0.0
+
+    @property
+    def throughput(self) -> float:
+        return self.rows / self.busy_time if self.busy_time else 0.0
+
+    def to_dict(self) -> dict[str, float]:
+        return {
+            "calls": self.calls,
+            "forward_passes": self.forward_passes,
+            "rows": self.rows,
+            "mean_latency": self.mean_latency,
+            "max_latency": self.max_latency,
+            "throughput": self.throughput,
+        }
+
+
+def _batch_rows(data: Any) -> int | None:
+    """
+    Returns the common length of the first axis of all arrays in *data*, or *None* if there are no
+    arrays or their lengths differ, in which case *data* cannot be merged with other requests.
+    """
+    rows = set()
+    _map_arrays(data, lambda arr: rows.add(arr.shape[0] if arr.ndim else None))
+    return rows.pop() if len(rows) == 1 else None
+
 
 class TFEvaluator:
     """
-    TensorFlow model evaluator that runs in a separate process with support for multiple models.
+    TensorFlow model evaluator that runs in separate processes with support for multiple models.
+    With the ``"shm"`` *transport*, a process blocks on all its model pipes until data arrives and
+    input and output arrays are exchanged through shared memory, while ``"pipe"``, the default,
+    pickles them and polls the pipes every *delay* seconds.
+
+    Models are distributed over *n_workers* processes, each using *intra_op_threads* and
+    *inter_op_threads* TensorFlow threads if set, so that calls to models on different workers
+    submitted through :py:meth:`evaluate_async` run concurrently. With *batching* enabled,
+    concurrent requests for the same model with compatible inputs arriving within *batch_wait*
+    seconds are merged along their first axis into a single forward pass of up to *max_batch_rows*
+    rows. Per-model counters are returned by :py:meth:`stats`.
+
+    With *use_server*, which defaults to *True* when ``MULTILEPTON_TF_SERVER`` is set to ``1``,
+    models are evaluated by the node-level model server at *server_address*, which is started if
+    needed. When the server cannot be reached within *server_timeout* seconds, models are evaluated
+    in local processes instead.
+
+    Models added with the ``"onnx"`` *backend* are evaluated in-process by ONNX Runtime from their
+    export in the model cache, falling back to TensorFlow if no export exists. No process is
+    started when all models use ONNX.
 
     .. code-block:: python
 
@@ -37,15 +282,37 @@ class TFEvaluator:
         path: str
         pipe: Connection | None = None
         signature_key: str = ""
+        backend: str = "tf"
+        onnx_path: str = ""
+        session: ONNXModel | None = None
+        in_buffer: SharedBuffer | None = None
+        out_buffer: SharedBuffer | None = None
+        lock: threading.Lock = field(default_factory=threading.Lock)
+        batch_lock: threading.Lock = field(default_factory=threading.Lock)
+        batch: list[tuple] = field(default_factory=list)
+        stats: EvaluationStats = field(default_factory=EvaluationStats)
 
     def __init__(self) -> None:
         super().__init__()
 
         self._models: dict[str, TFEvaluator.Model] = {}
-        self._p: Process | None = None
+        self._processes: list[Process] = []
+        self._server_connected = False
+        self._started = False
+        self._executor: ThreadPoolExecutor | None = None
 
+        self.transport = "pipe"
         self.delay = 0.2
         self.silent = False
+        self.n_workers = 1
+        self.intra_op_threads: int | None = None
+        self.inter_op_threads: int | None = None
+        self.batching = False
+        self.batch_wait = 0.002
+        self.max_batch_rows = 65536
+        self.use_server = os.getenv("MULTILEPTON_TF_SERVER", "0").lower() in ("1", "true", "yes")
+        self.server_address: str | None = None
+        self.server_timeout = 120.0
 
     def __enter__(self) -> TFEvaluator:
         self.start()
@@ -62,92 +329,320 @@ class TFEvaluator:
 
     @property
     def running(self) -> bool:
-        return self._p is not None
-
-    def add_model(self, name: str, path: str | pathlib.Path, signature_key: str = "") -> None:
+        return self._started
+
+    def add_model(
+        self,
+        name: str,
+        path: str | pathlib.Path,
+        signature_key: str = "",
+        backend: str = "tf",
+    ) -> None:
         if self.running:
             raise ValueError("cannot add models while running")
         if name in self._models:
             raise ValueError(f"model with name '{name}' already exists")
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown backend '{backend}', must be one of {BACKENDS}")
 
         # normalize path
         path = str(path)
         path = os.path.expandvars(os.path.expanduser(path))
         path = os.path.abspath(os.path.abspath(path))
 
+        # look up the onnx export
+        onnx_path = ""
+        if backend == "onnx":
+            onnx_path = onnx_model_path(path, signature_key)
+            if not os.path.exists(onnx_path):
+                logger.warning(
+                    f"no ONNX export of model '{name}' at {onnx_path}, evaluating it with TensorFlow; "
+                    f"create it with 'python -m multilepton.ml.onnx_backend export {path}'",
+                )
+                backend, onnx_path = "tf", ""
+
         # add it
-        self._models[name] = TFEvaluator.Model(name=name, path=path, signature_key=signature_key)
+        self._models[name] = TFEvaluator.Model(
+            name=name,
+            path=path,
+            signature_key=signature_key,
+            backend=backend,
+            onnx_path=onnx_path,
+        )
 
     def start(self) -> None:
         if self.running:
             raise ValueError("process already started")
+        if self.transport not in TRANSPORTS:
+            raise ValueError(f"unknown transport '{self.transport}', must be one of {TRANSPORTS}")
 
-        # build the subprocess config
-        config = []
+        # threads for asynchronous and batched calls
+        self._executor = ThreadPoolExecutor(
+            max_workers=2 * max(1, len(self._models)),
+            thread_name_prefix="tf_evaluator",
+        )
+        self._started = True
+
+        # load onnx models in this process
+        tf_models = []
         for model in self._models.values():
-            parent_pipe, child_pipe = Pipe()
-            model.pipe = parent_pipe
-            config.append({"name": model.name, "path": model.path, "pipe": child_pipe})
+            model.stats = EvaluationStats()
+            if model.backend == "onnx":
+                model.session = ONNXModel(
+                    model.onnx_path,
+                    intra_op_threads=self.intra_op_threads,
+                    inter_op_threads=self.inter_op_threads,
+                )
+            else:
+                tf_models.append(model)
+        if not tf_models:
+            return
 
-        # create and start the process
-        self._p = Process(
-            target=_tf_evaluate,
-            args=(config,),
-            kwargs={"delay": self.delay, "silent": self.silent},
-        )
-        self._p.start()
+        # prefer the model server if requested
+        if self.use_server and self._connect_server(tf_models):
+            return
 
-    def evaluate(self, name: str, *args, **kwargs) -> Any:
+        # build the subprocess configs, distributing models over workers
+        n_workers = max(1, min(self.n_workers, len(tf_models)))
+        configs: list[list[dict[str, Any]]] = [[] for _ in range(n_workers)]
+        for i, model in enumerate(tf_models):
+            parent_pipe, child_pipe = Pipe()
+            model.pipe = parent_pipe
+            if self.transport == "shm":
+                model.in_buffer = SharedBuffer()
+                model.out_buffer = SharedBuffer()
+            configs[i % n_workers].append({
+                "name": model.name,
+                "path": model.path,
+                "signature_key": model.signature_key,
+                "pipe": child_pipe,
+            })
+
+        # share the resource tracker of shared memory buffers with the subprocesses
+        if self.transport == "shm":
+            resource_tracker.ensure_running()
+
+        # create and start the processes
+        for config in configs:
+            p = Process(
+                target=_tf_evaluate,
+                args=(config,),
+                kwargs={
+                    "transport": self.transport,
+                    "delay": self.delay,
+                    "silent": self.silent,
+                    "intra_op_threads": self.intra_op_threads,
+                    "inter_op_threads": self.inter_op_threads,
+                },
+            )
+            p.start()
+            self._processes.append(p)
+
+    def _connect_server(self, models: list[TFEvaluator.Model]) -> bool:
+        from multilepton.ml.tf_server import connect, default_server_address
+
+        address = self.server_address or default_server_address()
+        try:
+            for model in models:
+                model.pipe = connect(
+                    address,
+                    {"name": model.name, "path": model.path, "signature_key": model.signature_key},
+                    timeout=self.server_timeout,
+                )
+                if self.transport == "shm":
+                    model.in_buffer = SharedBuffer()
+                    model.out_buffer = SharedBuffer(untrack_attached=True)
+        except Exception as e:
+            logger.warning(f"TF model server at {address} not available, evaluating models locally: {e}")
+            for model in models:
+                if model.pipe is not None:
+                    model.pipe.close()
+                    model.pipe = None
+                model.in_buffer = model.out_buffer = None
+            return False
+
+        self._server_connected = True
+        return True
+
+    def _get_model(self, name: str) -> TFEvaluator.Model:
         if not self.running:
             raise ValueError("process not started")
-
-        # get the model
         if name not in self._models:
             raise ValueError(f"model with name '{name}' does not exist")
-        model = self._models[name]
+        return self._models[name]
+
+    def _send(self, model: TFEvaluator.Model, args: tuple, kwargs: dict, rows: int | None = None) -> Any:
+        with model.lock:
+            t0 = time.perf_counter()
+
+            # evaluate in this process
+            if model.session is not None:
+                result = model.session(*args, **kwargs)
+
+            # pickle data through the pipe
+            elif model.in_buffer is None:
+                model.pipe.send((args, kwargs))  # type: ignore[union-attr]
+                result = model.pipe.recv()  # type: ignore[union-attr]
+
+            # send arrays through shared memory, and copy the result out of it
+            else:
+                args, kwargs = model.in_buffer.pack((args, kwargs))
+                model.pipe.send((model.in_buffer.name, args, kwargs))  # type: ignore[union-attr]
+                out_name, result = model.pipe.recv()  # type: ignore[union-attr]
+                model.out_buffer.attach(out_name)  # type: ignore[union-attr]
+                result = model.out_buffer.unpack(result, copy=True)  # type: ignore[union-attr]
+
+            model.stats.add_forward_pass(rows or 0, time.perf_counter() - t0)
+
+        return result
+
+    def _evaluate(self, model: TFEvaluator.Model, args: tuple, kwargs: dict) -> Any:
+        t0 = time.perf_counter()
+        result = self._send(model, args, kwargs, rows=_batch_rows((args, kwargs)))
+        with model.batch_lock:
+            model.stats.add_call(time.perf_counter() - t0)
+        return result
+
+    def evaluate(self, name: str, *args, **kwargs) -> Any:
+        model = self._get_model(name)
+
+        # go through the batching queue so that calls from other threads can be merged
+        if self.batching:
+            return self.evaluate_async(name, *args, **kwargs).result()
+
+        return self._evaluate(model, args, kwargs)
+
+    def evaluate_async(self, name: str, *args, **kwargs) -> Future:
+        """
+        Submits the evaluation of model *name* and returns a future for its result.
+        """
+        model = self._get_model(name)
+
+        rows = _batch_rows((args, kwargs)) if self.batching else None
+        if rows is None:
+            return self._executor.submit(self._evaluate, model, args, kwargs)  # type: ignore[union-attr]
+
+        # add to the batch and schedule it to be flushed, unless already scheduled
+        future: Future = Future()
+        with model.batch_lock:
+            model.batch.append((args, kwargs, rows, future, time.perf_counter()))
+            schedule = len(model.batch) == 1
+        if schedule:
+            self._executor.submit(self._flush_batch, model)  # type: ignore[union-attr]
+
+        return future
+
+    def _flush_batch(self, model: TFEvaluator.Model) -> None:
+        # wait for more requests to arrive, then take all of them
+        time.sleep(self.batch_wait)
+        with model.batch_lock:
+            requests, model.batch = model.batch, []
+
+        # group requests with the same input structure, shapes and types up to the maximum size
+        groups: list[tuple[Any, list[tuple]]] = []
+        for request in requests:
+            signature = _map_arrays(request[:2], lambda arr: (arr.shape[1:], arr.dtype.str))
+            for group_signature, group in groups:
+                if (
+                    group_signature == signature and
+                    sum(r[2] for r in group) + request[2] <= self.max_batch_rows
+                ):
+                    group.append(request)
+                    break
+            else:
+                groups.append((signature, [request]))
+
+        for _, group in groups:
+            try:
+                if len(group) == 1:
+                    results = [self._send(model, group[0][0], group[0][1], rows=group[0][2])]
+                else:
+                    # concatenate all arrays along the first axis and split the result accordingly
+                    leaves: list[list[np.ndarray]] = []
+                    for args, kwargs, *_ in group:
+                        leaves.append([])
+                        _map_arrays((args, kwargs), leaves[-1].append)
+                    merged = iter([np.concatenate(arrs, axis=0) for arrs in zip(*leaves)])
+                    args, kwargs = _map_arrays(group[0][:2], lambda arr: next(merged))
+                    rows = [r[2] for r in group]
+                    result = self._send(model, args, kwargs, rows=sum(rows))
+                    if not isinstance(result, np.ndarray) or len(result) != sum(rows):
+                        raise ValueError(
+                            f"cannot split batched result of model '{model.name}' into {len(group)} requests",
+                        )
+                    results = np.split(result, np.cumsum(rows)[:-1])
+            except Exception as e:
+                for *_, future, _ in group:
+                    future.set_exception(e)
+                continue
 
-        # evaluate and send back result
-        model.pipe.send((args, kwargs))  # type: ignore[union-attr]
-        return model.pipe.recv()  # type: ignore[union-attr]
+            now = time.perf_counter()
+            for (*_, future, t0), result in zip(group, results):
+                with model.batch_lock:
+                    model.stats.add_call(now - t0)
+                future.set_result(result)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """
+        Returns the latency and throughput counters per model.
+        """
+        return {name: model.stats.to_dict() for name, model in self._models.items()}
 
     def stop(self, timeout: int | float = 5) -> None:
-        # stop and remove model pipes
+        # finish pending calls
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+        # stop and remove model pipes and sessions
         for model in self._models.values():
+            model.session = None
             if model.pipe is not None:
                 model.pipe.send(STOP_SIGNAL)
                 model.pipe.close()
                 model.pipe = None
+            for buffer in (model.in_buffer, model.out_buffer):
+                if buffer is not None:
+                    buffer.close()
+            model.in_buffer = model.out_buffer = None
 
-        # nothing to do when not running
-        if not self.running:
-            return
-
-        # join to wait for normal termination
-        if self._p.is_alive():
-            self._p.join(timeout)
+        for p in self._processes:
+            # join to wait for normal termination
+            if p.is_alive():
+                p.join(timeout)
 
-            # kill if still alive
-            if self._p.is_alive():
-                self._p.kill()
+                # kill if still alive
+                if p.is_alive():
+                    p.kill()
 
         # reset
-        self._p = None
+        self._processes.clear()
+        self._server_connected = False
+        self._started = False
 
 
 def _tf_evaluate(
     config: list[dict[str, Any]],
     /,
     *,
+    transport: str = "pipe",
     delay: int | float = 0.2,
     silent: bool = False,
+    intra_op_threads: int | None = None,
+    inter_op_threads: int | None = None,
 ) -> None:
     _print = (lambda *args, **kwargs: None) if silent else print
 
     _print("importing tensorflow ...")
-    import numpy as np
     import tensorflow as tf  # type: ignore[import-not-found,import-untyped]
     _print("done")
 
+    # configure threading before any model is loaded
+    if intra_op_threads:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    if inter_op_threads:
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+
     @dataclass
     class Model:
         name: str
@@ -155,6 +650,8 @@ def _tf_evaluate(
         pipe: Connection
         signature_key: str = ""
         model: Any = None
+        in_buffer: SharedBuffer | None = None
+        out_buffer: SharedBuffer | None = None
 
         @classmethod
         def new(cls, config: dict[str, Any], /) -> Model:
@@ -170,6 +667,8 @@ def _tf_evaluate(
                 path=config["path"],
                 pipe=config["pipe"],
                 signature_key=config.get("signature_key", ""),
+                in_buffer=SharedBuffer() if transport == "shm" else None,
+                out_buffer=SharedBuffer() if transport == "shm" else None,
             )
 
         def load(self) -> None:
@@ -182,12 +681,23 @@ def _tf_evaluate(
             _print("done")
 
         def evaluate(self, *args, **kwargs) -> np.ndarray:
+            if self.signature_key:
+                return call_signature(self.model, *args, **kwargs).numpy()
             return self.model(*args, **kwargs).numpy()
 
+        def evaluate_shared(self, in_name: str, args: tuple, kwargs: dict) -> tuple[str, SharedArray]:
+            self.in_buffer.attach(in_name)
+            args, kwargs = self.in_buffer.unpack((args, kwargs))
+            result = self.out_buffer.pack(self.evaluate(*args, **kwargs))
+            return self.out_buffer.name, result
+
         def clear(self) -> None:
             _print(f"clearing model '{self.name}'")
             self.model = None
             self.pipe.close()
+            for buffer in (self.in_buffer, self.out_buffer):
+                if buffer is not None:
+                    buffer.close()
 
     # convert to model objects
     models = [Model.new(item) for item in config]
@@ -204,19 +714,25 @@ def _tf_evaluate(
 
     # start loop listening for data
     while models:
+        # with shared memory, block until at least one pipe has data
+        ready = wait([model.pipe for model in models]) if transport == "shm" else None
+
         remove_models: list[int] = []
         for i, model in enumerate(models):
             # skip if there is no data to process
-            if not model.pipe.poll():
+            if not (model.pipe in ready if ready is not None else model.pipe.poll()):
                 continue
 
             # get data and process
             data = model.pipe.recv()
-            if isinstance(data, tuple) and len(data) == 2:
+            if isinstance(data, tuple) and len(data) in (2, 3):
                 # evaluate
                 try:
-                    args, kwargs = data
-                    result = model.evaluate(*args, **kwargs)
+                    if len(data) == 2:
+                        args, kwargs = data
+                        result = model.evaluate(*args, **kwargs)
+                    else:
+                        result = model.evaluate_shared(*data)
                 except:
                     shutdown()
                     raise
@@ -231,6 +747,7 @@ def _tf_evaluate(
             else:
                 raise ValueError(f"unexpected data type {type(data)}")
 
-        # reduce models and sleep
+        # reduce models and sleep when polling
         models = [model for i, model in enumerate(models) if i not in remove_models]
-        time.sleep(delay)
+        if ready is None:
+            time.sleep(delay)
@@ -0,0 +1,274 @@
+# coding: utf-8
+
+"""
+Node-level server that loads each TensorFlow model once and evaluates it for all
+:py:class:`~multilepton.ml.tf_evaluator.TFEvaluator` clients on the same node, e.g. for all tasks
+of a law run with multiple local workers. Clients connect through a unix socket with one
+connection per model, which follows the same protocol as the pipes of a local evaluator process.
+The server is started by the first client and exits after no client was connected for
+*idle_timeout* seconds.
+
+.. code-block:: bash
+
+    export MULTILEPTON_TF_SERVER=1
+    # optional, defaults to a user specific directory in $TMPDIR
+    export MULTILEPTON_TF_SERVER_SOCKET=/path/to/server.sock
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+import fcntl
+import argparse
+import tempfile
+import threading
+import traceback
+import subprocess
+from multiprocessing.connection import Client, Connection, Listener
+from dataclasses import dataclass, field
+from typing import Any
+
+from multilepton.ml.tf_evaluator import STOP_SIGNAL, SharedBuffer, call_signature
+
+
+ACQUIRE_SIGNAL = "ACQUIRE"
+
+
+def default_server_address() -> str:
+    """
+    Returns the socket path of the model server, taken from ``MULTILEPTON_TF_SERVER_SOCKET`` and
+    defaulting to a user specific directory in the temporary directory.
+    """
+    address = os.getenv("MULTILEPTON_TF_SERVER_SOCKET")
+    if address:
+        return os.path.abspath(os.path.expandvars(os.path.expanduser(address)))
+    return os.path.join(tempfile.gettempdir(), f"multilepton_tf_{os.getuid()}", "server.sock")
+
+
+def _try_connect(address: str) -> Connection | None:
+    try:
+        return Client(address, family="AF_UNIX")
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+
+
+def _spawn_and_connect(address: str, timeout: float) -> Connection:
+    # serialize the start among clients on the same node
+    with open(f"{address}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+        # the server might have been started by another client in the meantime
+        if (conn := _try_connect(address)) is not None:
+            return conn
+
+        # remove a stale socket and start the server detached from this process
+        if os.path.exists(address):
+            os.remove(address)
+        with open(f"{address}.log", "a") as log_file:
+            subprocess.Popen(
+                [sys.executable, "-m", "multilepton.ml.tf_server", address],
+                stdin=subprocess.DEVNULL,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+
+        # wait until it listens
+        deadline = time.monotonic() + timeout
+        while (conn := _try_connect(address)) is None:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"TF model server at {address} did not start within {timeout} seconds")
+            time.sleep(0.1)
+
+    return conn
+
+
+def connect(
+    address: str,
+    config: dict[str, Any],
+    /,
+    *,
+    timeout: float = 120.0,
+    spawn: bool = True,
+) -> Connection:
+    """
+    Connects to the model server at *address* and acquires the model described by *config* with
+    fields ``name``, ``path`` and optionally ``signature_key``. The server is started first if it
+    is not running and *spawn* is *True*. The returned connection accepts the same messages as the
+    pipe of a local evaluator process.
+    """
+    os.makedirs(os.path.dirname(address), mode=0o700, exist_ok=True)
+
+    conn = _try_connect(address)
+    if conn is None:
+        if not spawn:
+            raise ConnectionRefusedError(f"TF model server at {address} is not running")
+        conn = _spawn_and_connect(address, timeout)
+
+    conn.send((ACQUIRE_SIGNAL, config))
+    status = conn.recv()
+    if status is not True:
+        conn.close()
+        raise RuntimeError(f"TF model server failed to provide model '{config['name']}': {status}")
+
+    return conn
+
+
+class TFModelServer:
+    """
+    Server listening at *address* that loads models on request of clients and keeps them loaded
+    until it shuts down, after no client was connected for *idle_timeout* seconds, so that clients
+    connecting one after another, e.g. subsequent tasks, share the same loaded model.
+    """
+
+    @dataclass
+    class Model:
+        path: str
+        signature_key: str = ""
+        model: Any = None
+        lock: threading.Lock = field(default_factory=threading.Lock)
+
+        def evaluate(self, *args, **kwargs) -> Any:
+            if self.signature_key:
+                return call_signature(self.model, *args, **kwargs).numpy()
+            return self.model(*args, **kwargs).numpy()
+
+    def __init__(self, address: str, idle_timeout: float = 300.0, silent: bool = False) -> None:
+        super().__init__()
+
+        self.address = address
+        self.idle_timeout = idle_timeout
+        self.silent = silent
+
+        self._models: dict[tuple[str, str], TFModelServer.Model] = {}
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._n_clients = 0
+        self._last_active = time.monotonic()
+        self._stopping = False
+        self._tf: Any = None
+
+    def _print(self, *args, **kwargs) -> None:
+        if not self.silent:
+            print(*args, **kwargs, flush=True)
+
+    def run(self) -> None:
+        self._print("importing tensorflow ...")
+        import tensorflow as tf  # type: ignore[import-not-found,import-untyped]
+        self._tf = tf
+        self._print("done")
+
+        # only the user should be able to connect
+        os.makedirs(os.path.dirname(self.address), mode=0o700, exist_ok=True)
+        old_umask = os.umask(0o177)
+        try:
+            listener = Listener(self.address, family="AF_UNIX")
+        finally:
+            os.umask(old_umask)
+        self._print(f"listening at {self.address}")
+
+        threading.Thread(target=self._watch, daemon=True).start()
+        try:
+            while True:
+                conn = listener.accept()
+                if self._stopping:
+                    conn.close()
+                    break
+                threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+            self._print("shut down")
+
+    def _watch(self) -> None:
+        while True:
+            time.sleep(min(1.0, self.idle_timeout))
+            with self._lock:
+                self._stopping = (
+                    self._n_clients == 0 and
+                    time.monotonic() - self._last_active > self.idle_timeout
+                )
+            if self._stopping:
+                # wake up the listener
+                if (conn := _try_connect(self.address)) is not None:
+                    conn.close()
+                return
+
+    def _acquire(self, config: dict[str, Any]) -> TFModelServer.Model:
+        key = (config["path"], config.get("signature_key", ""))
+        with self._load_lock:
+            if key not in self._models:
+                if not os.path.exists(key[0]):
+                    raise FileNotFoundError(f"model file '{key[0]}' does not exist")
+                sig_msg = f" (signature '{key[1]}')" if key[1] else ""
+                self._print(f"loading model '{config['name']}'{sig_msg} from {key[0]} ...")
+                model = self._tf.saved_model.load(key[0])
+                self._models[key] = self.Model(
+                    path=key[0],
+                    signature_key=key[1],
+                    model=model if not key[1] else model.signatures[key[1]],
+                )
+                self._print("done")
+            return self._models[key]
+
+    def _serve(self, conn: Connection) -> None:
+        in_buffer = SharedBuffer(untrack_attached=True)
+        out_buffer = SharedBuffer()
+        with self._lock:
+            self._n_clients += 1
+
+        try:
+            signal, config = conn.recv()
+            if signal != ACQUIRE_SIGNAL:
+                raise ValueError(f"expected {ACQUIRE_SIGNAL} signal, got {signal}")
+            try:
+                model = self._acquire(config)
+            except Exception as e:
+                conn.send(f"{e.__class__.__name__}: {e}")
+                return
+            conn.send(True)
+
+            # same protocol as local evaluator processes
+            while (data := conn.recv()) != STOP_SIGNAL:
+                if not isinstance(data, tuple) or len(data) not in (2, 3):
+                    raise ValueError(f"unexpected data type {type(data)}")
+                with model.lock:
+                    if len(data) == 2:
+                        args, kwargs = data
+                        conn.send(model.evaluate(*args, **kwargs))
+                    else:
+                        in_name, args, kwargs = data
+                        in_buffer.attach(in_name)
+                        args, kwargs = in_buffer.unpack((args, kwargs))
+                        result = out_buffer.pack(model.evaluate(*args, **kwargs))
+                        conn.send((out_buffer.name, result))
+                    del args, kwargs
+
+        except EOFError:
+            # client disconnected
+            pass
+        except Exception:
+            # only drop this client, which will see the closed connection
+            traceback.print_exc()
+        finally:
+            in_buffer.close()
+            out_buffer.close()
+            conn.close()
+            with self._lock:
+                self._n_clients -= 1
+                self._last_active = time.monotonic()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="node-level TF model server")
+    parser.add_argument("address", nargs="?", default=default_server_address(), help="socket path")
+    parser.add_argument("--idle-timeout", type=float, default=300.0, help="seconds without clients before exit")
+    parser.add_argument("--silent", action="store_true", help="suppress log output")
+    args = parser.parse_args()
+
+    TFModelServer(args.address, idle_timeout=args.idle_timeout, silent=args.silent).run()
+
+
+if __name__ == "__main__":
+    main()
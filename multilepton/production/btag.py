@@ -12,13 +12,15 @@ import law
 
 from columnflow.production import Producer, producer
 from columnflow.production.cms.btag import btag_weights
-from columnflow.util import maybe_import, safe_div
+from columnflow.util import maybe_import
 from columnflow.columnar_util import set_ak_column
 from columnflow.types import Any
 
+from multilepton.util import process_id_index
+from multilepton.production.selection_stats import load_selection_stats, safe_ratio
+
 np = maybe_import("numpy")
 ak = maybe_import("awkward")
-hist = maybe_import("hist")
 
 # helper
 set_ak_column_f32 = functools.partial(set_ak_column, value_type=np.float32)
@@ -45,24 +47,19 @@ btag_weights_pnet = btag_weights.derive("btag_weights_pnet", cls_dict={
     btag_weights_cls=None,
 )
 def _normalized_btag_weights(self: Producer, events: ak.Array, **kwargs) -> ak.Array:
+    # rows of the ratio tables per event, pointing to ones for unknown process ids, and the jet multiplicity as column
+    # (only used for known process ids)
+    pid_index = process_id_index(self.unique_process_ids, ak.to_numpy(events.process_id))
+    n_jets = np.where(pid_index < len(self.unique_process_ids), ak.to_numpy(ak.num(events.Jet.pt, axis=1)), 0)
+
     for route in self[self.btag_weights_cls].produced_columns:
         weight_name = str(route)
         if not weight_name.startswith(self.weight_name):
             continue
 
-        # create a weight vectors starting with ones for both weight variations, i.e.,
-        # nomalization per pid and normalization per pid and jet multiplicity
-        norm_weight_per_pid = np.ones(len(events), dtype=np.float32)
-        norm_weight_per_pid_njet = np.ones(len(events), dtype=np.float32)
-
-        # fill weights with a new mask per unique process id (mostly just one)
-        for pid in self.unique_process_ids:
-            pid_mask = events.process_id == pid
-            # single value
-            norm_weight_per_pid[pid_mask] = self.ratio_per_pid[weight_name][pid]
-            # lookup table
-            n_jets = ak.to_numpy(ak.num(events[pid_mask].Jet.pt, axis=1))
-            norm_weight_per_pid_njet[pid_mask] = self.ratio_per_pid_njet[weight_name][pid][n_jets]
+        # gather both weight variations, i.e., nomalization per pid and normalization per pid and jet multiplicity
+        norm_weight_per_pid = self.ratio_per_pid[weight_name][pid_index]
+        norm_weight_per_pid_njet = self.ratio_per_pid_njet[weight_name][pid_index, n_jets]
 
         # multiply with actual weight
         norm_weight_per_pid = norm_weight_per_pid * events[weight_name]
@@ -106,30 +103,34 @@ def _normalized_btag_weights_setup(
     inputs: dict[str, Any],
     **kwargs,
 ) -> None:
-    # load the selection hists
-    hists = task.cached_value(
-        key="selection_hists",
-        func=lambda: inputs["selection_stats"]["hists"].load(formatter="pickle"),
-    )
+    # load the selection stats
+    stats = load_selection_stats(task, inputs)
 
     # get the unique process ids in that dataset
     key = f"sum_btag_weight_{self.tagger_name}_selected_nob_{self.tagger_name}"
-    self.unique_process_ids = list(hists[key].axes["process"])
+    self.unique_process_ids = stats.process_ids(key)
 
     # get the maximum numbers of jets
-    max_n_jets = max(list(hists[key].axes["n_jets"]))
+    max_n_jets = max(stats.axis_values(key, "n_jets"))
 
-    # helper to get sums of mc weights per pid and njet, with an optional weight name
-    def get_sum(pid, n_jets, weight_name="", /) -> float:
+    # helpers to get sums of mc weights per pid, and per pid and njet, with an optional weight name
+    def get_key(weight_name="", /) -> str:
         if weight_name:
             weight_name += "_"
-        if n_jets != sum:
-            n_jets = hist.loc(n_jets)
-        key = f"sum_mc_weight_{weight_name}selected_nob_{self.tagger_name}"
-        return hists[key][{"process": hist.loc(pid), "n_jets": n_jets}].value
+        return f"sum_mc_weight_{weight_name}selected_nob_{self.tagger_name}"
+
+    def get_sum(weight_name="", /) -> np.ndarray:
+        return stats.sum_per_process(get_key(weight_name), self.unique_process_ids)
+
+    def get_sum_njet(weight_name="", /) -> np.ndarray:
+        key = get_key(weight_name)
+        n_jets_values = stats.axis_values(key, "n_jets")
+        values = stats.values(key, self.unique_process_ids)
+        return values[:, [n_jets_values.index(n_jets) for n_jets in range(max_n_jets + 1)]]
 
     # ratio per weight and pid
-    # extract the ratio per weight, pid and also the jet multiplicity, using the latter as in index
+    # extract the ratio per weight, pid and also the jet multiplicity as lookup tables over the pid index and the jet
+    # multiplicity, with ones for unknown pids in the last row
     self.ratio_per_pid = {}
     self.ratio_per_pid_njet = {}
     for route in self[self.btag_weights_cls].produced_columns:
@@ -137,18 +138,15 @@ def _normalized_btag_weights_setup(
         if not weight_name.startswith(self.btag_weights_cls.weight_name):
             continue
         # normal ratio
-        self.ratio_per_pid[weight_name] = {
-            pid: safe_div(get_sum(pid, sum), get_sum(pid, sum, weight_name))
-            for pid in self.unique_process_ids
-        }
+        self.ratio_per_pid[weight_name] = np.append(
+            safe_ratio(get_sum(), get_sum(weight_name)),
+            1.0,
+        ).astype(np.float32)
         # per jet multiplicity ratio
-        self.ratio_per_pid_njet[weight_name] = {
-            pid: np.array([
-                safe_div(get_sum(pid, n_jets), get_sum(pid, n_jets, weight_name))
-                for n_jets in range(max_n_jets + 1)
-            ])
-            for pid in self.unique_process_ids
-        }
+        self.ratio_per_pid_njet[weight_name] = np.concatenate([
+            safe_ratio(get_sum_njet(), get_sum_njet(weight_name)),
+            np.ones((1, max_n_jets + 1)),
+        ]).astype(np.float32)
 
 
 # derive for btaggers
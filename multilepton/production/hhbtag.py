@@ -6,6 +6,10 @@ See https://github.com/hh-italian-group/HHbtag for v1 and v2,
 and https://gitlab.cern.ch/hh/bbtautau/hh-btag for v3.
 """
 
+from __future__ import annotations
+
+import os
+
 import law
 
 from columnflow.production import Producer, producer
@@ -20,6 +24,47 @@ ak = maybe_import("awkward")
 logger = law.logger.get_logger(__name__)
 
 
+def build_feature_tensor(
+    jet_features: list[np.ndarray],
+    event_features: list[np.ndarray],
+    counts: np.ndarray,
+    n_jets_max: int,
+    event_order: np.ndarray | None = None,
+    jet_valid: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Fills a preallocated float32 tensor of shape (n_events, *n_jets_max*, n_features) with flat
+    *jet_features* of events with *counts* jets each (at most *n_jets_max*), followed by per-event
+    *event_features* that are broadcast to all jets of an event, or only to *jet_valid* jets if
+    given. Padded jets are zero. Events are placed in the order of *event_order* if given. Returns
+    the tensor and the row of each jet in the tensor when reshaped to (-1, n_features).
+    """
+    n_events = len(counts)
+    n_jet_features = len(jet_features)
+    tensor = np.zeros((n_events, n_jets_max, n_jet_features + len(event_features)), dtype=np.float32)
+
+    # position of each event in the tensor
+    position = np.arange(n_events)
+    if event_order is not None:
+        position[event_order] = np.arange(n_events)
+
+    # event index and row per jet
+    jet_events = np.repeat(np.arange(n_events), counts)
+    jet_slots = np.arange(len(jet_events)) - np.repeat(np.cumsum(counts) - counts, counts)
+    jet_rows = position[jet_events] * n_jets_max + jet_slots
+
+    rows = tensor.reshape(-1, tensor.shape[-1])
+    for i, values in enumerate(jet_features):
+        rows[jet_rows, i] = values
+    event_jet_rows, event_jet_events = jet_rows, jet_events
+    if jet_valid is not None:
+        event_jet_rows, event_jet_events = jet_rows[jet_valid], jet_events[jet_valid]
+    for i, values in enumerate(event_features, n_jet_features):
+        rows[event_jet_rows, i] = values[event_jet_events]
+
+    return tensor, jet_rows
+
+
 @producer(
     uses={
         "event", "channel_id",
@@ -27,6 +72,13 @@ logger = law.logger.get_logger(__name__)
         MET_COLUMN("{pt,phi}"),
     },
     sandbox=dev_sandbox("bash::$MULTILEPTON_BASE/sandboxes/venv_multilepton.sh"),
+    # number of evaluator processes, with two the even and odd models are evaluated concurrently
+    tf_workers=1,
+    # "onnx" to evaluate the models exported by multilepton.ml.onnx_backend without TensorFlow
+    model_backend="tf",
+    # whether to reuse scores of identical inputs from multilepton.ml.result_cache, enabled by
+    # default when MULTILEPTON_RESULT_CACHE is set
+    cache_results=None,
 )
 def hhbtag(
     self: Producer,
@@ -54,8 +106,12 @@ def hhbtag(
     jet_shape = abs(jets.pt) >= 0
     n_jets_capped = ak.num(jets, axis=1)
 
-    # get input features
-    input_features = [
+    # flat jet arrays, with missing jets set to zero
+    def flat(values):
+        return ak.to_numpy(ak.fill_none(ak.flatten(values, axis=1), 0))
+
+    # get input features, per jet and per event
+    jet_inputs = [
         jet_shape * 1,
         jets.pt,
         jets.eta,
@@ -64,48 +120,48 @@ def hhbtag(
         abs(jets.eta - htt.eta),
         (jets.btagDeepFlavB if self.hhbtag_version == "v2" else jets.btagPNetB),
         jets.delta_phi(htt),
-        jet_shape * (self.hhbtag_campaign),
-        jet_shape * self.hhbtag_channel_map[events[event_mask].channel_id],
-        jet_shape * htt.pt,
-        jet_shape * htt.eta,
-        jet_shape * htt.delta_phi(met),
-        jet_shape * (met.pt / htt.pt),
-        jet_shape * ak.sum(leps.pt, axis=1),
+    ]
+    jet_features = [flat(f) for f in jet_inputs]
+    event_features = [
+        np.full(len(htt), self.hhbtag_campaign),
+        self.hhbtag_channel_map[events[event_mask].channel_id],
+        htt.pt,
+        htt.eta,
+        htt.delta_phi(met),
+        met.pt / htt.pt,
+        ak.sum(leps.pt, axis=1),
     ]
 
-    # helper to split events, cast to float32, concatenate across new axis,
-    # then pad with zeros for up to n_jets_max jets
-    def split(where):
-        features = ak.concatenate(
-            [
-                ak.values_astype(f[where][..., None], np.float32)
-                for f in input_features
-            ],
-            axis=2,
-        )
-        # fill
-        features = ak.fill_none(
-            ak.pad_none(features, n_jets_max, axis=1),
-            np.zeros(len(input_features), dtype=np.float32),
-            axis=1,
-        )
-        # fix the dimension of the last axis to the known number of input features
-        features = features[..., list(range(len(input_features)))]
-        return ak.to_numpy(features)
+    # fill all features into one tensor with even events first, so that both parts are views
+    even_mask = ak.to_numpy((events[event_mask].event % 2) == 0)
+    n_even = int(np.sum(even_mask))
+    input_features_all, _ = build_feature_tensor(
+        jet_features,
+        [ak.to_numpy(f) for f in event_features],
+        ak.to_numpy(n_jets_capped),
+        n_jets_max,
+        event_order=np.argsort(~even_mask, kind="stable"),
+        jet_valid=jet_features[0].astype(bool),
+    )
 
     # reserve an output score array
     scores = np.ones((ak.sum(event_mask), n_jets_max), dtype=np.float32) * EMPTY_FLOAT
 
-    # fill even and odd events if there are any
-    even_mask = ak.to_numpy((events[event_mask].event % 2) == 0)
-    if ak.sum(even_mask):
-        input_features_even = split(even_mask)
-        scores_even = self.evaluator("hhbtag_even", input_features_even)
-        scores[even_mask] = scores_even
-    if ak.sum(~even_mask):
-        input_features_odd = split(~even_mask)
-        scores_odd = self.evaluator("hhbtag_odd", input_features_odd)
-        scores[~even_mask] = scores_odd
+    # fill even and odd events if there are any, submitting both evaluations before waiting for results
+    def evaluate_async(name, inputs):
+        if self.result_cache is None:
+            return self.evaluator.evaluate_async(name, inputs)
+        return self.result_cache.evaluate_async(name, inputs, lambda: self.evaluator.evaluate_async(name, inputs))
+
+    pending = []
+    if n_even:
+        input_features_even = input_features_all[:n_even]
+        pending.append((even_mask, evaluate_async("hhbtag_even", input_features_even)))
+    if n_even < len(even_mask):
+        input_features_odd = input_features_all[n_even:]
+        pending.append((~even_mask, evaluate_async("hhbtag_odd", input_features_odd)))
+    for mask, future in pending:
+        scores[mask] = future.result()
 
     # remove the scores of padded jets
     where = ak.from_regular(ak.local_index(scores) < n_jets_capped[..., None], axis=1)
@@ -141,7 +197,11 @@ def hhbtag(
             "htt_eta", "delta_phi_htt_to_met",
             "ratio_pt_met_to_htt", "all_lepton_pt",
         ]
-        store_sync_columns = dict(zip(input_feature_names, input_features))
+        # store the original feature arrays rather than the float32 values in the tensor
+        store_sync_columns = dict(zip(
+            input_feature_names,
+            jet_inputs + [jet_shape * f for f in event_features],
+        ))
 
         # store inputs
         for column, values in store_sync_columns.items():
@@ -193,8 +253,18 @@ def hhbtag_setup(
     # unpack the external files bundle and setup the evaluator
     bundle = reqs["external_files"]
     self.evaluator = TFEvaluator()
-    self.evaluator.add_model("hhbtag_even", bundle.files.hh_btag_repo.even.abspath)
-    self.evaluator.add_model("hhbtag_odd", bundle.files.hh_btag_repo.odd.abspath)
+    self.evaluator.n_workers = self.tf_workers
+    self.evaluator.add_model("hhbtag_even", bundle.files.hh_btag_repo.even.abspath, backend=self.model_backend)
+    self.evaluator.add_model("hhbtag_odd", bundle.files.hh_btag_repo.odd.abspath, backend=self.model_backend)
+
+    # optional cache of scores, keyed by the model files and the exact input tensors
+    self.result_cache = None
+    if self.cache_results or (self.cache_results is None and os.getenv("MULTILEPTON_RESULT_CACHE")):
+        from multilepton.ml.result_cache import ResultCache
+        self.result_cache = ResultCache()
+        for name in ("even", "odd"):
+            path = getattr(bundle.files.hh_btag_repo, name).abspath
+            self.result_cache.add_model(f"hhbtag_{name}", path, backend=self.model_backend)
 
     # get the model version (coincides with the external file version)
     self.hhbtag_version = self.config_inst.x.external_files.hh_btag_repo.version
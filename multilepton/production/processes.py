@@ -19,8 +19,6 @@ from multilepton.util import IF_DATASET_IS_DY, IF_DATASET_IS_W_LNU
 
 np = maybe_import("numpy")
 ak = maybe_import("awkward")
-sp = maybe_import("scipy")
-maybe_import("scipy.sparse")
 
 
 logger = law.logger.get_logger(__name__)
@@ -29,12 +27,36 @@ NJetsRange = tuple[int, int]
 PtRange = tuple[float, float]
 
 
+def range_bin_table(edges: np.ndarray, ranges: list[tuple[float, float]]) -> np.ndarray:
+    """
+    Returns a table mapping the bins defined by the sorted *edges*, as returned by
+    :py:func:`digitize`, to the 1-based index of the half-open interval in *ranges* containing them,
+    and to 0 if none does. In case of overlapping *ranges*, the last one takes precedence.
+    """
+    table = np.zeros(len(edges) + 1, dtype=np.int32)
+    for i, (low, high) in enumerate(ranges, 1):
+        first, last = np.searchsorted(edges, [low, high])
+        table[first + 1:last + 1] = i
+    return table
+
+
+def digitize(values: np.ndarray | ak.Array, edges: np.ndarray) -> np.ndarray:
+    """
+    Returns the indices of the bins defined by *edges* for *values*, with edges being compared in the
+    floating point precision of *values* when given in a floating point type.
+    """
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.floating):
+        edges = edges.astype(values.dtype)
+    return np.digitize(values, edges)
+
+
 class stitched_process_ids(Producer):
     """General class to calculate process ids for stitched samples.
 
     Individual producers should derive from this class and set the following attributes:
 
-    :param id_table: scipy lookup table mapping processes variables (using key_func) to process ids
+    :param id_table: dense lookup table mapping processes variables (using key_func) to process ids
     :param key_func: function to generate keys for the lookup, receiving values of stitching columns
     :param stitching_columns: list of observables to use for stitching
     :param cross_check_translation_dict: dictionary to translate stitching columns to auxiliary
@@ -43,7 +65,7 @@ class stitched_process_ids(Producer):
     """
 
     @abc.abstractproperty
-    def id_table(self) -> sp.sparse._lil.lil_matrix:
+    def id_table(self) -> np.ndarray:
         # must be overwritten by inheriting classes
         ...
 
@@ -84,11 +106,11 @@ class stitched_process_ids(Producer):
             self.stitching_range_cross_check(process_inst, stitching_values)
 
         # lookup the id and check for invalid values
-        process_ids = np.squeeze(np.asarray(self.id_table[self.key_func(*stitching_values)].todense()))
+        process_ids = self.id_table[self.key_func(*stitching_values)]
         invalid_mask = process_ids == 0
-        if ak.any(invalid_mask):
+        if np.any(invalid_mask):
             raise ValueError(
-                f"found {sum(invalid_mask)} events that could not be assigned to a process",
+                f"found {np.sum(invalid_mask)} events that could not be assigned to a process",
             )
 
         # store them
@@ -136,6 +158,10 @@ class stiched_process_ids_nj_pt(stitched_process_ids):
 
         # setup during setup
         self.sorted_stitching_ranges: list[tuple[NJetsRange, list[PtRange]]]
+        self.nj_edges: np.ndarray
+        self.pt_edges: np.ndarray
+        self.nj_bin_table: np.ndarray
+        self.pt_bin_table: np.ndarray
 
         # check that aux fields are present in cross_check_translation_dict
         for field in (self.njets_aux, self.pt_aux):
@@ -162,10 +188,24 @@ class stiched_process_ids_nj_pt(stitched_process_ids):
             for nj_range in sorted(stitching_ranges.keys(), key=lambda nj_range: nj_range[0])
         ]
 
+        # precompile the sorted edges of all ranges per axis, and tables mapping the bins they define
+        # to the stitching bins, with the pt bins depending on the njets bin
+        nj_ranges = [nj_range for nj_range, _ in self.sorted_stitching_ranges]
+        self.nj_edges = np.unique(np.array(nj_ranges, dtype=np.float64))
+        self.nj_bin_table = range_bin_table(self.nj_edges, nj_ranges)
+        self.pt_edges = np.unique(np.array(
+            [pt_range for _, pt_ranges in self.sorted_stitching_ranges for pt_range in pt_ranges],
+            dtype=np.float64,
+        ).reshape(-1))
+        self.pt_bin_table = np.stack(
+            [np.zeros(len(self.pt_edges) + 1, dtype=np.int32)] +
+            [range_bin_table(self.pt_edges, pt_ranges) for _, pt_ranges in self.sorted_stitching_ranges],
+        )
+
         # define the lookup table
         max_nj_bin = len(self.sorted_stitching_ranges)
         max_pt_bin = max(map(len, stitching_ranges.values()))
-        self.id_table = sp.sparse.lil_matrix((max_nj_bin + 1, max_pt_bin + 1), dtype=np.int64)
+        self.id_table = np.zeros((max_nj_bin + 1, max_pt_bin + 1), dtype=np.int64)
 
         # fill it
         for proc in self.leaf_processes:
@@ -186,16 +226,8 @@ class stiched_process_ids_nj_pt(stitched_process_ids):
             single = True
 
         # map into bins (index 0 means no binning)
-        nj_bins = np.zeros(len(njets), dtype=np.int32)
-        pt_bins = np.zeros(len(pt), dtype=np.int32)
-        for nj_bin, (nj_range, pt_ranges) in enumerate(self.sorted_stitching_ranges, 1):
-            # nj_bin
-            nj_mask = (nj_range[0] <= njets) & (njets < nj_range[1])
-            nj_bins[nj_mask] = nj_bin
-            # pt_bin
-            for pt_bin, (pt_min, pt_max) in enumerate(pt_ranges, 1):
-                pt_mask = (pt_min <= pt) & (pt < pt_max)
-                pt_bins[nj_mask & pt_mask] = pt_bin
+        nj_bins = self.nj_bin_table[digitize(njets, self.nj_edges)]
+        pt_bins = self.pt_bin_table[nj_bins, digitize(pt, self.pt_edges)]
 
         return (nj_bins[0], pt_bins[0]) if single else (nj_bins, pt_bins)
 
@@ -213,3 +245,59 @@ process_ids_w_lnu = stiched_process_ids_nj_pt.derive("process_ids_w_lnu", cls_di
     "include_condition": IF_DATASET_IS_W_LNU,
     # still misses leaf_processes, must be set dynamically
 })
+
+
+def dy_stitching_values(n: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns *n* values of LHE.NpNLO and LHE.Vpt following the shapes of an inclusive NLO DY sample,
+    i.e., mostly zero-parton events with a soft boson pt, and steeply falling pt spectra with tails
+    beyond 600 GeV for one and two partons.
+    """
+    rng = np.random.default_rng(seed)
+    njets = rng.choice([0, 1, 2], size=n, p=[0.62, 0.27, 0.11]).astype(np.uint8)
+    shape = np.array([1.0, 1.3, 1.6])[njets]
+    scale = np.array([4.0, 22.0, 35.0])[njets]
+    pt = rng.gamma(shape, scale).astype(np.float32)
+    return njets, pt
+
+
+def benchmark_stitching(
+    producer: stiched_process_ids_nj_pt,
+    n: int = 1_000_000,
+    repeat: int = 3,
+    seed: int = 0,
+) -> dict:
+    """
+    Throughput benchmark of the process id lookup of a set up *producer* on *n* DY-like stitching
+    values from :py:func:`dy_stitching_values`, comparing it with the previous lookup through
+    boolean masks per range and a sparse id table. Returns events per second of both and the number
+    of differing process ids.
+    """
+    from multilepton.util import benchmark
+    sp = maybe_import("scipy.sparse")
+
+    njets, pt = dy_stitching_values(n, seed=seed)
+
+    # previous lookup, with the same bin numbering
+    id_table = sp.lil_matrix(producer.id_table)
+
+    def reference(njets, pt):
+        nj_bins = np.zeros(len(njets), dtype=np.int32)
+        pt_bins = np.zeros(len(pt), dtype=np.int32)
+        for nj_bin, (nj_range, pt_ranges) in enumerate(producer.sorted_stitching_ranges, 1):
+            nj_mask = (nj_range[0] <= njets) & (njets < nj_range[1])
+            nj_bins[nj_mask] = nj_bin
+            for pt_bin, (pt_min, pt_max) in enumerate(pt_ranges, 1):
+                pt_mask = (pt_min <= pt) & (pt < pt_max)
+                pt_bins[nj_mask & pt_mask] = pt_bin
+        return np.squeeze(np.asarray(id_table[nj_bins, pt_bins].todense()))
+
+    ids, t_dense = benchmark(lambda *args: producer.id_table[producer.key_func(*args)], njets, pt, repeat=repeat)
+    ids_reference, t_reference = benchmark(reference, njets, pt, repeat=repeat)
+
+    return {
+        "events": n,
+        "events_per_second_dense": n / max(t_dense, 1e-12),
+        "events_per_second_reference": n / max(t_reference, 1e-12),
+        "differing_ids": int(np.sum(ids != ids_reference)),
+    }
@@ -7,6 +7,7 @@ See https://github.com/uhh-cms/tautauNN
 
 from __future__ import annotations
 
+import os
 import functools
 
 import law
@@ -17,7 +18,7 @@ from columnflow.columnar_util import (
     set_ak_column, attach_behavior, flat_np_view, EMPTY_FLOAT, default_coffea_collections,
 )
 from columnflow.util import maybe_import, dev_sandbox, DotDict
-from columnflow.types import Any
+from columnflow.types import Any, Sequence
 
 np = maybe_import("numpy")
 ak = maybe_import("awkward")
@@ -50,6 +51,11 @@ set_ak_column_f32 = functools.partial(set_ak_column, value_type=np.float32)
     max_chunk_size=5_000,
     # produced columns are added in the deferred init below
     sandbox=dev_sandbox("bash::$MULTILEPTON_BASE/sandboxes/venv_multilepton.sh"),
+    # "onnx" to evaluate the model exported by multilepton.ml.onnx_backend without TensorFlow
+    model_backend="tf",
+    # whether to reuse scores of identical inputs from multilepton.ml.result_cache, enabled by
+    # default when MULTILEPTON_RESULT_CACHE is set
+    cache_results=None,
     # not exposed to be called from the command line
     exposed=False,
 )
@@ -73,63 +79,35 @@ def _res_dnn_evaluation(
         **kwargs,
     )
 
-    # define the pair type (KLUBs channel id)
-    pair_type = np.zeros(len(events), dtype=np.int32)
-    for channel_id, pair_type_id in self.channel_id_to_pair_type.items():
-        pair_type[events.channel_id == channel_id] = pair_type_id
+    # encode all categorical inputs and whether they are covered by the embedding layers of the
+    # network in one pass over per-event arrays; other events cannot be evaluated!
+    lepton_charges = ak.concatenate((events.Electron.charge, events.Muon.charge, events.Tau.charge), axis=1)
+    n_jets, n_fatjets = ak.to_numpy(ak.num(events.HHBJet, axis=1)), ak.to_numpy(ak.num(events.FatJet, axis=1))
+    categorical, event_mask = encode_categorical_inputs(
+        self.categorical_luts,
+        ak.to_numpy(events.channel_id),
+        ak.to_numpy(ak.fill_none(ak.pad_none(events.Tau.decayMode, 2, axis=1, clip=True), -1)),
+        ak.to_numpy(lepton_charges[:, 0]),
+        ak.to_numpy(lepton_charges[:, 1]),
+        n_jets >= 2,
+        n_fatjets >= 1,
+    )
+    # whether the events is resolved, boosted or neither
+    event_mask &= (n_jets >= 2) | (n_fatjets >= 1)
+    event_mask &= self.year_flag in self.embedding_expected_inputs["year"]
+
+    # gather all remaining inputs from the selected events
+    _events = events[event_mask]
+    categorical = categorical[event_mask]
+    has_jet_pair, has_fatjet = categorical[:, 5].astype(bool), categorical[:, 6].astype(bool)
 
     # get visible tau decay products, consider them all as tau types
     vis_taus = attach_behavior(
-        ak.concatenate((events.Electron, events.Muon, events.Tau), axis=1),
+        ak.concatenate((_events.Electron, _events.Muon, _events.Tau), axis=1),
         type_name="Tau",
     )
     vis_tau1, vis_tau2 = vis_taus[:, 0], vis_taus[:, 1]
 
-    # get decay mode of first lepton (e, mu or tau)
-    tautau_mask = events.channel_id == self.config_inst.channels.n.tautau.id
-    dm1 = -1 * np.ones(len(events), dtype=np.int32)
-    if ak.any(tautau_mask):
-        dm1[tautau_mask] = events.Tau.decayMode[tautau_mask][:, 0]
-
-    # get decay mode of second lepton (also a tau, but position depends on channel)
-    leptau_mask = (
-        (events.channel_id == self.config_inst.channels.n.etau.id) |
-        (events.channel_id == self.config_inst.channels.n.mutau.id)
-    )
-    dm2 = -1 * np.ones(len(events), dtype=np.int32)
-    if ak.any(leptau_mask):
-        dm2[leptau_mask] = events.Tau.decayMode[leptau_mask][:, 0]
-    if ak.any(tautau_mask):
-        dm2[tautau_mask] = events.Tau.decayMode[tautau_mask][:, 1]
-
-    # the dnn treats dm 2 as 1, so we need to map it
-    dm1 = np.where(dm1 == 2, 1, dm1)
-    dm2 = np.where(dm2 == 2, 1, dm2)
-
-    # whether the events is resolvede, boosted or neither
-    has_jet_pair = ak.num(events.HHBJet) >= 2
-    has_fatjet = ak.num(events.FatJet) >= 1
-
-    # before preparing the network inputs, define a mask of events which have caregorical features
-    # that are actually covered by the networks embedding layers; other events cannot be evaluated!
-    event_mask = (
-        np.isin(pair_type, self.embedding_expected_inputs["pair_type"]) &
-        np.isin(dm1, self.embedding_expected_inputs["decay_mode1"]) &
-        np.isin(dm2, self.embedding_expected_inputs["decay_mode2"]) &
-        np.isin(vis_tau1.charge, self.embedding_expected_inputs["charge1"]) &
-        np.isin(vis_tau2.charge, self.embedding_expected_inputs["charge2"]) &
-        (has_jet_pair | has_fatjet) &
-        (self.year_flag in self.embedding_expected_inputs["year"])
-    )
-
-    # apply to all arrays needed until now
-    _events = events[event_mask]
-    pair_type = pair_type[event_mask]
-    vis_tau1, vis_tau2 = vis_tau1[event_mask], vis_tau2[event_mask]
-    tautau_mask = tautau_mask[event_mask]
-    dm1, dm2 = dm1[event_mask], dm2[event_mask]
-    has_jet_pair, has_fatjet = has_jet_pair[event_mask], has_fatjet[event_mask]
-
     # prepare network inputs
     f = DotDict()
 
@@ -237,27 +215,24 @@ def _res_dnn_evaluation(
         if t is not None
     ]
 
-    # build categorical inputs
+    # build categorical inputs, extended by the parameters of the network
     # (order exactly as documented in link above)
-    categorical_inputs = [
-        t[..., None] for t in [
-            pair_type,
-            dm1, dm2,
-            vis_tau1.charge, vis_tau2.charge,
-            has_jet_pair, has_fatjet,
-            (self.year_flag * np.ones(len(_events), dtype=np.int32)) if self.parametrized else None,
-            (self.spin * np.ones(len(_events), dtype=np.int32)) if self.parametrized else None,
-        ] if t is not None
-    ]
+    categorical_inputs = categorical
+    if self.parametrized:
+        categorical_inputs = np.concatenate(
+            [categorical, np.tile(np.array([self.year_flag, self.spin], dtype=np.int32), (len(_events), 1))],
+            axis=1,
+        )
 
     # evaluate the model
-    scores = self.evaluator(
-        "res",
-        inputs=[
-            np.concatenate(continous_inputs, axis=1),
-            np.concatenate(categorical_inputs, axis=1),
-        ],
-    )
+    inputs = [
+        np.concatenate(continous_inputs, axis=1),
+        categorical_inputs,
+    ]
+    if self.result_cache is None:
+        scores = self.evaluator("res", inputs=inputs)
+    else:
+        scores = self.result_cache.evaluate("res", inputs, lambda: self.evaluator("res", inputs=inputs))
 
     # in very rare cases (1 in 25k), the network output can be none, likely for numerical reasons,
     # so issue a warning and set them to a default value
@@ -267,7 +242,8 @@ def _res_dnn_evaluation(
             f"{nan_mask.sum() // scores.shape[1]} out of {scores.shape[0]} events have NaN scores; "
             "setting them to EMPTY_FLOAT",
         )
-        scores[nan_mask] = EMPTY_FLOAT
+        # (not in-place, as cached scores are read-only)
+        scores = np.where(nan_mask, EMPTY_FLOAT, scores)
 
     # prepare output columns with the shape of the original events and assign values into them
     for i, column in enumerate(self.output_columns):
@@ -294,10 +270,10 @@ def _res_dnn_evaluation(
         ]
         for column, values in zip(
             cont_inputs_names + cat_inputs_names,
-            continous_inputs + categorical_inputs,
+            [t[:, 0] for t in continous_inputs] + list(categorical.T),
         ):
             values_placeholder = EMPTY_FLOAT * np.ones(len(events), dtype=np.float32)
-            values_placeholder[event_mask] = ak.flatten(values)
+            values_placeholder[event_mask] = values
             events = set_ak_column_f32(events, "sync_res_dnn_" + column, values_placeholder)
 
     return events
@@ -338,7 +314,24 @@ def _res_dnn_evaluation_setup(
 
     # setup the evaluator
     self.evaluator = TFEvaluator()
-    self.evaluator.add_model("res", model_dir.child("model_fold0").abspath, signature_key="serving_default")
+    self.evaluator.add_model(
+        "res",
+        model_dir.child("model_fold0").abspath,
+        signature_key="serving_default",
+        backend=self.model_backend,
+    )
+
+    # optional cache of scores, keyed by the model files and the exact inputs
+    self.result_cache = None
+    if self.cache_results or (self.cache_results is None and os.getenv("MULTILEPTON_RESULT_CACHE")):
+        from multilepton.ml.result_cache import ResultCache
+        self.result_cache = ResultCache()
+        self.result_cache.add_model(
+            "res",
+            model_dir.child("model_fold0").abspath,
+            signature_key="serving_default",
+            backend=self.model_backend,
+        )
 
     # categorical values handled by the network
     # (names and values from training code that was aligned to KLUB notation)
@@ -366,6 +359,20 @@ def _res_dnn_evaluation_setup(
         self.config_inst.channels.n.emu.id: 1,
     }
 
+    # dense lookup tables for the categorical inputs and their validity
+    self.categorical_luts = build_categorical_luts(
+        channel_ids=[channel_inst.id for channel_inst, _, _ in self.config_inst.walk_channels()],
+        channel_id_to_pair_type=self.channel_id_to_pair_type,
+        # channels whose first tau defines the decay mode of the first or second lepton
+        dm1_tau_index={self.config_inst.channels.n.tautau.id: 0},
+        dm2_tau_index={
+            self.config_inst.channels.n.etau.id: 0,
+            self.config_inst.channels.n.mutau.id: 0,
+            self.config_inst.channels.n.tautau.id: 1,
+        },
+        expected_inputs=self.embedding_expected_inputs,
+    )
+
     # define the year based on the incoming campaign
     # (the training was done only for run 2, so map run 3 campaigns to 2018)
     self.year_flag = {
@@ -464,3 +471,100 @@ def rotate_to_phi(ref_phi: ak.Array, px: ak.Array, py: ak.Array) -> tuple[ak.Arr
     new_phi = np.arctan2(py, px) - ref_phi
     pt = (px**2 + py**2)**0.5
     return pt * np.cos(new_phi), pt * np.sin(new_phi)
+
+
+class DenseLookup(object):
+    """
+    Dense lookup table of integer keys, mapping the keys in *mapping* to their values and all other
+    keys, including those outside the range of *mapping*, to *default*.
+    """
+
+    def __init__(self, mapping: dict[int, Any], default: Any, dtype: type) -> None:
+        keys = np.array(list(mapping), dtype=np.int64)
+        # one entry of padding at both ends for keys out of range
+        self.offset = 1 - int(keys.min(initial=0))
+        self.table = np.full(int(keys.max(initial=0)) + self.offset + 2, default, dtype=dtype)
+        self.table[keys + self.offset] = list(mapping.values())
+
+    def __call__(self, keys: np.ndarray) -> np.ndarray:
+        return self.table[np.clip(np.asarray(keys, dtype=np.int64) + self.offset, 0, len(self.table) - 1)]
+
+    def valid(self, expected: Sequence[int]) -> DenseLookup:
+        """
+        Returns a lookup table of the same keys that is *True* where the value is in *expected*.
+        """
+        lut = object.__new__(self.__class__)
+        lut.offset = self.offset
+        lut.table = np.isin(self.table, expected)
+        return lut
+
+
+def build_categorical_luts(
+    channel_ids: Sequence[int],
+    channel_id_to_pair_type: dict[int, int],
+    dm1_tau_index: dict[int, int],
+    dm2_tau_index: dict[int, int],
+    expected_inputs: dict[str, Sequence[int]],
+) -> DotDict:
+    """
+    Builds the lookup tables used by :py:func:`encode_categorical_inputs`. Channels in *channel_ids*
+    map to the pair type in *channel_id_to_pair_type* (0 if missing), and to the index of the tau
+    whose decay mode is the one of the first or second lepton in *dm1_tau_index* and
+    *dm2_tau_index* (-1 if missing, i.e., for light leptons).
+    """
+    channel_ids = set(channel_ids) | set(channel_id_to_pair_type)
+    luts = DotDict(
+        pair_type=DenseLookup({cid: channel_id_to_pair_type.get(cid, 0) for cid in channel_ids}, 0, np.int32),
+        dm1_tau=DenseLookup(dm1_tau_index, -1, np.int64),
+        dm2_tau=DenseLookup(dm2_tau_index, -1, np.int64),
+        # the dnn treats dm 2 as 1, and keeps all other decay modes
+        decay_mode=DenseLookup({dm: 1 if dm == 2 else dm for dm in range(-1, 16)}, -2, np.int32),
+    )
+    luts.pair_type_valid = luts.pair_type.valid(expected_inputs["pair_type"])
+    luts.dm1_valid = luts.decay_mode.valid(expected_inputs["decay_mode1"])
+    luts.dm2_valid = luts.decay_mode.valid(expected_inputs["decay_mode2"])
+    charge = DenseLookup({q: q for q in range(-2, 3)}, 0, np.int32)
+    luts.charge1_valid = charge.valid(expected_inputs["charge1"])
+    luts.charge2_valid = charge.valid(expected_inputs["charge2"])
+    return luts
+
+
+def encode_categorical_inputs(
+    luts: DotDict,
+    channel_id: np.ndarray,
+    tau_decay_modes: np.ndarray,
+    charge1: np.ndarray,
+    charge2: np.ndarray,
+    has_jet_pair: np.ndarray,
+    has_fatjet: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the int32 matrix of categorical inputs (pair type, decay modes, charges, whether a jet
+    pair and a fatjet exist) with shape (n_events, 7), and an event mask that is *True* where all of
+    them are covered by the embedding layers, given the lookup tables *luts* built with
+    :py:func:`build_categorical_luts` and the decay modes of the first two taus per event
+    *tau_decay_modes* with shape (n_events, 2), padded with -1.
+    """
+    n_events = len(channel_id)
+    inputs = np.empty((n_events, 7), dtype=np.int32)
+
+    # pair type
+    inputs[:, 0] = luts.pair_type(channel_id)
+    valid = luts.pair_type_valid(channel_id)
+
+    # decay modes, -1 for light leptons
+    rows = np.arange(n_events)
+    for col, tau_lut, valid_lut in [(1, luts.dm1_tau, luts.dm1_valid), (2, luts.dm2_tau, luts.dm2_valid)]:
+        tau_index = tau_lut(channel_id)
+        dm = np.where(tau_index >= 0, tau_decay_modes[rows, np.maximum(tau_index, 0)], -1)
+        inputs[:, col] = luts.decay_mode(dm)
+        valid &= valid_lut(dm)
+
+    # charges and jets
+    inputs[:, 3] = charge1
+    inputs[:, 4] = charge2
+    valid &= luts.charge1_valid(charge1) & luts.charge2_valid(charge2)
+    inputs[:, 5] = has_jet_pair
+    inputs[:, 6] = has_fatjet
+
+    return inputs, valid
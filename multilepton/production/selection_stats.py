@@ -0,0 +1,275 @@
+# coding: utf-8
+
+"""
+Process-wide store of the merged selection stats histograms, shared by all normalization producers
+of a job. Histograms are converted once per node from the pickled output of MergeSelectionStats
+into npy files together with the sums needed by the producers, and loaded memory-mapped and
+read-only afterwards.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+
+import law
+
+from columnflow.util import maybe_import
+from columnflow.types import Any
+
+
+np = maybe_import("numpy")
+hist = maybe_import("hist")
+
+logger = law.logger.get_logger(__name__)
+
+# bump when the storage format changes
+_CACHE_VERSION = 1
+
+
+def selection_stats_cache_dir() -> str:
+    """
+    Returns the directory of converted selection stats, configurable through
+    ``MULTILEPTON_STATS_CACHE`` and defaulting to a node-local directory.
+    """
+    cache_dir = os.getenv("MULTILEPTON_STATS_CACHE") or os.path.join(
+        tempfile.gettempdir(),
+        f"multilepton_stats_{os.getuid()}",
+    )
+    return os.path.expandvars(os.path.expanduser(cache_dir))
+
+
+def safe_ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """
+    Element-wise version of :py:func:`columnflow.util.safe_div`, returning zero where the
+    *denominator* is zero.
+    """
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator != 0)
+
+
+def _read_only(arr: np.ndarray) -> np.ndarray:
+    arr = arr.view()
+    arr.flags.writeable = False
+    return arr
+
+
+class SelectionStats(object):
+    """
+    Read-only view of the selection stats histograms of a dataset. For each histogram, it provides
+    the total sum, the sorted process ids and the sums per process, as well as the values with the
+    process axis in sorted order and the bin values of the remaining axes.
+    """
+
+    def __init__(self, index: dict[str, Any], arrays: dict[str, np.ndarray]) -> None:
+        super().__init__()
+
+        self.index = index
+        self.arrays = {name: _read_only(arr) for name, arr in arrays.items()}
+
+    @classmethod
+    def from_hists(cls, hists: dict[str, hist.Hist]) -> SelectionStats:
+        """
+        Converts the *hists* into a new instance, with all sums computed by the histograms.
+        """
+        index = {"version": _CACHE_VERSION, "hists": {}}
+        arrays = {}
+        totals = []
+        for i, (key, h) in enumerate(hists.items()):
+            total = h.sum()
+            totals.append(getattr(total, "value", total))
+            axis_names = [ax.name for ax in h.axes]
+            index["hists"][key] = entry = {"id": i, "axes": {}}
+
+            values = h.values()
+            if "process" in axis_names:
+                process_axis = axis_names.index("process")
+                categories = np.asarray(list(h.axes["process"]), dtype=np.int64)
+                order = np.argsort(categories, kind="stable")
+                process_ids = categories[order]
+                per_process = [h[{"process": hist.loc(int(pid))}].sum() for pid in process_ids]
+                arrays[f"{i}_process_ids"] = process_ids
+                arrays[f"{i}_per_process"] = np.array(
+                    [getattr(s, "value", s) for s in per_process],
+                    dtype=np.float64,
+                )
+                values = np.moveaxis(np.take(values, order, axis=process_axis), process_axis, 0)
+                axis_names = ["process"] + axis_names[:process_axis] + axis_names[process_axis + 1:]
+            arrays[f"{i}_values"] = np.ascontiguousarray(values, dtype=np.float64)
+
+            # bin values of all other axes, in the order of the values
+            for name in axis_names:
+                if name != "process":
+                    entry["axes"][name] = [
+                        v.item() if isinstance(v, np.generic) else v
+                        for v in h.axes[name]
+                    ]
+            entry["axis_names"] = axis_names
+
+        arrays["totals"] = np.array(totals, dtype=np.float64)
+
+        return cls(index, arrays)
+
+    @classmethod
+    def load(cls, path: str) -> SelectionStats:
+        """
+        Loads an instance saved to the directory *path*, with all arrays memory-mapped.
+        """
+        with open(os.path.join(path, "index.json"), "r") as f:
+            index = json.load(f)
+        if index.get("version") != _CACHE_VERSION:
+            raise ValueError(f"selection stats at {path} have an incompatible version")
+        arrays = {
+            name[:-4]: np.load(os.path.join(path, name), mmap_mode="r")
+            for name in os.listdir(path)
+            if name.endswith(".npy")
+        }
+        return cls(index, arrays)
+
+    def save(self, path: str) -> None:
+        """
+        Saves all arrays and the index into the directory *path*, which is created atomically.
+        """
+        parent = os.path.dirname(path)
+        os.makedirs(parent, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=parent, prefix=".tmp_")
+        try:
+            for name, arr in self.arrays.items():
+                np.save(os.path.join(tmp_path, f"{name}.npy"), arr)
+            with open(os.path.join(tmp_path, "index.json"), "w") as f:
+                json.dump(self.index, f)
+            os.rename(tmp_path, path)
+        except OSError:
+            # another process might have saved the same stats in the meantime
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            if not os.path.exists(os.path.join(path, "index.json")):
+                raise
+
+    def keys(self) -> list[str]:
+        return list(self.index["hists"])
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index["hists"]
+
+    def _id(self, key: str) -> int:
+        return self.index["hists"][key]["id"]
+
+    def total(self, key: str) -> float:
+        """
+        Returns the sum of all values of the histogram *key*.
+        """
+        return float(self.arrays["totals"][self._id(key)])
+
+    def process_ids(self, key: str) -> np.ndarray:
+        """
+        Returns the sorted process ids of the histogram *key*.
+        """
+        return self.arrays[f"{self._id(key)}_process_ids"]
+
+    def sum_per_process(self, key: str, process_ids: np.ndarray | None = None) -> np.ndarray:
+        """
+        Returns the sums of the histogram *key* per process, aligned with *process_ids* when given,
+        and with the sorted process ids of the histogram otherwise.
+        """
+        sums = self.arrays[f"{self._id(key)}_per_process"]
+        return sums if process_ids is None else sums[self._process_index(key, process_ids)]
+
+    def values(self, key: str, process_ids: np.ndarray | None = None) -> np.ndarray:
+        """
+        Returns the values of the histogram *key*, with the process axis first and aligned with
+        *process_ids* when given. Bin values of the other axes are returned by
+        :py:meth:`axis_values`.
+        """
+        values = self.arrays[f"{self._id(key)}_values"]
+        return values if process_ids is None else values[self._process_index(key, process_ids)]
+
+    def axis_values(self, key: str, name: str) -> list[Any]:
+        """
+        Returns the bin values of the axis *name* of the histogram *key*.
+        """
+        return self.index["hists"][key]["axes"][name]
+
+    def _process_index(self, key: str, process_ids: np.ndarray) -> np.ndarray:
+        own_ids = self.process_ids(key)
+        process_ids = np.asarray(process_ids)
+        index = np.minimum(np.searchsorted(own_ids, process_ids), max(len(own_ids) - 1, 0))
+        if (len(own_ids) == 0 and len(process_ids)) or np.any(own_ids[index] != process_ids):
+            missing = sorted(set(process_ids.tolist()) - set(own_ids.tolist()))
+            raise KeyError(f"process ids {missing} not found in selection stats histogram '{key}'")
+        return index
+
+
+class SelectionStatsStore(object):
+    """
+    Process-wide store of :py:class:`SelectionStats` per dataset and MergeSelectionStats output.
+    The pickled histograms are converted into the cache directory on first access on a node, and
+    loaded from there by all further jobs and producers.
+    """
+
+    def __init__(self, cache_dir: str | None = None) -> None:
+        super().__init__()
+
+        self._cache_dir = cache_dir
+        self._stats: dict[tuple[str, str], SelectionStats] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def cache_dir(self) -> str:
+        return self._cache_dir or selection_stats_cache_dir()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def _cache_path(self, target: law.FileSystemFileTarget) -> str | None:
+        # the cache is only used when the target can be identified by its location and stat
+        try:
+            stat = target.stat()
+        except Exception:
+            return None
+        h = hashlib.sha256(f"{target.uri()}:{stat.st_size}:{stat.st_mtime}".encode())
+        return os.path.join(self.cache_dir, f"v{_CACHE_VERSION}_{h.hexdigest()}")
+
+    def get(self, dataset: str, target: law.FileSystemFileTarget) -> SelectionStats:
+        """
+        Returns the stats of the *dataset* stored in the pickled histograms *target*.
+        """
+        key = (dataset, target.uri())
+        with self._lock:
+            if key not in self._stats:
+                self._stats[key] = self._load(target)
+            return self._stats[key]
+
+    def _load(self, target: law.FileSystemFileTarget) -> SelectionStats:
+        cache_path = self._cache_path(target)
+        if cache_path and os.path.exists(os.path.join(cache_path, "index.json")):
+            try:
+                return SelectionStats.load(cache_path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"could not load cached selection stats from {cache_path}: {e}")
+
+        stats = SelectionStats.from_hists(target.load(formatter="pickle"))
+        if cache_path:
+            try:
+                stats.save(cache_path)
+                stats = SelectionStats.load(cache_path)
+            except OSError as e:
+                logger.warning(f"could not cache selection stats in {cache_path}: {e}")
+        return stats
+
+
+#: Default store of the process.
+selection_stats_store = SelectionStatsStore()
+
+
+def load_selection_stats(task: law.Task, inputs: dict[str, Any]) -> SelectionStats:
+    """
+    Returns the selection stats of the dataset of *task* from the default store, given the
+    *inputs* of a producer that required MergeSelectionStats as ``"selection_stats"``.
+    """
+    return selection_stats_store.get(task.dataset, inputs["selection_stats"]["hists"])
@@ -12,11 +12,26 @@ from columnflow.columnar_util import set_ak_column, flat_np_view, layout_ak_arra
 from columnflow.tasks.external import BundleExternalFiles
 from columnflow.types import Any
 
+from multilepton.selection.trigger import TriggerBitset
+
 ak = maybe_import("awkward")
 np = maybe_import("numpy")
 set_ak_column_f32 = functools.partial(set_ak_column, value_type=np.float32)
 
 
+def prod_per_event(values: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    Returns the product of the flat per-object *values* with shape (n_objects, ...) in each event, given the number of
+    objects per event in *counts*, and one for events without objects.
+    """
+    result = np.ones((len(counts),) + values.shape[1:], dtype=values.dtype)
+    filled = counts > 0
+    if np.any(filled):
+        starts = (np.cumsum(counts) - counts)[filled]
+        result[filled] = np.multiply.reduceat(values, starts, axis=0)
+    return result
+
+
 @producer(
     uses={
         # custom columns created upstream, probably by a selector
@@ -58,9 +73,6 @@ def tau_weights(self: Producer, events: ak.Array, **kwargs) -> ak.Array:
     - https://twiki.cern.ch/twiki/bin/view/CMS/TauIDRecommendationForRun2?rev=113
     - https://gitlab.cern.ch/cms-nanoAOD/jsonpog-integration/-/blob/849c6a6efef907f4033715d52290d1a661b7e8f9/POG/TAU
     """
-    # helper to bring a flat sf array into the shape of taus, and multiply across the tau axis
-    reduce_mul = lambda sf: ak.prod(layout_ak_array(sf, events.Tau.pt), axis=1, mask_identity=False)
-
     # the correction tool only supports flat arrays, so convert inputs to flat np view first
     pt = flat_np_view(events.Tau.pt, axis=1)
     abseta = flat_np_view(abs(events.Tau.eta), axis=1)
@@ -123,68 +135,59 @@ def tau_weights(self: Producer, events: ak.Array, **kwargs) -> ak.Array:
     sf_nom[mu_single_mask] = self.id_vs_mu_corrector(*mu_args(mu_single_mask, wp_config.id_vs_mu_single, "nom"))
     sf_nom[mu_cross_mask] = self.id_vs_mu_corrector(*mu_args(mu_cross_mask, wp_config.id_vs_mu_cross, "nom"))
 
-    # create and store weights
-    events = set_ak_column_f32(events, "tau_weight", reduce_mul(sf_nom))
-
     #
     # compute varied ID weights
     #
-    for direction in ["up", "down"]:
-        # genuine taus -> split into decay modes
-        sf_tau_dm0 = sf_nom.copy()
-        sf_tau_dm1 = sf_nom.copy()
-        sf_tau_dm10 = sf_nom.copy()
-        sf_tau_dm11 = sf_nom.copy()
-
-        tau_dm0_mask = tau_mask & (dm == 0)
-        tau_dm1_mask = tau_mask & (dm == 1)
-        tau_dm10_mask = tau_mask & (dm == 10)
-        tau_dm11_mask = tau_mask & (dm == 11)
-
-        sf_tau_dm0[tau_dm0_mask] = self.id_vs_jet_corrector(*tau_args(tau_dm0_mask, direction))
-        sf_tau_dm1[tau_dm1_mask] = self.id_vs_jet_corrector(*tau_args(tau_dm1_mask, direction))
-        sf_tau_dm10[tau_dm10_mask] = self.id_vs_jet_corrector(*tau_args(tau_dm10_mask, direction))
-        sf_tau_dm11[tau_dm11_mask] = self.id_vs_jet_corrector(*tau_args(tau_dm11_mask, direction))
-
-        events = set_ak_column_f32(events, f"tau_weight_jet_dm0_{direction}", reduce_mul(sf_tau_dm0))
-        events = set_ak_column_f32(events, f"tau_weight_jet_dm1_{direction}", reduce_mul(sf_tau_dm1))
-        events = set_ak_column_f32(events, f"tau_weight_jet_dm10_{direction}", reduce_mul(sf_tau_dm10))
-        events = set_ak_column_f32(events, f"tau_weight_jet_dm11_{direction}", reduce_mul(sf_tau_dm11))
-
-        # electron fakes -> split into 2 eta regions
-        for region, region_mask in [
-            ("barrel", (abseta < 1.5)),
-            ("endcap", (abseta >= 1.5)),
-        ]:
-            sf_e = sf_nom.copy()
-            e_single_region_mask = e_single_mask & region_mask
-            e_cross_region_mask = e_cross_mask & region_mask
-            sf_e[e_single_region_mask] = self.id_vs_e_corrector(
-                *e_args(e_single_region_mask, wp_config.id_vs_e_single, direction),
-            )
-            sf_e[e_cross_region_mask] = self.id_vs_e_corrector(
-                *e_args(e_cross_region_mask, wp_config.id_vs_e_cross, direction),
-            )
-            events = set_ak_column_f32(events, f"tau_weight_e_{region}_{direction}", reduce_mul(sf_e))
-
-        # muon fakes -> split into 5 eta regions
-        for region, region_mask in [
-            ("0p0To0p4", (abseta < 0.4)),
-            ("0p4To0p8", ((abseta >= 0.4) & (abseta < 0.8))),
-            ("0p8To1p2", ((abseta >= 0.8) & (abseta < 1.2))),
-            ("1p2To1p7", ((abseta >= 1.2) & (abseta < 1.7))),
-            ("1p7To2p3", (abseta >= 1.7)),
-        ]:
-            sf_mu = sf_nom.copy()
-            mu_single_region_mask = mu_single_mask & region_mask
-            mu_cross_region_mask = mu_cross_mask & region_mask
-            sf_mu[mu_single_region_mask] = self.id_vs_mu_corrector(
-                *mu_args(mu_single_region_mask, wp_config.id_vs_mu_single, direction),
-            )
-            sf_mu[mu_cross_region_mask] = self.id_vs_mu_corrector(
-                *mu_args(mu_cross_region_mask, wp_config.id_vs_mu_cross, direction),
-            )
-            events = set_ak_column_f32(events, f"tau_weight_mu_{region}_{direction}", reduce_mul(sf_mu))
+    # each tau contributes to at most one group of variations: genuine taus per decay mode, and electron and muon fakes
+    # per eta region, so each corrector is evaluated once per direction on all taus it applies to
+    var_groups = [f"jet_dm{decay_mode}" for decay_mode in [0, 1, 10, 11]]
+    var_group = np.full(len(pt), -1, dtype=np.int64)
+    for i, decay_mode in enumerate([0, 1, 10, 11]):
+        var_group[tau_mask & (dm == decay_mode)] = i
+
+    # electron fakes -> split into 2 eta regions
+    for region, region_mask in [
+        ("barrel", (abseta < 1.5)),
+        ("endcap", (abseta >= 1.5)),
+    ]:
+        var_group[(e_single_mask | e_cross_mask) & region_mask] = len(var_groups)
+        var_groups.append(f"e_{region}")
+
+    # muon fakes -> split into 5 eta regions
+    for region, region_mask in [
+        ("0p0To0p4", (abseta < 0.4)),
+        ("0p4To0p8", ((abseta >= 0.4) & (abseta < 0.8))),
+        ("0p8To1p2", ((abseta >= 0.8) & (abseta < 1.2))),
+        ("1p2To1p7", ((abseta >= 1.2) & (abseta < 1.7))),
+        ("1p7To2p3", (abseta >= 1.7)),
+    ]:
+        var_group[(mu_single_mask | mu_cross_mask) & region_mask] = len(var_groups)
+        var_groups.append(f"mu_{region}")
+
+    # sf matrix with shape (n_taus, 1 + 2 * n_groups), holding the nominal sf in the first column and in all columns of
+    # variations a tau does not contribute to
+    sf_matrix = np.repeat(sf_nom[:, None], 1 + 2 * len(var_groups), axis=1)
+    varied = var_group >= 0
+    for i, direction in enumerate(["up", "down"]):
+        sf_var = np.empty_like(sf_nom)
+        sf_var[tau_mask] = self.id_vs_jet_corrector(*tau_args(tau_mask, direction))
+        sf_var[e_single_mask] = self.id_vs_e_corrector(*e_args(e_single_mask, wp_config.id_vs_e_single, direction))
+        sf_var[e_cross_mask] = self.id_vs_e_corrector(*e_args(e_cross_mask, wp_config.id_vs_e_cross, direction))
+        sf_var[mu_single_mask] = self.id_vs_mu_corrector(
+            *mu_args(mu_single_mask, wp_config.id_vs_mu_single, direction),
+        )
+        sf_var[mu_cross_mask] = self.id_vs_mu_corrector(
+            *mu_args(mu_cross_mask, wp_config.id_vs_mu_cross, direction),
+        )
+        sf_matrix[varied, 1 + i * len(var_groups) + var_group[varied]] = sf_var[varied]
+
+    # multiply across the tau axis for all weights at once and store them
+    weights = prod_per_event(sf_matrix, ak.to_numpy(ak.num(events.Tau, axis=1)))
+    events = set_ak_column_f32(events, "tau_weight", weights[:, 0])
+    for i, direction in enumerate(["up", "down"]):
+        for j, group in enumerate(var_groups):
+            column = f"tau_weight_{group}_{direction}"
+            events = set_ak_column_f32(events, column, weights[:, 1 + i * len(var_groups) + j])
     return events
 
 
@@ -219,7 +222,7 @@ def tau_weights_setup(
 
 @producer(
     uses={
-        "channel_id", "single_triggered", "cross_triggered", "matched_trigger_ids",
+        "channel_id", "single_triggered", "cross_triggered", "matched_trigger_bits",
         "Tau.{pt,decayMode}",
     },
     produces={
@@ -252,25 +255,15 @@ def tau_trigger_efficiencies(self: Producer, events: ak.Array, **kwargs) -> ak.A
     ch_tautau = self.config_inst.get_channel("ctautau")
 
     # find out which tautau triggers are passed
-    tautau_trigger_passed = ak.zeros_like(events.channel_id, dtype=np.bool)
-    tautaujet_trigger_passed = ak.zeros_like(events.channel_id, dtype=np.bool)
-    tautauvbf_trigger_passed = ak.zeros_like(events.channel_id, dtype=np.bool)
-    for trigger in self.config_inst.x.triggers:
-        if trigger.has_tag("cross_tau_tau"):
-            tautau_trigger_passed = (
-                tautau_trigger_passed |
-                np.any(events.matched_trigger_ids == trigger.id, axis=-1)
-            )
-        if trigger.has_tag("cross_tau_tau_jet"):
-            tautaujet_trigger_passed = (
-                tautaujet_trigger_passed |
-                np.any(events.matched_trigger_ids == trigger.id, axis=-1)
-            )
-        if trigger.has_tag("cross_tau_tau_vbf"):
-            tautauvbf_trigger_passed = (
-                tautauvbf_trigger_passed |
-                np.any(events.matched_trigger_ids == trigger.id, axis=-1)
-            )
+    triggers = self.config_inst.x.triggers
+    bitset = TriggerBitset(triggers)
+    tautau_trigger_passed, tautaujet_trigger_passed, tautauvbf_trigger_passed = (
+        bitset.contains_any(
+            events.matched_trigger_bits,
+            [trigger.id for trigger in triggers if trigger.has_tag(tag)],
+        )
+        for tag in ("cross_tau_tau", "cross_tau_tau_jet", "cross_tau_tau_vbf")
+    )
 
     # the correction tool only supports flat arrays, so convert inputs to flat np view first
     pt = flat_np_view(events.Tau.pt, axis=1)
@@ -297,57 +290,42 @@ def tau_trigger_efficiencies(self: Producer, events: ak.Array, **kwargs) -> ak.A
     mutau_mask = (channel_id == ch_mutau.id) & cross_triggered & (ak.local_index(events.Tau) == 0)
     flat_mutau_mask = flat_np_view(mutau_mask, axis=1)
 
-    # start with flat ones
+    # evaluate each systematic once per channel on all objects in the channel, with the variations
+    # of all decay modes taken from the same up and down evaluations
+    wp_config = self.config_inst.x.tau_trigger_working_points
     for kind in ["data", "mc"]:
-        wp_config = self.config_inst.x.tau_trigger_working_points
-        eval_args = lambda mask, ch, syst: (pt[mask], dm[mask], ch, wp_config.trigger_corr, f"eff_{kind}", syst)
-        for corr_channel in ["etau", "mutau", "tautau", "tautaujet"]:  # TODO: add tautauvbf
-            if corr_channel == "etau":
-                mask = flat_etau_mask
-                corr_channel_arg = corr_channel
-            elif corr_channel == "mutau":
-                mask = flat_mutau_mask
-                corr_channel_arg = corr_channel
-            elif corr_channel == "tautau":
-                mask = flat_tautau_mask
-                corr_channel_arg = "ditau"
-            elif corr_channel == "tautaujet":
-                mask = flat_tautaujet_mask
-                corr_channel_arg = "ditaujet"
-            else:
-                raise ValueError(f"Unknown channel {corr_channel}")
+        for ch, ch_corr, flat_mask in [
+            ("etau", "etau", flat_etau_mask),
+            ("mutau", "mutau", flat_mutau_mask),
+            ("tautau", "ditau", flat_tautau_mask),
+            ("tautaujet", "ditaujet", flat_tautaujet_mask),
+            # ("tautauvbf", "ditauvbf", flat_tautauvbf_mask),  # TODO: add tautauvbf
+        ]:
+            eval_args = lambda mask, syst: (pt[mask], dm[mask], ch_corr, wp_config.trigger_corr, f"eff_{kind}", syst)
             sf_nom = np.ones_like(pt, dtype=np.float32)
-            sf_nom[mask] = self.tau_trig_corrector(*eval_args(mask, corr_channel_arg, "nom"))
+            sf_nom[flat_mask] = self.tau_trig_corrector(*eval_args(flat_mask, "nom"))
             # create and store weights
             events = set_ak_column_f32(
                 events,
-                f"tau_trigger_eff_{kind}_{corr_channel}",
+                f"tau_trigger_eff_{kind}_{ch}",
                 layout_ak_array(sf_nom, events.Tau.pt),
             )
-        #
-        # compute varied trigger weights
-        #
-        for ch, ch_corr, mask in [
-            ("etau", "etau", etau_mask),
-            ("mutau", "mutau", mutau_mask),
-            ("tautau", "ditau", tautau_mask),
-            ("tautaujet", "ditaujet", tautaujet_mask),
-            # ("tautauvbf", "ditauvbf", tautauvbf_mask),
-        ]:
-            for decay_mode in [0, 1, 10, 11]:
-                decay_mode_mask = mask & (events.Tau.decayMode == decay_mode)
-                flat_decay_mode_mask = flat_np_view(decay_mode_mask, axis=1)
-                for direction in ["up", "down"]:
+
+            #
+            # compute varied trigger weights
+            #
+            flat_var_mask = flat_mask & np.isin(dm, [0, 1, 10, 11])
+            for direction in ["up", "down"]:
+                sf_var = np.ones_like(pt, dtype=np.float32)
+                sf_var[flat_var_mask] = self.tau_trig_corrector(*eval_args(flat_var_mask, direction))
+                for decay_mode in [0, 1, 10, 11]:
                     # only possible with object-level information
-                    sf_unc = ak.copy(events[f"tau_trigger_eff_{kind}_{ch}"])
-                    sf_unc_flat = flat_np_view(sf_unc, axis=1)
-                    sf_unc_flat[flat_decay_mode_mask] = self.tau_trig_corrector(
-                        *eval_args(flat_decay_mode_mask, ch_corr, direction),
-                    )
+                    flat_decay_mode_mask = flat_var_mask & (dm == decay_mode)
+                    sf_unc = np.where(flat_decay_mode_mask, sf_var, sf_nom)
                     events = set_ak_column_f32(
                         events,
                         f"tau_trigger_eff_{kind}_{ch}_dm{decay_mode}_{direction}",
-                        sf_unc,
+                        layout_ak_array(sf_unc, events.Tau.pt),
                     )
     return events
 
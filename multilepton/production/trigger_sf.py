@@ -20,6 +20,7 @@ from columnflow.production.cms.electron import electron_trigger_weights as cf_el
 
 from multilepton.production.tau import tau_trigger_efficiencies
 from multilepton.production.jet import jet_trigger_efficiencies
+from multilepton.selection.trigger import TriggerBitset
 
 ak = maybe_import("awkward")
 np = maybe_import("numpy")
@@ -185,49 +186,85 @@ def calculate_correlated_ditrigger_efficiency(
     return trigger_efficiency
 
 
-def create_trigger_weight(
+def create_trigger_weights(
     events: ak.Array,
-    first_trigger_eff_data: ak.Array,
-    first_trigger_eff_mc: ak.Array,
-    second_trigger_common_object_eff_data: ak.Array,
-    second_trigger_common_object_eff_mc: ak.Array,
-    second_trigger_other_object_eff_data: ak.Array,
-    second_trigger_other_object_eff_mc: ak.Array,
+    first_trigger_eff_data: np.ndarray,
+    first_trigger_eff_mc: np.ndarray,
+    second_trigger_common_object_eff_data: np.ndarray,
+    second_trigger_common_object_eff_mc: np.ndarray,
+    second_trigger_other_object_eff_data: np.ndarray,
+    second_trigger_other_object_eff_mc: np.ndarray,
     channel: od.Channel,
     first_trigger_matched: ak.Array,
     second_trigger_matched: ak.Array,
-) -> ak.Array:
+) -> np.ndarray:
     """
-    Create the trigger weight for a given channel.
+    Create the trigger weights for a given channel for several variations at once. Efficiencies are
+    passed with shape (n_variations, n_events), or (n_events,) if they are the same for all
+    variations, and the weights are returned with shape (n_variations, n_events).
     """
+    first_trigger_matched = np.asarray(first_trigger_matched)
+    second_trigger_matched = np.asarray(second_trigger_matched)
+
     trigger_eff_data = calculate_correlated_ditrigger_efficiency(
         first_trigger_matched,
         second_trigger_matched,
-        first_trigger_eff_data,
-        second_trigger_common_object_eff_data,
-        second_trigger_other_object_eff_data,
+        np.asarray(first_trigger_eff_data),
+        np.asarray(second_trigger_common_object_eff_data),
+        np.asarray(second_trigger_other_object_eff_data),
     )
     trigger_eff_mc = calculate_correlated_ditrigger_efficiency(
         first_trigger_matched,
         second_trigger_matched,
-        first_trigger_eff_mc,
-        second_trigger_common_object_eff_mc,
-        second_trigger_other_object_eff_mc,
+        np.asarray(first_trigger_eff_mc),
+        np.asarray(second_trigger_common_object_eff_mc),
+        np.asarray(second_trigger_other_object_eff_mc),
     )
 
     # calculate the ratio
-    trigger_weight = trigger_eff_data / trigger_eff_mc
+    with np.errstate(invalid="ignore", divide="ignore"):
+        trigger_weight = np.atleast_2d(trigger_eff_data / trigger_eff_mc)
 
     # nan happens for all events not in the specific channel, due to efficiency == 0
     # add a failsafe here in case of efficiency 0 for an event actually in the channel
     nan_mask = np.isnan(trigger_weight)
-    if np.any(nan_mask & (events.channel_id == channel.id) & (first_trigger_matched | second_trigger_matched)):
+    channel_mask = np.asarray(events.channel_id == channel.id) & (first_trigger_matched | second_trigger_matched)
+    if np.any(nan_mask & channel_mask):
         raise ValueError(f"Found nan in {channel.name} trigger weight")
     trigger_weight_no_nan = np.nan_to_num(trigger_weight, nan=1.0)
 
     return trigger_weight_no_nan
 
 
+def create_trigger_weight(
+    events: ak.Array,
+    first_trigger_eff_data: ak.Array,
+    first_trigger_eff_mc: ak.Array,
+    second_trigger_common_object_eff_data: ak.Array,
+    second_trigger_common_object_eff_mc: ak.Array,
+    second_trigger_other_object_eff_data: ak.Array,
+    second_trigger_other_object_eff_mc: ak.Array,
+    channel: od.Channel,
+    first_trigger_matched: ak.Array,
+    second_trigger_matched: ak.Array,
+) -> np.ndarray:
+    """
+    Create the trigger weight for a given channel.
+    """
+    return create_trigger_weights(
+        events,
+        first_trigger_eff_data,
+        first_trigger_eff_mc,
+        second_trigger_common_object_eff_data,
+        second_trigger_common_object_eff_mc,
+        second_trigger_other_object_eff_data,
+        second_trigger_other_object_eff_mc,
+        channel,
+        first_trigger_matched,
+        second_trigger_matched,
+    )[0]
+
+
 @producer(
     uses={
         "channel_id", "single_triggered", "cross_triggered",  # "matched_trigger_ids"
@@ -293,109 +330,54 @@ def etau_mutau_trigger_weight(
     # create all tau efficiencies at object-level
     events = self[tau_trigger_effs_cclub](events, **kwargs)
 
-    # create the nominal case
+    # make tau efficiencies to event level quantities, once per systematic
+    def prod(column: str) -> np.ndarray:
+        return ak.to_numpy(ak.prod(events[column], axis=1, mask_identity=False))
+
+    # combine the nominal weight and all variations per channel in one batch
     for lepton, channel_name in [("e", "etau"), ("mu", "mutau")]:
         channel = self.config_inst.get_channel(channel_name)
-        single_trigger_lepton_data_effs = events[f"single_trigger_{lepton}_data_effs"]
-        cross_trigger_lepton_data_effs = events[f"cross_trigger_{lepton}_data_effs"]
-        single_trigger_lepton_mc_effs = events[f"single_trigger_{lepton}_mc_effs"]
-        cross_trigger_lepton_mc_effs = events[f"cross_trigger_{lepton}_mc_effs"]
-
-        # make tau efficiencies to event level quantity
-        cross_trigger_tau_data_effs = ak.prod(
-            events[f"tau_trigger_eff_data_{channel_name}"],
-            axis=1,
-            mask_identity=False,
-        )
-        cross_trigger_tau_mc_effs = ak.prod(
-            events[f"tau_trigger_eff_mc_{channel_name}"],
-            axis=1,
-            mask_identity=False,
-        )
+        lepton_effs = {
+            (trigger, kind, postfix): ak.to_numpy(events[f"{trigger}_trigger_{lepton}_{kind}_effs{postfix}"])
+            for trigger in ["single", "cross"]
+            for kind in ["data", "mc"]
+            for postfix in ["", "_up", "_down"]
+        }
+        tau_effs = {
+            (kind, postfix): prod(f"tau_trigger_eff_{kind}_{channel_name}{postfix}")
+            for kind in ["data", "mc"]
+            for postfix in [""] + [f"_dm{dm}_{direction}" for dm in [0, 1, 10, 11] for direction in ["up", "down"]]
+        }
+
+        # weight names mapped to the postfixes of the lepton and tau efficiencies
+        variations = {f"{channel_name}_trigger_weight": ("", "")}
+        for direction in ["up", "down"]:
+            variations[f"{channel_name}_trigger_weight_{lepton}_{direction}"] = (f"_{direction}", "")
+            for dm in [0, 1, 10, 11]:
+                variations[f"{channel_name}_trigger_weight_tau_dm{dm}_{direction}"] = ("", f"_dm{dm}_{direction}")
 
-        trigger_weight = create_trigger_weight(
+        stack = lambda effs, key: np.stack([effs[key(*postfixes)] for postfixes in variations.values()])
+        trigger_weights = create_trigger_weights(
             events,
-            single_trigger_lepton_data_effs,
-            single_trigger_lepton_mc_effs,
-            cross_trigger_lepton_data_effs,
-            cross_trigger_lepton_mc_effs,
-            cross_trigger_tau_data_effs,
-            cross_trigger_tau_mc_effs,
+            stack(lepton_effs, lambda lep, tau: ("single", "data", lep)),
+            stack(lepton_effs, lambda lep, tau: ("single", "mc", lep)),
+            stack(lepton_effs, lambda lep, tau: ("cross", "data", lep)),
+            stack(lepton_effs, lambda lep, tau: ("cross", "mc", lep)),
+            stack(tau_effs, lambda lep, tau: ("data", tau)),
+            stack(tau_effs, lambda lep, tau: ("mc", tau)),
             channel,
             ((events.channel_id == channel.id) & events.single_triggered),
             ((events.channel_id == channel.id) & events.cross_triggered),
         )
-        events = set_ak_column_f32(events, f"{channel_name}_trigger_weight", trigger_weight)
-
-    # create the variations
-    for direction in ["up", "down"]:
-        for lepton, channel_name in [("e", "etau"), ("mu", "mutau")]:
-            # e and mu variations
-
-            channel = self.config_inst.get_channel(channel_name)
-            single_triggered = (events.channel_id == channel.id) & events.single_triggered
-            cross_triggered = (events.channel_id == channel.id) & events.cross_triggered
-
-            single_trigger_lepton_data_effs = events[f"single_trigger_{lepton}_data_effs_{direction}"]
-            cross_trigger_lepton_data_effs = events[f"cross_trigger_{lepton}_data_effs_{direction}"]
-            single_trigger_lepton_mc_effs = events[f"single_trigger_{lepton}_mc_effs_{direction}"]
-            cross_trigger_lepton_mc_effs = events[f"cross_trigger_{lepton}_mc_effs_{direction}"]
-            cross_trigger_tau_data_effs = events[f"tau_trigger_eff_data_{channel_name}"]
-            cross_trigger_tau_mc_effs = events[f"tau_trigger_eff_mc_{channel_name}"]
-
-            # make tau efficiencies to event level quantity
-            cross_trigger_tau_data_effs = ak.prod(
-                cross_trigger_tau_data_effs,
-                axis=1,
-                mask_identity=False,
-            )
-            cross_trigger_tau_mc_effs = ak.prod(
-                cross_trigger_tau_mc_effs,
-                axis=1,
-                mask_identity=False,
-            )
-
-            trigger_weight = create_trigger_weight(
-                events,
-                single_trigger_lepton_data_effs,
-                single_trigger_lepton_mc_effs,
-                cross_trigger_lepton_data_effs,
-                cross_trigger_lepton_mc_effs,
-                cross_trigger_tau_data_effs,
-                cross_trigger_tau_mc_effs,
-                channel,
-                single_triggered,
-                cross_triggered,
-            )
-            events = set_ak_column_f32(events, f"{channel.name}_trigger_weight_{lepton}_{direction}", trigger_weight)
-
-            # tau variations
-            single_trigger_lepton_data_effs = events[f"single_trigger_{lepton}_data_effs"]
-            cross_trigger_lepton_data_effs = events[f"cross_trigger_{lepton}_data_effs"]
-            single_trigger_lepton_mc_effs = events[f"single_trigger_{lepton}_mc_effs"]
-            cross_trigger_lepton_mc_effs = events[f"cross_trigger_{lepton}_mc_effs"]
-
-            for dm in [0, 1, 10, 11]:
-                trigger_weight = create_trigger_weight(
-                    events,
-                    single_trigger_lepton_data_effs,
-                    single_trigger_lepton_mc_effs,
-                    cross_trigger_lepton_data_effs,
-                    cross_trigger_lepton_mc_effs,
-                    ak.prod(events[f"tau_trigger_eff_data_{channel.name}_dm{dm}_{direction}"], axis=1, mask_identity=False),  # noqa: E501
-                    ak.prod(events[f"tau_trigger_eff_mc_{channel.name}_dm{dm}_{direction}"], axis=1, mask_identity=False),  # noqa: E501
-                    channel,
-                    single_triggered,
-                    cross_triggered,
-                )
-                events = set_ak_column_f32(events, f"{channel.name}_trigger_weight_tau_dm{dm}_{direction}", trigger_weight)  # noqa: E501
+        for weight_name, trigger_weight in zip(variations, trigger_weights):
+            events = set_ak_column_f32(events, weight_name, trigger_weight)
 
     return events
 
 
 @producer(
     uses={
-        "channel_id", "matched_trigger_ids",
+        "channel_id", "matched_trigger_bits",
         tau_trigger_effs_cclub, jet_trigger_efficiencies,
         "Jet.{pt,eta,phi,mass}",
     },
@@ -420,16 +402,20 @@ def tautau_trigger_weight(
     events = self[tau_trigger_effs_cclub](events, **kwargs)
 
     # find out which tautau triggers are passed
-    tt_trigger_passed = ak.zeros_like(events.channel_id, dtype=np.bool)
-    ttj_trigger_passed = ak.zeros_like(events.channel_id, dtype=np.bool)
-    # ttv_trigger_passed = ak.zeros_like(events.channel_id, dtype=np.bool)
-    for trigger in self.config_inst.x.triggers:
-        if trigger.has_tag("cross_tau_tau"):
-            tt_trigger_passed = tt_trigger_passed | np.any(events.matched_trigger_ids == trigger.id, axis=-1)
-        if trigger.has_tag("cross_tau_tau_jet"):
-            ttj_trigger_passed = ttj_trigger_passed | np.any(events.matched_trigger_ids == trigger.id, axis=-1)  # noqa
-        # if trigger.has_tag("cross_tau_tau_vbf"):
-        #     ttv_trigger_passed = ttv_trigger_passed | np.any(events.matched_trigger_ids == trigger.id, axis=-1)  # noqa
+    triggers = self.config_inst.x.triggers
+    bitset = TriggerBitset(triggers)
+    tt_trigger_passed = bitset.contains_any(
+        events.matched_trigger_bits,
+        [trigger.id for trigger in triggers if trigger.has_tag("cross_tau_tau")],
+    )
+    ttj_trigger_passed = bitset.contains_any(
+        events.matched_trigger_bits,
+        [trigger.id for trigger in triggers if trigger.has_tag("cross_tau_tau_jet")],
+    )
+    # ttv_trigger_passed = bitset.contains_any(
+    #     events.matched_trigger_bits,
+    #     [trigger.id for trigger in triggers if trigger.has_tag("cross_tau_tau_vbf")],
+    # )
 
     tt_triggered = ((events.channel_id == channel.id) & tt_trigger_passed)
     ttj_triggered = ((events.channel_id == channel.id) & ttj_trigger_passed)
@@ -526,7 +512,7 @@ def tautau_trigger_weight(
 
 @producer(
     uses={
-        "channel_id", "matched_trigger_ids",
+        "channel_id", "matched_trigger_bits",
         emu_e_trigger_weight, emu_mu_trigger_weight,
     },
     produces={
@@ -543,13 +529,16 @@ def emu_trigger_weight(
     Producer for emu trigger scale factors.
     """
     # find out which triggers are passed
-    mu_trigger_passed = ak.zeros_like(events.channel_id, dtype=np.bool)
-    e_trigger_passed = ak.zeros_like(events.channel_id, dtype=np.bool)
-    for trigger in self.config_inst.x.triggers:
-        if trigger.has_tag("single_mu"):
-            mu_trigger_passed = mu_trigger_passed | np.any(events.matched_trigger_ids == trigger.id, axis=-1)
-        if trigger.has_tag("single_e"):
-            e_trigger_passed = e_trigger_passed | np.any(events.matched_trigger_ids == trigger.id, axis=-1)
+    triggers = self.config_inst.x.triggers
+    bitset = TriggerBitset(triggers)
+    mu_trigger_passed = bitset.contains_any(
+        events.matched_trigger_bits,
+        [trigger.id for trigger in triggers if trigger.has_tag("single_mu")],
+    )
+    e_trigger_passed = bitset.contains_any(
+        events.matched_trigger_bits,
+        [trigger.id for trigger in triggers if trigger.has_tag("single_e")],
+    )
 
     # create e/mu object-level masks for events in the emu channel, selecting only the leading lepton for
     # which the trigger efficiencies were initially calculated (we used the same lepton for matching in the selection)
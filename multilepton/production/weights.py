@@ -18,10 +18,12 @@ from columnflow.production.cms.parton_shower import ps_weights
 from columnflow.util import maybe_import, safe_div
 from columnflow.columnar_util import set_ak_column
 
+from multilepton.util import process_id_index
+from multilepton.production.selection_stats import load_selection_stats, safe_ratio
+
 
 ak = maybe_import("awkward")
 np = maybe_import("numpy")
-hist = maybe_import("hist")
 
 # helper
 set_ak_column_f32 = functools.partial(set_ak_column, value_type=np.float32)
@@ -32,14 +34,12 @@ set_ak_column_f32 = functools.partial(set_ak_column, value_type=np.float32)
     mc_only=True,
 )
 def normalized_pu_weight(self: Producer, events: ak.Array, **kwargs) -> ak.Array:
-    for weight_name in self.pu_weight_names:
-        # create a weight vector starting with ones
-        norm_weight_per_pid = np.ones(len(events), dtype=np.float32)
+    # rows of the ratio tables per event, pointing to ones for unknown process ids
+    pid_index = process_id_index(self.unique_process_ids, ak.to_numpy(events.process_id))
 
-        # fill weights with a new mask per unique process id (mostly just one)
-        for pid in self.unique_process_ids:
-            pid_mask = events.process_id == pid
-            norm_weight_per_pid[pid_mask] = self.ratio_per_pid[weight_name][pid]
+    for weight_name in self.pu_weight_names:
+        # gather the ratio per process id
+        norm_weight_per_pid = self.ratio_per_pid[weight_name][pid_index]
 
         # multiply with actual weight
         norm_weight_per_pid = norm_weight_per_pid * events[weight_name]
@@ -76,27 +76,18 @@ def normalized_pu_weight_requires(self: Producer, task: law.Task, reqs: dict, **
 @normalized_pu_weight.setup
 def normalized_pu_weight_setup(self: Producer, task: law.Task, inputs: dict, **kwargs) -> None:
     # load the selection stats
-    hists = task.cached_value(
-        key="selection_hists",
-        func=lambda: inputs["selection_stats"]["hists"].load(formatter="pickle"),
-    )
+    stats = load_selection_stats(task, inputs)
 
     # get the unique process ids in that dataset
-    self.unique_process_ids = list(hists["sum_mc_weight_pu_weight"].axes["process"])
+    self.unique_process_ids = stats.process_ids("sum_mc_weight_pu_weight")
 
-    # helper to get numerators and denominators
-    def get_sum(pid, weight_name="", /):
-        if weight_name:
-            weight_name = "_" + weight_name
-        key = f"sum_mc_weight{weight_name}"
-        return hists[key][{"process": hist.loc(pid)}].sum().value
-
-    # extract the ratio per weight and pid
+    # extract the ratio per weight as a lookup table over the pid index, with ones for unknown pids in the last row
+    sum_per_pid = stats.sum_per_process("sum_mc_weight", self.unique_process_ids)
     self.ratio_per_pid = {
-        weight_name: {
-            pid: safe_div(get_sum(pid), get_sum(pid, weight_name))
-            for pid in self.unique_process_ids
-        }
+        weight_name: np.append(
+            safe_ratio(sum_per_pid, stats.sum_per_process(f"sum_mc_weight_{weight_name}", self.unique_process_ids)),
+            1.0,
+        ).astype(np.float32)
         for weight_name in (str(route) for route in self[pu_weight].produced_columns)
         if weight_name.startswith("pu_weight")
     }
@@ -147,14 +138,11 @@ def normalized_pdf_weight_requires(self: Producer, task: law.Task, reqs: dict, *
 @normalized_pdf_weight.setup
 def normalized_pdf_weight_setup(self: Producer, task: law.Task, inputs: dict, **kwargs) -> None:
     # load the selection stats
-    hists = task.cached_value(
-        key="selection_hists",
-        func=lambda: inputs["selection_stats"]["hists"].load(formatter="pickle"),
-    )
+    stats = load_selection_stats(task, inputs)
 
     # save average weights
     self.average_pdf_weights = {
-        weight_name: safe_div(hists[f"sum_{weight_name}"].sum().value, hists["num_events"].sum())
+        weight_name: safe_div(stats.total(f"sum_{weight_name}"), stats.total("num_events"))
         for weight_name in self.pdf_weight_names
     }
 
@@ -209,14 +197,11 @@ def normalized_murmuf_weight_requires(self: Producer, task: law.Task, reqs: dict
 @normalized_murmuf_weight.setup
 def normalized_murmuf_weight_setup(self: Producer, task: law.Task, inputs: dict, **kwargs) -> None:
     # load the selection stats
-    hists = task.cached_value(
-        key="selection_hists",
-        func=lambda: inputs["selection_stats"]["hists"].load(formatter="pickle"),
-    )
+    stats = load_selection_stats(task, inputs)
 
     # save average weights
     self.average_mu_weights = {
-        weight_name: safe_div(hists[f"sum_{weight_name}"].sum().value, hists["num_events"].sum())
+        weight_name: safe_div(stats.total(f"sum_{weight_name}"), stats.total("num_events"))
         for weight_name in self.mu_weight_names
     }
 
@@ -266,13 +251,10 @@ def normalized_ps_weights_requires(self: Producer, task: law.Task, reqs: dict, *
 @normalized_ps_weights.setup
 def normalized_ps_weights_setup(self: Producer, task: law.Task, inputs: dict, **kwargs) -> None:
     # load the selection stats
-    hists = task.cached_value(
-        key="selection_hists",
-        func=lambda: inputs["selection_stats"]["hists"].load(formatter="pickle"),
-    )
+    stats = load_selection_stats(task, inputs)
 
     # save average weights
     self.average_ps_weights = {
-        weight_name: safe_div(hists[f"sum_{weight_name}"].sum().value, hists["num_events"].sum())
+        weight_name: safe_div(stats.total(f"sum_{weight_name}"), stats.total("num_events"))
         for weight_name in self.ps_weight_names
     }
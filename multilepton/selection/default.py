@@ -25,7 +25,7 @@ from columnflow.production.cms.scale import murmuf_weights
 from columnflow.production.cms.parton_shower import ps_weights
 from columnflow.production.util import attach_coffea_behavior
 from columnflow.columnar_util import Route, set_ak_column, full_like
-from columnflow.hist_util import create_hist_from_variables, fill_hist
+from columnflow.hist_util import create_hist_from_variables
 from columnflow.util import maybe_import, DotDict
 from columnflow.types import Iterable
 
@@ -39,7 +39,7 @@ from multilepton.selection.jet import jet_selection
 from multilepton.production.btag import btag_weights_deepjet, btag_weights_pnet
 from multilepton.production.features import cutflow_features
 from multilepton.production.patches import patch_ecalBadCalibFilter
-from multilepton.util import IF_DATASET_HAS_LHE_WEIGHTS, IF_RUN_3, IF_RUN_3_NOT_NANO_V15
+from multilepton.util import IF_DATASET_HAS_LHE_WEIGHTS, IF_RUN_3, IF_RUN_3_NOT_NANO_V15, fill_hists
 
 np = maybe_import("numpy")
 ak = maybe_import("awkward")
@@ -527,29 +527,46 @@ def increment_stats(
             stats["num_events_per_process"] = defaultdict(float)
         if "sum_mc_weight_per_process" not in stats:
             stats["sum_mc_weight_per_process"] = defaultdict(float)
-        for proc_id in np.unique(events.process_id):
-            proc_weights = events.mc_weight[events.process_id == proc_id]
-            stats["num_events_per_process"][str(proc_id)] += float(len(proc_weights))
-            stats["sum_mc_weight_per_process"][str(proc_id)] += float(ak.sum(proc_weights))
-
-    # fill stats and histograms
+        # group weights by process with a single stable sort, and reduce contiguous slices in the original order
+        process_id = np.asarray(events.process_id)
+        order = np.argsort(process_id, kind="stable")
+        proc_ids, starts, counts = np.unique(process_id[order], return_index=True, return_counts=True)
+        sorted_weights = np.asarray(events.mc_weight)[order]
+        for proc_id, start, count in zip(proc_ids, starts, counts):
+            stats["num_events_per_process"][str(proc_id)] += float(count)
+            stats["sum_mc_weight_per_process"][str(proc_id)] += float(np.sum(sorted_weights[start:start + count]))
+
+    # group entries by their selection mask
+    groups: dict[int, list[str]] = {}
     for key, val in stats_map.items():
-        is_num = key.startswith("num_")
-        weight, sel = ((None,) + law.util.make_tuple(val))[-2:]
-
-        if key in keys_for_hists:
-            # create the histogram when not existing
-            if key not in hists:
-                hists[key] = create_hist_from_variables(*self.hist_vars, storage="double" if is_num else "weight")
-            # fill it
-            fill_data = {
-                v.name: Route(v.expression).apply(events)[sel]
-                for v in self.hist_vars
-            }
-            if not is_num:
-                fill_data["weight"] = weight[sel]
-            fill_hist(hists[key], fill_data, last_edge_inclusive=True)
-
-        if key in keys_for_stats:
-            stats[key] += float(ak.sum(sel if is_num else weight[sel]))
+        groups.setdefault(id(law.util.make_tuple(val)[-1]), []).append(key)
+
+    # fill stats and histograms per group, with axis values computed once and all weights filled in one pass
+    hist_values = {v.name: np.asarray(Route(v.expression).apply(events)) for v in self.hist_vars}
+    for keys in groups.values():
+        sel = np.asarray(law.util.make_tuple(stats_map[keys[0]])[-1])
+        fill_data = {name: values[sel] for name, values in hist_values.items()}
+        n_sel = len(next(iter(fill_data.values())))
+
+        # selected weights, or None for counts
+        weights = {}
+        for key in keys:
+            weight = ((None,) + law.util.make_tuple(stats_map[key]))[-2]
+            weights[key] = None if key.startswith("num_") else np.asarray(weight)[sel]
+
+        # create histograms when not existing
+        for key in keys:
+            if key in keys_for_hists and key not in hists:
+                storage = "double" if weights[key] is None else "weight"
+                hists[key] = create_hist_from_variables(*self.hist_vars, storage=storage)
+
+        # fill them, separately for counts and weights
+        num_keys = [key for key in keys if key in keys_for_hists and weights[key] is None]
+        fill_hists([hists[key] for key in num_keys], fill_data)
+        weight_keys = [key for key in keys if key in keys_for_hists and weights[key] is not None]
+        fill_hists([hists[key] for key in weight_keys], fill_data, [weights[key] for key in weight_keys])
+
+        for key in keys:
+            if key in keys_for_stats:
+                stats[key] += float(n_sel if weights[key] is None else np.sum(weights[key]))
     return events, results
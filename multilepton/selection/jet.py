@@ -18,7 +18,8 @@ from columnflow.columnar_util import (
     EMPTY_FLOAT, set_ak_column, sorted_indices_from_mask, mask_from_indices, flat_np_view, full_like,
 )
 
-from multilepton.selection.lepton import trigger_object_matching
+from multilepton.selection.lepton import min_delta_r, trigger_object_matching_legs
+from multilepton.selection.trigger import TriggerBitset
 from multilepton.util import IF_RUN_2, IF_NOT_NANO_V15
 
 
@@ -29,14 +30,15 @@ ak = maybe_import("awkward")
 @selector(
     uses={
         jet_id, fatjet_id,
-        "fired_trigger_ids", "TrigObj.{pt,eta,phi}",
+        "fired_trigger_ids", "matched_trigger_bits", "TrigObj.{pt,eta,phi}",
         "Jet.{pt,eta,phi,mass}", IF_NOT_NANO_V15("Jet.jetId"), IF_RUN_2("Jet.puId"),
+        "{Electron,Muon,Tau}.{eta,phi}",
         "FatJet.{pt,eta,phi,mass,msoftdrop,subJetIdx1,subJetIdx2}", IF_NOT_NANO_V15("FatJet.jetId"),
         "SubJet.{pt,eta,phi,mass}", IF_NOT_NANO_V15("SubJet.btagDeepB"),
     },
     produces={
         # hhbtag,
-        "Jet.hhbtag", "matched_trigger_ids",
+        "Jet.{hhbtag,min_dr_lepton}", "matched_trigger_ids", "matched_trigger_bits",
     },
 )
 def jet_selection(
@@ -64,6 +66,25 @@ def jet_selection(
     events = self[jet_id](events, **kwargs)
     events = self[fatjet_id](events, **kwargs)
 
+    #
+    # jet-lepton overlap removal
+    #
+    # selected leptons, shared between ak4 and ak8 jet cleaning
+    selected_leptons = [
+        events.Tau[lepton_results.x.taus],
+        events.Muon[lepton_results.x.mus],
+        events.Electron[lepton_results.x.eles],
+    ]
+    jet_min_dr_lepton = min_delta_r(events.Jet, selected_leptons)
+
+    # store it for later steps, with EMPTY_FLOAT for jets in events without selected leptons
+    events = set_ak_column(
+        events,
+        "Jet.min_dr_lepton",
+        ak.where(np.isinf(jet_min_dr_lepton), EMPTY_FLOAT, jet_min_dr_lepton),
+        value_type=np.float32,
+    )
+
     #
     # default jet selection
     #
@@ -71,9 +92,7 @@ def jet_selection(
     # common ak4 jet mask for normal and vbf jets
     ak4_mask = (
         (events.Jet.jetId == 6) &  # tight plus lepton veto
-        ak.all(events.Jet.metric_table(events.Tau[lepton_results.x.taus]) > 0.5, axis=2) &
-        ak.all(events.Jet.metric_table(events.Muon[lepton_results.x.mus]) > 0.5, axis=2) &
-        ak.all(events.Jet.metric_table(events.Electron[lepton_results.x.eles]) > 0.5, axis=2)
+        (jet_min_dr_lepton > 0.5)
     )
 
     # puId for run 2
@@ -117,11 +136,7 @@ def jet_selection(
     # create mask for tautau events that fired and matched tautau trigger
     tt_match_mask = (
         (events.channel_id == ch_tautau.id) &
-        ak.any(reduce(
-            or_,
-            [(events.matched_trigger_ids == tid) for tid in self.trigger_ids_tt],
-            false_mask,
-        ), axis=1)
+        self.trigger_bitset.contains_any(events.matched_trigger_bits, self.trigger_ids_tt)
     )
 
     # create a mask to select tautau events that were triggered by a tau-tau-jet cross trigger
@@ -150,8 +165,14 @@ def jet_selection(
     # rejects these events
     match_at_least_one_trigger = full_like(events.event, True, dtype=bool)
 
-    # prepare to fill the list of matched trigger ids with the events passing tautaujet and vbf
-    matched_trigger_ids_list = [events.matched_trigger_ids]
+    # matched triggers, to be extended by events passing tautaujet and vbf, the ids are decoded from the bitsets
+    # and are thus unique and in the order of the triggers in the config rather than in the order of matching
+    def set_matched_triggers(events, bits):
+        events = set_ak_column(events, "matched_trigger_bits", bits)
+        ids = self.trigger_bitset.to_ids(bits)
+        return set_ak_column(events, "matched_trigger_ids", ids, value_type=np.int32)
+
+    matched_trigger_bits = events.matched_trigger_bits
 
     # only perform this special treatment when applicable
     if ak.any(ttj_mask):
@@ -167,42 +188,49 @@ def jet_selection(
         )
         # check which jets can be matched to any of the jet legs
         matching_mask = full_like(events.Jet.pt[ttj_mask], False, dtype=bool)
-        for trigger, _, leg_masks in trigger_results.x.trigger_data:
-            if trigger.id in self.trigger_ids_ttj:
-                trig_objs = events.TrigObj[leg_masks["jet"]]
-                trigger_matching_mask = trigger_object_matching(events.Jet[ttj_mask], trig_objs[ttj_mask])
-
-                # update overall matching mask to be used for the hhbjet selection
-                matching_mask = (
-                    matching_mask |
-                    trigger_matching_mask
-                )
+        ttj_trigger_data = [
+            (trigger, leg_masks)
+            for trigger, _, leg_masks in trigger_results.x.trigger_data
+            if trigger.id in self.trigger_ids_ttj
+        ]
+        # match jets against the jet legs of all tautaujet triggers at once
+        ttj_matching_masks = trigger_object_matching_legs(
+            events.Jet[ttj_mask],
+            [events.TrigObj[leg_masks["jet"]][ttj_mask] for _, leg_masks in ttj_trigger_data],
+        )
+        for (trigger, _), trigger_matching_mask in zip(ttj_trigger_data, ttj_matching_masks):
+            # update overall matching mask to be used for the hhbjet selection
+            matching_mask = (
+                matching_mask |
+                trigger_matching_mask
+            )
 
-                # update trigger matching mask with constraints on the jets
-                trigger_matching_mask = (
-                    trigger_matching_mask &
-                    constraints_mask_matched_hhbjet
-                )
+            # update trigger matching mask with constraints on the jets
+            trigger_matching_mask = (
+                trigger_matching_mask &
+                constraints_mask_matched_hhbjet
+            )
 
-                # add trigger_id to matched_trigger_ids if the pt-leading jet is matched
-                leading_matched = ak.fill_none(
-                    ak.firsts(trigger_matching_mask[sel_hhbjet_mask][pt_sorting_indices], axis=1),
-                    False,
-                )
+            # add trigger_id to matched_trigger_ids if the pt-leading jet is matched
+            leading_matched = ak.fill_none(
+                ak.firsts(trigger_matching_mask[sel_hhbjet_mask][pt_sorting_indices], axis=1),
+                False,
+            )
 
-                # cast leading matched mask to event mask
-                leading_matched_all_events = full_like(events.event, False, dtype=bool)
-                flat_leading_matched_all_events = flat_np_view(leading_matched_all_events)
-                flat_leading_matched_all_events[flat_np_view(ttj_mask)] = flat_np_view(leading_matched)
+            # cast leading matched mask to event mask
+            leading_matched_all_events = full_like(events.event, False, dtype=bool)
+            flat_leading_matched_all_events = flat_np_view(leading_matched_all_events)
+            flat_leading_matched_all_events[flat_np_view(ttj_mask)] = flat_np_view(leading_matched)
 
-                # store the matched trigger ids
-                ids = ak.where(leading_matched_all_events, np.float32(trigger.id), np.float32(np.nan))
-                matched_trigger_ids_list.append(ak.singletons(ak.nan_to_none(ids)))
+            # store the matched trigger
+            matched_trigger_bits = self.trigger_bitset.add(
+                matched_trigger_bits,
+                trigger.id,
+                leading_matched_all_events,
+            )
 
-        # store the matched trigger ids
-        matched_trigger_ids = ak.concatenate(matched_trigger_ids_list, axis=1)
-        # replace the existing column matched_trigger_ids from the lepton selection with the updated one
-        events = set_ak_column(events, "matched_trigger_ids", matched_trigger_ids, value_type=np.int32)
+        # replace the existing matched trigger columns from the lepton selection with the updated ones
+        events = set_matched_triggers(events, matched_trigger_bits)
 
         # constrain to jets with a score and a minimum pt corresponding to the trigger jet leg
         matching_mask = (
@@ -273,9 +301,7 @@ def jet_selection(
         (events.FatJet.msoftdrop > 30.0) &
         (events.FatJet.pt > 250.0) &  # ParticleNet not trained for lower values
         (abs(events.FatJet.eta) < 2.5) &
-        ak.all(events.FatJet.metric_table(events.Tau[lepton_results.x.taus]) > 0.8, axis=2) &
-        ak.all(events.FatJet.metric_table(events.Muon[lepton_results.x.mus]) > 0.8, axis=2) &
-        ak.all(events.FatJet.metric_table(events.Electron[lepton_results.x.eles]) > 0.8, axis=2) &
+        (min_delta_r(events.FatJet, selected_leptons) > 0.8) &
         (events.FatJet.subJetIdx1 >= 0) &
         (events.FatJet.subJetIdx2 >= 0)
     )
@@ -317,8 +343,8 @@ def jet_selection(
         (abs(vbf1.eta - vbf2.eta) > 3.0)
     )
 
-    # redefine the trigger matched list after it was updated with tautaujet ids
-    matched_trigger_ids_list = [events.matched_trigger_ids]
+    # redefine the matched triggers after they were updated with tautaujet ids
+    matched_trigger_bits = events.matched_trigger_bits
 
     # extra requirements for events for which only the tau tau vbf cross trigger fired
     if not self.trigger_ids_ttv:
@@ -335,16 +361,17 @@ def jet_selection(
                 # now, so define the final mask just from the tt matching decision for now
                 _ttv_fired_all_matched = ttv_fired_tt_matched
                 ttv_fired_all_matched = ttv_fired_all_matched | _ttv_fired_all_matched
-                ids = ak.where(_ttv_fired_all_matched, np.float32(trigger.id), np.float32(np.nan))
-                matched_trigger_ids_list.append(ak.singletons(ak.nan_to_none(ids)))
+                matched_trigger_bits = self.trigger_bitset.add(
+                    matched_trigger_bits,
+                    trigger.id,
+                    _ttv_fired_all_matched,
+                )
 
-        # store the matched trigger ids
-        matched_trigger_ids = ak.concatenate(matched_trigger_ids_list, axis=1)
-        events = set_ak_column(events, "matched_trigger_ids", matched_trigger_ids, value_type=np.int32)
+        # store the matched triggers
+        events = set_matched_triggers(events, matched_trigger_bits)
 
         # update the "ttv only" mask
-        cross_vbf_masks = [events.matched_trigger_ids == tid for tid in self.trigger_ids_ttv]
-        cross_vbf_mask = ak.all(reduce(or_, cross_vbf_masks), axis=1)
+        cross_vbf_mask = self.trigger_bitset.contains_only(events.matched_trigger_bits, self.trigger_ids_ttv)
         # remove all events that fired only vbf trigger but were not matched or
         # that fired vbf and tautaujet triggers and matched the taus but not the jets
         ttv_fired_v_not_matched = (
@@ -489,6 +516,9 @@ def jet_selection_init(self: Selector, **kwargs) -> None:
 
 @jet_selection.setup
 def jet_selection_setup(self: Selector, task: law.Task, **kwargs) -> None:
+    # bitset encoding of matched triggers
+    self.trigger_bitset = TriggerBitset(self.config_inst.x.triggers)
+
     # store ids of tau-tau cross triggers
     self.trigger_ids_tt = [
         trigger.id for trigger in self.config_inst.x.triggers
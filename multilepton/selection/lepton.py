@@ -7,25 +7,168 @@ Lepton selection methods.
 from __future__ import annotations
 
 import law
+import order as od
 
 from operator import or_
 from functools import reduce
+from collections import defaultdict
+from dataclasses import dataclass
 
 from columnflow.selection import Selector, SelectionResult, selector
 from columnflow.columnar_util import (
-    set_ak_column, sorted_indices_from_mask, flat_np_view, full_like,
+    set_ak_column, sorted_indices_from_mask, full_like,
 )
 from columnflow.util import maybe_import
+from columnflow.types import Sequence
 
-from multilepton.util import IF_NANO_V9, IF_NANO_GE_V10, IF_NANO_V12, IF_NANO_V14, IF_NANO_V15
-from multilepton.selection.muon_mva import compute_muon_mva_score
+from multilepton.util import (
+    IF_MC, IF_NANO_V9, IF_NANO_GE_V10, IF_NANO_V12, IF_NANO_V14, IF_NANO_V15, benchmark, columns_identical,
+    column_bytes_per_event,
+)
 from multilepton.config.util import Trigger
+from multilepton.selection.trigger import TriggerBitset
 
 np = maybe_import("numpy")
 ak = maybe_import("awkward")
 logger = law.logger.get_logger(__name__)
 
 
+def match_delta_r(
+    eta1: np.ndarray,
+    phi1: np.ndarray,
+    counts1: np.ndarray,
+    eta2: np.ndarray,
+    phi2: np.ndarray,
+    events2: np.ndarray,
+    legs2: np.ndarray,
+    n_legs: int,
+    threshold: float = 0.5,
+) -> np.ndarray:
+    """
+    Flat delta R matching kernel. Objects 1 are given by their *eta1* and *phi1* values and the number of objects
+    per event *counts1*, objects 2 by their *eta2* and *phi2* values, the index of their event *events2* and the
+    index of the leg collection *legs2* they belong to. Objects 2 are sorted by event, leg and eta, so that each
+    object 1 is only compared to those within a window of *threshold* in eta, stopping at its first match. Returns
+    a mask of shape (n_objects1, *n_legs*) that is *True* where an object 1 has a delta R below *threshold* to at
+    least one object of the respective leg collection in the same event.
+    """
+    n1 = len(eta1)
+    matches = np.zeros((n1, n_legs), dtype=bool)
+    if n1 == 0 or len(eta2) == 0:
+        return matches
+
+    # global sorting key: the eta offset within each (event, leg) group stays below the group width
+    eta_min = min(np.min(eta1), np.min(eta2)) - threshold
+    width = max(np.max(eta1), np.max(eta2)) - eta_min + threshold + 1.0
+    keys2 = (events2.astype(np.int64) * n_legs + legs2) * width + (eta2.astype(np.float64) - eta_min)
+    order = np.argsort(keys2, kind="stable")
+    keys2 = keys2[order]
+
+    # eta window per object 1 and leg, widened slightly as the final decision is taken on delta R
+    events1 = np.repeat(np.arange(len(counts1), dtype=np.int64), counts1)
+    keys1 = ((events1[:, None] * n_legs + np.arange(n_legs)) * width + (eta1[:, None] - eta_min)).ravel()
+    margin = threshold + 1e-6
+    lo = np.searchsorted(keys2, keys1 - margin, side="left")
+    n_cand = np.searchsorted(keys2, keys1 + margin, side="right") - lo
+    del keys1, keys2
+
+    # step through the windows, dropping (object, leg) pairs once matched
+    flat_matches = matches.ravel()
+    pending = np.flatnonzero(n_cand)
+    step = 0
+    while len(pending):
+        idx1 = pending // n_legs
+        idx2 = order[lo[pending] + step]
+        deta = eta1[idx1] - eta2[idx2]
+        dphi = (phi1[idx1] - phi2[idx2] + np.pi) % (2 * np.pi) - np.pi
+        matched = np.sqrt(deta**2 + dphi**2) < threshold
+        flat_matches[pending[matched]] = True
+        step += 1
+        pending = pending[~matched & (n_cand[pending] > step)]
+
+    return matches
+
+
+def min_delta_r(
+    vectors1: ak.Array,
+    collections: Sequence[ak.Array],
+    /,
+) -> ak.Array:
+    """
+    Returns the minimal delta R per object in *vectors1* to any object of the *collections* in the same
+    event, and *inf* for objects in events without any of them. The collections are concatenated once
+    and compared slot by slot, so that no temporary exceeds the number of objects in *vectors1*.
+    """
+    counts1 = ak.to_numpy(ak.num(vectors1, axis=1))
+    eta1 = ak.to_numpy(ak.flatten(vectors1.eta, axis=1))
+    phi1 = ak.to_numpy(ak.flatten(vectors1.phi, axis=1))
+
+    others = ak.concatenate([ak.zip({"eta": c.eta, "phi": c.phi}) for c in collections], axis=1)
+    counts2 = ak.to_numpy(ak.num(others, axis=1))
+    eta2 = ak.to_numpy(ak.flatten(others.eta, axis=1))
+    phi2 = ak.to_numpy(ak.flatten(others.phi, axis=1))
+
+    # index of the first partner and number of partners per object 1
+    starts2 = np.repeat(np.cumsum(counts2) - counts2, counts1)
+    n2 = np.repeat(counts2, counts1)
+
+    min_dr = np.full(len(eta1), np.inf, dtype=np.result_type(eta1, eta2))
+    for slot in range(n2.max() if len(n2) else 0):
+        idx1 = np.flatnonzero(n2 > slot)
+        idx2 = starts2[idx1] + slot
+        deta = eta1[idx1] - eta2[idx2]
+        dphi = (phi1[idx1] - phi2[idx2] + np.pi) % (2 * np.pi) - np.pi
+        min_dr[idx1] = np.minimum(min_dr[idx1], np.sqrt(deta**2 + dphi**2))
+
+    return ak.unflatten(min_dr, counts1)
+
+
+def trigger_object_matching_legs(
+    vectors1: ak.Array,
+    legs: Sequence[ak.Array],
+    /,
+    *,
+    threshold: float = 0.5,
+    event_mask: ak.Array | type(Ellipsis) | None = None,
+) -> list[ak.Array]:
+    """
+    Matches objects in *vectors1* against several trigger leg collections *legs* in one call, and returns one mask
+    per leg with the same shape as *vectors1* that is *True* for objects with at least one object of that leg within
+    a delta R below *threshold*. If an *event_mask* is given, objects in other events are not matched.
+    """
+    if not legs:
+        return []
+
+    used_event_mask = event_mask is not None and event_mask is not Ellipsis
+    if used_event_mask:
+        event_mask = np.asarray(ak.to_numpy(event_mask), dtype=bool)
+
+    counts1 = ak.to_numpy(ak.num(vectors1, axis=1))
+    eta2, phi2, events2, legs2 = [], [], [], []
+    for i, vectors2 in enumerate(legs):
+        counts2 = ak.to_numpy(ak.num(vectors2, axis=1))
+        leg_events = np.repeat(np.arange(len(counts2)), counts2)
+        keep = event_mask[leg_events] if used_event_mask else Ellipsis
+        eta2.append(ak.to_numpy(ak.flatten(vectors2.eta, axis=1))[keep])
+        phi2.append(ak.to_numpy(ak.flatten(vectors2.phi, axis=1))[keep])
+        events2.append(leg_events[keep])
+        legs2.append(np.full(len(events2[-1]), i, dtype=np.int64))
+
+    matches = match_delta_r(
+        ak.to_numpy(ak.flatten(vectors1.eta, axis=1)),
+        ak.to_numpy(ak.flatten(vectors1.phi, axis=1)),
+        counts1,
+        np.concatenate(eta2),
+        np.concatenate(phi2),
+        np.concatenate(events2),
+        np.concatenate(legs2),
+        len(legs),
+        threshold=threshold,
+    )
+
+    return [ak.unflatten(matches[:, i], counts1) for i in range(len(legs))]
+
+
 def trigger_object_matching(
     vectors1: ak.Array,
     vectors2: ak.Array,
@@ -37,52 +180,371 @@ def trigger_object_matching(
 ) -> ak.Array:
     """
     Helper to check per object in *vectors1* if there is at least one object in *vectors2* that
-    leads to a delta R metric below *threshold*. The final reduction is applied over *axis* of the
-    resulting metric table containing the full combinatorics. If an *event_mask* is given, the
-    the matching is performed only for those events, but a full object mask with the same shape as
-    that of *vectors1* is returned, which all objects set to *False* where not matching was done.
+    leads to a delta R metric below *threshold*. With *axis* 1 instead of 2, the check is done per
+    object in *vectors2* instead. If an *event_mask* is given, the matching is performed only for
+    those events, but a full object mask is returned, with all objects set to *False* where no
+    matching was done.
     """
-    # handle event masks
-    used_event_mask = event_mask is not None and event_mask is not Ellipsis
-    event_mask = Ellipsis if event_mask is None else event_mask
-    # delta_r for all combinations
-    dr = vectors1[event_mask].metric_table(vectors2[event_mask])
-    # check per element in vectors1 if there is at least one matching element in vectors2
-    any_match = ak.any(dr < threshold, axis=axis)
-    # expand to original shape if an event mask was given
-    if used_event_mask:
-        full_any_match = full_like(vectors1.pt, False, dtype=bool)
-        flat_full_any_match = flat_np_view(full_any_match)
-        flat_full_any_match[flat_np_view(full_any_match | event_mask)] = flat_np_view(any_match)
-        any_match = full_any_match
-    return any_match
+    if axis == 1:
+        vectors1, vectors2 = vectors2, vectors1
+    elif axis != 2:
+        raise ValueError(f"invalid axis {axis} for trigger object matching, must be 1 or 2")
+    return trigger_object_matching_legs(vectors1, [vectors2], threshold=threshold, event_mask=event_mask)[0]
 
 
-def update_channel_ids(
-    events: ak.Array,
-    previous_channel_ids: ak.Array,
-    correct_channel_id: int,
-    channel_mask: ak.Array,
-) -> ak.Array:
+def trigger_selection_key(selector: Selector, trigger: Trigger) -> frozenset[str]:
     """
-    Check if the events in the is_mask can be inside the given channel
-    or have already been sorted in another channel before.
+    Returns the tags of *trigger* that the outputs of the object *selector* depend on, as declared in
+    its *trigger_tags* attribute, to identify triggers leading to identical object masks.
     """
-    events_not_in_channel = (previous_channel_ids != 0) & (previous_channel_ids != correct_channel_id)
-    channel_id_overwrite = events_not_in_channel & channel_mask
-    if ak.any(channel_id_overwrite):
+    return frozenset(tag for tag in selector.trigger_tags if trigger.has_tag(tag))
+
+
+def assign_channel_ids(
+    channel_masks: np.ndarray,
+    channel_ids: np.ndarray,
+) -> np.ndarray:
+    """
+    Converts per-event *channel_masks* of shape (n_events, n_channels) into channel ids, taken from
+    *channel_ids*, and checks that no event is sorted into more than one channel.
+    """
+    n_channels = np.sum(channel_masks, axis=1)
+    if np.any(n_channels > 1):
         raise ValueError(
             "The channel_ids of some events are being set to two different values. "
             "The first event of this chunk concerned has index",
-            ak.where(channel_id_overwrite)[0],
+            np.where(n_channels > 1)[0],
+        )
+    return np.sum(channel_masks * channel_ids.astype(np.uint32), axis=1, dtype=np.uint32)
+
+
+# tags per trigger family that channels are routed to and matched against
+trigger_families = {
+    "single_e": {"single_e"},
+    "double_e": {"double_e"},
+    "triple_e": {"triple_e"},
+    "single_mu": {"single_mu"},
+    "double_mu": {"double_mu"},
+    "triple_mu": {"triple_mu"},
+    "double_emu": {"double_emu"},
+    "triple_eemu": {"triple_eemu"},
+    "triple_emumu": {"triple_emumu"},
+    "cross_e_tau": {"cross_e_tau"},
+    "cross_mu_tau": {"cross_mu_tau"},
+    "cross_tau_tau_any": {"cross_tau_tau", "cross_tau_tau_jet", "cross_tau_tau_vbf"},
+}
+
+_e_triggers = ("single_e", "double_e", "triple_e")
+_mu_triggers = ("single_mu", "double_mu", "triple_mu")
+
+# trigger families per channel in simulation ("mc") and per data stream tag, where the order of the
+# data streams defines their priority when a dataset carries multiple stream tags
+channel_trigger_routes = {
+    # eormu -> use single electron triggers only, so that eormu does not run over all triggers
+    "ceormu": {"mc": ("single_e",)},
+    # 3l0tau + 3l1tau + 4l: single, double and triple lepton triggers
+    "c3e": {"mc": _e_triggers, "ee": _e_triggers},
+    "c4e": {"mc": _e_triggers, "ee": _e_triggers},
+    "c3etau": {"mc": _e_triggers, "ee": _e_triggers},
+    "c3mu": {"mc": _mu_triggers, "mumu": _mu_triggers},
+    "c4mu": {"mc": _mu_triggers, "mumu": _mu_triggers},
+    "c3mutau": {"mc": _mu_triggers, "mumu": _mu_triggers},
+    "c2e2mu": {
+        "mc": ("single_e", "single_mu", "double_e", "double_mu", "double_emu", "triple_eemu", "triple_emumu"),
+        "mue": ("double_emu", "triple_emumu", "triple_eemu"),
+        "mumu": ("double_mu",),
+        "ee": ("double_e",),
+        "emu_from_e": ("single_e",),
+        "emu_from_mu": ("single_mu",),
+    },
+    "c3emu": {
+        "mc": ("single_e", "single_mu", "double_e", "double_emu", "triple_e", "triple_eemu"),
+        "mue": ("double_emu", "triple_eemu"),
+        "ee": ("double_e", "triple_e"),
+        "emu_from_e": ("single_e",),
+        "emu_from_mu": ("single_mu",),
+    },
+    "ce3mu": {
+        "mc": ("single_e", "single_mu", "double_mu", "double_emu", "triple_mu", "triple_emumu"),
+        "mue": ("double_emu", "triple_emumu"),
+        "mumu": ("double_mu", "triple_mu"),
+        "emu_from_e": ("single_e",),
+        "emu_from_mu": ("single_mu",),
+    },
+    **dict.fromkeys(("c2emu", "c2emutau"), {
+        "mc": ("single_e", "single_mu", "double_e", "double_emu", "triple_eemu"),
+        "mue": ("double_emu", "triple_eemu"),
+        "ee": ("double_e",),
+        "emu_from_e": ("single_e",),
+        "emu_from_mu": ("single_mu",),
+    }),
+    **dict.fromkeys(("ce2mu", "ce2mutau"), {
+        "mc": ("single_e", "single_mu", "double_mu", "double_emu", "triple_emumu"),
+        "mue": ("double_emu", "triple_emumu"),
+        "mumu": ("double_mu",),
+        "emu_from_e": ("single_e",),
+        "emu_from_mu": ("single_mu",),
+    }),
+    # 2l2tau + 2l0or1tau: single and double lepton triggers
+    **dict.fromkeys(("c2e2tau", "c2e0or1tau"), {
+        "mc": ("single_e", "double_e"),
+        "ee": ("single_e", "double_e"),
+    }),
+    **dict.fromkeys(("c2mu2tau", "c2mu0or1tau"), {
+        "mc": ("single_mu", "double_mu"),
+        "mumu": ("single_mu", "double_mu"),
+    }),
+    **dict.fromkeys(("cemu2tau", "cemu0or1tau"), {
+        "mc": ("single_e", "single_mu", "double_emu"),
+        "mue": ("double_emu",),
+        "emu_from_e": ("single_e",),
+        "emu_from_mu": ("single_mu",),
+    }),
+    # 1l3tau + 4tau: single lepton and tau cross triggers
+    "ce3tau": {
+        "mc": ("single_e", "cross_e_tau", "cross_tau_tau_any"),
+        "tautau": ("cross_e_tau", "cross_tau_tau_any"),
+        "etau": ("single_e", "cross_e_tau"),
+    },
+    "cmu3tau": {
+        "mc": ("single_mu", "cross_mu_tau", "cross_tau_tau_any"),
+        "tautau": ("cross_tau_tau_any",),
+        "mutau": ("single_mu", "cross_mu_tau"),
+    },
+    "c4tau": {"mc": ("cross_tau_tau_any",), "tautau": ("cross_tau_tau_any",)},
+}
+
+
+def route_channel(ch_key: str, dataset_inst: od.Dataset) -> tuple[str, ...] | None:
+    """
+    Returns the trigger families that events of *dataset_inst* are selected with in channel *ch_key*
+    according to :py:attr:`channel_trigger_routes`, or *None* if the dataset cannot populate it.
+    """
+    routes = channel_trigger_routes.get(ch_key, {})
+    if dataset_inst.is_mc:
+        return routes.get("mc")
+    for stream, families in routes.items():
+        if stream != "mc" and dataset_inst.has_tag(stream):
+            return families
+    return None
+
+
+# ordered names of the per-event object multiplicities that channel rules are evaluated on
+multiplicity_fields = ("e_ctrl", "e_veto", "e", "mu_ctrl", "mu_veto", "mu", "tau", "tau_iso")
+
+
+@dataclass(frozen=True)
+class ChannelRule:
+    """
+    Lepton multiplicity, charge and trigger matching requirements of an analysis channel.
+
+    *matching* is an ordered sequence of (trigger family, conditions) pairs, where the first pair
+    whose family the trigger belongs to defines the conditions of the trigger matching decision.
+    Triggers not covered by any family reuse the previous matching decision.
+    """
+
+    n_e: int = 0
+    n_mu: int = 0
+    n_tau: int = 0
+    # whether n_tau is an upper bound rather than the exact tau multiplicity
+    tau_up_to: bool = False
+    # tau id working points vs. electrons and muons
+    tau_wps: tuple[str, str] = ("vvvloose", "vloose")
+    # absolute charge sums of light leptons and of all leptons, None to skip
+    light_charge: int | None = None
+    total_charge: int | None = None
+    matching: tuple[tuple[str, tuple[str, ...]], ...] = ()
+
+    def bounds(self, tight: bool = False) -> list[tuple[int, int | None]]:
+        """
+        Returns (min, max) multiplicities per entry in :py:attr:`multiplicity_fields`, with *None*
+        denoting no upper bound, for either the base or, if *tight* is *True*, the tight selection.
+        """
+        any_n = (0, None)
+        exactly = lambda n: (n, n)
+        if tight:
+            return [
+                any_n, any_n, exactly(self.n_e) if self.n_e else any_n,
+                any_n, any_n, exactly(self.n_mu) if self.n_mu else any_n,
+                any_n, exactly(self.n_tau) if self.n_tau and not self.tau_up_to else any_n,
+            ]
+        return [
+            exactly(self.n_e) if self.n_e else any_n, exactly(self.n_e), any_n,
+            exactly(self.n_mu) if self.n_mu else any_n, exactly(self.n_mu), any_n,
+            (0, self.n_tau) if self.tau_up_to else exactly(self.n_tau), any_n,
+        ]
+
+
+_tight_tau_wps = ("vloose", "tight")
+_match_e = (("any", ("e_match",)),)
+_match_mu = (("any", ("mu_match",)),)
+_match_emu = (
+    # emu_from_e: accept only events without single muon triggers (anti-overlap)
+    ("single_e", ("e_only", "e_match")),
+    # emu_from_mu: if single electron triggers fired as well, also require an electron match
+    ("single_mu", ("mu_match", "e_guard")),
+)
+_match_etau = (
+    ("single_e", ("e_only_emutau", "e_match")),
+    ("cross_e_tau", ("tau_match", "e_match")),
+)
+_match_mutau = (
+    ("single_mu", ("mu_only_emutau", "mu_match")),
+    ("cross_mu_tau", ("tau_match", "mu_match")),
+)
+_match_emutau = (
+    ("single_e", ("e_match", "mu_guard")),
+    ("single_mu", ("mu_match", "e_guard")),
+    ("cross_e_tau", ("tau_match", "e_match", "mu_guard")),
+    ("cross_mu_tau", ("tau_match", "mu_match", "e_guard")),
+)
+_match_tautau = (("cross_tau_tau_any", ("tau_match",)),)
+
+channel_rules = {
+    # 3l and 4l without taus
+    "c3e": ChannelRule(n_e=3, light_charge=1, matching=_match_e),
+    "c3mu": ChannelRule(n_mu=3, light_charge=1, matching=_match_mu),
+    "c2emu": ChannelRule(n_e=2, n_mu=1, light_charge=1, matching=_match_emu),
+    "ce2mu": ChannelRule(n_e=1, n_mu=2, light_charge=1, matching=_match_emu),
+    "c4e": ChannelRule(n_e=4, light_charge=0, matching=_match_e),
+    "c4mu": ChannelRule(n_mu=4, light_charge=0, matching=_match_mu),
+    "c3emu": ChannelRule(n_e=3, n_mu=1, light_charge=0, matching=_match_emu),
+    "c2e2mu": ChannelRule(n_e=2, n_mu=2, light_charge=0, matching=_match_emu),
+    "ce3mu": ChannelRule(n_e=1, n_mu=3, light_charge=0, matching=_match_emu),
+    # 3l1tau
+    "c3etau": ChannelRule(
+        n_e=3, n_tau=1, tau_wps=_tight_tau_wps, light_charge=1, total_charge=0, matching=_match_etau,
+    ),
+    "c3mutau": ChannelRule(
+        n_mu=3, n_tau=1, tau_wps=_tight_tau_wps, light_charge=1, total_charge=0, matching=_match_mutau,
+    ),
+    "c2emutau": ChannelRule(
+        n_e=2, n_mu=1, n_tau=1, tau_wps=_tight_tau_wps, light_charge=1, total_charge=0, matching=_match_emutau,
+    ),
+    "ce2mutau": ChannelRule(
+        n_e=1, n_mu=2, n_tau=1, tau_wps=_tight_tau_wps, light_charge=1, total_charge=0, matching=_match_emutau,
+    ),
+    # 2l2tau
+    "c2e2tau": ChannelRule(
+        n_e=2, n_tau=2, tau_wps=_tight_tau_wps, light_charge=0, total_charge=0,
+        matching=_match_etau + _match_tautau,
+    ),
+    "c2mu2tau": ChannelRule(
+        n_mu=2, n_tau=2, tau_wps=_tight_tau_wps, light_charge=0, total_charge=0,
+        matching=_match_mutau + _match_tautau,
+    ),
+    "cemu2tau": ChannelRule(
+        n_e=1, n_mu=1, n_tau=2, tau_wps=_tight_tau_wps, light_charge=0, total_charge=0,
+        matching=_match_emutau + _match_tautau,
+    ),
+    # 1l3tau and 4tau
+    "ce3tau": ChannelRule(n_e=1, n_tau=3, tau_wps=_tight_tau_wps, total_charge=0, matching=_match_etau),
+    "cmu3tau": ChannelRule(n_mu=1, n_tau=3, tau_wps=_tight_tau_wps, total_charge=0, matching=_match_mutau),
+    "c4tau": ChannelRule(n_tau=4, tau_wps=("vvloose", "vloose"), total_charge=0, matching=_match_tautau),
+    # 2l with up to one tau
+    "c2e0or1tau": ChannelRule(
+        n_e=2, n_tau=1, tau_up_to=True, tau_wps=_tight_tau_wps, light_charge=0, matching=_match_e,
+    ),
+    "c2mu0or1tau": ChannelRule(
+        n_mu=2, n_tau=1, tau_up_to=True, tau_wps=_tight_tau_wps, light_charge=0, matching=_match_mu,
+    ),
+    "cemu0or1tau": ChannelRule(
+        n_e=1, n_mu=1, n_tau=1, tau_up_to=True, tau_wps=_tight_tau_wps, light_charge=0, matching=_match_emu,
+    ),
+}
+
+
+def compile_channel_rules(rules: Sequence[ChannelRule]) -> dict[str, np.ndarray]:
+    """
+    Converts *rules* into arrays of multiplicity bounds and charge requirements so that all of them
+    can be evaluated at once with :py:func:`evaluate_channel_rules`.
+    """
+    no_max = np.iinfo(np.int64).max
+
+    def bound_arrays(tight):
+        bounds = np.array(
+            [[(lo, no_max if hi is None else hi) for lo, hi in rule.bounds(tight=tight)] for rule in rules],
+            dtype=np.int64,
         )
-    return ak.where(channel_mask, correct_channel_id, previous_channel_ids)
+        return bounds[..., 0], bounds[..., 1]
+
+    lo, hi = bound_arrays(False)
+    tight_lo, tight_hi = bound_arrays(True)
+    # charge sums of (electrons, muons, taus) entering the light and total lepton charges
+    light_w = np.array([[bool(rule.n_e), bool(rule.n_mu), 0] for rule in rules], dtype=np.int64).T
+    total_w = np.array([[bool(rule.n_e), bool(rule.n_mu), 1] for rule in rules], dtype=np.int64).T
+    return {
+        "lo": lo,
+        "hi": hi,
+        "tight_lo": tight_lo,
+        "tight_hi": tight_hi,
+        "light_w": light_w,
+        "total_w": total_w,
+        "check_light": np.array([rule.light_charge is not None for rule in rules]),
+        "light_charge": np.array([rule.light_charge or 0 for rule in rules], dtype=np.int64),
+        "check_total": np.array([rule.total_charge is not None for rule in rules]),
+        "total_charge": np.array([rule.total_charge or 0 for rule in rules], dtype=np.int64),
+    }
+
+
+def lepton_multiplicities(
+    events: ak.Array,
+    masks: dict[str, ak.Array],
+    tau_mask: ak.Array,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the per-event object multiplicities, ordered as in :py:attr:`multiplicity_fields`, and the
+    charge sums of control electrons, control muons and taus, given the object *masks* of a trigger
+    and the channel dependent *tau_mask*.
+    """
+    counts = np.stack(
+        [
+            ak.to_numpy(ak.sum(mask, axis=1))
+            for mask in (
+                masks["e_ctrl"], masks["e_veto"], masks["e"],
+                masks["mu_ctrl"], masks["mu_veto"], masks["mu"],
+                tau_mask, tau_mask & masks["tau_iso"],
+            )
+        ],
+        axis=1,
+    )
+    charges = np.stack(
+        [
+            ak.to_numpy(ak.sum(events.Electron.charge[masks["e_ctrl"]], axis=1)),
+            ak.to_numpy(ak.sum(events.Muon.charge[masks["mu_ctrl"]], axis=1)),
+            ak.to_numpy(ak.sum(events.Tau.charge[tau_mask], axis=1)),
+        ],
+        axis=1,
+    ).astype(np.int64)
+    return counts, charges
+
+
+def evaluate_channel_rules(
+    compiled_rules: dict[str, np.ndarray],
+    counts: np.ndarray,
+    charges: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Evaluates all *compiled_rules* on per-event *counts* and *charges* as returned by
+    :py:func:`lepton_multiplicities` and returns the base selection, tight selection and charge
+    requirement decisions, each with shape (n_events, n_rules).
+    """
+    counts = counts[:, None, :]
+    base = np.all((counts >= compiled_rules["lo"]) & (counts <= compiled_rules["hi"]), axis=2)
+    tight = np.all((counts >= compiled_rules["tight_lo"]) & (counts <= compiled_rules["tight_hi"]), axis=2)
+    light_charge = np.abs(charges @ compiled_rules["light_w"])
+    total_charge = np.abs(charges @ compiled_rules["total_w"])
+    charge_ok = (
+        (~compiled_rules["check_light"] | (light_charge == compiled_rules["light_charge"])) &
+        (~compiled_rules["check_total"] | (total_charge == compiled_rules["total_charge"]))
+    )
+    return base, tight, charge_ok
 
 
 @selector(
     uses={
         "Electron.{pt,eta,phi,dxy,dz}",
-        "Electron.{pfRelIso03_all,seediEtaOriX,seediPhiOriY,sip3d,miniPFRelIso_all,sieie}",
+        "Electron.{seediEtaOriX,seediPhiOriY,sip3d,miniPFRelIso_all,sieie}",
         "Electron.{hoe,eInvMinusPInv,convVeto,lostHits,jetPtRelv2,jetIdx}",
         "Jet.btagDeepFlavB",
         IF_NANO_V12("Electron.mvaTTH"),
@@ -91,6 +553,8 @@ def update_channel_ids(
         IF_NANO_V9("Electron.mvaFall17V2{Iso_WP80,Iso_WP90}"),
         IF_NANO_GE_V10("Electron.{mvaIso_WP80,mvaIso_WP90}"),
     },
+    # trigger tags the returned masks depend on, used to share masks between triggers
+    trigger_tags=set(),
     exposed=False,
 )
 def electron_selection(
@@ -254,12 +718,16 @@ def electron_trigger_matching(
 @selector(
     uses={
         "Muon.{pt,eta,phi,looseId,mediumId,tightId}",
-        "Muon.{pfRelIso04_all,dxy,dz,sip3d,miniPFRelIso_all,jetPtRelv2,jetIdx}",
+        "Muon.{dxy,dz,sip3d,miniPFRelIso_all,jetPtRelv2,jetIdx}",
         "Jet.btagDeepFlavB",
-        IF_NANO_V12("Muon.mvaTTH"),
-        IF_NANO_V14("Muon.promptMVA"),
-        IF_NANO_V15("Muon.promptMVA"),
+        # columns of the muon mva score added dynamically depending on muon_mva_source
     },
+    # trigger tags the returned masks depend on, used to share masks between triggers
+    trigger_tags=set(),
+    # source of the prompt lepton mva score, "custom" (trained model from the external files) or "nano"
+    muon_mva_source="custom",
+    # number of threads for the custom muon mva evaluation, None for the xgboost default
+    muon_mva_nthread=1,
     exposed=False,
 )
 def muon_selection(
@@ -290,13 +758,10 @@ def muon_selection(
         #    min_pt = 23.0 if is_single else 20.0
         # else:
         #    min_pt = 26.0 if is_single else 22.0
-        # Compute custom muon MVA score (trained tLepton MVA model)
-        try:
-            promptMVA = compute_muon_mva_score(events)
-            logger.info("Using CUSTOM TRAINED muon MVA for selection")
-        except Exception as e:
-            # Fallback to NanoAOD MVA if custom model fails
-            logger.warning(f"Failed to load custom muon MVA model ({e}), falling back to NanoAOD MVA")
+        if self.muon_mva_source == "custom":
+            # custom muon MVA score (trained tLepton MVA model)
+            promptMVA = self.muon_mva(events)
+        else:
             if "promptMVA" in events.Muon.fields:
                 # >= nano v14
                 promptMVA = events.Muon.promptMVA
@@ -354,6 +819,57 @@ def muon_selection(
     return tight_mask, control_mask, veto_mask
 
 
+@muon_selection.init
+def muon_selection_init(self: Selector, **kwargs) -> None:
+    # inputs of the custom muon mva features, or the nano score
+    if self.muon_mva_source == "custom":
+        self.uses |= {
+            "Muon.{pdgId,phi,miniPFRelIso_chg,segmentComp}",
+            "Jet.{pt,phi,btagDeepFlavB,nConstituents}",
+        }
+    else:
+        self.uses |= {
+            IF_NANO_V12("Muon.mvaTTH"),
+            IF_NANO_V14("Muon.promptMVA"),
+            IF_NANO_V15("Muon.promptMVA"),
+        }
+
+
+@muon_selection.requires
+def muon_selection_requires(self: Selector, task: law.Task, reqs: dict, **kwargs) -> None:
+    if self.muon_mva_source != "custom" or "external_files" in reqs:
+        return
+
+    from columnflow.tasks.external import BundleExternalFiles
+    reqs["external_files"] = BundleExternalFiles.req(task)
+
+
+@muon_selection.setup
+def muon_selection_setup(self: Selector, task: law.Task, reqs: dict, **kwargs) -> None:
+    self.muon_mva = None
+    if self.muon_mva_source != "custom":
+        return
+
+    # load the converted custom muon MVA, converting the trained artifacts once per node
+    from multilepton.selection.muon_mva import load_muon_mva
+    if "muon_mva" not in reqs["external_files"].files:
+        raise ValueError(
+            f"{self.cls_name} uses the custom muon mva, but the external file 'muon_mva' is not registered in config "
+            f"{self.config_inst.name}, check out Lepton-MVA-Run3 next to this repository or use the nano muon mva "
+            "score, e.g. through lepton_selection_nano",
+        )
+    files = reqs["external_files"].files.muon_mva
+    self.muon_mva = load_muon_mva(
+        files.model.abspath,
+        files.scaler.abspath,
+        files.features.abspath,
+        nthread=self.muon_mva_nthread,
+    )
+
+
+muon_selection_nano = muon_selection.derive("muon_selection_nano", cls_dict={"muon_mva_source": "nano"})
+
+
 @selector(
     uses={"{Muon,TrigObj}.{pt,eta,phi}"},
     exposed=False,
@@ -382,12 +898,25 @@ def muon_trigger_matching(
     )
 
 
+def tau_noid_mask(events: ak.Array, max_eta: float = 2.5, min_pt: float = 20.0) -> ak.Array:
+    """
+    Returns the mask of taus passing the kinematic cuts of the tau selection, independent of the tagger.
+    """
+    return (
+        (abs(events.Tau.eta) < max_eta) &
+        (events.Tau.pt > min_pt) &
+        (abs(events.Tau.dz) < 0.2)
+    )
+
+
 @selector(
     uses={
         "Tau.{pt,eta,phi,dz,decayMode}",
         "{Electron,Muon,TrigObj}.{pt,eta,phi}",
     },
     # shifts are declared dynamically below in tau_selection_init
+    # trigger tags the returned masks depend on (through the trigger specific pt cut)
+    trigger_tags={"cross_e_tau", "cross_mu_tau", "cross_tau_tau", "cross_tau_tau_vbf", "cross_tau_tau_jet"},
     exposed=False,
 )
 def tau_selection(
@@ -441,11 +970,7 @@ def tau_selection(
         min_pt = 20.0
 
     # no_id mask for tagge rindependent tests
-    noid_mask = (
-        (abs(events.Tau.eta) < max_eta) &
-        (events.Tau.pt > base_pt) &
-        (abs(events.Tau.dz) < 0.2)
-    )
+    noid_mask = tau_noid_mask(events, max_eta=max_eta, min_pt=base_pt)
 
     # base tau mask for default and qcd sideband tau
     base_mask = noid_mask & (
@@ -527,14 +1052,9 @@ def tau_trigger_matching(
     assert abs(trigger.legs["tau2"].pdg_id) == 15
 
     # match both legs
-    matches_leg0 = trigger_object_matching(
-        events.Tau,
-        events.TrigObj[leg_masks["tau1"]],
-        event_mask=trigger_fired,
-    )
-    matches_leg1 = trigger_object_matching(
+    matches_leg0, matches_leg1 = trigger_object_matching_legs(
         events.Tau,
-        events.TrigObj[leg_masks["tau2"]],
+        [events.TrigObj[leg_masks["tau1"]], events.TrigObj[leg_masks["tau2"]]],
         event_mask=trigger_fired,
     )
 
@@ -548,21 +1068,55 @@ def tau_trigger_matching(
     return matches
 
 
+def gen_match_leptons(
+    reco_leptons: ak.Array,
+    gen_particles: ak.Array,
+    pdg_id: int,
+    delta_r_threshold: float = 0.1,
+) -> ak.Array:
+    """
+    Match reconstructed leptons to generator-level particles with *pdg_id* (particle or antiparticle) and returns
+    a boolean mask with the shape of *reco_leptons* that is *True* for leptons within *delta_r_threshold* of one.
+    """
+    gen_filtered = gen_particles[np.abs(gen_particles.pdgId) == pdg_id]
+
+    # handle chunks without events
+    if len(gen_filtered) == 0:
+        return full_like(reco_leptons.pt, False, dtype=bool)
+
+    # min over the gen axis of the (event, reco, gen) delta r table, none for events without gen particles
+    min_dr = ak.min(reco_leptons.metric_table(gen_filtered), axis=2)
+
+    return ak.fill_none(min_dr < delta_r_threshold, False)
+
+
+# columns written when gen matching is enabled for at least one channel
+gen_match_columns = {"ElectronGenMatched", "MuonGenMatched", "TauGenMatched", "all_leptons_genuine"}
+
+
 @selector(
     uses={
-        electron_selection, electron_trigger_matching, muon_selection, muon_trigger_matching,
+        electron_selection, electron_trigger_matching, muon_trigger_matching,
         tau_selection, tau_trigger_matching,
         "event", "{Electron,Muon,Tau}.{charge,mass}",
+        # muon selection added dynamically through muon_selection_cls
     },
     produces={
-        electron_selection, electron_trigger_matching, muon_selection, muon_trigger_matching,
+        electron_selection, electron_trigger_matching, muon_trigger_matching,
         tau_selection, tau_trigger_matching,
         # new columns
         "channel_id", "leptons_os", "tau2_isolated", "single_triggered", "cross_triggered",
-        "matched_trigger_ids", "tight_sel", "trig_match", "tight_sel_bdt", "trig_match_bdt", "ok_bdt_eormu",
-        "ok_bdt_eormu_bveto", "ElectronLoose", "ElectronTight", "MuonLoose", "MuonTight",
-        "TauIso", "TauNoID", "Muon.muonLeptoMVA_hh",
+        "matched_trigger_ids", "matched_trigger_bits", "tight_sel", "trig_match", "tight_sel_bdt", "trig_match_bdt",
+        "ok_bdt_eormu", "ok_bdt_eormu_bveto", "ElectronLoose", "ElectronTight", "MuonLoose", "MuonTight",
+        "TauIso", "TauNoID",
+        # muon mva and gen matching columns added dynamically
     },
+    # muon selection to use, which also defines the source of the muon mva score
+    muon_selection_cls=muon_selection,
+    # channels in which selected leptons are matched to generator-level leptons (mc only)
+    gen_match_channels=set(),
+    # whether to drop object selections and their columns for datasets that cannot populate any channel
+    prune_unreachable_columns=True,
 )
 def lepton_selection(
     self: Selector,
@@ -577,27 +1131,15 @@ def lepton_selection(
     disable_triggers = getattr(self.config_inst.x, "disable_triggers", False)
     get_tau_tagger = lambda tag: f"id{self.config_inst.x.tau_tagger}VS{tag}"
 
-    # get channels from the config
-    print(self.config_inst)
-    channels = {
-        name: self.config_inst.get_channel(name)
-        for name in self.config_inst.x.channel_names
-    }
-
     # Compute and add custom muon MVA scores as output column
-    try:
-        muon_mva_scores = compute_muon_mva_score(events)
+    if self.select_objects and self.muon_selection_cls.muon_mva_source == "custom":
+        muon_mva_scores = self[self.muon_selection_cls].muon_mva(events)
         events = set_ak_column(events, ("Muon", "muonLeptoMVA_hh"), muon_mva_scores)
-        print("✅ Using CUSTOM TRAINED muon Lepton MVA (XGBoost model from Lepton-MVA-Run3)")
-    except Exception as e:
-        print(f"❌ Failed to compute custom muon MVA ({e}), creating dummy column with zeros")
-        events = set_ak_column(events, ("Muon", "muonLeptoMVA_hh"), ak.zeros_like(events.Muon.pt))
 
     # prepare vectors for output vectors
-    false_mask = (abs(events.event) < 0)
-    channel_id = np.uint32(1) * false_mask
+    n_events = len(events)
+    false_mask = np.zeros(n_events, dtype=bool)
     ok_bdt_eormu = false_mask
-    ok_bdt_eormu_bveto = false_mask
     tau2_isolated = false_mask
     leptons_os = false_mask
     single_triggered = false_mask
@@ -615,29 +1157,35 @@ def lepton_selection(
     sel_tau_mask = full_like(events.Tau.pt, False, dtype=bool)
     sel_isotau_mask = full_like(events.Tau.pt, False, dtype=bool)
     sel_noid_tau_mask = full_like(events.Tau.pt, False, dtype=bool)
+    gen_matched = {
+        collection: full_like(events[collection].pt, False, dtype=bool)
+        for collection in ("Electron", "Muon", "Tau")
+    }
+    all_leptons_genuine = false_mask
     leading_taus = events.Tau[:, :0]
-    matched_trigger_ids = []
     lepton_part_trigger_ids = []
 
     # indices for sorting taus first by isolation, then by pt
     # for this, combine iso and pt values, e.g. iso 255 and pt 32.3 -> 2550032.3
-    f = 10**(np.ceil(np.log10(ak.max(events.Tau.pt))) + 2)
-    tau_sorting_key = events.Tau[f"raw{self.config_inst.x.tau_tagger}VSjet"] * f + events.Tau.pt
+    if self.select_objects:
+        f = 10**(np.ceil(np.log10(ak.max(events.Tau.pt))) + 2)
+        tau_sorting_key = events.Tau[f"raw{self.config_inst.x.tau_tagger}VSjet"] * f + events.Tau.pt
+    else:
+        tau_sorting_key = events.Tau.pt
     # tau_sorting_indices = ak.argsort(tau_sorting_key, axis=-1, ascending=False)
 
-    # perform each lepton election step separately per trigger, avoid caching
-    # sel_kwargs = {**kwargs, "call_force": True}
-
-    # INSERTING THE TWO LOOPS HERE
     # ────────────────────────────────────────────────────────────────
-    # 1 FIRST LOOP – build and cache masks once per fired trigger
+    # 1 FIRST LOOP – build and cache masks once per distinct trigger selection key
     # ────────────────────────────────────────────────────────────────
 
+    # per trigger id: fired flags, matching masks and the key of its object mask set
     _trig_cache = {}
-    _tid_tags = {}
-    e_trig_any = full_like(events.event, False, dtype=bool)  # we OR all fired flags for single_e here
-    mu_trig_any = full_like(events.event, False, dtype=bool)  # we OR all fired flags for single_mu here
-    tau_trig_any = full_like(events.event, False, dtype=bool)
+    # object masks per mask set key, and selector outputs per selector key
+    _mask_sets = {}
+    _sel_cache = {}
+    e_trig_any = false_mask  # we OR all fired flags for single_e here
+    mu_trig_any = false_mask  # we OR all fired flags for single_mu here
+    tau_trig_any = false_mask
     e_match_any = full_like(events.Electron.pt, False, dtype=bool)
     mu_match_any = full_like(events.Muon.pt, False, dtype=bool)
 
@@ -646,19 +1194,37 @@ def lepton_selection(
         if not ak.any(fired):
             continue
 
-        e_mask, e_ctrl, e_veto = self[electron_selection](events, trigger, **kwargs)
-        mu_mask, mu_ctrl, mu_veto = self[muon_selection](events, trigger, **kwargs)
-        e_mask_bdt, e_ctrl_bdt, e_veto_bdt = self[electron_selection](events, trigger, ch_key="eormu", **kwargs)
-        mu_mask_bdt, mu_ctrl_bdt, mu_veto_bdt = self[muon_selection](events, trigger, ch_key="eormu", **kwargs)
-        tau_mask, tau_trigger_specific_mask, tau_iso_mask, noid_tau_mask = self[tau_selection](events,
-            trigger, e_mask, mu_mask, **kwargs)
+        if not self.select_objects:
+            # no channel can be populated, so only the tagger independent taus are selected
+            sel_noid_tau_mask = tau_noid_mask(events)
+            continue
+
+        # object selections only depend on a few trigger tags, so compute them once per distinct key,
+        # noting that the eormu lepton masks are identical to the default ones as ch_key is not read
+        e_key = ("e", trigger_selection_key(self[electron_selection], trigger))
+        if e_key not in _sel_cache:
+            _sel_cache[e_key] = self[electron_selection](events, trigger, **kwargs)
+        mu_key = ("mu", trigger_selection_key(self[self.muon_selection_cls], trigger))
+        if mu_key not in _sel_cache:
+            _sel_cache[mu_key] = self[self.muon_selection_cls](events, trigger, **kwargs)
+        mask_key = (e_key, mu_key, trigger_selection_key(self[tau_selection], trigger))
+        if mask_key not in _mask_sets:
+            e_mask, e_ctrl, e_veto = _sel_cache[e_key]
+            mu_mask, mu_ctrl, mu_veto = _sel_cache[mu_key]
+            tau_mask, tau_trigger_specific_mask, tau_iso_mask, noid_tau_mask = self[tau_selection](events,
+                trigger, e_mask, mu_mask, **kwargs)
+            _mask_sets[mask_key] = {
+                "e": e_mask, "e_ctrl": e_ctrl, "e_veto": e_veto,
+                "mu": mu_mask, "mu_ctrl": mu_ctrl, "mu_veto": mu_veto,
+                "tau": tau_mask, "tau_iso": tau_iso_mask,
+            }
+            # early study tagger independendt taus
+            sel_noid_tau_mask = sel_noid_tau_mask | noid_tau_mask
+        fired_mask = ak.to_numpy(fired)
 
-        # early study tagger independendt taus
-        # sel_noid_tau_mask = noid_tau_mask
-        sel_noid_tau_mask = sel_noid_tau_mask | noid_tau_mask
         if trigger.has_tag({"single_e"}):
             e_match = self[electron_trigger_matching](events, trigger, fired, leg_masks, **kwargs)
-            e_trig_any = e_trig_any | fired  # “any single_e fired in this event?”
+            e_trig_any = e_trig_any | fired_mask  # “any single_e fired in this event?”
             e_match_any = e_match_any | e_match  # OR electron matching across all single_e tids
         else:
             # same jagged shape as events.Electron.pt; all False means "no e matched this trigger"
@@ -667,7 +1233,7 @@ def lepton_selection(
         # muon matching: only for triggers with a muon leg
         if trigger.has_tag({"single_mu"}):
             mu_match = self[muon_trigger_matching](events, trigger, fired, leg_masks, **kwargs)
-            mu_trig_any = mu_trig_any | fired      # “any single_mu fired in this event?”
+            mu_trig_any = mu_trig_any | fired_mask  # “any single_mu fired in this event?”
             mu_match_any = mu_match_any | mu_match
         else:
             mu_match = full_like(events.Muon.pt, False, dtype=bool)
@@ -676,1310 +1242,201 @@ def lepton_selection(
                 trigger.has_tag({"cross_tau_tau_jet"}) or trigger.has_tag({"cross_e_tau"}) or
                 trigger.has_tag({"cross_mu_tau"})):
             tau_match = self[tau_trigger_matching](events, trigger, fired, leg_masks, **kwargs)
-            tau_trig_any = tau_trig_any | fired
+            tau_trig_any = tau_trig_any | fired_mask
         else:
             tau_match = full_like(events.Tau.pt, False, dtype=bool)
 
         tid = trigger.id  # caching information particular to any trigger id
-        _trig_cache.update({
-            (tid, "e"): e_mask, (tid, "e_ctrl"): e_ctrl, (tid, "e_veto"): e_veto,
-            (tid, "mu"): mu_mask, (tid, "mu_ctrl"): mu_ctrl, (tid, "mu_veto"): mu_veto,
-            (tid, "e_match"): e_match, (tid, "mu_match"): mu_match,
-            (tid, "tau_mask"): tau_mask,
-            (tid, "tau_match"): tau_match,
-            (tid, "tau_iso_mask"): tau_iso_mask,
-            (tid, "e_ctrl_bdt"): e_ctrl_bdt, (tid, "e_mask_bdt"): e_mask_bdt, (tid, "e_veto_bdt"): e_veto_bdt,
-            (tid, "mu_ctrl_bdt"): mu_ctrl_bdt, (tid, "mu_mask_bdt"): mu_mask_bdt, (tid, "mu_veto_bdt"): mu_veto_bdt,
-            (tid, "fired"): fired,
-        })
-
-        _tid_tags[tid] = set(trigger.tags)
-
-    # Now it is useful to define orthogonal masks: events trigger only on single electrons or single muons
-    e_only = e_trig_any & ~mu_trig_any  # only single_e fired
-    mu_only = mu_trig_any & ~e_trig_any  # only single_mu fired
-    both_families = e_trig_any & mu_trig_any  # both fired
-
-    # Addapted logic for channels with all flavours
-    e_only_emutau = e_trig_any & ~mu_trig_any & ~tau_trig_any
-    mu_only_emutau = mu_trig_any & ~e_trig_any & ~tau_trig_any
-    cross_e_tau_only = tau_trig_any & ~e_trig_any & ~mu_trig_any
-
-    single_e_tids = [tid for tid, tags in _tid_tags.items() if "single_e" in tags]
-    double_e_tids = [tid for tid, tags in _tid_tags.items() if "double_e" in tags]
-    triple_e_tids = [tid for tid, tags in _tid_tags.items() if "triple_e" in tags]
-
-    single_mu_tids = [tid for tid, tags in _tid_tags.items() if "single_mu" in tags]
-    double_mu_tids = [tid for tid, tags in _tid_tags.items() if "double_mu" in tags]
-    triple_mu_tids = [tid for tid, tags in _tid_tags.items() if "triple_mu" in tags]
-
-    double_emu_tids = [tid for tid, tags in _tid_tags.items() if "double_emu" in tags]
-    triple_eemu_tids = [tid for tid, tags in _tid_tags.items() if "triple_eemu" in tags]
-    triple_emumu_tids = [tid for tid, tags in _tid_tags.items() if "triple_emumu" in tags]
-
-    cross_tau_tau_any = [tid for tid, tags in _tid_tags.items() if {"cross_tau_tau", "cross_tau_tau_jet", "cross_tau_tau_vbf"} & tags]  # noqa: E501
-    cross_e_tau = [tid for tid, tags in _tid_tags.items() if "cross_e_tau" in tags]
-    cross_mu_tau = [tid for tid, tags in _tid_tags.items() if "cross_mu_tau" in tags]
-
-    # all_tids = list(_tid_tags.keys())
-    _trig_cache.update({
-        # set of events that have triggered at least one single_e trigger
-        ("fam", "e_trig_any"): e_trig_any,
-        # set of events that have triggered at least one single_mu trigger
-        ("fam", "mu_trig_any"): mu_trig_any,
-        ("fam", "tau_trig_any"): tau_trig_any,
-        # set of events that have triggered at least one single_e trigger and no one single_mu trigger
-        ("fam", "e_only"): e_only,
-        # set of events that have triggered at least one single_mu trigger and no one single_e trigger
-        ("fam", "mu_only"): mu_only,
-        # set of events that have triggered at least one singe_e and single_mu trigger
-        ("fam", "both_families"): both_families,
-        ("fam", "e_only_emutau"): e_only_emutau,
-        ("fam", "mu_only_emutau"): mu_only_emutau,
-        ("fam", "cross_e_tau_only"): cross_e_tau_only,
-        # Electrons that have matched a single_e trigger object
-        ("fam", "e_match_any"): e_match_any,
-        ("fam", "mu_match_any"): mu_match_any,
-    })
-
-    # ────────────────────────────────────────────────────────────────
-    # 2 SECOND LOOP – evaluate every physics channel once
-    # ────────────────────────────────────────────────────────────────
-    for ch_key, spec in channels.items():
+        _trig_cache[tid] = {
+            "fired": fired_mask,
+            "masks": mask_key,
+            "e_match": e_match,
+            "mu_match": mu_match,
+            "tau_match": tau_match,
+        }
 
-        # eormu -> set trig_ids to any particular trigger, so that eormu does not run over all triggers
-        if ch_key in {"ceormu"}:
-            if self.dataset_inst.is_mc:
-                trig_ids = single_e_tids
-            else:
-                continue
+    logger.debug(
+        f"computed {len(_sel_cache) + len(_mask_sets)} object selections for {len(_trig_cache)} fired triggers",
+    )
 
-        # 3l0th + 3l1th + 4l: single, double, and triple lepton triggers
-        elif ch_key in {"c3e", "c4e", "c3etau"}:
-            if self.dataset_inst.is_mc or self.dataset_inst.has_tag("ee"):
-                trig_ids = single_e_tids + double_e_tids + triple_e_tids
-            else:
-                continue
+    # event-level masks of trigger families that are used in the trigger matching conditions
+    family_masks = {
+        # events that have triggered at least one single_e trigger and no single_mu trigger
+        "e_only": e_trig_any & ~mu_trig_any,
+        # same logic for channels with all flavours, also vetoing tau triggers
+        "e_only_emutau": e_trig_any & ~mu_trig_any & ~tau_trig_any,
+        "mu_only_emutau": mu_trig_any & ~e_trig_any & ~tau_trig_any,
+    }
 
-        elif ch_key in {"c3mu", "c4mu", "c3mutau"}:
-            if self.dataset_inst.is_mc or self.dataset_inst.has_tag("mumu"):
-                trig_ids = single_mu_tids + double_mu_tids + triple_mu_tids
-            else:
-                continue
-
-        elif ch_key in {"c2e2mu"}:
-            if self.dataset_inst.is_mc:
-                trig_ids = (single_e_tids + single_mu_tids + double_e_tids + double_mu_tids +
-                            double_emu_tids + triple_eemu_tids + triple_emumu_tids)
-            elif self.dataset_inst.has_tag("mue"):
-                trig_ids = double_emu_tids + triple_emumu_tids + triple_eemu_tids
-            elif self.dataset_inst.has_tag("mumu"):
-                trig_ids = double_mu_tids
-            elif self.dataset_inst.has_tag("ee"):
-                trig_ids = double_e_tids
-            elif self.dataset_inst.has_tag("emu_from_e"):
-                trig_ids = single_e_tids
-            elif self.dataset_inst.has_tag("emu_from_mu"):
-                trig_ids = single_mu_tids
-            else:
-                continue
-
-        elif ch_key in {"c3emu"}:
-            if self.dataset_inst.is_mc:
-                trig_ids = (single_e_tids + single_mu_tids + double_e_tids +
-                            double_emu_tids + triple_e_tids + triple_eemu_tids)
-            elif self.dataset_inst.has_tag("mue"):
-                trig_ids = double_emu_tids + triple_eemu_tids
-            elif self.dataset_inst.has_tag("ee"):
-                trig_ids = double_e_tids + triple_e_tids
-            elif self.dataset_inst.has_tag("emu_from_e"):
-                trig_ids = single_e_tids
-            elif self.dataset_inst.has_tag("emu_from_mu"):
-                trig_ids = single_mu_tids
-            else:
-                continue
-
-        elif ch_key in {"ce3mu"}:
-            if self.dataset_inst.is_mc:
-                trig_ids = (single_e_tids + single_mu_tids + double_mu_tids +
-                            double_emu_tids + triple_mu_tids + triple_emumu_tids)
-            elif self.dataset_inst.has_tag("mue"):
-                trig_ids = double_emu_tids + triple_emumu_tids
-            elif self.dataset_inst.has_tag("mumu"):
-                trig_ids = double_mu_tids + triple_mu_tids
-            elif self.dataset_inst.has_tag("emu_from_e"):
-                trig_ids = single_e_tids
-            elif self.dataset_inst.has_tag("emu_from_mu"):
-                trig_ids = single_mu_tids
-            else:
-                continue
-
-        elif ch_key in {"c2emu", "c2emutau"}:
-            if self.dataset_inst.is_mc:
-                trig_ids = single_e_tids + single_mu_tids + double_e_tids + double_emu_tids + triple_eemu_tids
-            elif self.dataset_inst.has_tag("mue"):
-                trig_ids = double_emu_tids + triple_eemu_tids
-            elif self.dataset_inst.has_tag("ee"):
-                trig_ids = double_e_tids
-            elif self.dataset_inst.has_tag("emu_from_e"):
-                trig_ids = single_e_tids
-            elif self.dataset_inst.has_tag("emu_from_mu"):
-                trig_ids = single_mu_tids
-            else:
-                continue
-
-        elif ch_key in {"ce2mu", "ce2mutau"}:
-            if self.dataset_inst.is_mc:
-                trig_ids = single_e_tids + single_mu_tids + double_mu_tids + double_emu_tids + triple_emumu_tids
-            elif self.dataset_inst.has_tag("mue"):
-                trig_ids = double_emu_tids + triple_emumu_tids
-            elif self.dataset_inst.has_tag("mumu"):
-                trig_ids = double_mu_tids
-            elif self.dataset_inst.has_tag("emu_from_e"):
-                trig_ids = single_e_tids
-            elif self.dataset_inst.has_tag("emu_from_mu"):
-                trig_ids = single_mu_tids
-            else:
-                continue
+    # trigger ids to consider per channel, resolved from the routing table built during init
+    channel_tids = {
+        ch_key: [tid for tid in tids if tid in _trig_cache]
+        for ch_key, tids in self.channel_trigger_ids.items()
+    }
 
-        # 2l2th + 2l0or1tau: single, double mixed lepton triggers
-        elif ch_key in {"c2e2tau", "c2e0or1tau"}:
-            if self.dataset_inst.is_mc or self.dataset_inst.has_tag("ee"):
-                trig_ids = single_e_tids + double_e_tids
-            else:
-                continue
+    # ────────────────────────────────────────────────────────────────
+    # 2 SECOND LOOP – evaluate every physics channel once
+    # ────────────────────────────────────────────────────────────────
 
-        elif ch_key in {"c2mu2tau", "c2mu0or1tau"}:
-            if self.dataset_inst.is_mc or self.dataset_inst.has_tag("mumu"):
-                trig_ids = single_mu_tids + double_mu_tids
-            else:
-                continue
-
-        elif ch_key in {"cemu2tau", "cemu0or1tau"}:
-            if self.dataset_inst.is_mc:
-                trig_ids = single_e_tids + single_mu_tids + double_emu_tids
-            elif self.dataset_inst.has_tag("mue"):
-                trig_ids = double_emu_tids
-            elif self.dataset_inst.has_tag("emu_from_e"):
-                trig_ids = single_e_tids
-            elif self.dataset_inst.has_tag("emu_from_mu"):
-                trig_ids = single_mu_tids
-            else:
-                continue
-
-        # 1l3th
-        elif ch_key in {"ce3tau"}:
-            if self.dataset_inst.is_mc:
-                trig_ids = single_e_tids + cross_e_tau + cross_tau_tau_any
-            elif self.dataset_inst.has_tag("tautau"):
-                trig_ids = cross_e_tau + cross_tau_tau_any
-            elif self.dataset_inst.has_tag("etau"):
-                trig_ids = single_e_tids + cross_e_tau
-            else:
-                continue
-
-        elif ch_key in {"cmu3tau"}:
-            if self.dataset_inst.is_mc:
-                trig_ids = single_mu_tids + cross_mu_tau + cross_tau_tau_any
-            elif self.dataset_inst.has_tag("tautau"):
-                trig_ids = cross_tau_tau_any
-            elif self.dataset_inst.has_tag("mutau"):
-                trig_ids = single_mu_tids + cross_mu_tau
-            else:
-                continue
+    # lazily filled caches of channel dependent tau masks, evaluated rules and matching conditions
+    ch_tau_masks = {}
+    evaluated_rules = {}
+    conditions = {}
+
+    def get_ch_tau_mask(key, tau_wps):
+        # channel dependent deeptau cuts vs e and mu, tau mask has vs jet vvvloose
+        if (key, tau_wps) not in ch_tau_masks:
+            ch_tau_masks[(key, tau_wps)] = (
+                _mask_sets[key]["tau"] &
+                (events.Tau[get_tau_tagger("e")] >= wp_config.tau_vs_e[tau_wps[0]]) &
+                (events.Tau[get_tau_tagger("mu")] >= wp_config.tau_vs_mu[tau_wps[1]])
+            )
+        return ch_tau_masks[(key, tau_wps)]
+
+    def get_evaluated_rules(key, tau_wps):
+        # multiplicities are computed once per mask set and tau working points, all rules at once
+        if (key, tau_wps) not in evaluated_rules:
+            counts, charges = lepton_multiplicities(events, _mask_sets[key], get_ch_tau_mask(key, tau_wps))
+            compiled_rules = self.compiled_channel_rules[tau_wps]
+            evaluated_rules[(key, tau_wps)] = evaluate_channel_rules(compiled_rules, counts, charges)
+        return evaluated_rules[(key, tau_wps)]
+
+    def get_condition(name, tid, key, tau_wps):
+        cache_key = (name, tid, key, tau_wps)
+        if cache_key in conditions:
+            return conditions[cache_key]
+        masks = _mask_sets[key]
+        if name in family_masks:
+            cond = family_masks[name]
+        elif name == "e_match":
+            cond = ak.to_numpy(ak.any(_trig_cache[tid]["e_match"] & masks["e_ctrl"], axis=1))
+        elif name == "mu_match":
+            cond = ak.to_numpy(ak.any(_trig_cache[tid]["mu_match"] & masks["mu_ctrl"], axis=1))
+        elif name == "tau_match":
+            cond = ak.to_numpy(ak.any(_trig_cache[tid]["tau_match"] & get_ch_tau_mask(key, tau_wps), axis=1))
+        elif name == "e_guard":
+            # for events in which single_e triggers fired, an electron must be matched to any of them
+            cond = ~e_trig_any | ak.to_numpy(ak.any(e_match_any & masks["e_ctrl"], axis=1))
+        elif name == "mu_guard":
+            cond = ~mu_trig_any | ak.to_numpy(ak.any(mu_match_any & masks["mu_ctrl"], axis=1))
+        else:
+            raise ValueError(f"unknown trigger matching condition '{name}'")
+        conditions[cache_key] = cond
+        return cond
+
+    # gen matching per collection, computed once when first needed
+    gen_matches = {}
+    gen_pdg_ids = {"Electron": 11, "Muon": 13, "Tau": 15}
+
+    def get_gen_match(collection):
+        if collection not in gen_matches:
+            gen_matches[collection] = gen_match_leptons(events[collection], events.GenPart, gen_pdg_ids[collection])
+        return gen_matches[collection]
+
+    # event masks per (collection, mask set key, tau working points) that select objects of that mask set
+    sel_events = defaultdict(lambda: false_mask)
+
+    channel_masks = []
+    channel_ids = []
+    matched_trigger_masks = []
+    trig_match_ok = false_mask
+    for ch_key, trig_ids in channel_tids.items():
+
+        if ch_key == "ceormu":
+            for tid in trig_ids:
+                key = _trig_cache[tid]["masks"]
+                e_base = ak.to_numpy(ak.any(_mask_sets[key]["e_veto"], axis=1))
+                mu_base = ak.to_numpy(ak.any(_mask_sets[key]["mu_veto"], axis=1))
+                base_ok = e_base | mu_base
+                ok_bdt_eormu = ok_bdt_eormu | base_ok
 
-        elif ch_key in {"c4tau"}:
-            if self.dataset_inst.is_mc or self.dataset_inst.has_tag("tautau"):
-                trig_ids = cross_tau_tau_any
-            else:
-                continue
+                sel_events[("e", key, None)] = sel_events[("e", key, None)] | e_base
+                sel_events[("mu", key, None)] = sel_events[("mu", key, None)] | mu_base
 
-        else:
+                trig_match_ok = base_ok
+                trig_match_bdt = trig_match_bdt | trig_match_ok
+                single_triggered = single_triggered | trig_match_ok
+                matched_trigger_masks.append((trig_match_ok, tid))
             continue
 
-        good_evt = ak.zeros_like(events.event, dtype=bool)
+        rule = channel_rules[ch_key]
+        index = self.channel_rule_index[ch_key]
+        good_evt = false_mask
 
         for tid in trig_ids:
-            e_mask = _trig_cache[(tid, "e")]
-            e_ctrl = _trig_cache[(tid, "e_ctrl")]
-            e_veto = _trig_cache[(tid, "e_veto")]
-            e_match = _trig_cache[(tid, "e_match")]
-            e_ctrl_bdt = _trig_cache[(tid, "e_ctrl_bdt")]
-            e_veto_bdt = _trig_cache[(tid, "e_veto_bdt")]
-            e_mask_bdt = _trig_cache[(tid, "e_mask_bdt")]
-
-            mu_mask = _trig_cache[(tid, "mu")]
-            mu_ctrl = _trig_cache[(tid, "mu_ctrl")]
-            mu_veto = _trig_cache[(tid, "mu_veto")]
-            mu_match = _trig_cache[(tid, "mu_match")]
-            mu_ctrl_bdt = _trig_cache[(tid, "mu_ctrl_bdt")]
-            mu_veto_bdt = _trig_cache[(tid, "mu_veto_bdt")]
-            mu_mask_bdt = _trig_cache[(tid, "mu_mask_bdt")]
-
-            tau_mask = _trig_cache[(tid, "tau_mask")]
-            tau_iso_mask = _trig_cache[(tid, "tau_iso_mask")]
-
-            fired = _trig_cache[(tid, "fired")]
-
-            # channel dependent deeptau cuts vs e and mu, taumask has vs jet vvloose
-            ch_tau_mask = (
-                tau_mask &
-                (events.Tau[get_tau_tagger("e")] >= wp_config.tau_vs_e.vvvloose) &
-                (events.Tau[get_tau_tagger("mu")] >= wp_config.tau_vs_mu.vloose)
-            )
-
-            ok = ak.ones_like(events.event, dtype=bool)
-
-            if ch_key == "ceormu":
-
-                e_base = (
-                    (ak.sum(e_veto_bdt, axis=1) >= 1) &
-                    (ak.sum(ch_tau_mask, axis=1) >= 0)
-                )
-                mu_base = (
-                    (ak.sum(mu_veto_bdt, axis=1) >= 1) &
-                    (ak.sum(ch_tau_mask, axis=1) >= 0)
-                )
-
-                base_ok = e_base | mu_base
-                ok_bdt_eormu = ok_bdt_eormu | base_ok
-                ok_bdt_eormu_bveto = ok_bdt_eormu
-
-                sel_electron_mask = sel_electron_mask | (e_base & e_ctrl_bdt)
-                sel_looseelectron_mask = sel_looseelectron_mask | (e_base & e_veto_bdt)
-                sel_tightelectron_mask = sel_tightelectron_mask | (e_base & e_mask_bdt)
-                sel_muon_mask = sel_muon_mask | (mu_base & mu_ctrl_bdt)
-                sel_loosemuon_mask = sel_loosemuon_mask | (mu_base & mu_veto_bdt)
-                sel_tightmuon_mask = sel_tightmuon_mask | (mu_base & mu_mask_bdt)
-
-                # leptons_os = ak.where(ok_bdt_eormu, False, leptons_os)
-                # tight_ok = (e_base & (ak.sum(e_mask_bdt,  axis=1) >= 1)) | (mu_base & (ak.sum(mu_mask_bdt,  axis=1) >= 1))  # noqa E501
-                # tight_sel_bdt = tight_sel_bdt | tight_ok
-                # if tid in single_e_tids:
-                #     trig_match_ok = base_ok & (ak.sum(e_match & e_ctrl_bdt, axis=1) >= 1)
-                # elif tid in single_mu_tids:
-                #     trig_match_ok = base_ok & (ak.sum(mu_match & mu_ctrl_bdt, axis=1) >= 1)
-                trig_match_ok = base_ok
-                trig_match_bdt = trig_match_bdt | trig_match_ok
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-                continue
-
-            elif ch_key == "c3e":
-                base_ok = (
-                    (ak.sum(e_ctrl, axis=1) == 3) &
-                    (ak.sum(e_veto, axis=1) == 3) &
-                    (ak.sum(mu_veto, axis=1) == 0) &
-                    (ak.sum(ch_tau_mask, axis=1) == 0)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_electron_mask = sel_electron_mask | (ok & e_ctrl)
-                sel_looseelectron_mask = sel_looseelectron_mask | (ok & e_veto)
-                sel_tightelectron_mask = sel_tightelectron_mask | (ok & e_mask)
-
-                e_charge = events.Electron.charge[e_ctrl]
-                chargeok = (np.abs(ak.sum(e_charge, axis=1)) == 1)
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & (ak.sum(e_mask, axis=1) == 3)
-                tight_sel = tight_sel | tight_ok
-
-                trig_match_ok = base_ok & (ak.sum(e_match & e_ctrl, axis=1) >= 1)
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-            elif ch_key == "c3mu":
-                base_ok = (
-                    (ak.sum(mu_ctrl, axis=1) == 3) &
-                    (ak.sum(mu_veto, axis=1) == 3) &
-                    (ak.sum(e_veto, axis=1) == 0) &
-                    (ak.sum(ch_tau_mask, axis=1) == 0)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_muon_mask = sel_muon_mask | (ok & mu_ctrl)
-                sel_loosemuon_mask = sel_loosemuon_mask | (ok & mu_veto)
-                sel_tightmuon_mask = sel_tightmuon_mask | (ok & mu_mask)
-
-                mu_charge = events.Muon.charge[mu_ctrl]
-                chargeok = (np.abs(ak.sum(mu_charge, axis=1)) == 1)
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & (ak.sum(mu_mask, axis=1) == 3)
-                tight_sel = tight_sel | tight_ok
-
-                trig_match_ok = base_ok & (ak.sum(mu_match & mu_ctrl, axis=1) >= 1)
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-            elif ch_key == "c2emu":
-                base_ok = (
-                    (ak.sum(e_ctrl, axis=1) == 2) &
-                    (ak.sum(e_veto, axis=1) == 2) &
-                    (ak.sum(mu_ctrl, axis=1) == 1) &
-                    (ak.sum(mu_veto, axis=1) == 1) &
-                    (ak.sum(ch_tau_mask, axis=1) == 0)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_electron_mask = sel_electron_mask | (ok & e_ctrl)
-                sel_looseelectron_mask = sel_looseelectron_mask | (ok & e_veto)
-                sel_tightelectron_mask = sel_tightelectron_mask | (ok & e_mask)
-                sel_muon_mask = sel_muon_mask | (ok & mu_ctrl)
-                sel_loosemuon_mask = sel_loosemuon_mask | (ok & mu_veto)
-                sel_tightmuon_mask = sel_tightmuon_mask | (ok & mu_mask)
-
-                e_charge = events.Electron.charge[e_ctrl]
-                mu_charge = events.Muon.charge[mu_ctrl]
-                chargeok = (np.abs((ak.sum(e_charge, axis=1) + ak.sum(mu_charge, axis=1))) == 1)
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & ((ak.sum(e_mask, axis=1) == 2) & (ak.sum(mu_mask, axis=1) == 1))
-                tight_sel = tight_sel | tight_ok
-
-                if tid in single_e_tids:
-                    # emu_from_e — accept ONLY events with e_only (anti-overlap)
-                    trig_match_ok = base_ok & e_only & (ak.sum(e_match & e_ctrl, axis=1) >= 1)
-
-                elif tid in single_mu_tids:
-                    # emu_from_mu — allow both_families; the matching/logic below handles e-side
-                    trig_match_ok = base_ok & (ak.sum(mu_match & mu_ctrl, axis=1) >= 1)
-                    # for events with both triggers firing:
-                    if_e_fired = base_ok & e_trig_any & (ak.sum(e_match_any & e_ctrl, axis=1) >= 1)
-                    trig_match_ok = ak.where(e_trig_any, trig_match_ok & if_e_fired, trig_match_ok)
-
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-            elif ch_key == "ce2mu":
-                base_ok = (
-                    (ak.sum(e_ctrl, axis=1) == 1) &
-                    (ak.sum(e_veto, axis=1) == 1) &
-                    (ak.sum(mu_ctrl, axis=1) == 2) &
-                    (ak.sum(mu_veto, axis=1) == 2) &
-                    (ak.sum(ch_tau_mask, axis=1) == 0)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_electron_mask = sel_electron_mask | (ok & e_ctrl)
-                sel_looseelectron_mask = sel_looseelectron_mask | (ok & e_veto)
-                sel_tightelectron_mask = sel_tightelectron_mask | (ok & e_mask)
-                sel_muon_mask = sel_muon_mask | (ok & mu_ctrl)
-                sel_loosemuon_mask = sel_loosemuon_mask | (ok & mu_veto)
-                sel_tightmuon_mask = sel_tightmuon_mask | (ok & mu_mask)
-
-                e_charge = events.Electron.charge[e_ctrl]
-                mu_charge = events.Muon.charge[mu_ctrl]
-                chargeok = (np.abs((ak.sum(e_charge, axis=1) + ak.sum(mu_charge, axis=1))) == 1)
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & ((ak.sum(e_mask, axis=1) == 1) & (ak.sum(mu_mask, axis=1) == 2))
-                tight_sel = tight_sel | tight_ok
-
-                if tid in single_e_tids:
-                    # emu_from_e — accept ONLY events with e_only (anti-overlap)
-                    trig_match_ok = base_ok & e_only & (ak.sum(e_match & e_ctrl, axis=1) >= 1)
-
-                elif tid in single_mu_tids:
-                    # emu_from_mu — allow both_families; the matching/logic below handles e-side
-                    trig_match_ok = base_ok & (ak.sum(mu_match & mu_ctrl, axis=1) >= 1)
-                    # for events with both triggers firing:
-                    if_e_fired = base_ok & e_trig_any & (ak.sum(e_match_any & e_ctrl, axis=1) >= 1)
-                    trig_match_ok = ak.where(e_trig_any, trig_match_ok & if_e_fired, trig_match_ok)
-
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-            elif ch_key == "c4e":
-                base_ok = (
-                    (ak.sum(e_ctrl, axis=1) == 4) &
-                    (ak.sum(e_veto, axis=1) == 4) &
-                    (ak.sum(mu_veto, axis=1) == 0) &
-                    (ak.sum(ch_tau_mask, axis=1) == 0)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_electron_mask = sel_electron_mask | (ok & e_ctrl)
-                sel_looseelectron_mask = sel_looseelectron_mask | (ok & e_veto)
-                sel_tightelectron_mask = sel_tightelectron_mask | (ok & e_mask)
-
-                e_charge = events.Electron.charge[e_ctrl]
-                chargeok = (np.abs(ak.sum(e_charge, axis=1)) == 0)
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & (ak.sum(e_mask, axis=1) == 4)
-                tight_sel = tight_sel | tight_ok
-
-                trig_match_ok = base_ok & (ak.sum(e_match & e_ctrl, axis=1) >= 1)
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-            elif ch_key == "c4mu":
-                base_ok = (
-                    (ak.sum(mu_ctrl, axis=1) == 4) &
-                    (ak.sum(mu_veto, axis=1) == 4) &
-                    (ak.sum(e_veto, axis=1) == 0) &
-                    (ak.sum(ch_tau_mask, axis=1) == 0)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_muon_mask = sel_muon_mask | (ok & mu_ctrl)
-                sel_loosemuon_mask = sel_loosemuon_mask | (ok & mu_veto)
-                sel_tightmuon_mask = sel_tightmuon_mask | (ok & mu_mask)
-
-                mu_charge = events.Muon.charge[mu_ctrl]
-                chargeok = (np.abs(ak.sum(mu_charge, axis=1)) == 0)
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & (ak.sum(mu_mask, axis=1) == 4)
-                tight_sel = tight_sel | tight_ok
-
-                trig_match_ok = base_ok & (ak.sum(mu_match & mu_ctrl, axis=1) >= 1)
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-            elif ch_key == "c3emu":
-                base_ok = (
-                    (ak.sum(e_ctrl, axis=1) == 3) &
-                    (ak.sum(e_veto, axis=1) == 3) &
-                    (ak.sum(mu_ctrl, axis=1) == 1) &
-                    (ak.sum(mu_veto, axis=1) == 1) &
-                    (ak.sum(ch_tau_mask, axis=1) == 0)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_electron_mask = sel_electron_mask | (ok & e_ctrl)
-                sel_looseelectron_mask = sel_looseelectron_mask | (ok & e_veto)
-                sel_tightelectron_mask = sel_tightelectron_mask | (ok & e_mask)
-                sel_muon_mask = sel_muon_mask | (ok & mu_ctrl)
-                sel_loosemuon_mask = sel_loosemuon_mask | (ok & mu_veto)
-                sel_tightmuon_mask = sel_tightmuon_mask | (ok & mu_mask)
-
-                e_charge = events.Electron.charge[e_ctrl]
-                mu_charge = events.Muon.charge[mu_ctrl]
-                chargeok = (np.abs((ak.sum(e_charge, axis=1) + ak.sum(mu_charge, axis=1))) == 0)
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & ((ak.sum(e_mask, axis=1) == 3) & (ak.sum(mu_mask, axis=1) == 1))
-                tight_sel = tight_sel | tight_ok
-
-                if tid in single_e_tids:
-                    # emu_from_e — accept ONLY events with e_only (anti-overlap)
-                    trig_match_ok = base_ok & e_only & (ak.sum(e_match & e_ctrl, axis=1) >= 1)
-
-                elif tid in single_mu_tids:
-                    # emu_from_mu — allow both_families; the matching/logic below handles e-side
-                    trig_match_ok = base_ok & (ak.sum(mu_match & mu_ctrl, axis=1) >= 1)
-                    # for events with both triggers firing:
-                    if_e_fired = base_ok & e_trig_any & (ak.sum(e_match_any & e_ctrl, axis=1) >= 1)
-                    trig_match_ok = ak.where(e_trig_any, trig_match_ok & if_e_fired, trig_match_ok)
-
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-            elif ch_key == "c2e2mu":
-                base_ok = (
-                    (ak.sum(e_ctrl, axis=1) == 2) &
-                    (ak.sum(e_veto, axis=1) == 2) &
-                    (ak.sum(mu_ctrl, axis=1) == 2) &
-                    (ak.sum(mu_veto, axis=1) == 2) &
-                    (ak.sum(ch_tau_mask, axis=1) == 0)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_electron_mask = sel_electron_mask | (ok & e_ctrl)
-                sel_looseelectron_mask = sel_looseelectron_mask | (ok & e_veto)
-                sel_tightelectron_mask = sel_tightelectron_mask | (ok & e_mask)
-                sel_muon_mask = sel_muon_mask | (ok & mu_ctrl)
-                sel_loosemuon_mask = sel_loosemuon_mask | (ok & mu_veto)
-                sel_tightmuon_mask = sel_tightmuon_mask | (ok & mu_mask)
-
-                e_charge = events.Electron.charge[e_ctrl]
-                mu_charge = events.Muon.charge[mu_ctrl]
-                chargeok = (np.abs((ak.sum(e_charge, axis=1) + ak.sum(mu_charge, axis=1))) == 0)
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & ((ak.sum(e_mask, axis=1) == 2) & (ak.sum(mu_mask, axis=1) == 2))
-                tight_sel = tight_sel | tight_ok
-
-                if tid in single_e_tids:
-                    # emu_from_e — accept ONLY events with e_only (anti-overlap)
-                    trig_match_ok = base_ok & e_only & (ak.sum(e_match & e_ctrl, axis=1) >= 1)
-
-                elif tid in single_mu_tids:
-                    # emu_from_mu — allow both_families; the matching/logic below handles e-side
-                    trig_match_ok = base_ok & (ak.sum(mu_match & mu_ctrl, axis=1) >= 1)
-                    # for events with both triggers firing:
-                    if_e_fired = base_ok & e_trig_any & (ak.sum(e_match_any & e_ctrl, axis=1) >= 1)
-                    trig_match_ok = ak.where(e_trig_any, trig_match_ok & if_e_fired, trig_match_ok)
-
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-            elif ch_key == "ce3mu":
-                base_ok = (
-                    (ak.sum(e_ctrl, axis=1) == 1) &
-                    (ak.sum(e_veto, axis=1) == 1) &
-                    (ak.sum(mu_ctrl, axis=1) == 3) &
-                    (ak.sum(mu_veto, axis=1) == 3) &
-                    (ak.sum(ch_tau_mask, axis=1) == 0)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_electron_mask = sel_electron_mask | (ok & e_ctrl)
-                sel_looseelectron_mask = sel_looseelectron_mask | (ok & e_veto)
-                sel_tightelectron_mask = sel_tightelectron_mask | (ok & e_mask)
-                sel_muon_mask = sel_muon_mask | (ok & mu_ctrl)
-                sel_loosemuon_mask = sel_loosemuon_mask | (ok & mu_veto)
-                sel_tightmuon_mask = sel_tightmuon_mask | (ok & mu_mask)
-
-                e_charge = events.Electron.charge[e_ctrl]
-                mu_charge = events.Muon.charge[mu_ctrl]
-                chargeok = (np.abs((ak.sum(e_charge, axis=1) + ak.sum(mu_charge, axis=1))) == 0)
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & ((ak.sum(e_mask, axis=1) == 1) & (ak.sum(mu_mask, axis=1) == 3))
-                tight_sel = tight_sel | tight_ok
-
-                if tid in single_e_tids:
-                    # emu_from_e — accept ONLY events with e_only (anti-overlap)
-                    trig_match_ok = base_ok & e_only & (ak.sum(e_match & e_ctrl, axis=1) >= 1)
-
-                elif tid in single_mu_tids:
-                    # emu_from_mu — allow both_families; the matching/logic below handles e-side
-                    trig_match_ok = base_ok & (ak.sum(mu_match & mu_ctrl, axis=1) >= 1)
-                    # for events with both triggers firing:
-                    if_e_fired = base_ok & e_trig_any & (ak.sum(e_match_any & e_ctrl, axis=1) >= 1)
-                    trig_match_ok = ak.where(e_trig_any, trig_match_ok & if_e_fired, trig_match_ok)
-
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-            elif ch_key == "c3etau":
-                ch_tau_mask = (
-                    tau_mask &
-                    (events.Tau[get_tau_tagger("e")] >= wp_config.tau_vs_e.vloose) &
-                    (events.Tau[get_tau_tagger("mu")] >= wp_config.tau_vs_mu.tight)
-                )
-
-                base_ok = (
-                    (ak.sum(e_ctrl, axis=1) == 3) &
-                    (ak.sum(e_veto, axis=1) == 3) &
-                    (ak.sum(mu_veto, axis=1) == 0) &
-                    (ak.sum(ch_tau_mask, axis=1) == 1)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_electron_mask = sel_electron_mask | (ok & e_ctrl)
-                sel_looseelectron_mask = sel_looseelectron_mask | (ok & e_veto)
-                sel_tightelectron_mask = sel_tightelectron_mask | (ok & e_mask)
-                sel_tau_mask = sel_tau_mask | (ok & ch_tau_mask)
-                sel_isotau_mask = sel_isotau_mask | (ok & (ch_tau_mask & tau_iso_mask))
-
-                e_charge = events.Electron.charge[e_ctrl]
-                tau_charge = events.Tau.charge[ch_tau_mask]
-                chargeok = ((np.abs((ak.sum(tau_charge, axis=1)) +
-                    (ak.sum(e_charge, axis=1))) == 0) & (np.abs(ak.sum(e_charge, axis=1)) == 1))
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & ((ak.sum((ch_tau_mask & tau_iso_mask), axis=1) == 1) & (ak.sum(e_mask, axis=1) == 3))
-                tight_sel = tight_sel | tight_ok
-
-                if tid in single_e_tids:
-                    trig_match_ok = base_ok & e_only_emutau & (ak.sum(e_match & e_ctrl, axis=1) >= 1)
-                elif tid in cross_e_tau:
-                    trig_match_ok = base_ok & (
-                        (ak.sum(tau_match & ch_tau_mask, axis=1) >= 1) &
-                        (ak.sum(e_match & e_ctrl, axis=1) >= 1)
-                    )
-
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-            elif ch_key == "c2e2tau":
-                ch_tau_mask = (
-                    tau_mask &
-                    (events.Tau[get_tau_tagger("e")] >= wp_config.tau_vs_e.vloose) &
-                    (events.Tau[get_tau_tagger("mu")] >= wp_config.tau_vs_mu.tight)
-                )
-
-                base_ok = (
-                    (ak.sum(e_ctrl, axis=1) == 2) &
-                    (ak.sum(e_veto, axis=1) == 2) &
-                    (ak.sum(mu_veto, axis=1) == 0) &
-                    (ak.sum(ch_tau_mask, axis=1) == 2)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_electron_mask = sel_electron_mask | (ok & e_ctrl)
-                sel_looseelectron_mask = sel_looseelectron_mask | (ok & e_veto)
-                sel_tightelectron_mask = sel_tightelectron_mask | (ok & e_mask)
-                sel_tau_mask = sel_tau_mask | (ok & ch_tau_mask)
-                sel_isotau_mask = sel_isotau_mask | (ok & (ch_tau_mask & tau_iso_mask))
-
-                e_charge = events.Electron.charge[e_ctrl]
-                tau_charge = events.Tau.charge[ch_tau_mask]
-                chargeok = ((np.abs((ak.sum(tau_charge, axis=1)) +
-                    (ak.sum(e_charge, axis=1))) == 0) & (np.abs(ak.sum(e_charge, axis=1)) == 0))
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & ((ak.sum((ch_tau_mask & tau_iso_mask), axis=1) == 2) & (ak.sum(e_mask, axis=1) == 2))
-                tight_sel = tight_sel | tight_ok
-
-                if tid in single_e_tids:
-                    trig_match_ok = base_ok & e_only_emutau & (ak.sum(e_match & e_ctrl, axis=1) >= 1)
-                elif tid in cross_e_tau:
-                    trig_match_ok = base_ok & (
-                        (ak.sum(tau_match & ch_tau_mask, axis=1) >= 1) &
-                        (ak.sum(e_match & e_ctrl, axis=1) >= 1)
-                    )
-                elif tid in cross_tau_tau_any:
-                    trig_match_ok = base_ok & (ak.sum(tau_match & ch_tau_mask, axis=1) >= 1)
-
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-            elif ch_key == "ce3tau":
-                ch_tau_mask = (
-                    tau_mask &
-                    (events.Tau[get_tau_tagger("e")] >= wp_config.tau_vs_e.vloose) &
-                    (events.Tau[get_tau_tagger("mu")] >= wp_config.tau_vs_mu.tight)
-                )
-
-                base_ok = (
-                    (ak.sum(e_ctrl, axis=1) == 1) &
-                    (ak.sum(e_veto, axis=1) == 1) &
-                    (ak.sum(mu_veto, axis=1) == 0) &
-                    (ak.sum(ch_tau_mask, axis=1) == 3)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_electron_mask = sel_electron_mask | (ok & e_ctrl)
-                sel_looseelectron_mask = sel_looseelectron_mask | (ok & e_veto)
-                sel_tightelectron_mask = sel_tightelectron_mask | (ok & e_mask)
-                sel_tau_mask = sel_tau_mask | (ok & ch_tau_mask)
-                sel_isotau_mask = sel_isotau_mask | (ok & (ch_tau_mask & tau_iso_mask))
-
-                e_charge = events.Electron.charge[e_ctrl]
-                tau_charge = events.Tau.charge[ch_tau_mask]
-                chargeok = (np.abs((ak.sum(tau_charge, axis=1)) +
-                    (ak.sum(e_charge, axis=1))) == 0)
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & ((ak.sum((ch_tau_mask & tau_iso_mask), axis=1) == 3) & (ak.sum(e_mask, axis=1) == 1))
-                tight_sel = tight_sel | tight_ok
-
-                if tid in single_e_tids:
-                    trig_match_ok = base_ok & e_only_emutau & (ak.sum(e_match & e_ctrl, axis=1) >= 1)
-                elif tid in cross_e_tau:
-                    trig_match_ok = base_ok & (
-                        (ak.sum(tau_match & ch_tau_mask, axis=1) >= 1) &
-                        (ak.sum(e_match & e_ctrl, axis=1) >= 1)
-                    )
-
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-            elif ch_key == "c3mutau":
-
-                ch_tau_mask = (
-                    tau_mask &
-                    (events.Tau[get_tau_tagger("e")] >= wp_config.tau_vs_e.vloose) &
-                    (events.Tau[get_tau_tagger("mu")] >= wp_config.tau_vs_mu.tight)
-                )
-
-                base_ok = (
-                    (ak.sum(mu_ctrl, axis=1) == 3) &
-                    (ak.sum(mu_veto, axis=1) == 3) &
-                    (ak.sum(e_veto, axis=1) == 0) &
-                    (ak.sum(ch_tau_mask, axis=1) == 1)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_muon_mask = sel_muon_mask | (ok & mu_ctrl)
-                sel_loosemuon_mask = sel_loosemuon_mask | (ok & mu_veto)
-                sel_tightmuon_mask = sel_tightmuon_mask | (ok & mu_mask)
-                sel_tau_mask = sel_tau_mask | (ok & ch_tau_mask)
-                sel_isotau_mask = sel_isotau_mask | (ok & (ch_tau_mask & tau_iso_mask))
-
-                mu_charge = events.Muon.charge[mu_ctrl]
-                tau_charge = events.Tau.charge[ch_tau_mask]
-                chargeok = ((np.abs((ak.sum(tau_charge, axis=1)) +
-                    (ak.sum(mu_charge, axis=1))) == 0) & (np.abs((ak.sum(mu_charge, axis=1))) == 1))
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & ((ak.sum((ch_tau_mask & tau_iso_mask), axis=1) == 1) &
-                    (ak.sum(mu_mask, axis=1) == 3))
-                tight_sel = tight_sel | tight_ok
-
-                if tid in single_mu_tids:
-                    trig_match_ok = base_ok & mu_only_emutau & (ak.sum(mu_match & mu_ctrl, axis=1) >= 1)
-                elif tid in cross_mu_tau:
-                    trig_match_ok = base_ok & (
-                        (ak.sum(tau_match & ch_tau_mask, axis=1) >= 1) &
-                        (ak.sum(mu_match & mu_ctrl, axis=1) >= 1)
-                    )
-
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-            elif ch_key == "c2mu2tau":
-                ch_tau_mask = (
-                    tau_mask &
-                    (events.Tau[get_tau_tagger("e")] >= wp_config.tau_vs_e.vloose) &
-                    (events.Tau[get_tau_tagger("mu")] >= wp_config.tau_vs_mu.tight)
-                )
-
-                base_ok = (
-                    (ak.sum(mu_ctrl, axis=1) == 2) &
-                    (ak.sum(mu_veto, axis=1) == 2) &
-                    (ak.sum(e_veto, axis=1) == 0) &
-                    (ak.sum(ch_tau_mask, axis=1) == 2)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_muon_mask = sel_muon_mask | (ok & mu_ctrl)
-                sel_loosemuon_mask = sel_loosemuon_mask | (ok & mu_veto)
-                sel_tightmuon_mask = sel_tightmuon_mask | (ok & mu_mask)
-                sel_tau_mask = sel_tau_mask | (ok & ch_tau_mask)
-                sel_isotau_mask = sel_isotau_mask | (ok & (ch_tau_mask & tau_iso_mask))
-
-                mu_charge = events.Muon.charge[mu_ctrl]
-                tau_charge = events.Tau.charge[ch_tau_mask]
-                chargeok = ((np.abs((ak.sum(tau_charge, axis=1)) +
-                    (ak.sum(mu_charge, axis=1))) == 0) & (np.abs(ak.sum(mu_charge, axis=1)) == 0))
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & ((ak.sum((ch_tau_mask & tau_iso_mask), axis=1) == 2) & (ak.sum(mu_mask, axis=1) == 2))
-                tight_sel = tight_sel | tight_ok
-
-                if tid in single_mu_tids:
-                    trig_match_ok = base_ok & mu_only_emutau & (ak.sum(mu_match & mu_ctrl, axis=1) >= 1)
-                elif tid in cross_mu_tau:
-                    trig_match_ok = base_ok & (
-                        (ak.sum(tau_match & ch_tau_mask, axis=1) >= 1) &
-                        (ak.sum(mu_match & mu_ctrl, axis=1) >= 1)
-                    )
-                elif tid in cross_tau_tau_any:
-                    trig_match_ok = base_ok & (ak.sum(tau_match & ch_tau_mask, axis=1) >= 1)
-
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-            elif ch_key == "cmu3tau":
-                ch_tau_mask = (
-                    tau_mask &
-                    (events.Tau[get_tau_tagger("e")] >= wp_config.tau_vs_e.vloose) &
-                    (events.Tau[get_tau_tagger("mu")] >= wp_config.tau_vs_mu.tight)
-                )
-
-                base_ok = (
-                    (ak.sum(mu_ctrl, axis=1) == 1) &
-                    (ak.sum(mu_veto, axis=1) == 1) &
-                    (ak.sum(e_veto, axis=1) == 0) &
-                    (ak.sum(ch_tau_mask, axis=1) == 3)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_muon_mask = sel_muon_mask | (ok & mu_ctrl)
-                sel_loosemuon_mask = sel_loosemuon_mask | (ok & mu_veto)
-                sel_tightmuon_mask = sel_tightmuon_mask | (ok & mu_mask)
-                sel_tau_mask = sel_tau_mask | (ok & ch_tau_mask)
-                sel_isotau_mask = sel_isotau_mask | (ok & (ch_tau_mask & tau_iso_mask))
-
-                mu_charge = events.Muon.charge[mu_ctrl]
-                tau_charge = events.Tau.charge[ch_tau_mask]
-                chargeok = (np.abs((ak.sum(tau_charge, axis=1)) +
-                    (ak.sum(mu_charge, axis=1))) == 0)
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & ((ak.sum((ch_tau_mask & tau_iso_mask), axis=1) == 3) & (ak.sum(mu_mask, axis=1) == 1))
-                tight_sel = tight_sel | tight_ok
-
-                if tid in single_mu_tids:
-                    trig_match_ok = base_ok & mu_only_emutau & (ak.sum(mu_match & mu_ctrl, axis=1) >= 1)
-                elif tid in cross_mu_tau:
-                    trig_match_ok = base_ok & (
-                        (ak.sum(tau_match & ch_tau_mask, axis=1) >= 1) &
-                        (ak.sum(mu_match & mu_ctrl, axis=1) >= 1)
-                    )
-
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-            elif ch_key == "c2emutau":
-                ch_tau_mask = (
-                    tau_mask &
-                    (events.Tau[get_tau_tagger("e")] >= wp_config.tau_vs_e.vloose) &
-                    (events.Tau[get_tau_tagger("mu")] >= wp_config.tau_vs_mu.tight)
-                )
-
-                base_ok = (
-                    (ak.sum(e_ctrl, axis=1) == 2) &
-                    (ak.sum(e_veto, axis=1) == 2) &
-                    (ak.sum(mu_ctrl, axis=1) == 1) &
-                    (ak.sum(mu_veto, axis=1) == 1) &
-                    (ak.sum(ch_tau_mask, axis=1) == 1)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_electron_mask = sel_electron_mask | (ok & e_ctrl)
-                sel_looseelectron_mask = sel_looseelectron_mask | (ok & e_veto)
-                sel_tightelectron_mask = sel_tightelectron_mask | (ok & e_mask)
-                sel_muon_mask = sel_muon_mask | (ok & mu_ctrl)
-                sel_loosemuon_mask = sel_loosemuon_mask | (ok & mu_veto)
-                sel_tightmuon_mask = sel_tightmuon_mask | (ok & mu_mask)
-                sel_tau_mask = sel_tau_mask | (ok & ch_tau_mask)
-                sel_isotau_mask = sel_isotau_mask | (ok & (ch_tau_mask & tau_iso_mask))
-
-                e_charge = events.Electron.charge[e_ctrl]
-                mu_charge = events.Muon.charge[mu_ctrl]
-                tau_charge = events.Tau.charge[ch_tau_mask]
-                chargeok = ((np.abs((ak.sum(tau_charge, axis=1)) +
-                    (ak.sum(e_charge, axis=1)) + (ak.sum(mu_charge, axis=1))) == 0) &
-                    (np.abs((ak.sum(e_charge, axis=1)) + (ak.sum(mu_charge, axis=1))) == 1))
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & ((ak.sum((ch_tau_mask & tau_iso_mask), axis=1) == 1) &
-                    (ak.sum(e_mask, axis=1) == 2) & (ak.sum(mu_mask, axis=1) == 1))
-                tight_sel = tight_sel | tight_ok
-
-                if tid in single_e_tids:
-                    trig_match_ok = base_ok & (ak.sum(e_match & e_ctrl, axis=1) >= 1)
-                    if_mu_fired = base_ok & mu_trig_any & (ak.sum(mu_match_any & mu_ctrl, axis=1) >= 1)
-                    trig_match_ok = ak.where(mu_trig_any, trig_match_ok & if_mu_fired, trig_match_ok)
-                elif tid in single_mu_tids:
-                    trig_match_ok = base_ok & (ak.sum(mu_match & mu_ctrl, axis=1) >= 1)
-                    if_e_fired = base_ok & e_trig_any & (ak.sum(e_match_any & e_ctrl, axis=1) >= 1)
-                    trig_match_ok = ak.where(e_trig_any, trig_match_ok & if_e_fired, trig_match_ok)
-                elif tid in cross_e_tau:
-                    trig_match_ok = base_ok & (
-                        (ak.sum(tau_match & ch_tau_mask, axis=1) >= 1) &
-                        (ak.sum(e_match & e_ctrl, axis=1) >= 1)
-                    )
-                    if_mu_fired = base_ok & mu_trig_any & (ak.sum(mu_match_any & mu_ctrl, axis=1) >= 1)
-                    trig_match_ok = ak.where(mu_trig_any, trig_match_ok & if_mu_fired, trig_match_ok)
-                elif tid in cross_mu_tau:
-                    trig_match_ok = base_ok & (
-                        (ak.sum(tau_match & ch_tau_mask, axis=1) >= 1) &
-                        (ak.sum(mu_match & mu_ctrl, axis=1) >= 1)
-                    )
-                    if_e_fired = base_ok & e_trig_any & (ak.sum(e_match_any & e_ctrl, axis=1) >= 1)
-                    trig_match_ok = ak.where(e_trig_any, trig_match_ok & if_e_fired, trig_match_ok)
-
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-            elif ch_key == "ce2mutau":
-                ch_tau_mask = (
-                    tau_mask &
-                    (events.Tau[get_tau_tagger("e")] >= wp_config.tau_vs_e.vloose) &
-                    (events.Tau[get_tau_tagger("mu")] >= wp_config.tau_vs_mu.tight)
-                )
-
-                base_ok = (
-                    (ak.sum(e_ctrl, axis=1) == 1) &
-                    (ak.sum(e_veto, axis=1) == 1) &
-                    (ak.sum(mu_ctrl, axis=1) == 2) &
-                    (ak.sum(mu_veto, axis=1) == 2) &
-                    (ak.sum(ch_tau_mask, axis=1) == 1)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_electron_mask = sel_electron_mask | (ok & e_ctrl)
-                sel_looseelectron_mask = sel_looseelectron_mask | (ok & e_veto)
-                sel_tightelectron_mask = sel_tightelectron_mask | (ok & e_mask)
-                sel_muon_mask = sel_muon_mask | (ok & mu_ctrl)
-                sel_loosemuon_mask = sel_loosemuon_mask | (ok & mu_veto)
-                sel_tightmuon_mask = sel_tightmuon_mask | (ok & mu_mask)
-                sel_tau_mask = sel_tau_mask | (ok & ch_tau_mask)
-                sel_isotau_mask = sel_isotau_mask | (ok & (ch_tau_mask & tau_iso_mask))
-
-                e_charge = events.Electron.charge[e_ctrl]
-                mu_charge = events.Muon.charge[mu_ctrl]
-                tau_charge = events.Tau.charge[ch_tau_mask]
-                chargeok = ((np.abs((ak.sum(tau_charge, axis=1)) +
-                    (ak.sum(e_charge, axis=1)) + (ak.sum(mu_charge, axis=1))) == 0) &
-                    (np.abs((ak.sum(e_charge, axis=1)) + (ak.sum(mu_charge, axis=1))) == 1))
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & ((ak.sum((ch_tau_mask & tau_iso_mask), axis=1) == 1) &
-                    (ak.sum(e_mask, axis=1) == 1) & (ak.sum(mu_mask, axis=1) == 2))
-                tight_sel = tight_sel | tight_ok
-
-                if tid in single_e_tids:
-                    trig_match_ok = base_ok & (ak.sum(e_match & e_ctrl, axis=1) >= 1)
-                    if_mu_fired = base_ok & mu_trig_any & (ak.sum(mu_match_any & mu_ctrl, axis=1) >= 1)
-                    trig_match_ok = ak.where(mu_trig_any, trig_match_ok & if_mu_fired, trig_match_ok)
-                elif tid in single_mu_tids:
-                    trig_match_ok = base_ok & (ak.sum(mu_match & mu_ctrl, axis=1) >= 1)
-                    if_e_fired = base_ok & e_trig_any & (ak.sum(e_match_any & e_ctrl, axis=1) >= 1)
-                    trig_match_ok = ak.where(e_trig_any, trig_match_ok & if_e_fired, trig_match_ok)
-                elif tid in cross_e_tau:
-                    trig_match_ok = base_ok & (
-                        (ak.sum(tau_match & ch_tau_mask, axis=1) >= 1) &
-                        (ak.sum(e_match & e_ctrl, axis=1) >= 1)
-                    )
-                    if_mu_fired = base_ok & mu_trig_any & (ak.sum(mu_match_any & mu_ctrl, axis=1) >= 1)
-                    trig_match_ok = ak.where(mu_trig_any, trig_match_ok & if_mu_fired, trig_match_ok)
-                elif tid in cross_mu_tau:
-                    trig_match_ok = base_ok & (
-                        (ak.sum(tau_match & ch_tau_mask, axis=1) >= 1) &
-                        (ak.sum(mu_match & mu_ctrl, axis=1) >= 1)
-                    )
-                    if_e_fired = base_ok & e_trig_any & (ak.sum(e_match_any & e_ctrl, axis=1) >= 1)
-                    trig_match_ok = ak.where(e_trig_any, trig_match_ok & if_e_fired, trig_match_ok)
-
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-            elif ch_key == "cemu2tau":
-                ch_tau_mask = (
-                    tau_mask &
-                    (events.Tau[get_tau_tagger("e")] >= wp_config.tau_vs_e.vloose) &
-                    (events.Tau[get_tau_tagger("mu")] >= wp_config.tau_vs_mu.tight)
-                )
-
-                base_ok = (
-                    (ak.sum(e_ctrl, axis=1) == 1) &
-                    (ak.sum(e_veto, axis=1) == 1) &
-                    (ak.sum(mu_ctrl, axis=1) == 1) &
-                    (ak.sum(mu_veto, axis=1) == 1) &
-                    (ak.sum(ch_tau_mask, axis=1) == 2)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_electron_mask = sel_electron_mask | (ok & e_ctrl)
-                sel_looseelectron_mask = sel_looseelectron_mask | (ok & e_veto)
-                sel_tightelectron_mask = sel_tightelectron_mask | (ok & e_mask)
-                sel_muon_mask = sel_muon_mask | (ok & mu_ctrl)
-                sel_loosemuon_mask = sel_loosemuon_mask | (ok & mu_veto)
-                sel_tightmuon_mask = sel_tightmuon_mask | (ok & mu_mask)
-                sel_tau_mask = sel_tau_mask | (ok & ch_tau_mask)
-                sel_isotau_mask = sel_isotau_mask | (ok & (ch_tau_mask & tau_iso_mask))
-
-                e_charge = events.Electron.charge[e_ctrl]
-                mu_charge = events.Muon.charge[mu_ctrl]
-                tau_charge = events.Tau.charge[ch_tau_mask]
-                chargeok = ((np.abs((ak.sum(tau_charge, axis=1)) +
-                    (ak.sum(e_charge, axis=1)) + (ak.sum(mu_charge, axis=1))) == 0) &
-                    (np.abs((ak.sum(e_charge, axis=1)) + (ak.sum(mu_charge, axis=1))) == 0))
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & ((ak.sum((ch_tau_mask & tau_iso_mask), axis=1) == 2) &
-                    (ak.sum(e_mask, axis=1) == 1) & (ak.sum(mu_mask, axis=1) == 1))
-                tight_sel = tight_sel | tight_ok
-
-                if tid in single_e_tids:
-                    trig_match_ok = base_ok & (ak.sum(e_match & e_ctrl, axis=1) >= 1)
-                    if_mu_fired = base_ok & mu_trig_any & (ak.sum(mu_match_any & mu_ctrl, axis=1) >= 1)
-                    trig_match_ok = ak.where(mu_trig_any, trig_match_ok & if_mu_fired, trig_match_ok)
-                elif tid in single_mu_tids:
-                    trig_match_ok = base_ok & (ak.sum(mu_match & mu_ctrl, axis=1) >= 1)
-                    if_e_fired = base_ok & e_trig_any & (ak.sum(e_match_any & e_ctrl, axis=1) >= 1)
-                    trig_match_ok = ak.where(e_trig_any, trig_match_ok & if_e_fired, trig_match_ok)
-                elif tid in cross_e_tau:
-                    trig_match_ok = base_ok & (
-                        (ak.sum(tau_match & ch_tau_mask, axis=1) >= 1) &
-                        (ak.sum(e_match & e_ctrl, axis=1) >= 1)
-                    )
-                    if_mu_fired = base_ok & mu_trig_any & (ak.sum(mu_match_any & mu_ctrl, axis=1) >= 1)
-                    trig_match_ok = ak.where(mu_trig_any, trig_match_ok & if_mu_fired, trig_match_ok)
-                elif tid in cross_mu_tau:
-                    trig_match_ok = base_ok & (
-                        (ak.sum(tau_match & ch_tau_mask, axis=1) >= 1) &
-                        (ak.sum(mu_match & mu_ctrl, axis=1) >= 1)
-                    )
-                    if_e_fired = base_ok & e_trig_any & (ak.sum(e_match_any & e_ctrl, axis=1) >= 1)
-                    trig_match_ok = ak.where(e_trig_any, trig_match_ok & if_e_fired, trig_match_ok)
-                elif tid in cross_tau_tau_any:
-                    trig_match_ok = base_ok & (ak.sum(tau_match & ch_tau_mask, axis=1) >= 1)
-
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-            elif ch_key == "c4tau":
-                ch_tau_mask = (
-                    tau_mask &
-                    (events.Tau[get_tau_tagger("e")] >= wp_config.tau_vs_e.vvloose) &
-                    (events.Tau[get_tau_tagger("mu")] >= wp_config.tau_vs_mu.vloose)
-                )
-
-                base_ok = (
-                    (ak.sum(mu_veto, axis=1) == 0) &
-                    (ak.sum(e_veto, axis=1) == 0) &
-                    (ak.sum(ch_tau_mask, axis=1) == 4)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_tau_mask = sel_tau_mask | (ok & ch_tau_mask)
-                sel_isotau_mask = sel_isotau_mask | (ok & (ch_tau_mask & tau_iso_mask))
-
-                tau_charge = events.Tau.charge[ch_tau_mask]
-                chargeok = (np.abs((ak.sum(tau_charge, axis=1))) == 0)
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & (ak.sum((ch_tau_mask & tau_iso_mask), axis=1) == 4)
-                tight_sel = tight_sel | tight_ok
-
-                if tid in cross_tau_tau_any:
-                    trig_match_ok = base_ok & (ak.sum(tau_match & ch_tau_mask, axis=1) >= 1)
-
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-            elif ch_key == "c2e0or1tau":
-                ch_tau_mask = (
-                    tau_mask &
-                    (events.Tau[get_tau_tagger("e")] >= wp_config.tau_vs_e.vloose) &
-                    (events.Tau[get_tau_tagger("mu")] >= wp_config.tau_vs_mu.tight)
-                )
-
-                base_ok = (
-                    (ak.sum(e_ctrl, axis=1) == 2) &
-                    (ak.sum(e_veto, axis=1) == 2) &
-                    (ak.sum(mu_veto, axis=1) == 0) &
-                    (ak.sum(ch_tau_mask, axis=1) <= 1)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_electron_mask = sel_electron_mask | (ok & e_ctrl)
-                sel_looseelectron_mask = sel_looseelectron_mask | (ok & e_veto)
-                sel_tightelectron_mask = sel_tightelectron_mask | (ok & e_mask)
-                sel_tau_mask = sel_tau_mask | (ok & ch_tau_mask)
-                sel_isotau_mask = sel_isotau_mask | (ok & (ch_tau_mask & tau_iso_mask))
-
-                e_charge = events.Electron.charge[e_ctrl]
-                chargeok = (np.abs(ak.sum(e_charge, axis=1)) == 0)
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & (ak.sum(e_mask, axis=1) == 2)
-                tight_sel = tight_sel | tight_ok
-
-                trig_match_ok = base_ok & (ak.sum(e_match & e_ctrl, axis=1) >= 1)
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-            elif ch_key == "c2mu0or1tau":
-                ch_tau_mask = (
-                    tau_mask &
-                    (events.Tau[get_tau_tagger("e")] >= wp_config.tau_vs_e.vloose) &
-                    (events.Tau[get_tau_tagger("mu")] >= wp_config.tau_vs_mu.tight)
-                )
-
-                base_ok = (
-                    (ak.sum(mu_ctrl, axis=1) == 2) &
-                    (ak.sum(mu_veto, axis=1) == 2) &
-                    (ak.sum(e_veto, axis=1) == 0) &
-                    (ak.sum(ch_tau_mask, axis=1) <= 1)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_muon_mask = sel_muon_mask | (ok & mu_ctrl)
-                sel_loosemuon_mask = sel_loosemuon_mask | (ok & mu_veto)
-                sel_tightmuon_mask = sel_tightmuon_mask | (ok & mu_mask)
-                sel_tau_mask = sel_tau_mask | (ok & ch_tau_mask)
-                sel_isotau_mask = sel_isotau_mask | (ok & (ch_tau_mask & tau_iso_mask))
-
-                mu_charge = events.Muon.charge[mu_ctrl]
-                chargeok = (np.abs(ak.sum(mu_charge, axis=1)) == 0)
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & (ak.sum(mu_mask, axis=1) == 2)
-                tight_sel = tight_sel | tight_ok
-
-                trig_match_ok = base_ok & (ak.sum(mu_match & mu_ctrl, axis=1) >= 1)
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-            elif ch_key == "cemu0or1tau":
-                ch_tau_mask = (
-                    tau_mask &
-                    (events.Tau[get_tau_tagger("e")] >= wp_config.tau_vs_e.vloose) &
-                    (events.Tau[get_tau_tagger("mu")] >= wp_config.tau_vs_mu.tight)
-                )
-
-                base_ok = (
-                    (ak.sum(e_ctrl, axis=1) == 1) &
-                    (ak.sum(e_veto, axis=1) == 1) &
-                    (ak.sum(mu_ctrl, axis=1) == 1) &
-                    (ak.sum(mu_veto, axis=1) == 1) &
-                    (ak.sum(ch_tau_mask, axis=1) <= 1)
-                )
-                if not disable_triggers:
-                    base_ok = base_ok & fired
-
-                ok = ak.where(base_ok, ok, False)
-
-                sel_electron_mask = sel_electron_mask | (ok & e_ctrl)
-                sel_looseelectron_mask = sel_looseelectron_mask | (ok & e_veto)
-                sel_tightelectron_mask = sel_tightelectron_mask | (ok & e_mask)
-                sel_muon_mask = sel_muon_mask | (ok & mu_ctrl)
-                sel_loosemuon_mask = sel_loosemuon_mask | (ok & mu_veto)
-                sel_tightmuon_mask = sel_tightmuon_mask | (ok & mu_mask)
-                sel_tau_mask = sel_tau_mask | (ok & ch_tau_mask)
-                sel_isotau_mask = sel_isotau_mask | (ok & (ch_tau_mask & tau_iso_mask))
-
-                e_charge = events.Electron.charge[e_ctrl]
-                mu_charge = events.Muon.charge[mu_ctrl]
-                chargeok = (np.abs((ak.sum(e_charge, axis=1) + ak.sum(mu_charge, axis=1))) == 0)
-                leptons_os = ak.where(ok, chargeok, leptons_os)
-
-                tight_ok = ok & ((ak.sum(e_mask, axis=1) == 1) & (ak.sum(mu_mask, axis=1) == 1))
-                tight_sel = tight_sel | tight_ok
-
-                if tid in single_e_tids:
-                    # emu_from_e — accept ONLY events with e_only (anti-overlap)
-                    trig_match_ok = base_ok & e_only & (ak.sum(e_match & e_ctrl, axis=1) >= 1)
-
-                elif tid in single_mu_tids:
-                    # emu_from_mu — allow both_families; the matching/logic below handles e-side
-                    trig_match_ok = base_ok & (ak.sum(mu_match & mu_ctrl, axis=1) >= 1)
-                    # for events with both triggers firing:
-                    if_e_fired = base_ok & e_trig_any & (ak.sum(e_match_any & e_ctrl, axis=1) >= 1)
-                    trig_match_ok = ak.where(e_trig_any, trig_match_ok & if_e_fired, trig_match_ok)
-
-                trig_match = trig_match | trig_match_ok
-
-                single_triggered = ak.where(trig_match_ok, True, single_triggered)
-                ids = ak.where(trig_match_ok, np.float32(tid), np.float32(np.nan))
-                matched_trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
-
-        # accumulate over triggers
-            good_evt = ak.where(ok, True, good_evt)
-
-        if ch_key != "eormu":
-            channel_id = update_channel_ids(events, channel_id, spec.id, good_evt)
+            key = _trig_cache[tid]["masks"]
+            base, tight, charge_ok = get_evaluated_rules(key, rule.tau_wps)
+
+            base_ok = base[:, index]
+            if not disable_triggers:
+                base_ok = base_ok & _trig_cache[tid]["fired"]
+            ok = base_ok
+
+            if rule.n_e:
+                sel_events[("e", key, None)] = sel_events[("e", key, None)] | ok
+            if rule.n_mu:
+                sel_events[("mu", key, None)] = sel_events[("mu", key, None)] | ok
+            if rule.n_tau:
+                sel_events[("tau", key, rule.tau_wps)] = sel_events[("tau", key, rule.tau_wps)] | ok
+
+            # match the leptons selected in this channel to gen leptons, events are genuine if all of them match
+            if ch_key in self.gen_match_channels and self.dataset_inst.is_mc:
+                genuine = ok
+                for collection, n, lep_mask in [
+                    ("Electron", rule.n_e, _mask_sets[key]["e_ctrl"]),
+                    ("Muon", rule.n_mu, _mask_sets[key]["mu_ctrl"]),
+                    ("Tau", rule.n_tau, get_ch_tau_mask(key, rule.tau_wps) if rule.n_tau else None),
+                ]:
+                    if not n:
+                        continue
+                    matched = get_gen_match(collection)
+                    gen_matched[collection] = gen_matched[collection] | (ok & lep_mask & matched)
+                    genuine = genuine & ak.to_numpy(ak.all(matched[lep_mask], axis=1))
+                all_leptons_genuine = all_leptons_genuine | genuine
+
+            leptons_os = np.where(ok, charge_ok[:, index], leptons_os)
+            tight_sel = tight_sel | (ok & tight[:, index])
+
+            # the first matching rule whose family the trigger belongs to decides, others keep the
+            # previous decision
+            for family, names in rule.matching:
+                if family == "any" or family in self.trigger_id_families[tid]:
+                    trig_match_ok = base_ok
+                    for name in names:
+                        trig_match_ok = trig_match_ok & get_condition(name, tid, key, rule.tau_wps)
+                    break
+            trig_match = trig_match | trig_match_ok
+
+            single_triggered = single_triggered | trig_match_ok
+            matched_trigger_masks.append((trig_match_ok, tid))
+
+            # accumulate over triggers
+            good_evt = good_evt | ok
+
+        channel_masks.append(good_evt)
+        channel_ids.append(self.config_inst.get_channel(ch_key).id)
+
+    # assign channel ids in one go, checking that channels are exclusive
+    if channel_masks:
+        channel_id = assign_channel_ids(np.stack(channel_masks, axis=1), np.array(channel_ids))
+    else:
+        channel_id = np.zeros(n_events, dtype=np.uint32)
+
+    # apply the event selections to the object masks once per mask set
+    for (collection, key, tau_wps), evt_mask in sel_events.items():
+        masks = _mask_sets[key]
+        if collection == "e":
+            sel_electron_mask = sel_electron_mask | (evt_mask & masks["e_ctrl"])
+            sel_looseelectron_mask = sel_looseelectron_mask | (evt_mask & masks["e_veto"])
+            sel_tightelectron_mask = sel_tightelectron_mask | (evt_mask & masks["e"])
+        elif collection == "mu":
+            sel_muon_mask = sel_muon_mask | (evt_mask & masks["mu_ctrl"])
+            sel_loosemuon_mask = sel_loosemuon_mask | (evt_mask & masks["mu_veto"])
+            sel_tightmuon_mask = sel_tightmuon_mask | (evt_mask & masks["mu"])
+        else:
+            ch_tau_mask = get_ch_tau_mask(key, tau_wps)
+            sel_tau_mask = sel_tau_mask | (evt_mask & ch_tau_mask)
+            sel_isotau_mask = sel_isotau_mask | (evt_mask & (ch_tau_mask & masks["tau_iso"]))
 
     # some final type conversions
     channel_id = ak.values_astype(channel_id, np.uint32)
@@ -1989,12 +1446,18 @@ def lepton_selection(
     trig_match = ak.fill_none(trig_match, False)
     trig_match_bdt = ak.fill_none(trig_match_bdt, False)
     ok_bdt_eormu = ak.fill_none(ok_bdt_eormu, False)
-    ok_bdt_eormu_bveto = ak.fill_none(ok_bdt_eormu_bveto, False)
+    ok_bdt_eormu_bveto = ok_bdt_eormu
 
-    # concatenate matched trigger ids
+    # encode matched triggers as bitsets, the decoded ids are unique and in the order of the triggers in the config
+    # rather than in the order in which they were matched
     empty_ids = ak.singletons(full_like(events.event, 0, dtype=np.int32), axis=0)[:, :0]
     merge_ids = lambda ids: ak.values_astype(ak.concatenate(ids, axis=1), np.int32) if ids else empty_ids
-    matched_trigger_ids = merge_ids(matched_trigger_ids)
+    matched_trigger_bits = self.trigger_bitset.encode(
+        np.stack([mask for mask, _ in matched_trigger_masks], axis=1)
+        if matched_trigger_masks else np.zeros((n_events, 0), dtype=bool),
+        [tid for _, tid in matched_trigger_masks],
+    )
+    matched_trigger_ids = self.trigger_bitset.to_ids(matched_trigger_bits)
     lepton_part_trigger_ids = merge_ids(lepton_part_trigger_ids)
 
     # save new columns
@@ -2003,7 +1466,8 @@ def lepton_selection(
     events = set_ak_column(events, "tau2_isolated", tau2_isolated)
     events = set_ak_column(events, "single_triggered", single_triggered)
     events = set_ak_column(events, "cross_triggered", cross_triggered)
-    events = set_ak_column(events, "matched_trigger_ids", matched_trigger_ids)
+    events = set_ak_column(events, "matched_trigger_ids", matched_trigger_ids, value_type=np.int32)
+    events = set_ak_column(events, "matched_trigger_bits", matched_trigger_bits)
 
     # new columns for lepton bdt
     events = set_ak_column(events, "ok_bdt_eormu", ok_bdt_eormu)
@@ -2038,6 +1502,13 @@ def lepton_selection(
     events = set_ak_column(events, "TauIso", events.Tau[sel_isotau_indices])
     events = set_ak_column(events, "TauNoID", events.Tau[sel_noid_tau_indicies])
 
+    # gen matching columns
+    if self.gen_match_channels:
+        events = set_ak_column(events, "ElectronGenMatched", gen_matched["Electron"])
+        events = set_ak_column(events, "MuonGenMatched", gen_matched["Muon"])
+        events = set_ak_column(events, "TauGenMatched", gen_matched["Tau"])
+        events = set_ak_column(events, "all_leptons_genuine", all_leptons_genuine)
+
     return events, SelectionResult(
         steps={
             "lepton": (channel_id != 0) | ok_bdt_eormu | ok_bdt_eormu_bveto,
@@ -2092,5 +1563,146 @@ def lepton_selection(
 
 @lepton_selection.init
 def lepton_selection_init(self: Selector, **kwargs) -> None:
+    # trigger families per trigger id, and the trigger ids per channel this dataset is routed to,
+    # in the order of the triggers in the config; channels without a route are never evaluated
+    triggers = [
+        trigger for trigger in self.config_inst.x.triggers
+        if trigger.applies_to_dataset(self.dataset_inst)
+    ]
+    self.trigger_bitset = TriggerBitset(self.config_inst.x.triggers)
+    self.trigger_id_families = {
+        trigger.id: {family for family, tags in trigger_families.items() if trigger.has_tag(tags)}
+        for trigger in triggers
+    }
+    self.channel_trigger_ids = {}
+    for ch_key in self.config_inst.x.channel_names:
+        families = route_channel(ch_key, self.dataset_inst)
+        if families is None:
+            continue
+        self.channel_trigger_ids[ch_key] = [
+            trigger.id
+            for family in families
+            for trigger in triggers
+            if family in self.trigger_id_families[trigger.id]
+        ]
+
+    # object selections are only evaluated for datasets that are routed to at least one channel, as all channel
+    # rules count leptons of all flavours, so otherwise neither they nor their columns are needed
+    self.select_objects = bool(self.channel_trigger_ids) or not self.prune_unreachable_columns
+    if self.gen_match_channels:
+        self.produces |= gen_match_columns
+    if not self.select_objects:
+        unreachable = {
+            electron_selection, electron_trigger_matching, muon_trigger_matching, tau_selection, tau_trigger_matching,
+        }
+        self.uses -= unreachable
+        self.produces -= unreachable
+        # kinematics of the empty lepton collections and of the tagger independent taus
+        self.uses |= {"{Electron,Muon,Tau}.{pt,eta,phi}", "Tau.dz"}
+        logger.debug(
+            f"dataset {self.dataset_inst.name} is not routed to any channel, skipping object selections in "
+            f"{self.cls_name}",
+        )
+        return
+
     # add column to load the raw tau tagger score
     self.uses.add(f"Tau.raw{self.config_inst.x.tau_tagger}VSjet")
+
+    # pluggable muon selection and gen matching
+    self.uses.add(self.muon_selection_cls)
+    self.produces.add(self.muon_selection_cls)
+    if self.muon_selection_cls.muon_mva_source == "custom":
+        self.produces.add("Muon.muonLeptoMVA_hh")
+    if self.gen_match_channels:
+        self.uses.add(IF_MC("GenPart.{pt,eta,phi,pdgId}"))
+
+
+@lepton_selection.setup
+def lepton_selection_setup(self: Selector, task: law.Task, **kwargs) -> None:
+    # compile the rules of all routed channels, grouped by the tau working points that define the
+    # tau multiplicities, so that each group is evaluated at once
+    rule_groups = {}
+    for ch_key in self.channel_trigger_ids:
+        if ch_key in channel_rules:
+            rule_groups.setdefault(channel_rules[ch_key].tau_wps, []).append(ch_key)
+    self.compiled_channel_rules = {
+        tau_wps: compile_channel_rules([channel_rules[ch_key] for ch_key in ch_keys])
+        for tau_wps, ch_keys in rule_groups.items()
+    }
+    self.channel_rule_index = {
+        ch_key: index
+        for ch_keys in rule_groups.values()
+        for index, ch_key in enumerate(ch_keys)
+    }
+
+
+# variant using the nano muon mva score
+lepton_selection_nano = lepton_selection.derive("lepton_selection_nano", cls_dict={
+    "muon_selection_cls": muon_selection_nano,
+})
+
+# variant using the nano muon mva score that additionally matches 4e leptons to gen leptons
+lepton_selection_gen_match = lepton_selection.derive("lepton_selection_gen_match", cls_dict={
+    "muon_selection_cls": muon_selection_nano,
+    "gen_match_channels": {"c4e"},
+})
+
+
+# columns written by all lepton selection variants
+lepton_selection_columns = (
+    "channel_id", "leptons_os", "tau2_isolated", "single_triggered", "cross_triggered", "matched_trigger_ids",
+    "matched_trigger_bits", "tight_sel", "trig_match", "tight_sel_bdt", "trig_match_bdt", "ok_bdt_eormu",
+    "ok_bdt_eormu_bveto", "ElectronLoose", "ElectronTight", "MuonLoose", "MuonTight", "TauIso", "TauNoID",
+)
+
+
+def compare_lepton_selections(
+    reference: Selector,
+    variant: Selector,
+    events: ak.Array,
+    trigger_results: SelectionResult,
+    columns: Sequence[str] = lepton_selection_columns,
+    repeat: int = 3,
+    **kwargs,
+) -> tuple[list[str], dict[str, float]]:
+    """
+    Regression benchmark that runs the two lepton selection instances *reference* and *variant* on the same *events*
+    and returns the *columns* that are not byte-identical, as well as the fastest wall time of each selector in
+    seconds. Columns only agree if both variants use the same muon mva source.
+    """
+    (events_ref, _), time_ref = benchmark(reference, events, trigger_results, repeat=repeat, **kwargs)
+    (events_var, _), time_var = benchmark(variant, events, trigger_results, repeat=repeat, **kwargs)
+    differing = columns_identical(events_ref, events_var, columns)
+
+    logger.info(
+        f"{reference.cls_name}: {time_ref:.3f}s, {variant.cls_name}: {time_var:.3f}s, "
+        f"{len(columns) - len(differing)}/{len(columns)} columns byte-identical",
+    )
+    if differing:
+        logger.warning(f"columns differing between {reference.cls_name} and {variant.cls_name}: {differing}")
+
+    return differing, {reference.cls_name: time_ref, variant.cls_name: time_var}
+
+
+def pruned_column_bytes(
+    reference: Selector,
+    pruned: Selector,
+    events: ak.Array,
+    selector: Selector | None = None,
+) -> dict[str, float]:
+    """
+    Returns the average number of bytes per event in *events* of the columns that the lepton selection instance
+    *reference* reads but *pruned* does not, e.g. for the same dataset without and with pruning of unreachable
+    columns. Columns that are still read by the top-level *selector*, if given, are not counted.
+    """
+    columns = reference.used_columns - pruned.used_columns
+    if selector is not None:
+        columns -= selector.used_columns
+    sizes = column_bytes_per_event(events, sorted(columns, key=str))
+
+    logger.info(
+        f"{pruned.cls_name} skips {len(sizes)} columns read by {reference.cls_name} for dataset "
+        f"{pruned.dataset_inst.name}, saving {sum(sizes.values()):.1f} bytes per event",
+    )
+
+    return sizes
@@ -1,169 +1,373 @@
 """
 Helper module for loading and applying custom muon MVA model.
-Loads pre-trained XGBoost model and applies it to muon events.
+Trained XGBoost models (pickled classifier, scaler and feature list) are converted once into native XGBoost models
+with the scaler folded in, stored in a node-local cache keyed by the content hash of the trained artifacts.
 """
 
 import os
+import json
 import pickle
+import shutil
+import hashlib
+import tempfile
 import numpy as np
 import awkward as ak
 
 
-# Model paths (relative to this module or absolute)
-_MODEL_DIR = os.path.expandvars("${PWD}/../../../Lepton-MVA-Run3/models")
-_MODEL_PATH = os.path.join(_MODEL_DIR, "mu_xgb_clf.pkl")
-_SCALER_PATH = os.path.join(_MODEL_DIR, "mu_scaler.pkl")
-_FEATURES_PATH = os.path.join(_MODEL_DIR, "mu_features.pkl")
-
-# Singleton cache for model and scaler (loaded once)
-_model = None
-_scaler = None
-_features = None
-
-
-def _load_model():
-    """Load and cache the trained model and scaler."""
-    global _model, _scaler, _features
-    
-    if _model is None:
-        if not os.path.exists(_MODEL_PATH):
-            raise FileNotFoundError(f"Model not found at {_MODEL_PATH}")
-        if not os.path.exists(_SCALER_PATH):
-            raise FileNotFoundError(f"Scaler not found at {_SCALER_PATH}")
-        if not os.path.exists(_FEATURES_PATH):
-            raise FileNotFoundError(f"Features not found at {_FEATURES_PATH}")
-        
-        with open(_MODEL_PATH, "rb") as f:
-            _model = pickle.load(f)
-        
-        with open(_SCALER_PATH, "rb") as f:
-            _scaler = pickle.load(f)
-        
-        with open(_FEATURES_PATH, "rb") as f:
-            _features = pickle.load(f)
-    
-    return _model, _scaler, _features
-
-
-def compute_muon_mva_score(events: ak.Array) -> ak.Array:
-    """
-    Compute custom muon MVA scores using trained XGBoost model.
-    
-    Expected muon features (13 total):
-    'pdgId', 'pt', 'eta', 'pratio', 'prel_T', 'Irel_charged', 'Irel_neutral',
-    'dxy', 'dz', 'sip3d', 'segmentComp', 'btagDeepFlavB', 'ntracks'
-    
-    Features computed from NanoAOD following same recipe as training in Lepton-MVA-Run3/src/lepton_producer.py
-    
-    Args:
-        events: NanoAOD-like awkward array with Muon collection
-        
-    Returns:
-        Awkward array with muon MVA scores (per-muon, same structure as events.Muon.pt)
-    """
-    model, scaler, features = _load_model()
-    
-    muon = events.Muon
-    jet = events.Jet
-    
-    # Compute features following the same calculation as in lepton_producer.py training
-    feature_dict = {}
-    
-    for feat in features:
-        if feat == 'pdgId':
-            feature_dict[feat] = muon.pdgId
-        
-        elif feat == 'pt':
-            feature_dict[feat] = muon.pt
-        
-        elif feat == 'eta':
-            feature_dict[feat] = muon.eta
-        
-        elif feat == 'pratio':
-            # pratio = lepton_pt / jet_pt (from associated jet)
-            # Computed as: lep_pt / jets_pt[jidx]
-            jet_indices = muon.jetIdx
-            jet_pts = ak.fill_none(ak.where(jet_indices >= 0, jet[jet_indices].pt, None), 0.0)
-            pratio = ak.where(jet_pts > 0, muon.pt / jet_pts, 0.0)
-            feature_dict[feat] = pratio
-        
-        elif feat == 'prel_T':
-            # prel_T = abs(lep_pt * sin(delta_phi)) where delta_phi = angle between lepton and jet
-            # Computed as: delta_phi = (lep_phi - jets_phi + pi) % (2*pi) - pi
-            #              prelT = lep_pt * sin(delta_phi)
-            jet_indices = muon.jetIdx
-            
-            # Get jet phi values (0.0 if no associated jet)
-            jet_phi = ak.fill_none(ak.where(jet_indices >= 0, jet[jet_indices].phi, None), 0.0)
-            
-            # Compute delta phi
-            delta_phi = (muon.phi - jet_phi + np.pi) % (2 * np.pi) - np.pi
-            
-            # Compute prel_T
-            prel_T = ak.abs(muon.pt * np.sin(delta_phi))
-            feature_dict[feat] = prel_T
-        
-        elif feat == 'Irel_charged':
-            # Charged particle isolation: miniPFRelIso_chg
-            if hasattr(muon, 'miniPFRelIso_chg'):
-                feature_dict[feat] = muon.miniPFRelIso_chg
-            else:
-                feature_dict[feat] = ak.zeros_like(muon.pt)
-        
-        elif feat == 'Irel_neutral':
-            # Neutral particle isolation: miniPFRelIso_all - miniPFRelIso_chg
-            if hasattr(muon, 'miniPFRelIso_all') and hasattr(muon, 'miniPFRelIso_chg'):
-                feature_dict[feat] = muon.miniPFRelIso_all - muon.miniPFRelIso_chg
-            else:
-                feature_dict[feat] = ak.zeros_like(muon.pt)
-        
-        elif feat == 'dxy':
-            feature_dict[feat] = muon.dxy
-        
-        elif feat == 'dz':
-            feature_dict[feat] = muon.dz
-        
-        elif feat == 'sip3d':
-            feature_dict[feat] = muon.sip3d
-        
-        elif feat == 'segmentComp':
-            # Segment compatibility (CMS variable, muon-specific)
-            if hasattr(muon, 'segmentComp'):
-                feature_dict[feat] = muon.segmentComp
-            else:
-                feature_dict[feat] = ak.zeros_like(muon.pt)
-        
-        elif feat == 'btagDeepFlavB':
-            # B-tagging score from associated jet
-            jet_indices = muon.jetIdx
-            btag = ak.fill_none(ak.where(jet_indices >= 0, jet[jet_indices].btagDeepFlavB, None), 0.0)
-            feature_dict[feat] = btag
-        
-        elif feat == 'ntracks':
-            # Number of tracks in associated jet: jet.nConstituents
-            jet_indices = muon.jetIdx
-            ntracks = ak.fill_none(ak.where(jet_indices >= 0, jet[jet_indices].nConstituents, None), 0.0)
-            feature_dict[feat] = ntracks
-    
-    # Flatten awkward arrays to 1D numpy (muon by muon)
-    num_muons = ak.num(muon.pt)
-    X_list = []
-    
-    for feat in features:
-        arr = feature_dict[feat]
-        # Flatten to 1D
-        flat = ak.to_numpy(ak.flatten(arr))
-        X_list.append(flat)
-    
-    X = np.column_stack(X_list)
-    
-    # Apply scaler (trained on same features)
-    X_scaled = scaler.transform(X)
-    
-    # Get predictions (probabilities for positive class = prompt muon)
-    scores = model.predict_proba(X_scaled)[:, 1]  # probability of prompt muon
-    
-    # Reshape back to awkward structure (per-muon)
-    scores = ak.unflatten(scores, num_muons)
-    
-    return scores
+# format of converted models, bump when the conversion changes
+_CONVERSION_VERSION = 1
+
+# evaluators loaded in this process per (content hash, nthread)
+_evaluators = {}
+
+# associated jet columns needed per feature, gathered in one go
+_jet_columns = {
+    "pratio": "pt",
+    "prel_T": "phi",
+    "btagDeepFlavB": "btagDeepFlavB",
+    "ntracks": "nConstituents",
+}
+
+
+def _load_pickles(model_path, scaler_path, features_path):
+    """Unpickles the trained model, scaler and feature list."""
+    loaded = []
+    for path in (model_path, scaler_path, features_path):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"muon MVA artifact not found at {path}")
+        with open(path, "rb") as f:
+            loaded.append(pickle.load(f))
+    return tuple(loaded)
+
+
+def _affine_scaler_params(scaler, n_features):
+    """
+    Returns the per-feature offset and slope of *scaler* if it is an affine transformation x -> offset + slope * x
+    (e.g. standard, min-max or robust scaling), and None otherwise.
+    """
+    probe = np.array([np.zeros(n_features), np.ones(n_features), np.full(n_features, 2.0)])
+    t = np.asarray(scaler.transform(probe), dtype=np.float64)
+    offset, slope = t[0], t[1] - t[0]
+    if not np.allclose(t[2], offset + 2.0 * slope, rtol=1e-9, atol=1e-12):
+        return None
+    return offset, slope
+
+
+def _float32_to_ordered(x):
+    """Maps float32 values to int64 keys with the same ordering, adjacent floats having adjacent keys."""
+    bits = np.asarray(x, dtype=np.float32).view(np.int32).astype(np.int64)
+    return np.where(bits >= 0, bits, -(bits & 0x7fffffff))
+
+
+def _ordered_to_float32(keys):
+    """Inverse of :py:func:`_float32_to_ordered`."""
+    bits = np.where(keys >= 0, keys, (-keys) | 0x80000000)
+    return bits.astype(np.uint32).view(np.float32)
+
+
+def _raw_thresholds(scaler, n_features, indices, conditions):
+    """
+    Maps split *conditions* on scaled features with *indices* to float32 thresholds on raw features. For each split,
+    the threshold is the smallest float32 value v with float32(scaler(v)) >= condition, found by bisection over all
+    float32 values, so that raw inputs take exactly the same branch as their scaled counterparts. The scaler is
+    assumed to be monotonically increasing.
+    """
+    conditions = np.asarray(conditions, dtype=np.float32)
+    rows = np.arange(len(conditions))
+    max_float = np.finfo(np.float32).max
+
+    def goes_right(keys):
+        probe = np.zeros((len(keys), n_features), dtype=np.float64)
+        probe[rows, indices] = _ordered_to_float32(keys)
+        scaled = np.asarray(scaler.transform(probe), dtype=np.float64)[rows, indices]
+        # probes near the float32 range overflow to +-inf, which is the intended comparison
+        with np.errstate(over="ignore"):
+            return scaled.astype(np.float32) >= conditions
+
+    lo = np.full(len(conditions), _float32_to_ordered(-max_float))
+    hi = np.full(len(conditions), _float32_to_ordered(max_float))
+    always_right, never_right = goes_right(lo), ~goes_right(hi)
+    while np.any(hi - lo > 1):
+        mid = (lo + hi) // 2
+        right = goes_right(mid)
+        hi, lo = np.where(right, mid, hi), np.where(right, lo, mid)
+
+    thresholds = _ordered_to_float32(hi)
+    thresholds[always_right] = -np.inf
+    thresholds[never_right] = np.inf
+    return thresholds
+
+
+def fold_scaler_into_booster(booster, scaler, n_features):
+    """
+    Returns a copy of the xgboost *booster* whose split thresholds are mapped from scaled to raw feature space for an
+    affine *scaler*, so that unscaled float32 features can be passed directly and yield identical predictions.
+    Returns None if the scaler is not affine with strictly positive slopes, as flipped comparisons cannot be
+    expressed by thresholds.
+    """
+    import xgboost as xgb
+
+    params = _affine_scaler_params(scaler, n_features)
+    if params is None or np.any(params[1] <= 0):
+        return None
+
+    model = json.loads(booster.save_raw(raw_format="json"))
+    trees = model["learner"]["gradient_booster"]["model"]["trees"]
+
+    # map the thresholds of all splits (leaves store their value in split_conditions) of all trees at once
+    conditions = [np.asarray(tree["split_conditions"], dtype=np.float32) for tree in trees]
+    splits = [np.asarray(tree["left_children"]) != -1 for tree in trees]
+    indices = np.concatenate([np.asarray(tree["split_indices"], dtype=np.int64)[m] for tree, m in zip(trees, splits)])
+    split_conditions = np.concatenate([c[m] for c, m in zip(conditions, splits)])
+    thresholds = _raw_thresholds(scaler, n_features, indices, split_conditions)
+
+    offset = 0
+    for tree, cond, mask in zip(trees, conditions, splits):
+        n = int(mask.sum())
+        cond[mask] = thresholds[offset:offset + n]
+        offset += n
+        tree["split_conditions"] = cond.tolist()
+
+    folded = xgb.Booster()
+    folded.load_model(bytearray(json.dumps(model).encode("utf-8")))
+    return folded
+
+
+class MuonMVAEvaluator:
+    """
+    Evaluates the custom muon MVA on flat, contiguous float32 feature matrices, either through a native xgboost
+    *booster* with *nthread* threads (with the scaler folded into the thresholds unless a *scaler* is given), or
+    through the *scaler* and *predict_proba* of a sklearn-like *model*.
+    """
+
+    def __init__(self, features, booster=None, scaler=None, model=None, nthread=None):
+        if booster is None and model is None:
+            raise ValueError("either a booster or a model is required")
+        self.features = list(features)
+        self.booster = booster
+        self.scaler = scaler
+        self.model = model
+        self.scaler_folded = booster is not None and scaler is None
+        if booster is not None and nthread is not None:
+            booster.set_param({"nthread": int(nthread)})
+        # content hash and scores of the last evaluated feature matrix
+        self._last_scores = (None, None)
+
+    @classmethod
+    def from_pickles(cls, model_path, scaler_path, features_path, nthread=None, native=True):
+        """
+        Creates an evaluator from the trained artifacts. When *native* is *True* and the model is an xgboost
+        classifier, its booster is used and, if the scaler is affine, the scaler is folded into it.
+        """
+        model, scaler, features = _load_pickles(model_path, scaler_path, features_path)
+        if not native or not hasattr(model, "get_booster"):
+            return cls(features, scaler=scaler, model=model)
+        booster = model.get_booster()
+        folded = fold_scaler_into_booster(booster, scaler, len(features))
+        if folded is not None:
+            return cls(features, booster=folded, nthread=nthread)
+        return cls(features, booster=booster.copy(), scaler=scaler, nthread=nthread)
+
+    def feature_matrix(self, events: ak.Array) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Builds the (n_muons, n_features) float32 feature matrix following the recipe used in the training in
+        Lepton-MVA-Run3/src/lepton_producer.py, and returns it together with the number of muons per event.
+        """
+        muon = events.Muon
+        counts = ak.to_numpy(ak.num(muon.pt, axis=1))
+        n_muons = int(counts.sum())
+        flat = lambda arr: ak.to_numpy(ak.flatten(arr, axis=1))
+        zeros = lambda: np.zeros(n_muons, dtype=np.float32)
+
+        # single fused gather of all needed associated jet columns, muons without jet point to a row of zeros
+        jet_cols = list(dict.fromkeys(_jet_columns[feat] for feat in self.features if feat in _jet_columns))
+        jet_values = {}
+        if jet_cols:
+            n_jets = ak.to_numpy(ak.num(events.Jet, axis=1))
+            jet_offsets = np.concatenate([[0], np.cumsum(n_jets)[:-1]])
+            jet_table = np.zeros((int(n_jets.sum()) + 1, len(jet_cols)), dtype=np.float32)
+            for i, col in enumerate(jet_cols):
+                jet_table[:-1, i] = flat(events.Jet[col])
+            jet_idx = flat(muon.jetIdx).astype(np.int64)
+            muon_event = np.repeat(np.arange(len(counts)), counts)
+            has_jet = (jet_idx >= 0) & (jet_idx < n_jets[muon_event])
+            rows = np.where(has_jet, jet_offsets[muon_event] + jet_idx, len(jet_table) - 1)
+            gathered = jet_table[rows]
+            jet_values = {col: gathered[:, i] for i, col in enumerate(jet_cols)}
+
+        def column(feat):
+            if feat in ("pdgId", "pt", "eta", "dxy", "dz", "sip3d"):
+                return flat(muon[feat])
+            if feat == "pratio":
+                # lep_pt / jet_pt of the associated jet
+                jet_pt = jet_values["pt"]
+                return np.divide(flat(muon.pt), jet_pt, out=zeros(), where=jet_pt > 0)
+            if feat == "prel_T":
+                # abs(lep_pt * sin(delta_phi)) with the lepton-jet delta phi
+                delta_phi = (flat(muon.phi) - jet_values["phi"] + np.pi) % (2 * np.pi) - np.pi
+                return np.abs(flat(muon.pt) * np.sin(delta_phi))
+            if feat == "Irel_charged":
+                return flat(muon.miniPFRelIso_chg) if "miniPFRelIso_chg" in muon.fields else zeros()
+            if feat == "Irel_neutral":
+                if "miniPFRelIso_all" in muon.fields and "miniPFRelIso_chg" in muon.fields:
+                    return flat(muon.miniPFRelIso_all) - flat(muon.miniPFRelIso_chg)
+                return zeros()
+            if feat == "segmentComp":
+                return flat(muon.segmentComp) if "segmentComp" in muon.fields else zeros()
+            if feat == "btagDeepFlavB":
+                return jet_values["btagDeepFlavB"]
+            if feat == "ntracks":
+                return jet_values["nConstituents"]
+            raise ValueError(f"unknown muon MVA feature '{feat}'")
+
+        # write features directly into the contiguous matrix
+        X = np.empty((n_muons, len(self.features)), dtype=np.float32)
+        for i, feat in enumerate(self.features):
+            X[:, i] = column(feat)
+
+        return X, counts
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Returns the probability of the prompt muon class for the feature matrix *X*."""
+        if len(X) == 0:
+            return np.zeros(0, dtype=np.float32)
+        if self.booster is not None:
+            if not self.scaler_folded:
+                X = np.ascontiguousarray(self.scaler.transform(X.astype(np.float64)), dtype=np.float32)
+            return self.booster.inplace_predict(X)
+        # scale in double precision as done in the training
+        return self.model.predict_proba(self.scaler.transform(X.astype(np.float64)))[:, 1]
+
+    def __call__(self, events: ak.Array) -> ak.Array:
+        """
+        Returns the muon MVA scores per muon of *events*. Scores of the last evaluated feature matrix are cached, so
+        that repeated calls on the same chunk skip the prediction, while any change of a muon or jet input, e.g. in a
+        shifted rerun, invalidates them.
+        """
+        X, counts = self.feature_matrix(events)
+        key = _feature_fingerprint(X, counts)
+        if self._last_scores[0] == key:
+            return self._last_scores[1]
+
+        scores = ak.unflatten(self.predict(X), counts)
+        self._last_scores = (key, scores)
+
+        return scores
+
+
+def _feature_fingerprint(X: np.ndarray, counts: np.ndarray) -> str:
+    """Returns a content hash of the feature matrix *X* and the number of muons per event."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(counts).tobytes())
+    h.update(np.ascontiguousarray(X).tobytes())
+    return h.hexdigest()
+
+
+def muon_mva_content_hash(model_path, scaler_path, features_path) -> str:
+    """Returns the sha256 hash of the contents of the trained artifacts and the conversion version."""
+    h = hashlib.sha256(str(_CONVERSION_VERSION).encode())
+    for path in (model_path, scaler_path, features_path):
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()
+
+
+def muon_mva_cache_dir() -> str:
+    """
+    Returns the directory of converted models, configurable through ``MULTILEPTON_MODEL_CACHE`` and defaulting to a
+    node-local directory so that all worker processes on a node share one conversion.
+    """
+    cache_dir = os.getenv("MULTILEPTON_MODEL_CACHE") or os.path.join(
+        tempfile.gettempdir(),
+        f"multilepton_models_{os.getuid()}",
+    )
+    return os.path.expandvars(os.path.expanduser(cache_dir))
+
+
+def convert_muon_mva(model_path, scaler_path, features_path, cache_dir=None) -> str:
+    """
+    Converts the trained artifacts into a native xgboost model (UBJ) with the scaler folded in and a json file with
+    the features, stored in a directory named after their content hash within *cache_dir*, and returns the path to
+    that directory. Existing conversions are reused. Raises an exception if the model cannot be converted.
+    """
+    if cache_dir is None:
+        cache_dir = muon_mva_cache_dir()
+    content_hash = muon_mva_content_hash(model_path, scaler_path, features_path)
+    target_dir = os.path.join(cache_dir, content_hash)
+    if os.path.exists(os.path.join(target_dir, "meta.json")):
+        return target_dir
+
+    evaluator = MuonMVAEvaluator.from_pickles(model_path, scaler_path, features_path, native=True)
+    if not evaluator.scaler_folded:
+        raise ValueError(
+            f"muon MVA in {os.path.dirname(model_path)} cannot be converted, it must be an xgboost classifier with an "
+            "affine, monotonically increasing scaler",
+        )
+
+    # write into a temporary directory first and move it into place atomically, other processes converting the same
+    # model concurrently produce identical content, so the first one wins
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=cache_dir, prefix=f".{content_hash}_")
+    try:
+        evaluator.booster.save_model(os.path.join(tmp_dir, "model.ubj"))
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump({"features": evaluator.features, "version": _CONVERSION_VERSION}, f)
+        try:
+            os.rename(tmp_dir, target_dir)
+        except OSError:
+            if not os.path.exists(os.path.join(target_dir, "meta.json")):
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return target_dir
+
+
+def load_muon_mva(model_path, scaler_path, features_path, nthread=None, cache_dir=None) -> MuonMVAEvaluator:
+    """
+    Returns the evaluator of the trained artifacts, converting them on first use and loading the native model from
+    the cache otherwise. Evaluators are shared within a process per content hash and *nthread*.
+    """
+    import xgboost as xgb
+
+    target_dir = convert_muon_mva(model_path, scaler_path, features_path, cache_dir=cache_dir)
+    key = (os.path.basename(target_dir), nthread)
+    if key not in _evaluators:
+        with open(os.path.join(target_dir, "meta.json")) as f:
+            meta = json.load(f)
+        booster = xgb.Booster(model_file=os.path.join(target_dir, "model.ubj"))
+        _evaluators[key] = MuonMVAEvaluator(meta["features"], booster=booster, nthread=nthread)
+    return _evaluators[key]
+
+
+def benchmark_muon_mva(
+    events: ak.Array,
+    model_path,
+    scaler_path,
+    features_path,
+    nthread=None,
+    repeat: int = 3,
+) -> dict:
+    """
+    Throughput benchmark of the muon MVA on *events*, comparing the converted native evaluation (scaler folded into
+    the booster) with the reference scaler + predict_proba path of the trained artifacts. Returns muons per second of
+    both, measured on the prebuilt feature matrix and end-to-end, and the maximum absolute score difference.
+    """
+    from multilepton.util import benchmark
+
+    native = load_muon_mva(model_path, scaler_path, features_path, nthread=nthread)
+    reference = MuonMVAEvaluator.from_pickles(model_path, scaler_path, features_path, native=False)
+
+    (X, counts), t_features = benchmark(native.feature_matrix, events, repeat=repeat)
+    n_muons = max(int(counts.sum()), 1)
+    scores_native, t_native = benchmark(native.predict, X, repeat=repeat)
+    scores_reference, t_reference = benchmark(reference.predict, X, repeat=repeat)
+
+    return {
+        "muons": int(counts.sum()),
+        "muons_per_second_native": n_muons / max(t_native, 1e-12),
+        "muons_per_second_reference": n_muons / max(t_reference, 1e-12),
+        "muons_per_second_end_to_end": n_muons / max(t_features + t_native, 1e-12),
+        "max_abs_diff": float(np.max(np.abs(scores_native - scores_reference), initial=0.0)),
+    }
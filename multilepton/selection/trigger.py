@@ -4,6 +4,8 @@
 Trigger selection methods.
 """
 
+import law
+
 from columnflow.selection import Selector, SelectionResult, selector
 from columnflow.util import maybe_import
 from columnflow.columnar_util import set_ak_column, optional_column as opt
@@ -12,13 +14,125 @@ np = maybe_import("numpy")
 ak = maybe_import("awkward")
 
 
+class TriggerBitset(object):
+    """
+    Encodes the set of trigger ids per event as a bitset of uint64 words with shape (n_events, n_words), using the
+    fixed :py:attr:`~multilepton.config.util.Trigger.bit` of each trigger in *triggers* (usually
+    ``config_inst.x.triggers``) as its position, so that bitsets written with one config are decoded identically with
+    another one. Bitsets with fewer or more words, e.g. written for a different set of triggers, are accepted.
+    """
+
+    def __init__(self, triggers) -> None:
+        triggers = list(triggers)
+        missing = [trigger.name for trigger in triggers if trigger.bit is None]
+        if missing:
+            raise ValueError(f"triggers without bitset position: {', '.join(missing)}")
+        self.ids = np.array([trigger.id for trigger in triggers], dtype=np.int32)
+        self.bits = np.array([trigger.bit for trigger in triggers], dtype=np.int64)
+        if len(np.unique(self.bits)) != len(self.bits):
+            raise ValueError(f"triggers with duplicate bitset positions: {dict(zip(self.ids, self.bits))}")
+        self.positions = dict(zip(self.ids.tolist(), self.bits.tolist()))
+        self.n_words = max(1, (int(self.bits.max(initial=-1)) + 64) // 64)
+
+    def _as_words(self, bits) -> np.ndarray:
+        if isinstance(bits, ak.Array):
+            bits = ak.to_numpy(bits)
+        words = np.asarray(bits, dtype=np.uint64).reshape(len(bits), -1)
+        if words.shape[1] < self.n_words:
+            words = np.pad(words, ((0, 0), (0, self.n_words - words.shape[1])))
+        return words
+
+    def words(self, trigger_ids) -> np.ndarray:
+        """Returns the (n_words,) bit mask of the given *trigger_ids*."""
+        flags = np.zeros(self.n_words * 64, dtype=bool)
+        flags[[self.positions[trigger_id] for trigger_id in trigger_ids]] = True
+        return np.packbits(flags, bitorder="little").view("<u8").astype(np.uint64)
+
+    def encode(self, masks, trigger_ids) -> np.ndarray:
+        """
+        Returns the bitsets of events given event *masks* of shape (n_events, len(trigger_ids)), setting the bit of
+        trigger ``trigger_ids[i]`` where ``masks[:, i]`` is *True*.
+        """
+        masks = np.asarray(masks, dtype=bool).reshape(len(masks), len(trigger_ids))
+        flags = np.zeros((len(masks), self.n_words * 64), dtype=bool)
+        for i, trigger_id in enumerate(trigger_ids):
+            flags[:, self.positions[trigger_id]] |= masks[:, i]
+        return np.packbits(flags, axis=1, bitorder="little").view("<u8").astype(np.uint64)
+
+    def add(self, bits, trigger_id, mask) -> np.ndarray:
+        """Returns a copy of *bits* with the bit of *trigger_id* set for events in *mask*."""
+        words = self._as_words(bits).copy()
+        words[:, :self.n_words] |= self.encode(np.asarray(mask)[:, None], [trigger_id])
+        return words
+
+    def contains_any(self, bits, trigger_ids) -> np.ndarray:
+        """Returns an event mask that is *True* where any of the *trigger_ids* is set."""
+        return np.any((self._as_words(bits)[:, :self.n_words] & self.words(trigger_ids)) != 0, axis=1)
+
+    def contains_only(self, bits, trigger_ids) -> np.ndarray:
+        """Returns an event mask that is *True* where no trigger other than the *trigger_ids* is set."""
+        words = self._as_words(bits)
+        return (
+            np.all((words[:, :self.n_words] & ~self.words(trigger_ids)) == 0, axis=1) &
+            np.all(words[:, self.n_words:] == 0, axis=1)
+        )
+
+    def to_ids(self, bits) -> ak.Array:
+        """Converts *bits* back to lists of trigger ids per event, in the order of the triggers."""
+        words = self._as_words(bits)[:, :self.n_words]
+        flags = np.unpackbits(np.ascontiguousarray(words).astype("<u8").view(np.uint8), axis=1, bitorder="little")
+        flags = flags[:, self.bits].astype(bool)
+        return ak.unflatten(np.broadcast_to(self.ids, flags.shape)[flags], flags.sum(axis=1))
+
+
+def leg_signature(leg) -> tuple:
+    """
+    Returns the hashable (pdg_id, min_pt, trigger_bits) signature of a trigger *leg*, legs with equal signatures
+    select the same trigger objects.
+    """
+    return (leg.pdg_id, leg.min_pt, tuple(leg.trigger_bits) if leg.trigger_bits is not None else None)
+
+
+def evaluate_trigger_legs(
+    trig_obj: ak.Array,
+    pdg_ids: np.ndarray,
+    min_pts: np.ndarray,
+    bit_masks: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Evaluates *L* distinct trigger legs on the flattened trigger objects *trig_obj* in a single vectorized pass.
+    *pdg_ids* (-1 for any) and *min_pts* (-inf for none) have shape (L,), *bit_masks* has shape (L, B) and contains
+    bit masks that must all overlap with the object's filter bits, padded with -1. As for single legs, a bit mask of
+    zero never overlaps and thus rejects all objects. Returns the (n_objects, L) object masks, the (n_events, L)
+    number of matching objects per event and the objects counts per event.
+    """
+    counts = ak.to_numpy(ak.num(trig_obj, axis=1))
+    abs_id = np.abs(ak.to_numpy(ak.flatten(trig_obj.id, axis=1)))
+    pt = ak.to_numpy(ak.flatten(trig_obj.pt, axis=1))
+    bits = ak.to_numpy(ak.flatten(trig_obj.filterBits, axis=1)).astype(np.int64)
+
+    obj_masks = (
+        ((pdg_ids < 0) | (abs_id[:, None] == pdg_ids)) &
+        (pt[:, None] >= min_pts) &
+        np.all((bit_masks < 0) | ((bits[:, None, None] & bit_masks) > 0), axis=2)
+    )
+
+    # number of matching objects per event from the cumulative sum at event boundaries
+    cum = np.zeros((len(abs_id) + 1, len(pdg_ids)), dtype=np.int64)
+    np.cumsum(obj_masks, axis=0, out=cum[1:])
+    stops = np.cumsum(counts)
+    n_matches = cum[stops] - cum[stops - counts]
+
+    return obj_masks, n_matches, counts
+
+
 @selector(
     uses={
         "run",
         "TrigObj.{id,pt,eta,phi,filterBits}",
     },
     produces={
-        "fired_trigger_ids",
+        "fired_trigger_ids", "fired_trigger_bits",
     },
     exposed=True,
 )
@@ -33,16 +147,23 @@ def trigger_selection(
 
     any_fired = False
     trigger_data = []
-    trigger_ids = []
-
-    # index of TrigObj's to repeatedly convert masks to indices
-    index = ak.local_index(events.TrigObj)
-
-    for trigger in self.config_inst.x.triggers:
-        # skip the trigger if it does not apply to the dataset
-        if not trigger.applies_to_dataset(self.dataset_inst):
-            continue
-
+    fired_masks = []
+
+    # evaluate all distinct legs at once on the flattened trigger objects
+    obj_masks, n_matches, counts = evaluate_trigger_legs(
+        events.TrigObj,
+        self.leg_pdg_ids,
+        self.leg_min_pts,
+        self.leg_bit_masks,
+    )
+    # per-event local index of all flat objects to convert leg masks to indices
+    local_index = np.arange(len(obj_masks)) - np.repeat(np.cumsum(counts) - counts, counts)
+    leg_indices = [
+        ak.unflatten(local_index[obj_masks[:, i]], n_matches[:, i])
+        for i in range(len(self.leg_signatures))
+    ]
+
+    for trigger in self.triggers:
         # get bare decisions
         fired = events.HLT[trigger.hlt_field] == 1
         if trigger.run_range:
@@ -52,26 +173,12 @@ def trigger_selection(
             )
         any_fired = any_fired | fired
 
-        # get trigger objects for fired events per leg
+        # get trigger objects for fired events per leg, at least one object must match each leg
         leg_masks = {}
         all_legs_match = True
-        for key, leg in trigger.legs.items():
-            # start with a True mask
-            leg_mask = abs(events.TrigObj.id) >= 0
-            # pdg id selection
-            if leg.pdg_id is not None:
-                leg_mask = leg_mask & (abs(events.TrigObj.id) == leg.pdg_id)
-            # pt cut
-            if leg.min_pt is not None:
-                leg_mask = leg_mask & (events.TrigObj.pt >= leg.min_pt)
-            # trigger bits match
-            if leg.trigger_bits is not None:
-                # OR across bits themselves, AND between all decision in the list
-                for bits in leg.trigger_bits:
-                    leg_mask = leg_mask & ((events.TrigObj.filterBits & bits) > 0)
-            leg_masks[key] = index[leg_mask]
-            # at least one object must match this leg
-            all_legs_match = all_legs_match & ak.any(leg_mask, axis=1)
+        for key, i in self.trigger_leg_columns[trigger.id].items():
+            leg_masks[key] = leg_indices[i]
+            all_legs_match = all_legs_match & (n_matches[:, i] > 0)
 
         # final trigger decision
         fired_and_all_legs_match = fired & all_legs_match
@@ -79,13 +186,16 @@ def trigger_selection(
         # store all intermediate results for subsequent selectors
         trigger_data.append((trigger, fired_and_all_legs_match, leg_masks))
 
-        # store the trigger id
-        ids = ak.where(fired_and_all_legs_match, np.float32(trigger.id), np.float32(np.nan))
-        trigger_ids.append(ak.singletons(ak.nan_to_none(ids)))
+        # store the trigger decision
+        fired_masks.append(ak.to_numpy(fired_and_all_legs_match))
 
-    # store the fired trigger ids
-    trigger_ids = ak.concatenate(trigger_ids, axis=1)
-    events = set_ak_column(events, "fired_trigger_ids", trigger_ids, value_type=np.int32)
+    # store the fired triggers as bitsets and ids
+    fired_bits = self.trigger_bitset.encode(
+        np.stack(fired_masks, axis=1) if fired_masks else np.zeros((len(events), 0), dtype=bool),
+        [trigger.id for trigger in self.triggers],
+    )
+    events = set_ak_column(events, "fired_trigger_bits", fired_bits)
+    events = set_ak_column(events, "fired_trigger_ids", self.trigger_bitset.to_ids(fired_bits), value_type=np.int32)
     # If triggers are disabled let everything pass
     if getattr(self.config_inst.x, "disable_triggers", False):
         any_fired = ak.ones_like(events.run, dtype=bool)
@@ -98,9 +208,35 @@ def trigger_selection(
 
 @trigger_selection.init
 def trigger_selection_init(self: Selector, **kwargs) -> None:
-    # full used columns
-    self.uses |= {
-        opt(trigger.name)
-        for trigger in self.config_inst.x.triggers
+    self.triggers = [
+        trigger for trigger in self.config_inst.x.triggers
         if trigger.applies_to_dataset(self.dataset_inst)
-    }
+    ]
+
+    # full used columns
+    self.uses |= {opt(trigger.name) for trigger in self.triggers}
+
+    # bitset encoding of fired triggers, using the fixed bit of each trigger
+    self.trigger_bitset = TriggerBitset(self.config_inst.x.triggers)
+
+    # distinct leg signatures and the index of each trigger leg among them
+    self.leg_signatures = []
+    self.trigger_leg_columns = {}
+    for trigger in self.triggers:
+        self.trigger_leg_columns[trigger.id] = {}
+        for key, leg in trigger.legs.items():
+            signature = leg_signature(leg)
+            if signature not in self.leg_signatures:
+                self.leg_signatures.append(signature)
+            self.trigger_leg_columns[trigger.id][key] = self.leg_signatures.index(signature)
+
+
+@trigger_selection.setup
+def trigger_selection_setup(self: Selector, task: law.Task, **kwargs) -> None:
+    # leg requirements as arrays for the vectorized leg evaluation
+    n_bits = max([len(bits or ()) for _, _, bits in self.leg_signatures] + [1])
+    self.leg_pdg_ids = np.array([-1 if pdg_id is None else pdg_id for pdg_id, _, _ in self.leg_signatures])
+    self.leg_min_pts = np.array([-np.inf if min_pt is None else min_pt for _, min_pt, _ in self.leg_signatures])
+    self.leg_bit_masks = np.full((len(self.leg_signatures), n_bits), -1, dtype=np.int64)
+    for i, (_, _, bits) in enumerate(self.leg_signatures):
+        self.leg_bit_masks[i, :len(bits or ())] = bits or ()
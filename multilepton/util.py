@@ -8,14 +8,16 @@ from __future__ import annotations
 
 __all__ = []
 
+import time
 import functools
 
-from columnflow.types import Any
-from columnflow.columnar_util import ArrayFunction, deferred_column
+from columnflow.types import Any, Callable, Sequence
+from columnflow.columnar_util import ArrayFunction, Route, deferred_column, has_ak_column
 from columnflow.util import maybe_import
 
 np = maybe_import("numpy")
 ak = maybe_import("awkward")
+hist = maybe_import("hist")
 
 
 @deferred_column
@@ -237,3 +239,178 @@ def uppercase_wp(wp: str) -> str:
     if base not in {"loose", "tight"}:
         raise ValueError(f"unknown working point for uppercase conversion: {wp}")
     return "V" * n_v + base.capitalize()
+
+
+def columns_identical(events_a: ak.Array, events_b: ak.Array, columns: Sequence[str]) -> list[str]:
+    """
+    Compares *columns* of *events_a* and *events_b* byte by byte, i.e., their form and all their packed buffers, and
+    returns the names of the columns that differ or that are missing in one of the arrays.
+    """
+    differing = []
+    for column in columns:
+        route = Route(column)
+        if not (has_ak_column(events_a, route) and has_ak_column(events_b, route)):
+            differing.append(column)
+            continue
+        form_a, len_a, buffers_a = ak.to_buffers(ak.to_packed(route.apply(events_a)))
+        form_b, len_b, buffers_b = ak.to_buffers(ak.to_packed(route.apply(events_b)))
+        if (
+            form_a.to_dict() != form_b.to_dict() or
+            len_a != len_b or
+            buffers_a.keys() != buffers_b.keys() or
+            any(bytes(buffers_a[key]) != bytes(buffers_b[key]) for key in buffers_a)
+        ):
+            differing.append(column)
+    return differing
+
+
+def column_bytes_per_event(events: ak.Array, columns: Sequence[str | Route]) -> dict[str, float]:
+    """
+    Returns the average number of bytes per event of the flat values of each of the *columns* that exist in *events*,
+    i.e., the payload that is read for them, not counting offsets that might be shared with other columns.
+    """
+    if not len(events):
+        return {}
+    sizes = {}
+    for column in columns:
+        route = Route(column)
+        if not has_ak_column(events, route):
+            continue
+        values = ak.to_numpy(ak.flatten(route.apply(events), axis=None))
+        sizes[route.column] = values.nbytes / len(events)
+    return sizes
+
+
+def benchmark(func: Callable, *args, repeat: int = 3, **kwargs) -> tuple[Any, float]:
+    """
+    Calls *func* with *args* and *kwargs* *repeat* times and returns the result of the last call and the fastest
+    wall time in seconds.
+    """
+    result, best = None, float("inf")
+    for _ in range(max(repeat, 1)):
+        t0 = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - t0)
+    return result, best
+
+
+def process_id_index(process_ids: np.ndarray, process_id: np.ndarray) -> np.ndarray:
+    """
+    Returns the index of each *process_id* in the sorted array of unique *process_ids*, and ``len(process_ids)`` for
+    ids that are not contained, so that the result can be used to gather rows of dense lookup tables that have one
+    additional row with default values at the end.
+    """
+    process_id = np.asarray(process_id)
+    n = len(process_ids)
+    if not n:
+        return np.zeros(len(process_id), dtype=np.int64)
+    index = np.searchsorted(process_ids, process_id)
+    found = process_ids[np.minimum(index, n - 1)] == process_id
+    return np.where(found, index, n)
+
+
+def _grow_values(h: hist.Hist, data: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    # distinct values that grow axes in the same way a fill with data would, i.e., categories in order of first
+    # appearance, and extreme values of continuous axes, padded to the same length
+    values = []
+    for ax in h.axes:
+        if not ax.traits.growth:
+            values.append(data[ax.name][:1])
+        elif ax.traits.discrete and not ax.traits.ordered:
+            uniques, first = np.unique(data[ax.name], return_index=True)
+            values.append(uniques[np.argsort(first)])
+        else:
+            values.append(np.array([data[ax.name].min(), data[ax.name].max()]))
+    n = max(map(len, values))
+    return {ax.name: np.concatenate([v, np.repeat(v[:1], n - len(v))]) for ax, v in zip(h.axes, values)}
+
+
+def _flat_index(h: hist.Hist, data: dict[str, np.ndarray]) -> np.ndarray | None:
+    # flat indices of data into the storage of h including flow bins, or None when growing axes need to grow first
+    bin_indices = []
+    for ax in h.axes:
+        values = data[ax.name]
+        if ax.traits.discrete and not ax.traits.ordered:
+            categories = np.asarray(list(ax))
+            order = np.argsort(categories)
+            index = process_id_index(categories[order], values)
+            complete = bool(np.all(index < len(categories)))
+            if len(categories):
+                index = np.append(order, len(categories))[index]
+        else:
+            index = np.asarray(ax.index(values))
+            complete = bool(np.all((index >= 0) & (index < len(ax))))
+        if ax.traits.growth and not complete:
+            return None
+        bin_indices.append(index + int(ax.traits.underflow))
+    return np.ravel_multi_index(bin_indices, h.axes.extent)
+
+
+def fill_hists(
+    hists: Sequence[hist.Hist],
+    data: dict[str, np.ndarray],
+    weights: Sequence[np.ndarray] | None = None,
+) -> None:
+    """
+    Fills all *hists* with the same axis *data*, either with unit weights or with one of the *weights* per histogram,
+    in a single accumulation pass per set of identical axes. Bin indices are only computed once, and weights are added
+    to the storages sequentially in the order of *data*, so that contents are identical to individual fills. Values on
+    the upper-most edge of variable axes are not shifted.
+    """
+    data = {name: np.asarray(values) for name, values in data.items()}
+    if not hists or not len(next(iter(data.values()))):
+        return
+
+    # group histograms with identical axes, and compute flat indices into their storages including flow bins once per
+    # group, growing axes first when needed by filling the distinct values with zero weight
+    groups: list[tuple[Any, np.ndarray, list[int]]] = []
+    find_group = lambda axes: next((group for group in groups if group[0] == axes), None)
+    grow_data = None
+    growing_axes = []
+    for i, h in enumerate(hists):
+        if (group := find_group(h.axes)) is None and (
+            h.axes in growing_axes or
+            (flat_index := _flat_index(h, data)) is None
+        ):
+            growing_axes.append(h.axes)
+            if grow_data is None:
+                grow_data = _grow_values(h, data)
+            h.fill(**grow_data, weight=np.zeros(len(next(iter(grow_data.values())))))
+            if (group := find_group(h.axes)) is None:
+                flat_index = _flat_index(h, data)
+        if group is None:
+            groups.append(group := (h.axes, flat_index, []))
+        group[2].append(i)
+
+    get = lambda view, field: view if field is None else getattr(view, field)
+    for axes, flat_index, indices in groups:
+        size = int(np.prod(axes.extent))
+        views = [hists[i].view(flow=True) for i in indices]
+        fields = ("value", "variance") if hasattr(views[0], "value") else (None,)
+
+        if weights is None:
+            # unit weights, for which counting is exact
+            counts = np.bincount(flat_index, minlength=size).reshape(axes.extent)
+            for view in views:
+                for field in fields:
+                    get(view, field)[...] += counts
+            continue
+
+        # accumulate all weights sequentially in one pass over a flat histogram of the stacked storages, offset per
+        # histogram (a plain bincount would add the sum of weights per bin to the previous content, which is not
+        # bitwise identical to the sequential fill)
+        acc = hist.Hist(
+            hist.axis.Integer(0, len(indices) * size, underflow=False, overflow=False),
+            storage=hist.storage.Weight() if fields[0] else hist.storage.Double(),
+        )
+        acc_view = acc.view()
+        for field in fields:
+            get(acc_view, field)[...] = np.concatenate([get(view, field).reshape(-1) for view in views])
+        acc.fill(
+            (np.arange(len(indices))[:, None] * size + flat_index[None, :]).reshape(-1),
+            weight=np.concatenate([np.asarray(weights[i], dtype=np.float64) for i in indices]),
+        )
+        for field in fields:
+            values = get(acc_view, field).reshape(len(indices), *axes.extent)
+            for view, _values in zip(views, values):
+                get(view, field)[...] = _values
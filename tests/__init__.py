@@ -16,4 +16,19 @@ sys.path.append(base)
 import multilepton  # noqa
 
 # import all tests
-# ...
+from .test_onnx_backend import *
+from .test_lepton_selection import *
+from .test_hhbtag import *
+from .test_res_networks import *
+from .test_result_cache import *
+from .test_ml_base import *
+from .test_trigger_sf import *
+from .test_tau import *
+from .test_weights import *
+from .test_selection_stats import *
+from .test_processes import *
+from .test_util import *
+from .test_muon_mva import *
+from .test_trigger import *
+from .test_delta_r import *
+from .test_tf_evaluator import *
@@ -0,0 +1,186 @@
+# coding: utf-8
+
+
+__all__ = ["TriggerObjectMatchingTest", "MinDeltaRTest"]
+
+import unittest
+import importlib.util
+
+import numpy as np
+import awkward as ak
+
+from multilepton.selection.lepton import trigger_object_matching, trigger_object_matching_legs, min_delta_r
+
+
+def random_vectors(rng, counts, name="PtEtaPhiMLorentzVector"):
+    """
+    Returns random vectors with *counts* objects per event, with eta and phi values on a coarse grid so that
+    pairs at exactly the delta R thresholds occur, and phi values close to and at the +-pi boundary.
+    """
+    from coffea.nanoevents.methods import vector
+
+    n = int(np.sum(counts))
+    eta = rng.choice(np.arange(-2.5, 2.51, 0.1), size=n)
+    coarse = rng.random(n) < 0.5
+    eta[coarse] = rng.choice(np.arange(-2.0, 2.01, 0.25), size=coarse.sum())
+    phi = rng.uniform(-np.pi, np.pi, size=n)
+    grid = rng.random(n) < 0.5
+    phi[grid] = rng.choice(np.concatenate([
+        np.arange(-3.0, 3.01, 0.25), [-np.pi, np.pi, np.pi - 0.2, -np.pi + 0.3, -np.pi + 0.1],
+    ]), size=grid.sum())
+    return ak.unflatten(ak.zip({
+        "pt": np.full(n, 40.0, dtype=np.float32),
+        "eta": eta.astype(np.float32),
+        "phi": phi.astype(np.float32),
+        "mass": np.zeros(n, dtype=np.float32),
+    }, with_name=name, behavior=vector.behavior), counts)
+
+
+def old_trigger_object_matching(vectors1, vectors2, threshold=0.5, event_mask=None):
+    """
+    Previous metric table based matching of objects in *vectors1* against objects in *vectors2*.
+    """
+    used_event_mask = event_mask is not None and event_mask is not Ellipsis
+    event_mask = Ellipsis if event_mask is None else event_mask
+    dr = vectors1[event_mask].metric_table(vectors2[event_mask])
+    any_match = ak.any(dr < threshold, axis=2)
+    if used_event_mask:
+        full_any_match = ak.zeros_like(vectors1.pt, dtype=bool)
+        flat_full_any_match = ak.to_numpy(ak.flatten(full_any_match)).copy()
+        flat_full_any_match[ak.to_numpy(ak.flatten(ak.ones_like(vectors1.pt, dtype=bool) & event_mask))] = (
+            ak.to_numpy(ak.flatten(any_match))
+        )
+        any_match = ak.unflatten(flat_full_any_match, ak.num(vectors1, axis=1))
+    return any_match
+
+
+@unittest.skipUnless(importlib.util.find_spec("coffea") is not None, "coffea not available")
+class TriggerObjectMatchingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = np.random.default_rng(4)
+        n_events = 3000
+        # leptons, with some events without any
+        counts1 = self.rng.integers(0, 4, size=n_events)
+        counts1[:20] = 0
+        self.leptons = random_vectors(self.rng, counts1)
+        # trigger objects of three legs, including events without any and events with many
+        self.legs = []
+        for _ in range(3):
+            counts2 = self.rng.integers(0, 6, size=n_events)
+            counts2[10:30] = 0
+            counts2[-10:] = 30
+            self.legs.append(random_vectors(self.rng, counts2))
+        self.event_mask = ak.Array(self.rng.random(n_events) < 0.7)
+
+    def test_exact_thresholds(self):
+        # objects exactly at the threshold in eta, across the phi boundary and within and outside the threshold
+        from coffea.nanoevents.methods import vector
+
+        def make(eta, phi):
+            return ak.zip({
+                "pt": np.full((len(eta), 1), 40.0, dtype=np.float32),
+                "eta": np.array(eta, dtype=np.float32)[:, None],
+                "phi": np.array(phi, dtype=np.float32)[:, None],
+                "mass": np.zeros((len(eta), 1), dtype=np.float32),
+            }, with_name="PtEtaPhiMLorentzVector", behavior=vector.behavior)
+
+        leptons = make([0.0, 0.0, 1.0, 0.0, 0.0, 0.0], [0.0, np.pi - 0.2, 0.0, np.pi, -np.pi, 2.9])
+        trig_objs = make([0.5, 0.0, 0.5, 0.0, 0.0, 0.0], [0.0, -np.pi + 0.2, 0.0, -np.pi + 0.4, np.pi, -2.7])
+        expected = old_trigger_object_matching(leptons, trig_objs)
+        self.assertEqual(ak.flatten(expected).tolist(), [False, True, False, True, True, False])
+        self.assertEqual(trigger_object_matching(leptons, trig_objs).tolist(), expected.tolist())
+
+    def test_legs(self):
+        for threshold in [0.5, 0.25]:
+            for event_mask in [None, Ellipsis, self.event_mask]:
+                matches = trigger_object_matching_legs(
+                    self.leptons, self.legs, threshold=threshold, event_mask=event_mask,
+                )
+                self.assertEqual(len(matches), len(self.legs))
+                for leg, leg_matches in zip(self.legs, matches):
+                    expected = old_trigger_object_matching(
+                        self.leptons, leg, threshold=threshold, event_mask=event_mask,
+                    )
+                    self.assertEqual(leg_matches.tolist(), expected.tolist())
+                    # all cases occur
+                    self.assertTrue(ak.any(leg_matches))
+                    self.assertFalse(ak.all(leg_matches))
+
+    def test_axis(self):
+        for leg in self.legs:
+            self.assertEqual(
+                trigger_object_matching(self.leptons, leg, axis=1, event_mask=self.event_mask).tolist(),
+                old_trigger_object_matching(leg, self.leptons, event_mask=self.event_mask).tolist(),
+            )
+
+    def test_empty(self):
+        empty = self.leptons[:, :0]
+        self.assertEqual(trigger_object_matching_legs(self.leptons, []), [])
+        self.assertEqual(
+            trigger_object_matching_legs(self.leptons, [empty])[0].tolist(),
+            ak.zeros_like(self.leptons.pt, dtype=bool).tolist(),
+        )
+        self.assertEqual(
+            trigger_object_matching_legs(empty, self.legs)[0].tolist(),
+            [[] for _ in range(len(empty))],
+        )
+        self.assertEqual(trigger_object_matching_legs(self.leptons[:0], self.legs[:1])[0].tolist(), [])
+
+
+@unittest.skipUnless(importlib.util.find_spec("coffea") is not None, "coffea not available")
+class MinDeltaRTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        n_events = 3000
+        self.jets = random_vectors(rng, rng.integers(0, 8, size=n_events))
+        self.fatjets = random_vectors(rng, rng.integers(0, 3, size=n_events))
+        # selected taus, muons and electrons, with events without any lepton and with only one kind of them
+        self.leptons = []
+        for i in range(3):
+            counts = rng.integers(0, 3, size=n_events)
+            counts[:100] = 0
+            counts[100 + 50 * i:150 + 50 * i] = 0
+            self.leptons.append(random_vectors(rng, counts))
+        n_leptons = sum(ak.to_numpy(ak.num(leptons, axis=1)) for leptons in self.leptons)
+        self.no_leptons = n_leptons == 0
+        self.assertTrue(np.any(self.no_leptons))
+
+    def test_min_delta_r(self):
+        min_dr = min_delta_r(self.jets, self.leptons)
+        self.assertEqual(ak.num(min_dr, axis=1).tolist(), ak.num(self.jets, axis=1).tolist())
+
+        # minimum over the metric tables of all collections
+        expected = ak.min(ak.concatenate([self.jets.metric_table(leptons) for leptons in self.leptons], axis=2),
+            axis=2)
+        flat_min_dr = ak.to_numpy(ak.flatten(min_dr))
+        flat_expected = ak.to_numpy(ak.flatten(ak.fill_none(expected, np.inf)))
+        np.testing.assert_array_equal(flat_min_dr, flat_expected)
+
+        # inf for jets in events without leptons, stored as EMPTY_FLOAT by the jet selection
+        no_leptons = ak.to_numpy(ak.flatten(ak.broadcast_arrays(self.no_leptons, self.jets.pt)[0]))
+        self.assertTrue(np.all(np.isinf(flat_min_dr[no_leptons])))
+        self.assertTrue(np.all(np.isfinite(flat_min_dr[~no_leptons])))
+        self.assertGreater(np.sum(no_leptons), 0)
+
+    def test_cleaning_masks(self):
+        # ak4 and ak8 jet cleaning as done by the jet selection before the introduction of min_delta_r
+        for jets, threshold in [(self.jets, 0.5), (self.fatjets, 0.8)]:
+            old_mask = (
+                ak.all(jets.metric_table(self.leptons[0]) > threshold, axis=2) &
+                ak.all(jets.metric_table(self.leptons[1]) > threshold, axis=2) &
+                ak.all(jets.metric_table(self.leptons[2]) > threshold, axis=2)
+            )
+            mask = min_delta_r(jets, self.leptons) > threshold
+            self.assertEqual(mask.tolist(), old_mask.tolist())
+            # jets in events without leptons are kept, and others are removed
+            self.assertTrue(ak.all(mask[self.no_leptons]))
+            self.assertFalse(ak.all(mask))
+
+    def test_empty(self):
+        self.assertEqual(min_delta_r(self.jets[:0], [leptons[:0] for leptons in self.leptons]).tolist(), [])
+        self.assertEqual(
+            min_delta_r(self.jets, [leptons[:, :0] for leptons in self.leptons]).tolist(),
+            ak.full_like(self.jets.pt, np.inf).tolist(),
+        )
@@ -0,0 +1,97 @@
+# coding: utf-8
+
+
+__all__ = ["FeatureTensorTest"]
+
+import unittest
+
+import numpy as np
+import awkward as ak
+
+from multilepton.production.hhbtag import build_feature_tensor
+
+
+def split(input_features, where, n_jets_max):
+    """
+    Previous assembly of the hhbtag inputs of events in *where*, with missing jets set to zero.
+    """
+    features = ak.concatenate(
+        [
+            ak.values_astype(ak.fill_none(f[where], 0)[..., None], np.float32)
+            for f in input_features
+        ],
+        axis=2,
+    )
+    features = ak.fill_none(
+        ak.pad_none(features, n_jets_max, axis=1),
+        np.zeros(len(input_features), dtype=np.float32),
+        axis=1,
+    )
+    features = features[..., list(range(len(input_features)))]
+    return ak.to_numpy(features)
+
+
+class FeatureTensorTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.n_jets_max = 10
+        n_events = 1000
+
+        # jets with missing entries, and per-event features of different types
+        counts = rng.integers(0, self.n_jets_max + 1, size=n_events)
+        n_jets = counts.sum()
+        valid = ak.unflatten(rng.random(n_jets) > 0.1, counts)
+        self.counts = counts
+        self.jet_pt = ak.mask(ak.unflatten(rng.exponential(50.0, n_jets) + 20.0, counts), valid)
+        self.jet_eta = ak.mask(ak.unflatten(rng.uniform(-2.5, 2.5, n_jets), counts), valid)
+        self.jet_shape = abs(self.jet_pt) >= 0
+        self.htt_pt = rng.exponential(80.0, n_events)
+        self.channel = rng.integers(0, 6, size=n_events)
+        self.even_mask = rng.random(n_events) > 0.5
+
+    def test_build_feature_tensor(self):
+        jet_inputs = [self.jet_shape * 1, self.jet_pt, self.jet_eta]
+        event_features = [self.htt_pt, self.channel]
+        flat = lambda values: ak.to_numpy(ak.fill_none(ak.flatten(values, axis=1), 0))
+        jet_features = [flat(f) for f in jet_inputs]
+
+        tensor, jet_rows = build_feature_tensor(
+            jet_features,
+            event_features,
+            self.counts,
+            self.n_jets_max,
+            event_order=np.argsort(~self.even_mask, kind="stable"),
+            jet_valid=jet_features[0].astype(bool),
+        )
+
+        # identical to the previous per-parity assembly, with even events first
+        input_features = jet_inputs + [self.jet_shape * f for f in event_features]
+        expected = np.concatenate([
+            split(input_features, self.even_mask, self.n_jets_max),
+            split(input_features, ~self.even_mask, self.n_jets_max),
+        ])
+        self.assertEqual(tensor.dtype, np.float32)
+        self.assertEqual(tensor.shape, expected.shape)
+        np.testing.assert_array_equal(tensor, expected)
+
+        # jet rows point to the features of each jet in the original event order
+        jet_values = tensor.reshape(-1, tensor.shape[-1])[jet_rows]
+        jet_events = np.repeat(np.arange(len(self.counts)), self.counts)
+        valid = jet_features[0].astype(bool)
+        np.testing.assert_array_equal(jet_values[:, :3], np.stack(jet_features, axis=1).astype(np.float32))
+        for i, values in enumerate(event_features, 3):
+            np.testing.assert_array_equal(jet_values[:, i], np.where(valid, values[jet_events], 0).astype(np.float32))
+
+    def test_no_event_order(self):
+        tensor, jet_rows = build_feature_tensor(
+            [ak.to_numpy(ak.fill_none(ak.flatten(self.jet_pt), 0))],
+            [self.htt_pt],
+            self.counts,
+            self.n_jets_max,
+        )
+        # without jet_valid, event features are also set for missing jets
+        all_jets = ak.unflatten(np.ones(self.counts.sum()), self.counts)
+        expected = split([self.jet_pt, all_jets * self.htt_pt], ..., self.n_jets_max)
+        np.testing.assert_array_equal(tensor, expected)
+        np.testing.assert_array_equal(jet_rows // self.n_jets_max, np.repeat(np.arange(len(self.counts)), self.counts))
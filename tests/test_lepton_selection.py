@@ -0,0 +1,373 @@
+# coding: utf-8
+
+
+__all__ = ["ChannelRulesTest", "LeptonSelectionTest"]
+
+import unittest
+import importlib.util
+
+import numpy as np
+import awkward as ak
+import order as od
+
+from columnflow.util import DotDict
+from columnflow.selection import SelectionResult
+
+from multilepton.config.util import Trigger, TriggerLeg
+from multilepton.selection.lepton import (
+    channel_rules, compile_channel_rules, evaluate_channel_rules, multiplicity_fields, lepton_selection_nano,
+    lepton_selection_gen_match, compare_lepton_selections, lepton_selection_columns, pruned_column_bytes,
+)
+from multilepton.util import columns_identical
+
+
+# variant that keeps all object selections for datasets that are not routed to any channel
+lepton_selection_nano_unpruned = lepton_selection_nano.derive("lepton_selection_nano_unpruned", cls_dict={
+    "prune_unreachable_columns": False,
+})
+
+
+# base selection, charge and tight selection conditions per channel as implemented by the if/elif ladder of the
+# lepton selection before the introduction of channel rules, given multiplicities *c* and charge sums *q*
+old_ladder = {
+    "c3e": (
+        lambda c: (c.e_ctrl == 3) & (c.e_veto == 3) & (c.mu_veto == 0) & (c.tau == 0),
+        lambda q: np.abs(q.e) == 1,
+        lambda c: c.e == 3,
+    ),
+    "c3mu": (
+        lambda c: (c.mu_ctrl == 3) & (c.mu_veto == 3) & (c.e_veto == 0) & (c.tau == 0),
+        lambda q: np.abs(q.mu) == 1,
+        lambda c: c.mu == 3,
+    ),
+    "c2emu": (
+        lambda c: (c.e_ctrl == 2) & (c.e_veto == 2) & (c.mu_ctrl == 1) & (c.mu_veto == 1) & (c.tau == 0),
+        lambda q: np.abs(q.e + q.mu) == 1,
+        lambda c: (c.e == 2) & (c.mu == 1),
+    ),
+    "ce2mu": (
+        lambda c: (c.e_ctrl == 1) & (c.e_veto == 1) & (c.mu_ctrl == 2) & (c.mu_veto == 2) & (c.tau == 0),
+        lambda q: np.abs(q.e + q.mu) == 1,
+        lambda c: (c.e == 1) & (c.mu == 2),
+    ),
+    "c4e": (
+        lambda c: (c.e_ctrl == 4) & (c.e_veto == 4) & (c.mu_veto == 0) & (c.tau == 0),
+        lambda q: np.abs(q.e) == 0,
+        lambda c: c.e == 4,
+    ),
+    "c4mu": (
+        lambda c: (c.mu_ctrl == 4) & (c.mu_veto == 4) & (c.e_veto == 0) & (c.tau == 0),
+        lambda q: np.abs(q.mu) == 0,
+        lambda c: c.mu == 4,
+    ),
+    "c3emu": (
+        lambda c: (c.e_ctrl == 3) & (c.e_veto == 3) & (c.mu_ctrl == 1) & (c.mu_veto == 1) & (c.tau == 0),
+        lambda q: np.abs(q.e + q.mu) == 0,
+        lambda c: (c.e == 3) & (c.mu == 1),
+    ),
+    "c2e2mu": (
+        lambda c: (c.e_ctrl == 2) & (c.e_veto == 2) & (c.mu_ctrl == 2) & (c.mu_veto == 2) & (c.tau == 0),
+        lambda q: np.abs(q.e + q.mu) == 0,
+        lambda c: (c.e == 2) & (c.mu == 2),
+    ),
+    "ce3mu": (
+        lambda c: (c.e_ctrl == 1) & (c.e_veto == 1) & (c.mu_ctrl == 3) & (c.mu_veto == 3) & (c.tau == 0),
+        lambda q: np.abs(q.e + q.mu) == 0,
+        lambda c: (c.e == 1) & (c.mu == 3),
+    ),
+    "c3etau": (
+        lambda c: (c.e_ctrl == 3) & (c.e_veto == 3) & (c.mu_veto == 0) & (c.tau == 1),
+        lambda q: (np.abs(q.tau + q.e) == 0) & (np.abs(q.e) == 1),
+        lambda c: (c.tau_iso == 1) & (c.e == 3),
+    ),
+    "c2e2tau": (
+        lambda c: (c.e_ctrl == 2) & (c.e_veto == 2) & (c.mu_veto == 0) & (c.tau == 2),
+        lambda q: (np.abs(q.tau + q.e) == 0) & (np.abs(q.e) == 0),
+        lambda c: (c.tau_iso == 2) & (c.e == 2),
+    ),
+    "ce3tau": (
+        lambda c: (c.e_ctrl == 1) & (c.e_veto == 1) & (c.mu_veto == 0) & (c.tau == 3),
+        lambda q: np.abs(q.tau + q.e) == 0,
+        lambda c: (c.tau_iso == 3) & (c.e == 1),
+    ),
+    "c3mutau": (
+        lambda c: (c.mu_ctrl == 3) & (c.mu_veto == 3) & (c.e_veto == 0) & (c.tau == 1),
+        lambda q: (np.abs(q.tau + q.mu) == 0) & (np.abs(q.mu) == 1),
+        lambda c: (c.tau_iso == 1) & (c.mu == 3),
+    ),
+    "c2mu2tau": (
+        lambda c: (c.mu_ctrl == 2) & (c.mu_veto == 2) & (c.e_veto == 0) & (c.tau == 2),
+        lambda q: (np.abs(q.tau + q.mu) == 0) & (np.abs(q.mu) == 0),
+        lambda c: (c.tau_iso == 2) & (c.mu == 2),
+    ),
+    "cmu3tau": (
+        lambda c: (c.mu_ctrl == 1) & (c.mu_veto == 1) & (c.e_veto == 0) & (c.tau == 3),
+        lambda q: np.abs(q.tau + q.mu) == 0,
+        lambda c: (c.tau_iso == 3) & (c.mu == 1),
+    ),
+    "c2emutau": (
+        lambda c: (c.e_ctrl == 2) & (c.e_veto == 2) & (c.mu_ctrl == 1) & (c.mu_veto == 1) & (c.tau == 1),
+        lambda q: (np.abs(q.tau + q.e + q.mu) == 0) & (np.abs(q.e + q.mu) == 1),
+        lambda c: (c.tau_iso == 1) & (c.e == 2) & (c.mu == 1),
+    ),
+    "ce2mutau": (
+        lambda c: (c.e_ctrl == 1) & (c.e_veto == 1) & (c.mu_ctrl == 2) & (c.mu_veto == 2) & (c.tau == 1),
+        lambda q: (np.abs(q.tau + q.e + q.mu) == 0) & (np.abs(q.e + q.mu) == 1),
+        lambda c: (c.tau_iso == 1) & (c.e == 1) & (c.mu == 2),
+    ),
+    "cemu2tau": (
+        lambda c: (c.e_ctrl == 1) & (c.e_veto == 1) & (c.mu_ctrl == 1) & (c.mu_veto == 1) & (c.tau == 2),
+        lambda q: (np.abs(q.tau + q.e + q.mu) == 0) & (np.abs(q.e + q.mu) == 0),
+        lambda c: (c.tau_iso == 2) & (c.e == 1) & (c.mu == 1),
+    ),
+    "c4tau": (
+        lambda c: (c.mu_veto == 0) & (c.e_veto == 0) & (c.tau == 4),
+        lambda q: np.abs(q.tau) == 0,
+        lambda c: c.tau_iso == 4,
+    ),
+    "c2e0or1tau": (
+        lambda c: (c.e_ctrl == 2) & (c.e_veto == 2) & (c.mu_veto == 0) & (c.tau <= 1),
+        lambda q: np.abs(q.e) == 0,
+        lambda c: c.e == 2,
+    ),
+    "c2mu0or1tau": (
+        lambda c: (c.mu_ctrl == 2) & (c.mu_veto == 2) & (c.e_veto == 0) & (c.tau <= 1),
+        lambda q: np.abs(q.mu) == 0,
+        lambda c: c.mu == 2,
+    ),
+    "cemu0or1tau": (
+        lambda c: (c.e_ctrl == 1) & (c.e_veto == 1) & (c.mu_ctrl == 1) & (c.mu_veto == 1) & (c.tau <= 1),
+        lambda q: np.abs(q.e + q.mu) == 0,
+        lambda c: (c.e == 1) & (c.mu == 1),
+    ),
+}
+
+
+class ChannelRulesTest(unittest.TestCase):
+
+    def test_rules_match_old_ladder(self):
+        self.assertEqual(set(old_ladder), set(channel_rules))
+
+        # random multiplicities and charge sums, plus the exact multiplicities of each channel
+        rng = np.random.default_rng(0)
+        n = 200000
+        counts = rng.integers(0, 5, size=(n, len(multiplicity_fields)))
+        for i, rule in enumerate(channel_rules.values()):
+            counts[i, :] = [rule.n_e] * 3 + [rule.n_mu] * 3 + [rule.n_tau] * 2
+        charges = rng.integers(-3, 4, size=(n, 3))
+        c = ak.Array(dict(zip(multiplicity_fields, counts.T)))
+        q = ak.Array(dict(zip(("e", "mu", "tau"), charges.T)))
+
+        ch_keys = list(channel_rules)
+        base, tight, charge_ok = evaluate_channel_rules(
+            compile_channel_rules([channel_rules[ch_key] for ch_key in ch_keys]),
+            counts,
+            charges,
+        )
+        for index, ch_key in enumerate(ch_keys):
+            old_base, old_charge, old_tight = old_ladder[ch_key]
+            old_base = ak.to_numpy(old_base(c))
+            self.assertGreater(old_base.sum(), 0, ch_key)
+            np.testing.assert_array_equal(base[:, index], old_base, err_msg=ch_key)
+            # charge and tight decisions were only taken for events passing the base selection
+            np.testing.assert_array_equal(
+                charge_ok[old_base, index],
+                ak.to_numpy(old_charge(q))[old_base],
+                err_msg=ch_key,
+            )
+            np.testing.assert_array_equal(
+                tight[old_base, index],
+                ak.to_numpy(old_tight(c))[old_base],
+                err_msg=ch_key,
+            )
+
+
+@unittest.skipUnless(importlib.util.find_spec("coffea") is not None, "coffea not available")
+class LeptonSelectionTest(unittest.TestCase):
+
+    # channel ids, taken from the analysis config
+    channel_ids = {
+        "c3e": 14, "c2emu": 15, "c4e": 18, "c3emu": 19, "c2e2mu": 20, "c3etau": 23, "c2e2tau": 27,
+        "c2e0or1tau": 33,
+    }
+
+    def setUp(self):
+        analysis_inst = od.Analysis("test_analysis", 1)
+        campaign_inst = od.Campaign("test_campaign", 1, ecm=13.6, aux={"year": 2022, "run": 3, "version": 14})
+        self.config_inst = config_inst = analysis_inst.add_config(campaign_inst)
+        for name, ch_id in self.channel_ids.items():
+            config_inst.add_channel(name=name, id=ch_id)
+        config_inst.x.channel_names = list(self.channel_ids)
+        config_inst.x.tau_tagger = "DeepTau2018v2p5"
+        config_inst.x.tau_id_working_points = DotDict.wrap({
+            "tau_vs_e": {"vvvloose": 1, "vvloose": 2, "vloose": 3, "loose": 4, "medium": 5, "tight": 6},
+            "tau_vs_jet": {"vvvloose": 1, "vvloose": 2, "vloose": 3, "loose": 4, "medium": 5, "tight": 6},
+            "tau_vs_mu": {"vloose": 1, "loose": 2, "medium": 3, "tight": 4},
+        })
+        config_inst.x.btag_working_points = {"deepJet": {"loose": 0.05, "medium": 0.25, "tight": 0.65}}
+        self.single_e = Trigger(
+            name="HLT_Ele30_WPTight_Gsf",
+            id=201,
+            legs={"e": TriggerLeg(pdg_id=11, min_pt=31.0)},
+            applies_to_dataset=lambda dataset_inst: True,
+            tags={"single_trigger", "single_e"},
+            bit=5,
+        )
+        self.double_e = Trigger(
+            name="HLT_Ele23_Ele12_CaloIdL_TrackIdL_IsoVL",
+            id=202,
+            legs={"e1": TriggerLeg(pdg_id=11, min_pt=23.0), "e2": TriggerLeg(pdg_id=11, min_pt=12.0)},
+            applies_to_dataset=lambda dataset_inst: True,
+            tags={"double_e"},
+            bit=3,
+        )
+        config_inst.x.triggers = od.UniqueObjectIndex(Trigger, [self.single_e, self.double_e])
+        self.dataset_inst = campaign_inst.add_dataset(name="data_e_c", id=1, is_data=True, tags={"ee"})
+
+    def make_selector(self, cls, dataset_inst=None):
+        inst = cls(inst_dict={
+            "analysis_inst": self.config_inst.analysis,
+            "config_inst": self.config_inst,
+            "dataset_inst": dataset_inst or self.dataset_inst,
+        })
+        inst.run_setup(task=None)
+        return inst
+
+    @staticmethod
+    def make_events(electrons, muons, taus, trig_objs):
+        from columnflow.columnar_util import attach_coffea_behavior
+
+        def collection(objects, defaults):
+            # jagged collection of *objects* given as dicts, with field types and default values taken from *defaults*
+            counts = [len(objs) for objs in objects]
+            return ak.unflatten(ak.zip({
+                field: np.array([obj.get(field, value) for objs in objects for obj in objs], dtype=type(value))
+                for field, value in defaults.items()
+            }), counts)
+
+        # objects passing all selections unless overwritten
+        events = ak.Array({
+            "event": np.arange(len(electrons), dtype=np.uint64),
+            "Electron": collection(electrons, {
+                "pt": 40.0, "eta": 0.5, "phi": 0.0, "mass": 0.0, "charge": 1, "dxy": 0.0, "dz": 0.0,
+                "pfRelIso03_all": 0.0, "seediEtaOriX": 0, "seediPhiOriY": 0, "sip3d": 1.0, "miniPFRelIso_all": 0.0,
+                "sieie": 0.01, "hoe": 0.0, "eInvMinusPInv": 0.0, "convVeto": True, "lostHits": 0,
+                "jetPtRelv2": 0.0, "jetIdx": -1, "promptMVA": 0.9, "mvaIso_WP80": True, "mvaIso_WP90": True,
+            }),
+            "Muon": collection(muons, {
+                "pt": 40.0, "eta": 1.0, "phi": -1.0, "mass": 0.1, "charge": 1, "looseId": True, "mediumId": True,
+                "tightId": True, "pfRelIso04_all": 0.0, "dxy": 0.0, "dz": 0.0, "sip3d": 1.0, "miniPFRelIso_all": 0.0,
+                "jetPtRelv2": 0.0, "jetIdx": -1, "promptMVA": 0.9,
+            }),
+            "Tau": collection(taus, {
+                "pt": 40.0, "eta": -1.0, "phi": 2.0, "mass": 1.0, "charge": 1, "dz": 0.0, "decayMode": 0,
+                "idDeepTau2018v2p5VSe": 6, "idDeepTau2018v2p5VSmu": 4, "idDeepTau2018v2p5VSjet": 6,
+                "rawDeepTau2018v2p5VSjet": 0.9,
+            }),
+            "Jet": collection([[]] * len(electrons), {"pt": 0.0, "eta": 0.0, "phi": 0.0, "mass": 0.0,
+                "btagDeepFlavB": 0.0}),
+            "TrigObj": collection(trig_objs, {"pt": 40.0, "eta": 0.5, "phi": 0.0}),
+        })
+        return attach_coffea_behavior(events)
+
+    def trigger_results(self, events, fired):
+        # all trigger objects belong to all legs
+        leg_masks = lambda trigger: {leg: ak.ones_like(events.TrigObj.pt, dtype=bool) for leg in trigger.legs}
+        return SelectionResult(aux={
+            "trigger_data": [
+                (trigger, ak.Array(np.asarray(fired[trigger.id], dtype=bool)), leg_masks(trigger))
+                for trigger in self.config_inst.x.triggers
+            ],
+        })
+
+    def test_channels(self):
+        e = lambda **kwargs: kwargs
+        electrons = [
+            # c3e, single electron trigger matched to the leading electron
+            [e(charge=1), e(charge=1, eta=-0.5, pt=30.0), e(charge=-1, eta=1.5, pt=20.0)],
+            # c4e, double electron trigger, which is not matched to electrons
+            [e(charge=1), e(charge=-1, eta=-0.5), e(charge=1, eta=1.5), e(charge=-1, eta=-1.5)],
+            # c2e0or1tau without taus, single electron trigger matched
+            [e(charge=1), e(charge=-1, eta=-0.5, pt=25.0)],
+            # c2e0or1tau with one tau, both triggers fired, only the single electron one matched
+            [e(charge=1), e(charge=-1, eta=-0.5, pt=25.0)],
+            # c2e2tau, single electron trigger matched
+            [e(charge=1), e(charge=-1, eta=-0.5, pt=25.0)],
+            # c3e whose single electron trigger object is not matched, and a failing electron
+            [e(charge=1, eta=1.0, pt=30.0), e(charge=1, eta=-0.5), e(charge=-1, eta=1.5, pt=20.0), e(pt=5.0)],
+            # no selected leptons
+            [e(promptMVA=0.1, mvaIso_WP80=False, mvaIso_WP90=False)],
+        ]
+        taus = [[], [], [], [{}], [{"charge": 1}, {"charge": -1, "phi": -2.0}], [], [{"pt": 15.0}]]
+        trig_objs = [[{}], [{}], [{}], [{}], [{}], [{"eta": -2.0, "phi": 3.0}], []]
+        fired = {201: [1, 0, 1, 1, 1, 1, 0], 202: [0, 1, 0, 1, 0, 0, 0]}
+
+        events = self.make_events(electrons, [[]] * len(electrons), taus, trig_objs)
+        trigger_results = self.trigger_results(events, fired)
+        reference = self.make_selector(lepton_selection_nano)
+        variant = self.make_selector(lepton_selection_gen_match)
+
+        # both variants produce identical columns on data, where gen matching is inactive
+        differing, times = compare_lepton_selections(reference, variant, events, trigger_results, repeat=1)
+        self.assertEqual(differing, [])
+        self.assertEqual(set(times), {reference.cls_name, variant.cls_name})
+
+        # expected channels, leptons and trigger matches of the old selection
+        events, results = reference(events, trigger_results)
+        ch = self.channel_ids
+        self.assertEqual(events.channel_id.tolist(), [ch["c3e"], ch["c4e"], ch["c2e0or1tau"], ch["c2e0or1tau"],
+            ch["c2e2tau"], ch["c3e"], 0])
+        self.assertEqual(results.steps["lepton"].tolist(), [True] * 6 + [False])
+        self.assertEqual(
+            results.objects.Electron.Electron.tolist(),
+            [[0, 1, 2], [0, 1, 2, 3], [0, 1], [0, 1], [0, 1], [1, 0, 2], []],
+        )
+        self.assertEqual(results.objects.Tau.Tau.tolist(), [[], [], [], [0], [0, 1], [], []])
+        self.assertEqual(events.leptons_os.tolist(), [True] * 6 + [False])
+        self.assertEqual(events.tight_sel.tolist(), [True] * 6 + [False])
+        self.assertEqual(events.trig_match.tolist(), [True, False, True, True, True, False, False])
+        # as in the old selection, the double electron trigger reuses the matching decision of the single electron
+        # trigger in channels without double electron matching conditions
+        self.assertEqual(events.matched_trigger_ids.tolist(), [[201], [], [201], [201], [201, 202], [], []])
+        self.assertEqual(
+            self.reference_bits(events.matched_trigger_ids),
+            ak.to_numpy(events.matched_trigger_bits).tolist(),
+        )
+
+    def reference_bits(self, matched_trigger_ids):
+        bits = {trigger.id: trigger.bit for trigger in self.config_inst.x.triggers}
+        return [[sum(1 << bits[tid] for tid in tids)] for tids in matched_trigger_ids.tolist()]
+
+    def test_unrouted_dataset(self):
+        # the tau stream is not routed to any of the configured channels
+        dataset_inst = self.config_inst.campaign.add_dataset(name="data_tau_c", id=2, is_data=True, tags={"tautau"})
+        reference = self.make_selector(lepton_selection_nano_unpruned, dataset_inst)
+        pruned = self.make_selector(lepton_selection_nano, dataset_inst)
+        self.assertTrue(self.make_selector(lepton_selection_nano).select_objects)
+        self.assertTrue(reference.select_objects)
+        self.assertFalse(pruned.select_objects)
+
+        # columns of the object selections are not read anymore
+        columns = {route.column for route in pruned.used_columns}
+        self.assertLess(columns, {route.column for route in reference.used_columns})
+        self.assertTrue({"Electron.promptMVA", "Muon.promptMVA", "Tau.rawDeepTau2018v2p5VSjet"}.isdisjoint(columns))
+        self.assertTrue({"Electron.pt", "Muon.pt", "Tau.pt", "Tau.dz"} <= columns)
+
+        e = lambda **kwargs: kwargs
+        electrons = [[e(charge=1), e(charge=1, eta=-0.5, pt=30.0), e(charge=-1, eta=1.5, pt=20.0)], [e()], []]
+        taus = [[{}], [{"pt": 15.0}, {"eta": 0.0}], []]
+        events = self.make_events(electrons, [[]] * 3, taus, [[{}], [{}], []])
+        trigger_results = self.trigger_results(events, {201: [1, 0, 0], 202: [0, 1, 0]})
+
+        # identical outputs, without any selected leptons
+        events_ref, _ = reference(events, trigger_results)
+        events_pruned, results = pruned(events, trigger_results)
+        self.assertEqual(columns_identical(events_ref, events_pruned, lepton_selection_columns), [])
+        self.assertEqual(events_pruned.channel_id.tolist(), [0, 0, 0])
+        self.assertEqual(results.objects.Tau.TauNoID.tolist(), [[0], [1], []])
+
+        # bytes per event of the skipped columns
+        sizes = pruned_column_bytes(reference, pruned, events)
+        self.assertIn("Electron.promptMVA", sizes)
+        self.assertNotIn("Electron.pt", sizes)
+        self.assertEqual(sizes["Electron.promptMVA"], 4 * 8 / 3)
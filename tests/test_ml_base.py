@@ -0,0 +1,104 @@
+# coding: utf-8
+
+
+from __future__ import annotations
+
+__all__ = ["PrefetchMLModelTest"]
+
+import time
+import threading
+import unittest
+
+import numpy as np
+import awkward as ak
+import order as od
+
+from multilepton.ml.base import PrefetchMLModel
+
+
+class FixtureModel(PrefetchMLModel):
+
+    def __init__(self, *args, fail_at: int | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fail_at = fail_at
+        self.lock = threading.Lock()
+        self.prepared = 0
+        self.predicted = 0
+        self.max_ahead = 0
+        self.threads = set()
+
+    def sandbox(self, task):
+        return None
+
+    def datasets(self, config_inst):
+        return set()
+
+    def uses(self, config_inst):
+        return {"Jet.pt"}
+
+    def produces(self, config_inst):
+        return {"score", "n_jets"}
+
+    def output(self, task):
+        return None
+
+    def open_model(self, target):
+        return None
+
+    def train(self, task, input, output):
+        return None
+
+    def prepare_features(self, task, events, fold_indices):
+        if self.fail_at is not None and self.prepared == self.fail_at:
+            raise ValueError("preparation failed")
+        features = np.stack([ak.to_numpy(ak.sum(events.Jet.pt, axis=1)), fold_indices], axis=1)
+        with self.lock:
+            self.prepared += 1
+            self.max_ahead = max(self.max_ahead, self.prepared - self.predicted)
+            self.threads.add(threading.current_thread().name)
+        return features
+
+    def predict(self, task, features, models, fold_indices, events_used_in_training=False):
+        # slow inference, so that preparation can run ahead
+        time.sleep(0.005)
+        with self.lock:
+            self.predicted += 1
+        return {"score": (features[:, 0] * (fold_indices + 1)).astype(np.float32), "n_jets": features[:, 1]}
+
+
+class PrefetchMLModelTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        counts = rng.integers(0, 5, size=1003)
+        self.events = ak.Array({"Jet": ak.unflatten(ak.zip({"pt": rng.exponential(50.0, counts.sum())}), counts)})
+        self.fold_indices = ak.Array(rng.integers(0, 2, size=len(counts)))
+        self.expected = (ak.to_numpy(ak.sum(self.events.Jet.pt, axis=1)) * (self.fold_indices + 1)).to_numpy()
+        self.analysis_inst = od.Analysis("analysis", 1)
+
+    def evaluate(self, model, events=None):
+        return model.evaluate(None, self.events if events is None else events, [], self.fold_indices)
+
+    def test_evaluate(self):
+        for depth in (0, 1, 3):
+            model = FixtureModel(self.analysis_inst, prefetch_batch_size=100, prefetch_queue_depth=depth)
+            events = self.evaluate(model)
+            np.testing.assert_array_equal(events.score, self.expected.astype(np.float32))
+            np.testing.assert_array_equal(events.n_jets, self.fold_indices)
+            self.assertEqual(model.prepared, 11)
+
+            # prepared batches ahead of the evaluation are bounded by the queue depth, plus the one
+            # being put and the one being evaluated
+            self.assertLessEqual(model.max_ahead, depth + 2)
+            self.assertEqual(model.threads != {threading.current_thread().name}, depth > 0)
+
+    def test_empty_events(self):
+        model = FixtureModel(self.analysis_inst)
+        events = model.evaluate(None, self.events[:0], [], self.fold_indices[:0])
+        self.assertEqual(len(events.score), 0)
+
+    def test_failed_preparation(self):
+        model = FixtureModel(self.analysis_inst, prefetch_batch_size=100, fail_at=4)
+        with self.assertRaises(ValueError):
+            self.evaluate(model)
+        self.assertEqual(model.predicted, 4)
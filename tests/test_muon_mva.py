@@ -0,0 +1,210 @@
+# coding: utf-8
+
+
+__all__ = ["FoldedMuonMVATest", "MuonMVACacheTest"]
+
+import os
+import json
+import pickle
+import shutil
+import tempfile
+import unittest
+import importlib.util
+from unittest import mock
+
+import numpy as np
+import awkward as ak
+
+from multilepton.selection import muon_mva
+from multilepton.selection.muon_mva import MuonMVAEvaluator, convert_muon_mva, load_muon_mva
+
+
+@unittest.skipUnless(
+    importlib.util.find_spec("xgboost") is not None and importlib.util.find_spec("sklearn") is not None,
+    "xgboost or sklearn not available",
+)
+class MuonMVATestBase(unittest.TestCase):
+
+    features = ["pt", "eta", "dxy", "sip3d"]
+
+    def setUp(self):
+        import xgboost as xgb
+        from sklearn.preprocessing import StandardScaler
+
+        # small classifier trained behind a standard scaler, as done for the custom muon mva
+        rng = np.random.default_rng(0)
+        n = 2000
+        X = np.stack([
+            rng.exponential(20.0, n) + 5.0,
+            rng.uniform(-2.4, 2.4, n),
+            rng.normal(0.0, 0.02, n),
+            rng.exponential(2.0, n),
+        ], axis=1).astype(np.float32)
+        y = ((X[:, 0] > 20) & (X[:, 3] < 3) | (np.abs(X[:, 1]) < 0.5) | (X[:, 2] > 0.03)).astype(int)
+        scaler = StandardScaler().fit(X)
+        model = xgb.XGBClassifier(n_estimators=20, max_depth=3, learning_rate=0.3, random_state=0)
+        model.fit(scaler.transform(X), y)
+        self.X = X
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+        self.paths = self.write_artifacts(model, scaler, self.features, "model_a")
+
+    def write_artifacts(self, model, scaler, features, name):
+        paths = []
+        for kind, obj in [("model", model), ("scaler", scaler), ("features", features)]:
+            path = os.path.join(self.tmp_dir, f"{name}_{kind}.pkl")
+            with open(path, "wb") as f:
+                pickle.dump(obj, f)
+            paths.append(path)
+        return tuple(paths)
+
+
+class FoldedMuonMVATest(MuonMVATestBase):
+
+    def split_thresholds(self, booster):
+        # raw thresholds per feature of all splits of the booster
+        model = json.loads(booster.save_raw(raw_format="json"))
+        thresholds = [[] for _ in self.features]
+        for tree in model["learner"]["gradient_booster"]["model"]["trees"]:
+            for left, index, cond in zip(tree["left_children"], tree["split_indices"], tree["split_conditions"]):
+                if left != -1:
+                    thresholds[index].append(np.float32(cond))
+        return thresholds
+
+    def test_folded_predictions(self):
+        native = MuonMVAEvaluator.from_pickles(*self.paths, native=True)
+        reference = MuonMVAEvaluator.from_pickles(*self.paths, native=False)
+        self.assertTrue(native.scaler_folded)
+        self.assertIsNone(native.scaler)
+
+        # training inputs, plus inputs exactly on and next to every split threshold of the folded booster
+        rng = np.random.default_rng(1)
+        X = [self.X]
+        for index, thresholds in enumerate(self.split_thresholds(native.booster)):
+            self.assertTrue(thresholds, self.features[index])
+            for threshold in thresholds:
+                for value in (
+                    threshold,
+                    np.nextafter(threshold, np.float32(-np.inf)),
+                    np.nextafter(threshold, np.float32(np.inf)),
+                ):
+                    row = self.X[rng.integers(len(self.X), size=4)].copy()
+                    row[:, index] = value
+                    X.append(row)
+        X = np.concatenate(X, axis=0)
+
+        scores = native.predict(X)
+        expected = reference.model.predict_proba(reference.scaler.transform(X.astype(np.float64)))[:, 1]
+        self.assertEqual(scores.dtype, np.float32)
+        np.testing.assert_array_equal(scores, expected.astype(np.float32))
+
+    def test_score_cache(self):
+        native = MuonMVAEvaluator.from_pickles(*self.paths, native=True)
+        rng = np.random.default_rng(2)
+        counts = rng.integers(0, 4, size=300)
+        n = counts.sum()
+        muons = {
+            "pt": self.X[:n, 0], "eta": self.X[:n, 1], "dxy": self.X[:n, 2], "sip3d": self.X[:n, 3],
+        }
+        events = ak.Array({"Muon": ak.unflatten(ak.zip(muons), counts)})
+        shifted_muons = dict(muons, pt=muons["pt"] * np.float32(1.01))
+        shifted = ak.Array({"Muon": ak.unflatten(ak.zip(shifted_muons), counts)})
+
+        with mock.patch.object(native, "predict", wraps=native.predict) as predict:
+            scores = native(events)
+            # hit, also for a copy of the same inputs
+            self.assertIs(native(events), scores)
+            self.assertIs(native(ak.Array(ak.to_list(events))), scores)
+            self.assertEqual(predict.call_count, 1)
+            # miss for shifted inputs, and again when returning to the nominal ones
+            shifted_scores = native(shifted)
+            renewed_scores = native(events)
+            self.assertEqual(predict.call_count, 3)
+
+        # scores of hits and misses agree with uncached predictions
+        fresh = MuonMVAEvaluator.from_pickles(*self.paths, native=True)
+        np.testing.assert_array_equal(ak.flatten(scores), fresh.predict(fresh.feature_matrix(events)[0]))
+        np.testing.assert_array_equal(ak.flatten(renewed_scores), ak.flatten(scores))
+        np.testing.assert_array_equal(ak.flatten(shifted_scores), fresh.predict(fresh.feature_matrix(shifted)[0]))
+        self.assertFalse(np.array_equal(ak.flatten(shifted_scores), ak.flatten(scores)))
+        self.assertEqual(ak.num(scores, axis=1).tolist(), counts.tolist())
+
+
+class MuonMVACacheTest(MuonMVATestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = os.path.join(self.tmp_dir, "cache")
+        evaluators = mock.patch.dict(muon_mva._evaluators, clear=True)
+        evaluators.start()
+        self.addCleanup(evaluators.stop)
+
+    def test_reuse(self):
+        target_dir = convert_muon_mva(*self.paths, cache_dir=self.cache_dir)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), [os.path.basename(target_dir)])
+        self.assertEqual(sorted(os.listdir(target_dir)), ["meta.json", "model.ubj"])
+
+        # existing conversions are reused without converting again
+        with mock.patch.object(MuonMVAEvaluator, "from_pickles") as from_pickles:
+            self.assertEqual(convert_muon_mva(*self.paths, cache_dir=self.cache_dir), target_dir)
+            evaluator = load_muon_mva(*self.paths, cache_dir=self.cache_dir)
+            self.assertIs(load_muon_mva(*self.paths, cache_dir=self.cache_dir), evaluator)
+            from_pickles.assert_not_called()
+
+        # the loaded model predicts the same scores as the trained artifacts
+        reference = MuonMVAEvaluator.from_pickles(*self.paths, native=False)
+        np.testing.assert_array_equal(evaluator.predict(self.X), reference.predict(self.X).astype(np.float32))
+
+    def test_cache_key(self):
+        import xgboost as xgb
+        from sklearn.preprocessing import StandardScaler
+
+        target_dir = convert_muon_mva(*self.paths, cache_dir=self.cache_dir)
+
+        # same content at another location
+        copied = []
+        for path in self.paths:
+            copied.append(os.path.join(self.tmp_dir, f"copy_{os.path.basename(path)}"))
+            shutil.copy(path, copied[-1])
+        self.assertEqual(convert_muon_mva(*copied, cache_dir=self.cache_dir), target_dir)
+        with open(self.paths[0], "rb") as f:
+            model = pickle.load(f)
+        with open(self.paths[1], "rb") as f:
+            scaler = pickle.load(f)
+
+        # changed model or scaler
+        y = (self.X[:, 0] > 30).astype(int)
+        other_model = xgb.XGBClassifier(n_estimators=5, max_depth=2, random_state=0).fit(scaler.transform(self.X), y)
+        other_dirs = {
+            convert_muon_mva(*self.write_artifacts(other_model, scaler, self.features, "model_b"),
+                cache_dir=self.cache_dir),
+            convert_muon_mva(*self.write_artifacts(model, StandardScaler().fit(self.X[:100]), self.features,
+                "model_c"), cache_dir=self.cache_dir),
+        }
+        self.assertEqual(len(other_dirs), 2)
+        self.assertNotIn(target_dir, other_dirs)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 3)
+
+    def test_atomic_write(self):
+        # a failed conversion leaves neither the target nor temporary directories behind
+        with mock.patch.object(muon_mva.json, "dump", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                convert_muon_mva(*self.paths, cache_dir=self.cache_dir)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+        # when another process moves its conversion into place first, that one is kept
+        rename = os.rename
+        other = {}
+
+        def concurrent_rename(src, dst):
+            shutil.copytree(src, dst)
+            other["mtime"] = os.stat(os.path.join(dst, "meta.json")).st_mtime_ns
+            rename(src, dst)
+
+        with mock.patch.object(muon_mva.os, "rename", side_effect=concurrent_rename):
+            target_dir = convert_muon_mva(*self.paths, cache_dir=self.cache_dir)
+        self.assertEqual(os.listdir(self.cache_dir), [os.path.basename(target_dir)])
+        self.assertEqual(os.stat(os.path.join(target_dir, "meta.json")).st_mtime_ns, other["mtime"])
+        self.assertEqual(sorted(os.listdir(target_dir)), ["meta.json", "model.ubj"])
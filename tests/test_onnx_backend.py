@@ -0,0 +1,126 @@
+# coding: utf-8
+
+
+__all__ = ["ONNXBackendTest"]
+
+import tempfile
+import unittest
+import importlib.util
+
+import numpy as np
+
+from multilepton.ml.onnx_backend import ONNXModel, export_onnx, check_onnx_equivalence, onnx_model_path
+
+
+def has_modules(*names: str) -> bool:
+    return all(importlib.util.find_spec(name) is not None for name in names)
+
+
+@unittest.skipUnless(has_modules("onnx", "onnxruntime"), "onnxruntime not available")
+class ONNXBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+        # fixture weights of a small network with an embedding of a categorical input
+        rng = np.random.default_rng(0)
+        self.embedding = rng.normal(size=(5, 4)).astype(np.float32)
+        self.weights = rng.normal(size=(10 + 3 * 4, 4)).astype(np.float32)
+        self.inputs = [
+            rng.normal(size=(1000, 10)).astype(np.float32),
+            rng.integers(0, 5, size=(1000, 3)).astype(np.int32),
+        ]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def reference(self, cont, cat):
+        x = np.concatenate([cont, self.embedding[cat].reshape(len(cat), -1)], axis=1) @ self.weights
+        x = np.exp(x - x.max(axis=1, keepdims=True))
+        return x / x.sum(axis=1, keepdims=True)
+
+    def test_onnx_model(self):
+        from onnx import TensorProto, helper, numpy_helper
+
+        # same network built directly in onnx
+        graph = helper.make_graph(
+            [
+                helper.make_node("Gather", ["embedding", "input_1"], ["emb"], axis=0),
+                helper.make_node("Reshape", ["emb", "shape"], ["emb_flat"]),
+                helper.make_node("Concat", ["input_0", "emb_flat"], ["features"], axis=1),
+                helper.make_node("MatMul", ["features", "weights"], ["logits"]),
+                helper.make_node("Softmax", ["logits"], ["output"], axis=1),
+            ],
+            "fixture",
+            [
+                helper.make_tensor_value_info("input_0", TensorProto.FLOAT, [None, 10]),
+                helper.make_tensor_value_info("input_1", TensorProto.INT32, [None, 3]),
+            ],
+            [helper.make_tensor_value_info("output", TensorProto.FLOAT, [None, 4])],
+            initializer=[
+                numpy_helper.from_array(self.embedding, "embedding"),
+                numpy_helper.from_array(self.weights, "weights"),
+                numpy_helper.from_array(np.array([-1, 12], dtype=np.int64), "shape"),
+            ],
+        )
+        model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17)], ir_version=8)
+        path = f"{self.tmp_dir.name}/fixture.onnx"
+        with open(path, "wb") as f:
+            f.write(model.SerializeToString())
+
+        onnx_model = ONNXModel(path)
+        expected = self.reference(*self.inputs)
+
+        # inputs are accepted in the structure of the keras call, also as keyword arguments
+        np.testing.assert_allclose(onnx_model(self.inputs), expected, rtol=1e-5, atol=1e-6)
+        np.testing.assert_allclose(onnx_model(inputs=self.inputs), expected, rtol=1e-5, atol=1e-6)
+        with self.assertRaises(ValueError):
+            onnx_model(self.inputs[0])
+
+    @unittest.skipUnless(has_modules("tensorflow", "tf2onnx"), "tensorflow or tf2onnx not available")
+    def test_tf_equivalence(self):
+        import tensorflow as tf
+
+        embedding, weights = self.embedding, self.weights
+
+        class Network(tf.Module):
+
+            def __init__(self):
+                super().__init__()
+                self.embedding = tf.Variable(embedding)
+                self.weights = tf.Variable(weights)
+
+            @tf.function(input_signature=[[
+                tf.TensorSpec((None, 10), tf.float32),
+                tf.TensorSpec((None, 3), tf.int32),
+            ]])
+            def __call__(self, inputs):
+                cont, cat = inputs
+                emb = tf.reshape(tf.gather(self.embedding, cat), (-1, 12))
+                return tf.nn.softmax(tf.concat([cont, emb], axis=1) @ self.weights)
+
+        network = Network()
+        path = f"{self.tmp_dir.name}/saved_model"
+        tf.saved_model.save(network, path, signatures={"serving_default": network.__call__.get_concrete_function()})
+
+        cache_dir = f"{self.tmp_dir.name}/cache"
+        for signature_key in ("", "serving_default"):
+            onnx_path = export_onnx(path, signature_key=signature_key, cache_dir=cache_dir)
+            self.assertEqual(onnx_path, onnx_model_path(path, signature_key, cache_dir=cache_dir))
+
+            result = check_onnx_equivalence(
+                path,
+                signature_key=signature_key,
+                cache_dir=cache_dir,
+                inputs=self.inputs,
+            )
+            self.assertTrue(result["equivalent"], result)
+            self.assertEqual(result["shape"], (1000, 4))
+
+        # the export reproduces the network itself
+        np.testing.assert_allclose(
+            ONNXModel(onnx_path)(inputs=self.inputs),
+            self.reference(*self.inputs),
+            rtol=1e-5,
+            atol=1e-6,
+        )
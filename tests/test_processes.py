@@ -0,0 +1,88 @@
+# coding: utf-8
+
+
+__all__ = ["StitchedProcessIdsTest"]
+
+import unittest
+
+import numpy as np
+import awkward as ak
+import order as od
+
+from multilepton.production.processes import stiched_process_ids_nj_pt, benchmark_stitching, dy_stitching_values
+
+
+class StitchedProcessIdsTest(unittest.TestCase):
+
+    def setUp(self):
+        analysis_inst = od.Analysis("test_analysis", 1)
+        campaign_inst = od.Campaign("test_campaign", 1, ecm=13.6)
+        self.config_inst = config_inst = analysis_inst.add_config(campaign_inst)
+
+        # leaf processes as built by build_stitching_config, in unsorted order
+        pt_bins = [(40.0, 100.0), (0.0, 40.0), (100.0, 200.0), (200.0, 400.0), (400.0, 600.0), (600.0, float("inf"))]
+        self.leaf_processes = [od.Process("dy_0j", id=100, aux={"njets": (0, 1)})]
+        for nj in (2, 1):
+            for i, pt_range in enumerate(pt_bins):
+                self.leaf_processes.append(od.Process(
+                    f"dy_{nj}j_pt{i}",
+                    id=100 + 10 * nj + i + 1,
+                    aux={"njets": (nj, nj + 1), "ptll": pt_range},
+                ))
+        self.leaf_processes.append(od.Process("dy_ge3j", id=130, aux={"njets": (3, float("inf"))}))
+
+        process_inst = self.leaf_processes[7]
+        config_inst.add_process(process_inst)
+        self.dataset_inst = campaign_inst.add_dataset(name="dy_1j_pt40to100", id=1, processes=[process_inst])
+
+    def make_producer(self):
+        cls = stiched_process_ids_nj_pt.derive("process_ids_dy_test", cls_dict={
+            "stitching_columns": ["LHE.NpNLO", "LHE.Vpt"],
+            "cross_check_translation_dict": {"LHE.NpNLO": "njets", "LHE.Vpt": "ptll"},
+            "include_condition": None,
+            "leaf_processes": self.leaf_processes,
+        })
+        inst = cls(inst_dict={
+            "analysis_inst": self.config_inst.analysis,
+            "config_inst": self.config_inst,
+            "dataset_inst": self.dataset_inst,
+        })
+        inst.setup_func(task=None)
+        return inst
+
+    def test_lookup(self):
+        inst = self.make_producer()
+        self.assertEqual(inst.id_table.dtype, np.int64)
+        self.assertEqual(inst.id_table.shape, (5, 7))
+
+        # values at and around all edges, including those outside any range
+        njets = np.array([0, 0, 1, 1, 1, 1, 1, 2, 2, 3, 7, 1, 1, 1], dtype=np.uint8)
+        pt = np.array([0.0, 900.0, 0.0, 39.99, 40.0, 599.9, 600.0, 100.0, 1e4, 5.0, 5.0, -1.0, np.inf, np.nan])
+        pt = pt.astype(np.float32)
+        np.testing.assert_array_equal(
+            inst.id_table[inst.key_func(njets, pt)],
+            [100, 100, 112, 112, 111, 115, 116, 123, 126, 130, 130, 0, 0, 0],
+        )
+
+        # identical to the previous lookup on DY-like values
+        results = benchmark_stitching(inst, n=100_000, repeat=1)
+        self.assertEqual(results["differing_ids"], 0)
+
+    def test_call(self):
+        inst = self.make_producer()
+        njets, pt = dy_stitching_values(1000)
+        njets[:] = 1
+        events = ak.Array({"LHE": ak.zip({"NpNLO": njets, "Vpt": pt})})
+
+        # events outside the range of the dataset are reported
+        with self.assertLogs("multilepton.production.processes", level="WARNING") as logs:
+            events = inst.call_func(events)
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("ptll", logs.output[0])
+        self.assertEqual(events.process_id.type.content, ak.types.NumpyType("int64"))
+        self.assertTrue(np.all(np.isin(events.process_id, [111, 112, 113, 114, 115, 116])))
+
+        # events that cannot be assigned
+        pt[0] = -1.0
+        with self.assertRaises(ValueError), self.assertLogs("multilepton.production.processes", level="WARNING"):
+            inst.call_func(ak.Array({"LHE": ak.zip({"NpNLO": njets, "Vpt": pt})}))
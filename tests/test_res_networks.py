@@ -0,0 +1,90 @@
+# coding: utf-8
+
+
+__all__ = ["CategoricalInputsTest"]
+
+import unittest
+
+import numpy as np
+
+from multilepton.production.res_networks import build_categorical_luts, encode_categorical_inputs
+
+
+class CategoricalInputsTest(unittest.TestCase):
+
+    etau, mutau, tautau, ee, mumu, emu, c3e = 1, 2, 3, 4, 5, 6, 14
+
+    expected_inputs = {
+        "pair_type": [0, 1, 2],
+        "decay_mode1": [-1, 0, 1, 10, 11],
+        "decay_mode2": [0, 1, 10, 11],
+        "charge1": [-1, 1],
+        "charge2": [-1, 1],
+    }
+
+    def setUp(self):
+        self.channel_id_to_pair_type = {
+            self.mutau: 0, self.etau: 1, self.tautau: 2, self.ee: 1, self.mumu: 0, self.emu: 1,
+        }
+        self.luts = build_categorical_luts(
+            channel_ids=[self.etau, self.mutau, self.tautau, self.ee, self.mumu, self.emu, self.c3e],
+            channel_id_to_pair_type=self.channel_id_to_pair_type,
+            dm1_tau_index={self.tautau: 0},
+            dm2_tau_index={self.etau: 0, self.mutau: 0, self.tautau: 1},
+            expected_inputs=self.expected_inputs,
+        )
+
+        rng = np.random.default_rng(0)
+        n = 50000
+        self.channel_id = rng.choice([0, self.etau, self.mutau, self.tautau, self.ee, self.c3e, 99], size=n)
+        self.tau_decay_modes = rng.choice([-1, 0, 1, 2, 5, 10, 11, 15, 20], size=(n, 2))
+        self.charge1 = rng.choice([-2, -1, 0, 1, 2], size=n).astype(np.int32)
+        self.charge2 = rng.choice([-1, 1], size=n).astype(np.int32)
+        self.has_jet_pair = rng.random(n) > 0.3
+        self.has_fatjet = rng.random(n) > 0.7
+
+    def reference(self):
+        # previous per-channel loop, masked assignments and isin checks
+        n = len(self.channel_id)
+        pair_type = np.zeros(n, dtype=np.int32)
+        for channel_id, pair_type_id in self.channel_id_to_pair_type.items():
+            pair_type[self.channel_id == channel_id] = pair_type_id
+        tautau_mask = self.channel_id == self.tautau
+        leptau_mask = (self.channel_id == self.etau) | (self.channel_id == self.mutau)
+        dm1 = -1 * np.ones(n, dtype=np.int32)
+        dm1[tautau_mask] = self.tau_decay_modes[tautau_mask, 0]
+        dm2 = -1 * np.ones(n, dtype=np.int32)
+        dm2[leptau_mask] = self.tau_decay_modes[leptau_mask, 0]
+        dm2[tautau_mask] = self.tau_decay_modes[tautau_mask, 1]
+        dm1 = np.where(dm1 == 2, 1, dm1)
+        dm2 = np.where(dm2 == 2, 1, dm2)
+        valid = (
+            np.isin(pair_type, self.expected_inputs["pair_type"]) &
+            np.isin(dm1, self.expected_inputs["decay_mode1"]) &
+            np.isin(dm2, self.expected_inputs["decay_mode2"]) &
+            np.isin(self.charge1, self.expected_inputs["charge1"]) &
+            np.isin(self.charge2, self.expected_inputs["charge2"])
+        )
+        inputs = np.stack(
+            [pair_type, dm1, dm2, self.charge1, self.charge2, self.has_jet_pair, self.has_fatjet],
+            axis=1,
+        ).astype(np.int32)
+        return inputs, valid
+
+    def test_encode_categorical_inputs(self):
+        inputs, valid = encode_categorical_inputs(
+            self.luts,
+            self.channel_id,
+            self.tau_decay_modes,
+            self.charge1,
+            self.charge2,
+            self.has_jet_pair,
+            self.has_fatjet,
+        )
+        ref_inputs, ref_valid = self.reference()
+
+        self.assertEqual(inputs.dtype, np.int32)
+        np.testing.assert_array_equal(valid, ref_valid)
+        self.assertTrue(0 < valid.sum() < len(valid))
+        # inputs are only defined for valid events
+        np.testing.assert_array_equal(inputs[valid], ref_inputs[valid])
@@ -0,0 +1,107 @@
+# coding: utf-8
+
+
+__all__ = ["ResultCacheTest"]
+
+import os
+import tempfile
+import unittest
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from multilepton.ml.result_cache import ResultCache
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+        # fixture model stored as a single file and a directory
+        self.model_file = os.path.join(self.tmp_dir.name, "model.bin")
+        with open(self.model_file, "wb") as f:
+            f.write(b"weights")
+        self.model_dir = os.path.join(self.tmp_dir.name, "saved_model")
+        os.makedirs(os.path.join(self.model_dir, "variables"))
+        with open(os.path.join(self.model_dir, "variables", "data"), "wb") as f:
+            f.write(b"weights")
+
+        rng = np.random.default_rng(0)
+        self.inputs = [
+            rng.normal(size=(100, 5)).astype(np.float32),
+            rng.integers(0, 3, size=(100, 2)).astype(np.int32),
+        ]
+        self.calls = 0
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def compute(self, inputs):
+        self.calls += 1
+        return (inputs[0].sum(axis=1, keepdims=True) * inputs[1]).astype(np.float32)
+
+    def make_cache(self):
+        cache = ResultCache(os.path.join(self.tmp_dir.name, "results"))
+        cache.add_model("file", self.model_file)
+        cache.add_model("dir", self.model_dir, signature_key="serving_default")
+        return cache
+
+    def test_evaluate(self):
+        cache = self.make_cache()
+        expected = self.compute(self.inputs)
+        self.calls = 0
+
+        # the first call evaluates, the second returns read-only, memory-mapped scores
+        for name in ("file", "dir"):
+            values = cache.evaluate(name, self.inputs, lambda: self.compute(self.inputs))
+            np.testing.assert_array_equal(values, expected)
+        self.assertEqual(self.calls, 2)
+
+        cache = self.make_cache()
+        values = cache.evaluate("dir", self.inputs, lambda: self.compute(self.inputs))
+        self.assertEqual(self.calls, 2)
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+        self.assertIsInstance(values, np.memmap)
+        self.assertFalse(values.flags.writeable)
+        np.testing.assert_array_equal(values, expected)
+
+        # any change in the inputs or in the model is a miss
+        inputs = [self.inputs[0].copy(), self.inputs[1]]
+        inputs[0][17, 3] = np.nextafter(inputs[0][17, 3], np.inf)
+        cache.evaluate("dir", inputs, lambda: self.compute(inputs))
+        cache.evaluate("dir", [self.inputs[0], self.inputs[1].astype(np.int64)], lambda: self.compute(self.inputs))
+        self.assertEqual(self.calls, 4)
+
+        with open(self.model_file, "ab") as f:
+            f.write(b"!")
+        cache = self.make_cache()
+        cache.evaluate("file", self.inputs, lambda: self.compute(self.inputs))
+        self.assertEqual(self.calls, 5)
+
+    def test_evaluate_async(self):
+        cache = self.make_cache()
+        with ThreadPoolExecutor(1) as executor:
+            submit = lambda: executor.submit(self.compute, self.inputs)
+            first = cache.evaluate_async("file", self.inputs, submit).result()
+            # wait for the result to be stored
+            executor.submit(lambda: None).result()
+            future = cache.evaluate_async("file", self.inputs, submit)
+
+        self.assertIsInstance(future, Future)
+        self.assertTrue(future.done())
+        np.testing.assert_array_equal(future.result(), first)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_failed_evaluation(self):
+        cache = self.make_cache()
+
+        def fail():
+            future = Future()
+            future.set_exception(RuntimeError("evaluation failed"))
+            return future
+
+        with self.assertRaises(RuntimeError):
+            cache.evaluate_async("file", self.inputs, fail).result()
+        self.assertIsNone(cache.get(cache.key("file", self.inputs)))
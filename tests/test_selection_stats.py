@@ -0,0 +1,102 @@
+# coding: utf-8
+
+
+__all__ = ["SelectionStatsTest"]
+
+import os
+import time
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import hist
+import law
+
+from multilepton.production.selection_stats import SelectionStats, SelectionStatsStore, safe_ratio
+
+
+class SelectionStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        n = 20000
+        process_id = rng.choice([51010, 3, 51001, 900000], size=n)
+        n_jets = rng.integers(0, 12, size=n)
+        weight = rng.normal(1.0, 2.0, size=n)
+
+        # histograms as filled by the default selector, with growing axes
+        make_hist = lambda storage: hist.Hist(
+            hist.axis.IntCategory([], growth=True, name="process"),
+            hist.axis.Integer(0, 8, growth=True, name="n_jets"),
+            storage=storage,
+        )
+        self.hists = {
+            "num_events": make_hist(hist.storage.Double()),
+            "sum_mc_weight": make_hist(hist.storage.Weight()),
+        }
+        self.hists["num_events"].fill(process=process_id, n_jets=n_jets)
+        self.hists["sum_mc_weight"].fill(process=process_id, n_jets=n_jets, weight=weight)
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+        self.target = law.LocalFileTarget(os.path.join(self.tmp_dir, "hists.pickle"))
+        with open(self.target.abspath, "wb") as f:
+            pickle.dump(self.hists, f)
+
+    def check_stats(self, stats):
+        process_ids = [3, 51001, 51010, 900000]
+        for key, h in self.hists.items():
+            value = lambda obj: getattr(obj, "value", obj)
+            self.assertEqual(stats.total(key), value(h.sum()))
+            np.testing.assert_array_equal(stats.process_ids(key), process_ids)
+            np.testing.assert_array_equal(
+                stats.sum_per_process(key),
+                [value(h[{"process": hist.loc(pid)}].sum()) for pid in process_ids],
+            )
+            self.assertEqual(stats.axis_values(key, "n_jets"), list(range(12)))
+            np.testing.assert_array_equal(
+                stats.values(key, [900000, 3]),
+                [
+                    [value(h[{"process": hist.loc(pid), "n_jets": hist.loc(n)}]) for n in range(12)]
+                    for pid in [900000, 3]
+                ],
+            )
+
+            # views are read-only
+            with self.assertRaises(ValueError):
+                stats.sum_per_process(key)[0] = 0.0
+
+        with self.assertRaises(KeyError):
+            stats.sum_per_process("num_events", [3, 4])
+
+    def test_conversion(self):
+        self.check_stats(SelectionStats.from_hists(self.hists))
+
+    def test_store(self):
+        store = SelectionStatsStore(os.path.join(self.tmp_dir, "cache"))
+        stats = store.get("tt", self.target)
+        self.check_stats(stats)
+        self.assertIsInstance(stats.values("num_events"), np.memmap)
+
+        # shared within the store
+        self.assertIs(store.get("tt", self.target), stats)
+
+        # a new store on the same node loads the converted stats without unpickling
+        store = SelectionStatsStore(store.cache_dir)
+        with mock.patch.object(law.LocalFileTarget, "load", side_effect=AssertionError("unpickled")):
+            self.check_stats(store.get("tt", self.target))
+
+        # changed stats are converted again
+        self.hists["num_events"].fill(process=[7], n_jets=[0])
+        time.sleep(0.01)
+        with open(self.target.abspath, "wb") as f:
+            pickle.dump(self.hists, f)
+        store = SelectionStatsStore(store.cache_dir)
+        process_ids = store.get("tt", self.target).process_ids("num_events")
+        np.testing.assert_array_equal(process_ids, [3, 7, 51001, 51010, 900000])
+
+    def test_safe_ratio(self):
+        np.testing.assert_array_equal(safe_ratio([1.0, 2.0, 3.0], [2.0, 0.0, -4.0]), [0.5, 0.0, -0.75])
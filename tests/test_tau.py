@@ -0,0 +1,162 @@
+# coding: utf-8
+
+
+__all__ = ["TauWeightsTest"]
+
+import unittest
+
+import numpy as np
+import awkward as ak
+import order as od
+
+from columnflow.util import DotDict
+from columnflow.columnar_util import flat_np_view, layout_ak_array
+
+from multilepton.production.tau import tau_weights, prod_per_event
+
+
+class FakeCorrector(object):
+
+    def __init__(self, name, version, calls):
+        super().__init__()
+        self.name = name
+        self.version = version
+        self.calls = calls
+
+    def __call__(self, *args):
+        syst = args[-2] if self.name == "jet" else args[-1]
+        self.calls.append((self.name, syst))
+        # element-wise values depending on the first input, the working points and the systematic
+        offset = {"nom": 0.0, "up": 0.1, "down": -0.1}[syst] + 0.01 * len(self.name)
+        offset += 0.001 * sum(len(arg) for arg in args if isinstance(arg, str))
+        return 0.9 + 0.001 * args[0] + offset
+
+
+class TauWeightsTest(unittest.TestCase):
+
+    def setUp(self):
+        analysis_inst = od.Analysis("test_analysis", 1)
+        campaign_inst = od.Campaign("test_campaign", 1, ecm=13.6, aux={"year": 2022, "run": 3, "version": 14})
+        self.config_inst = config_inst = analysis_inst.add_config(campaign_inst)
+        config_inst.x.tau_trigger_working_points = DotDict.wrap({
+            "id_vs_jet_v0": "Medium",
+            "id_vs_jet_gv0": ("Medium", "VVLoose"),
+            "id_vs_e_single": "VVLoose",
+            "id_vs_e_cross": "Tight",
+            "id_vs_mu_single": "VLoose",
+            "id_vs_mu_cross": "Tight",
+        })
+        self.dataset_inst = campaign_inst.add_dataset(name="tt", id=1, is_data=False)
+
+        rng = np.random.default_rng(0)
+        n = 5000
+        counts = rng.integers(0, 4, size=n)
+        n_taus = counts.sum()
+        self.events = ak.Array({
+            "single_triggered": rng.random(n) > 0.5,
+            "cross_triggered": rng.random(n) > 0.5,
+            "Tau": ak.unflatten(ak.zip({
+                "pt": rng.uniform(20.0, 200.0, n_taus).astype(np.float32),
+                "eta": rng.uniform(-2.5, 2.5, n_taus).astype(np.float32),
+                "phi": np.zeros(n_taus, dtype=np.float32),
+                "mass": np.ones(n_taus, dtype=np.float32),
+                "decayMode": rng.choice([0, 1, 2, 5, 6, 10, 11], size=n_taus).astype(np.int32),
+                "genPartFlav": rng.choice([0, 1, 2, 3, 4, 5], size=n_taus).astype(np.uint8),
+            }), counts),
+        })
+
+    def make_producer(self, calls):
+        inst = tau_weights(inst_dict={
+            "analysis_inst": self.config_inst.analysis,
+            "config_inst": self.config_inst,
+            "dataset_inst": self.dataset_inst,
+        })
+        inst.id_vs_jet_corrector = FakeCorrector("jet", 2, calls)
+        inst.id_vs_e_corrector = FakeCorrector("e", 1, calls)
+        inst.id_vs_mu_corrector = FakeCorrector("mu", 1, calls)
+        return inst
+
+    def old_variations(self, inst, events):
+        # previous loop with a copy of the nominal sfs, corrector calls and products per variation
+        wp_config = self.config_inst.x.tau_trigger_working_points
+        reduce_mul = lambda sf: ak.prod(layout_ak_array(sf, events.Tau.pt), axis=1, mask_identity=False)
+        pt = flat_np_view(events.Tau.pt, axis=1)
+        abseta = flat_np_view(abs(events.Tau.eta), axis=1)
+        dm = flat_np_view(events.Tau.decayMode, axis=1)
+        match = flat_np_view(events.Tau.genPartFlav, axis=1)
+        tau_args = lambda mask, syst: (pt[mask], dm[mask], match[mask], *wp_config.id_vs_jet_gv0, syst, "dm")
+        e_args = lambda mask, wp, syst: (abseta[mask], dm[mask], match[mask], wp, syst)
+        mu_args = lambda mask, wp, syst: (abseta[mask], match[mask], wp, syst)
+
+        dm_mask = np.isin(dm, [0, 1, 10, 11])
+        tau_mask = dm_mask & (match == 5)
+        e_mask = ((match == 1) | (match == 3)) & (dm != 5) & (dm != 6)
+        mu_mask = (match == 2) | (match == 4)
+        single = flat_np_view(ak.broadcast_arrays(events.single_triggered, events.Tau.pt)[0], axis=1)
+        cross = flat_np_view(ak.broadcast_arrays(events.cross_triggered, events.Tau.pt)[0], axis=1)
+        masks = {
+            "e_single": e_mask & single, "e_cross": e_mask & cross,
+            "mu_single": mu_mask & single, "mu_cross": mu_mask & cross,
+        }
+
+        sf_nom = np.ones_like(pt, dtype=np.float32)
+        sf_nom[tau_mask] = inst.id_vs_jet_corrector(*tau_args(tau_mask, "nom"))
+        sf_nom[masks["e_single"]] = inst.id_vs_e_corrector(*e_args(masks["e_single"], "VVLoose", "nom"))
+        sf_nom[masks["e_cross"]] = inst.id_vs_e_corrector(*e_args(masks["e_cross"], "Tight", "nom"))
+        sf_nom[masks["mu_single"]] = inst.id_vs_mu_corrector(*mu_args(masks["mu_single"], "VLoose", "nom"))
+        sf_nom[masks["mu_cross"]] = inst.id_vs_mu_corrector(*mu_args(masks["mu_cross"], "Tight", "nom"))
+        columns = {"tau_weight": reduce_mul(sf_nom)}
+
+        for direction in ["up", "down"]:
+            for decay_mode in [0, 1, 10, 11]:
+                sf = sf_nom.copy()
+                mask = tau_mask & (dm == decay_mode)
+                sf[mask] = inst.id_vs_jet_corrector(*tau_args(mask, direction))
+                columns[f"tau_weight_jet_dm{decay_mode}_{direction}"] = reduce_mul(sf)
+            for region, region_mask in [("barrel", abseta < 1.5), ("endcap", abseta >= 1.5)]:
+                sf = sf_nom.copy()
+                for trigger, wp in [("single", "VVLoose"), ("cross", "Tight")]:
+                    mask = masks[f"e_{trigger}"] & region_mask
+                    sf[mask] = inst.id_vs_e_corrector(*e_args(mask, wp, direction))
+                columns[f"tau_weight_e_{region}_{direction}"] = reduce_mul(sf)
+            for region, region_mask in [
+                ("0p0To0p4", (abseta < 0.4)),
+                ("0p4To0p8", ((abseta >= 0.4) & (abseta < 0.8))),
+                ("0p8To1p2", ((abseta >= 0.8) & (abseta < 1.2))),
+                ("1p2To1p7", ((abseta >= 1.2) & (abseta < 1.7))),
+                ("1p7To2p3", (abseta >= 1.7)),
+            ]:
+                sf = sf_nom.copy()
+                for trigger, wp in [("single", "VLoose"), ("cross", "Tight")]:
+                    mask = masks[f"mu_{trigger}"] & region_mask
+                    sf[mask] = inst.id_vs_mu_corrector(*mu_args(mask, wp, direction))
+                columns[f"tau_weight_mu_{region}_{direction}"] = reduce_mul(sf)
+        return columns
+
+    def test_tau_weights(self):
+        calls = []
+        inst = self.make_producer(calls)
+        events = inst(self.events)
+
+        # one call per corrector, trigger type and systematic
+        self.assertEqual(len(calls), 5 * 3)
+
+        expected = self.old_variations(self.make_producer([]), self.events)
+        self.assertEqual(len(expected), 1 + 2 * 11)
+        for column, values in expected.items():
+            self.assertEqual(events[column].type, ak.values_astype(values, np.float32).type, column)
+            np.testing.assert_array_equal(ak.to_numpy(events[column]), ak.to_numpy(values), err_msg=column)
+
+    def test_prod_per_event(self):
+        rng = np.random.default_rng(1)
+        counts = rng.integers(0, 5, size=1000)
+        counts[:3] = 0
+        counts[-3:] = 0
+        values = rng.random((counts.sum(), 3)).astype(np.float32) + 0.5
+
+        result = prod_per_event(values, counts)
+        self.assertEqual(result.dtype, np.float32)
+        for i in range(3):
+            expected = ak.prod(ak.unflatten(values[:, i], counts), axis=1, mask_identity=False)
+            np.testing.assert_array_equal(result[:, i], ak.to_numpy(expected))
+        np.testing.assert_array_equal(prod_per_event(values[:0], np.zeros(4, dtype=int)), np.ones((4, 3)))
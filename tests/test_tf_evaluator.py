@@ -0,0 +1,393 @@
+# coding: utf-8
+
+
+__all__ = ["SharedBufferTest", "TFEvaluatorTransportTest", "TFEvaluatorBatchingTest", "TFModelServerTest"]
+
+import os
+import sys
+import types
+import time
+import tempfile
+import unittest
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from multilepton.ml import tf_server, tf_evaluator
+from multilepton.ml.tf_evaluator import STOP_SIGNAL, SharedArray, SharedBuffer, TFEvaluator, _map_arrays
+from multilepton.ml.tf_server import TFModelServer, connect
+
+
+class FakeTensor(object):
+
+    def __init__(self, value):
+        self.value = value
+
+    def numpy(self):
+        return self.value
+
+
+class DummySignature(object):
+    """
+    Stand-in for a SavedModel signature with a single input, returning the negated output of the model.
+    """
+
+    structured_input_signature = ((), {"inputs": None})
+    inputs = [types.SimpleNamespace(name="inputs:0")]
+
+    def __call__(self, inputs):
+        return {"output": FakeTensor(-DummyModel()(inputs).numpy())}
+
+
+class DummyModel(object):
+    """
+    Stand-in for a loaded SavedModel whose output rows are the flattened rows of all its inputs, with inputs of
+    other lengths than the first one added as a column of their sum.
+    """
+
+    def __init__(self):
+        self.signatures = {"serving_default": DummySignature()}
+
+    def __call__(self, *args, **kwargs):
+        leaves = []
+        _map_arrays((args, kwargs), leaves.append)
+        n = len(leaves[0])
+        return FakeTensor(np.concatenate([
+            leaf.reshape(n, -1).astype(np.float64) if len(leaf) == n else np.full((n, 1), leaf.sum())
+            for leaf in leaves
+        ], axis=1))
+
+
+def dummy_output(*args, **kwargs):
+    return DummyModel()(*args, **kwargs).numpy()
+
+
+def fake_tensorflow():
+    """
+    Returns a module that replaces tensorflow in forked evaluator processes, loading a
+    :py:class:`DummyModel` from any path.
+    """
+    tf = types.ModuleType("tensorflow")
+    tf.saved_model = types.SimpleNamespace(load=lambda path: DummyModel())
+    tf.config = types.SimpleNamespace(threading=types.SimpleNamespace(
+        set_intra_op_parallelism_threads=lambda n: None,
+        set_inter_op_parallelism_threads=lambda n: None,
+    ))
+    return tf
+
+
+def shm_exists(name):
+    try:
+        shm = SharedMemory(name=name)
+    except FileNotFoundError:
+        return False
+    shm.close()
+    return True
+
+
+class TFEvaluatorTestBase(unittest.TestCase):
+
+    def setUp(self):
+        if multiprocessing.get_start_method() != "fork":
+            self.skipTest("evaluator processes are not forked")
+
+        # evaluator processes are forked with tensorflow replaced by a dummy
+        modules = mock.patch.dict(sys.modules, {"tensorflow": fake_tensorflow()})
+        modules.start()
+        self.addCleanup(modules.stop)
+
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+        self.model_paths = []
+        for name in ["model_a", "model_b"]:
+            self.model_paths.append(os.path.join(self.tmp_dir, name))
+            os.makedirs(self.model_paths[-1])
+
+    def make_evaluator(self, n_models=1, **attrs):
+        evaluator = TFEvaluator()
+        evaluator.silent = True
+        evaluator.use_server = False
+        for name, value in attrs.items():
+            setattr(evaluator, name, value)
+        for i in range(n_models):
+            evaluator.add_model(f"model_{i}", self.model_paths[i])
+        return evaluator
+
+
+class SharedBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(6)
+        self.obj = (
+            [rng.normal(size=(7, 3)).astype(np.float32), rng.integers(0, 9, size=(7,)).astype(np.int64)],
+            {
+                "a": rng.normal(size=(7, 2, 2)),
+                "b": {"c": np.array([True, False] * 3), "d": [np.arange(5, dtype=np.uint8)]},
+                "e": "not an array",
+                "f": np.array(["objects", "are", "kept"], dtype=object),
+            },
+        )
+        self.owner = SharedBuffer()
+        self.attached = SharedBuffer()
+        self.addCleanup(self.attached.close)
+        self.addCleanup(self.owner.close)
+
+    def assert_equal_nested(self, a, b):
+        self.assertEqual(type(a), type(b))
+        if isinstance(a, np.ndarray):
+            self.assertEqual(a.dtype, b.dtype)
+            np.testing.assert_array_equal(a, b)
+        elif isinstance(a, (list, tuple)):
+            self.assertEqual(len(a), len(b))
+            for x, y in zip(a, b):
+                self.assert_equal_nested(x, y)
+        elif isinstance(a, dict):
+            self.assertEqual(list(a), list(b))
+            for key in a:
+                self.assert_equal_nested(a[key], b[key])
+        else:
+            self.assertEqual(a, b)
+
+    def test_pack_unpack(self):
+        packed = self.owner.pack(self.obj)
+        # only placeholders and non-array objects remain
+        placeholders = []
+        _map_arrays(packed, placeholders.append, cls=SharedArray)
+        self.assertEqual(len(placeholders), 5)
+        self.assertTrue(all(p.offset % SharedBuffer.alignment == 0 for p in placeholders))
+        self.assertIs(packed[1]["f"], self.obj[1]["f"])
+
+        self.attached.attach(self.owner.name)
+        self.assertFalse(self.attached.owner)
+        views = self.attached.unpack(packed)
+        copies = self.attached.unpack(packed, copy=True)
+        self.assert_equal_nested(views, self.obj)
+        self.assert_equal_nested(copies, self.obj)
+
+        # views see later writes into the buffer while copies do not
+        self.owner.pack(_map_arrays(self.obj, np.zeros_like))
+        self.assertFalse(np.any(views[0][0]))
+        self.assert_equal_nested(copies, self.obj)
+
+    def test_growth(self):
+        self.owner.pack(self.obj)
+        name, size = self.owner.name, self.owner.shm.size
+        self.assertTrue(self.owner.owner)
+
+        # smaller and equally sized payloads reuse the segment
+        self.owner.pack([np.zeros(3)])
+        self.assertEqual(self.owner.name, name)
+
+        # larger ones replace and unlink it
+        large = {"x": np.arange(10 * size, dtype=np.uint8), "y": [np.ones((5, 3))]}
+        packed = self.owner.pack(large)
+        self.assertNotEqual(self.owner.name, name)
+        self.assertGreaterEqual(self.owner.shm.size, large["x"].nbytes + 5 * 3 * 8)
+        self.assertFalse(shm_exists(name))
+
+        # attaching follows the new segment
+        self.attached.attach(self.owner.name)
+        self.assert_equal_nested(self.attached.unpack(packed, copy=True), large)
+
+    def test_close(self):
+        self.owner.pack(self.obj)
+        self.attached.attach(self.owner.name)
+        name = self.owner.name
+
+        # closing an attached buffer keeps the segment, closing the owner unlinks it
+        self.attached.close()
+        self.assertTrue(shm_exists(name))
+        self.owner.close()
+        self.assertIsNone(self.owner.name)
+        self.assertFalse(shm_exists(name))
+
+
+class TFEvaluatorTransportTest(TFEvaluatorTestBase):
+
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(7)
+        self.args = ([rng.normal(size=(50, 4)).astype(np.float32), rng.integers(0, 3, size=(50, 2))],)
+        self.kwargs = {"extra": {"z": rng.normal(size=(50,))}}
+
+    def test_default(self):
+        self.assertEqual(TFEvaluator().transport, "pipe")
+
+    def test_transports(self):
+        expected = dummy_output(*self.args, **self.kwargs)
+        for transport in ["pipe", "shm"]:
+            evaluator = self.make_evaluator(transport=transport)
+            with evaluator:
+                np.testing.assert_array_equal(evaluator("model_0", *self.args, **self.kwargs), expected)
+                # larger inputs grow the buffers
+                args = (_map_arrays(self.args[0], lambda arr: np.concatenate([arr] * 40)),)
+                kwargs = _map_arrays(self.kwargs, lambda arr: np.concatenate([arr] * 40))
+                np.testing.assert_array_equal(
+                    evaluator("model_0", *args, **kwargs),
+                    dummy_output(*args, **kwargs),
+                )
+                model = evaluator._models["model_0"]
+                names = [buffer.name for buffer in (model.in_buffer, model.out_buffer) if buffer is not None]
+            self.assertEqual(len(names), 2 if transport == "shm" else 0)
+
+            # segments of both the client and the evaluator process are unlinked after stopping
+            self.assertFalse(evaluator.running)
+            self.assertEqual(evaluator._processes, [])
+            for name in names:
+                self.assertFalse(shm_exists(name), name)
+
+
+class TFEvaluatorBatchingTest(TFEvaluatorTestBase):
+
+    def make_requests(self, model_index, rng):
+        # inputs whose rows identify the request and row, so that misaligned results are detected
+        requests = []
+        for i in range(12):
+            rows = int(rng.integers(1, 30))
+            ids = np.full(rows, 1000 * model_index + i, dtype=np.float32)
+            requests.append(((np.stack([ids, np.arange(rows, dtype=np.float32)], axis=1),), {}))
+        # inputs with another shape that cannot be merged with the others
+        requests.append(((np.ones((3, 5), dtype=np.float32),), {}))
+        requests.append(((np.zeros((4, 5), dtype=np.float32),), {}))
+        # inputs with different lengths that are evaluated unbatched
+        requests.append(((np.ones((3, 2), dtype=np.float32),), {"other": np.ones(4)}))
+        return requests
+
+    def test_worker_pool_batching(self):
+        rng = np.random.default_rng(8)
+        for transport in ["pipe", "shm"]:
+            evaluator = self.make_evaluator(
+                n_models=2,
+                transport=transport,
+                delay=0.01,
+                n_workers=2,
+                batching=True,
+                batch_wait=0.2,
+                max_batch_rows=100,
+            )
+            requests = {f"model_{i}": self.make_requests(i, rng) for i in range(2)}
+            submissions = [(name, request) for name, reqs in requests.items() for request in reqs]
+            rng.shuffle(submissions)
+
+            with evaluator:
+                self.assertEqual(len(evaluator._processes), 2)
+                # submit concurrently from several threads
+                with ThreadPoolExecutor(max_workers=8) as pool:
+                    futures = list(pool.map(
+                        lambda sub: evaluator.evaluate_async(sub[0], *sub[1][0], **sub[1][1]),
+                        submissions,
+                    ))
+                results = [future.result(timeout=60) for future in futures]
+                stats = evaluator.stats()
+
+            # results in submission order and aligned with the rows of each request
+            for (name, (args, kwargs)), result in zip(submissions, results):
+                np.testing.assert_array_equal(result, dummy_output(*args, **kwargs), err_msg=name)
+
+            for name, reqs in requests.items():
+                model_stats = stats[name]
+                batchable_rows = sum(len(args[0]) for args, kwargs in reqs if not kwargs)
+                self.assertEqual(model_stats["calls"], len(reqs))
+                self.assertEqual(model_stats["rows"], batchable_rows)
+                # requests were merged, but not beyond the maximum number of rows
+                self.assertLess(model_stats["forward_passes"], len(reqs) - 2)
+                self.assertGreaterEqual(model_stats["forward_passes"], -(-batchable_rows // 100) + 2)
+                self.assertGreater(model_stats["mean_latency"], 0.0)
+                self.assertGreaterEqual(model_stats["max_latency"], model_stats["mean_latency"])
+                self.assertGreater(model_stats["throughput"], 0.0)
+
+
+class TFModelServerTest(TFEvaluatorTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.address = os.path.join(self.tmp_dir, "server", "server.sock")
+        os.makedirs(os.path.dirname(self.address))
+        tf = sys.modules["tensorflow"]
+        load = mock.patch.object(tf.saved_model, "load", wraps=tf.saved_model.load)
+        self.load = load.start()
+        self.addCleanup(load.stop)
+        self.servers = []
+        self.x = np.random.default_rng(9).normal(size=(20, 3))
+
+        # the server and its clients share the resource tracker of this process, so attached buffers stay tracked
+        for module in (tf_server, tf_evaluator):
+            buffers = mock.patch.object(module, "SharedBuffer", lambda untrack_attached=False: SharedBuffer())
+            buffers.start()
+            self.addCleanup(buffers.stop)
+
+    def start_server(self, wait=False):
+        # run the server in a thread of this process instead of a detached one
+        server = TFModelServer(self.address, idle_timeout=0.5, silent=True)
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        self.servers.append((server, thread))
+        deadline = time.monotonic() + 10
+        while wait and not os.path.exists(self.address):
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+        return server, thread
+
+    def assert_shutdown(self, thread):
+        # still running briefly after the last client left, then shut down after idling
+        self.assertTrue(thread.is_alive())
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+
+    def test_shared_model(self):
+        server, thread = self.start_server(wait=True)
+        config = {"name": "model", "path": self.model_paths[0]}
+        conns = [connect(self.address, config, spawn=False) for _ in range(2)]
+        conns.append(connect(self.address, dict(config, signature_key="serving_default"), spawn=False))
+        with self.assertRaises(RuntimeError):
+            connect(self.address, dict(config, path=os.path.join(self.tmp_dir, "missing")), spawn=False)
+
+        # one loaded model per path and signature key, shared by the clients
+        self.assertEqual(self.load.call_count, 2)
+        self.assertEqual(sorted(server._models), [(self.model_paths[0], ""), (self.model_paths[0], "serving_default")])
+        for conn, sign in zip(conns, [1, 1, -1]):
+            conn.send(((self.x,), {}))
+            np.testing.assert_array_equal(conn.recv(), sign * dummy_output(self.x))
+
+        # no shutdown while clients are connected
+        time.sleep(1.5)
+        self.assertTrue(thread.is_alive())
+        for conn in conns:
+            conn.send(STOP_SIGNAL)
+            conn.close()
+        self.assert_shutdown(thread)
+
+    def test_evaluator_clients(self):
+        evaluators = []
+        for transport in ["pipe", "shm"]:
+            evaluator = self.make_evaluator(transport=transport, use_server=True, server_address=self.address)
+            evaluator.add_model("signature", self.model_paths[0], signature_key="serving_default")
+            evaluators.append(evaluator)
+
+        # evaluators starting at the same time spawn a single server
+        with mock.patch.object(tf_server.subprocess, "Popen", side_effect=lambda *args, **kwargs: self.start_server()):
+            threads = [threading.Thread(target=evaluator.start) for evaluator in evaluators]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join(30)
+            self.assertEqual(tf_server.subprocess.Popen.call_count, 1)
+        server, thread = self.servers[0]
+
+        try:
+            self.assertTrue(all(evaluator._server_connected for evaluator in evaluators))
+            self.assertEqual(evaluators[0]._processes, [])
+            for evaluator in evaluators:
+                np.testing.assert_array_equal(evaluator("model_0", self.x), dummy_output(self.x))
+                np.testing.assert_array_equal(evaluator("signature", self.x), -dummy_output(self.x))
+            self.assertEqual(self.load.call_count, 2)
+            self.assertEqual(len(server._models), 2)
+        finally:
+            for evaluator in evaluators:
+                evaluator.stop()
+        self.assert_shutdown(thread)
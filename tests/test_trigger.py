@@ -0,0 +1,170 @@
+# coding: utf-8
+
+
+__all__ = ["TriggerLegsTest", "TriggerBitsetTest"]
+
+import unittest
+
+import numpy as np
+import awkward as ak
+import order as od
+
+from multilepton.config.util import Trigger, TriggerLeg
+from multilepton.config.triggers import add_triggers, trigger_ids, check_trigger_ids
+from multilepton.selection.trigger import TriggerBitset, leg_signature, evaluate_trigger_legs
+
+
+def old_leg_mask(trig_obj, leg):
+    """
+    Previous object mask of a single trigger *leg*.
+    """
+    leg_mask = abs(trig_obj.id) >= 0
+    if leg.pdg_id is not None:
+        leg_mask = leg_mask & (abs(trig_obj.id) == leg.pdg_id)
+    if leg.min_pt is not None:
+        leg_mask = leg_mask & (trig_obj.pt >= leg.min_pt)
+    if leg.trigger_bits is not None:
+        for bits in leg.trigger_bits:
+            leg_mask = leg_mask & ((trig_obj.filterBits & bits) > 0)
+    return leg_mask
+
+
+def leg_arrays(signatures):
+    # leg requirements as set up by trigger_selection
+    n_bits = max([len(bits or ()) for _, _, bits in signatures] + [1])
+    pdg_ids = np.array([-1 if pdg_id is None else pdg_id for pdg_id, _, _ in signatures])
+    min_pts = np.array([-np.inf if min_pt is None else min_pt for _, min_pt, _ in signatures])
+    bit_masks = np.full((len(signatures), n_bits), -1, dtype=np.int64)
+    for i, (_, _, bits) in enumerate(signatures):
+        bit_masks[i, :len(bits or ())] = bits or ()
+    return pdg_ids, min_pts, bit_masks
+
+
+class TriggerLegsTest(unittest.TestCase):
+
+    def config_triggers(self, year, version):
+        analysis_inst = od.Analysis("test_analysis", 1)
+        campaign_inst = od.Campaign(f"test_{year}_v{version}", 1, ecm=13.6,
+            aux={"year": year, "run": 3, "version": version})
+        config_inst = analysis_inst.add_config(campaign_inst)
+        add_triggers(config_inst)
+        return list(config_inst.x.triggers)
+
+    def test_config_legs(self):
+        # all legs of the triggers of all run 3 configs, and edge cases with zero, multiple and no bit masks
+        legs = [
+            leg
+            for year, version in [(2022, 12), (2022, 14), (2023, 14), (2024, 15)]
+            for trigger in self.config_triggers(year, version)
+            for leg in trigger.legs.values()
+        ]
+        self.assertGreater(len(legs), 50)
+        legs += [
+            TriggerLeg(pdg_id=11, trigger_bits=0),
+            TriggerLeg(pdg_id=13, trigger_bits=[8, 0]),
+            TriggerLeg(pdg_id=15, min_pt=30.0, trigger_bits=[1 | 8, 64]),
+            TriggerLeg(min_pt=25.0),
+            TriggerLeg(),
+        ]
+        signatures = list(dict.fromkeys(map(leg_signature, legs)))
+
+        # random trigger objects, including events without any
+        rng = np.random.default_rng(0)
+        counts = rng.integers(0, 6, size=2000)
+        counts[:10] = 0
+        n = counts.sum()
+        trig_obj = ak.unflatten(ak.zip({
+            "id": rng.choice([1, 11, -11, 13, -13, 15, 22], size=n).astype(np.int32),
+            "pt": rng.choice([20.0, 25.0, 30.0, 35.0, 40.0, 60.0], size=n).astype(np.float32),
+            "filterBits": rng.integers(0, 2**18, size=n).astype(np.int32),
+        }), counts)
+
+        obj_masks, n_matches, obj_counts = evaluate_trigger_legs(trig_obj, *leg_arrays(signatures))
+        np.testing.assert_array_equal(obj_counts, counts)
+        for leg in legs:
+            i = signatures.index(leg_signature(leg))
+            expected = old_leg_mask(trig_obj, leg)
+            np.testing.assert_array_equal(obj_masks[:, i], ak.to_numpy(ak.flatten(expected)), err_msg=repr(leg))
+            np.testing.assert_array_equal(n_matches[:, i], ak.to_numpy(ak.sum(expected, axis=1)), err_msg=repr(leg))
+
+        # legs with a zero bit mask never match
+        self.assertFalse(np.any(obj_masks[:, signatures.index(leg_signature(TriggerLeg(pdg_id=11, trigger_bits=0)))]))
+
+
+class TriggerBitsetTest(unittest.TestCase):
+
+    def setUp(self):
+        # triggers in config order, with positions spanning two words and not sorted by position
+        self.triggers = [
+            Trigger(name=f"HLT_test_{i}", id=trigger_id, bit=bit, applies_to_dataset=None)
+            for i, (trigger_id, bit) in enumerate([(105, 4), (1001, 70), (202, 0), (501, 63), (1, 64), (901, 12)])
+        ]
+        self.ids = [trigger.id for trigger in self.triggers]
+        self.bitset = TriggerBitset(self.triggers)
+        rng = np.random.default_rng(3)
+        self.masks = rng.random((500, len(self.ids))) < 0.3
+        self.masks[:20] = False
+
+    def expected_ids(self, masks, ids):
+        # unique ids per event, in config order
+        return [[tid for tid in self.ids if tid in ids and mask[ids.index(tid)]] for mask in masks]
+
+    def test_encode_to_ids(self):
+        self.assertEqual(self.bitset.n_words, 2)
+        bits = self.bitset.encode(self.masks, self.ids)
+        self.assertEqual(bits.shape, (len(self.masks), 2))
+        self.assertEqual(bits.dtype, np.uint64)
+        self.assertEqual(self.bitset.to_ids(bits).tolist(), self.expected_ids(self.masks, self.ids))
+
+        # encoding in another order, with repeated ids, decodes to the same unique ids in config order
+        ids = self.ids[::-1] + self.ids[:2]
+        masks = np.concatenate([self.masks[:, ::-1], self.masks[:, :2]], axis=1)
+        np.testing.assert_array_equal(self.bitset.encode(masks, ids), bits)
+
+        # bitsets with fewer or more words, e.g. written for other triggers
+        first_word = [0, 2, 3, 5]
+        self.assertEqual(
+            self.bitset.to_ids(bits[:, :1]).tolist(),
+            self.expected_ids(self.masks[:, first_word], [self.ids[i] for i in first_word]),
+        )
+        padded = np.pad(bits, ((0, 0), (0, 1)))
+        self.assertEqual(self.bitset.to_ids(ak.Array(padded)).tolist(), self.bitset.to_ids(bits).tolist())
+
+    def test_add(self):
+        bits = self.bitset.encode(self.masks[:, :3], self.ids[:3])
+        for i in range(3, len(self.ids)):
+            bits = self.bitset.add(bits, self.ids[i], self.masks[:, i])
+        np.testing.assert_array_equal(bits, self.bitset.encode(self.masks, self.ids))
+
+    def test_contains(self):
+        bits = self.bitset.encode(self.masks, self.ids)
+        for selected in [self.ids[:1], self.ids[1:3], [self.ids[4], self.ids[1]], self.ids, []]:
+            is_selected = np.isin(self.ids, selected)
+            np.testing.assert_array_equal(
+                self.bitset.contains_any(bits, selected),
+                np.any(self.masks & is_selected, axis=1),
+            )
+            np.testing.assert_array_equal(
+                self.bitset.contains_only(bits, selected),
+                ~np.any(self.masks & ~is_selected, axis=1),
+            )
+
+        # bits of unknown triggers in additional words are not contained in any selection
+        padded = np.pad(bits, ((0, 0), (0, 1)))
+        padded[:, 2] = 1
+        self.assertFalse(np.any(self.bitset.contains_only(padded, self.ids)))
+        np.testing.assert_array_equal(self.bitset.contains_any(padded, self.ids), np.any(self.masks, axis=1))
+
+    def test_invalid_triggers(self):
+        with self.assertRaises(ValueError):
+            TriggerBitset(self.triggers + [Trigger(name="HLT_test_dup", id=2, bit=63, applies_to_dataset=None)])
+        with self.assertRaises(ValueError):
+            TriggerBitset(self.triggers + [Trigger(name="HLT_test_none", id=3, applies_to_dataset=None)])
+
+    def test_check_trigger_ids(self):
+        check_trigger_ids(trigger_ids)
+        free_bit = max(bit for _, bit in trigger_ids.values()) + 1
+        with self.assertRaisesRegex(ValueError, "HLT_test"):
+            check_trigger_ids(dict(trigger_ids, HLT_test=(trigger_ids["HLT_IsoMu24"][0], free_bit)))
+        with self.assertRaisesRegex(ValueError, "HLT_test"):
+            check_trigger_ids(dict(trigger_ids, HLT_test=(99999, trigger_ids["HLT_IsoMu24"][1])))
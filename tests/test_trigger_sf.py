@@ -0,0 +1,184 @@
+# coding: utf-8
+
+
+__all__ = ["TriggerWeightsTest", "TauTriggerEfficienciesTest"]
+
+import unittest
+
+import numpy as np
+import awkward as ak
+import order as od
+
+from columnflow.util import DotDict
+from columnflow.columnar_util import flat_np_view, layout_ak_array
+
+from multilepton.config.util import Trigger
+from multilepton.selection.trigger import TriggerBitset
+from multilepton.production.tau import tau_trigger_efficiencies
+from multilepton.production.trigger_sf import create_trigger_weights, calculate_correlated_ditrigger_efficiency
+
+
+def old_create_trigger_weight(events, effs, channel, first_trigger_matched, second_trigger_matched):
+    """
+    Previous trigger weight of a single variation, computed with awkward arrays.
+    """
+    eff_data = calculate_correlated_ditrigger_efficiency(
+        first_trigger_matched, second_trigger_matched, effs[0], effs[2], effs[4],
+    )
+    eff_mc = calculate_correlated_ditrigger_efficiency(
+        first_trigger_matched, second_trigger_matched, effs[1], effs[3], effs[5],
+    )
+    trigger_weight = eff_data / eff_mc
+    nan_mask = np.isnan(trigger_weight)
+    if np.any(nan_mask & (events.channel_id == channel.id) & (first_trigger_matched | second_trigger_matched)):
+        raise ValueError(f"Found nan in {channel.name} trigger weight")
+    return np.nan_to_num(trigger_weight, nan=1.0)
+
+
+class TriggerWeightsTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.n = n = 5000
+        self.channel = od.Channel("etau", 1)
+        channel_id = rng.choice([0, 1, 2], size=n)
+        self.events = ak.Array({"channel_id": channel_id})
+        self.first_matched = ak.Array((channel_id == 1) & (rng.random(n) > 0.3))
+        self.second_matched = ak.Array((channel_id == 1) & (rng.random(n) > 0.5))
+
+        # float32 efficiencies of 5 variations, the same for all in the case of the other object
+        effs = rng.random((6, 5, n)).astype(np.float32)
+        effs[4:] = effs[4:, :1]
+        self.effs = effs
+
+    def test_batched_weights(self):
+        effs = self.effs
+        weights = create_trigger_weights(
+            self.events,
+            effs[0], effs[1], effs[2], effs[3], effs[4, 0], effs[5, 0],
+            self.channel,
+            self.first_matched,
+            self.second_matched,
+        )
+        self.assertEqual(weights.shape, (5, self.n))
+        self.assertEqual(weights.dtype, np.float32)
+
+        # identical to the previous computation per variation
+        for i in range(5):
+            expected = old_create_trigger_weight(
+                self.events,
+                [ak.Array(e[i]) for e in effs],
+                self.channel,
+                self.first_matched,
+                self.second_matched,
+            )
+            np.testing.assert_array_equal(weights[i], ak.to_numpy(expected))
+
+        # events outside the channel have weight one
+        self.assertTrue(np.all(weights[:, ak.to_numpy(self.events.channel_id != 1)] == 1.0))
+
+    def test_nan_in_channel(self):
+        effs = self.effs.copy()
+        event = np.argmax(ak.to_numpy(self.first_matched))
+        effs[:, 3, event] = 0.0
+        with self.assertRaises(ValueError):
+            create_trigger_weights(self.events, *effs, self.channel, self.first_matched, self.second_matched)
+
+
+class TauTriggerEfficienciesTest(unittest.TestCase):
+
+    channel_ids = {"cetau": 1, "cmutau": 2, "ctautau": 3}
+
+    def setUp(self):
+        analysis_inst = od.Analysis("test_analysis", 1)
+        campaign_inst = od.Campaign("test_campaign", 1, ecm=13.6, aux={"year": 2022, "run": 3, "version": 14})
+        self.config_inst = config_inst = analysis_inst.add_config(campaign_inst)
+        for name, ch_id in self.channel_ids.items():
+            config_inst.add_channel(name=name, id=ch_id)
+        config_inst.x.tau_trigger_working_points = DotDict.wrap({"trigger_corr": "Medium"})
+        config_inst.x.triggers = od.UniqueObjectIndex(Trigger, [
+            Trigger(name=f"HLT_{tag}", id=i, applies_to_dataset=lambda dataset_inst: True, tags={tag}, bit=i)
+            for i, tag in enumerate(["cross_tau_tau", "cross_tau_tau_jet", "cross_tau_tau_vbf"], 1)
+        ])
+        self.dataset_inst = campaign_inst.add_dataset(name="tt", id=1, is_data=False)
+
+        rng = np.random.default_rng(0)
+        n = 3000
+        counts = rng.integers(0, 4, size=n)
+        bitset = TriggerBitset(config_inst.x.triggers)
+        self.events = ak.Array({
+            "channel_id": rng.choice([0, 1, 2, 3], size=n),
+            "single_triggered": rng.random(n) > 0.5,
+            "cross_triggered": rng.random(n) > 0.5,
+            "matched_trigger_bits": bitset.encode(rng.random((n, 3)) > 0.5, [1, 2, 3]),
+            "Tau": ak.unflatten(ak.zip({
+                "pt": rng.uniform(20.0, 200.0, counts.sum()).astype(np.float32),
+                "decayMode": rng.choice([0, 1, 2, 10, 11], size=counts.sum()).astype(np.int32),
+            }), counts),
+        })
+
+    def corrector(self, pt, dm, channel, wp, kind, syst):
+        self.calls.append((channel, kind, syst))
+        offset = {"nom": 0.0, "up": 0.05, "down": -0.05}[syst] + (0.01 if kind == "eff_mc" else 0.0)
+        return 0.5 + 0.001 * pt + 0.01 * dm + 0.1 * len(channel) + offset
+
+    def old_tau_trigger_efficiencies(self, events, tautau_passed, tautaujet_passed):
+        # previous loop, with one corrector call per decay mode and direction
+        pt = flat_np_view(events.Tau.pt, axis=1)
+        dm = flat_np_view(events.Tau.decayMode, axis=1)
+        first = ak.local_index(events.Tau) == 0
+        default_tautau_mask = (events.channel_id == 3) & (first | (ak.local_index(events.Tau) == 1))
+        masks = {
+            ("etau", "etau"): (events.channel_id == 1) & events.cross_triggered & first,
+            ("mutau", "mutau"): (events.channel_id == 2) & events.cross_triggered & first,
+            ("tautau", "ditau"): default_tautau_mask & tautau_passed,
+            ("tautaujet", "ditaujet"): default_tautau_mask & tautaujet_passed,
+        }
+        columns = {}
+        for kind in ["data", "mc"]:
+            eval_args = lambda mask, ch, syst: (pt[mask], dm[mask], ch, "Medium", f"eff_{kind}", syst)
+            for (ch, ch_corr), mask in masks.items():
+                flat_mask = flat_np_view(mask, axis=1)
+                sf_nom = np.ones_like(pt, dtype=np.float32)
+                sf_nom[flat_mask] = self.corrector(*eval_args(flat_mask, ch_corr, "nom"))
+                columns[f"tau_trigger_eff_{kind}_{ch}"] = layout_ak_array(sf_nom, events.Tau.pt)
+            for (ch, ch_corr), mask in masks.items():
+                for decay_mode in [0, 1, 10, 11]:
+                    flat_decay_mode_mask = flat_np_view(mask & (events.Tau.decayMode == decay_mode), axis=1)
+                    for direction in ["up", "down"]:
+                        sf_unc = ak.copy(columns[f"tau_trigger_eff_{kind}_{ch}"])
+                        sf_unc_flat = flat_np_view(sf_unc, axis=1)
+                        sf_unc_flat[flat_decay_mode_mask] = self.corrector(
+                            *eval_args(flat_decay_mode_mask, ch_corr, direction),
+                        )
+                        columns[f"tau_trigger_eff_{kind}_{ch}_dm{decay_mode}_{direction}"] = sf_unc
+        return columns
+
+    def test_tau_trigger_efficiencies(self):
+        inst = tau_trigger_efficiencies(inst_dict={
+            "analysis_inst": self.config_inst.analysis,
+            "config_inst": self.config_inst,
+            "dataset_inst": self.dataset_inst,
+        })
+        inst.tau_trig_corrector = self.corrector
+
+        self.calls = []
+        events = inst(self.events)
+        # one call per systematic, channel and kind
+        self.assertEqual(len(self.calls), 3 * 4 * 2)
+        self.assertEqual(len(set(self.calls)), len(self.calls))
+
+        bitset = TriggerBitset(self.config_inst.x.triggers)
+        expected = self.old_tau_trigger_efficiencies(
+            self.events,
+            bitset.contains_any(self.events.matched_trigger_bits, [1]),
+            bitset.contains_any(self.events.matched_trigger_bits, [2]),
+        )
+        self.assertEqual(len(expected), 2 * 4 * 9)
+        for column, values in expected.items():
+            self.assertEqual(events[column].type, values.type, column)
+            np.testing.assert_array_equal(
+                ak.to_numpy(ak.flatten(events[column])),
+                ak.to_numpy(ak.flatten(values)),
+                err_msg=column,
+            )
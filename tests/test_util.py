@@ -0,0 +1,69 @@
+# coding: utf-8
+
+
+__all__ = ["FillHistsTest"]
+
+import unittest
+
+import numpy as np
+import hist
+
+from columnflow.hist_util import fill_hist
+
+from multilepton.util import fill_hists
+
+
+class FillHistsTest(unittest.TestCase):
+
+    def make_hists(self, storage):
+        return [
+            # growing axes as used for selection stats
+            hist.Hist(
+                hist.axis.IntCategory([], growth=True, name="process"),
+                hist.axis.Integer(0, 8, growth=True, name="n_jets"),
+                storage=storage,
+            ),
+            # fixed axes with flow bins
+            hist.Hist(
+                hist.axis.IntCategory([3, 51001], name="process"),
+                hist.axis.Integer(2, 6, name="n_jets"),
+                storage=storage,
+            ),
+        ]
+
+    def assert_hists_equal(self, h1, h2):
+        self.assertEqual(h1.axes, h2.axes)
+        v1, v2 = h1.view(flow=True), h2.view(flow=True)
+        for field in (v1.dtype.names or [None]):
+            np.testing.assert_array_equal(v1 if field is None else v1[field], v2 if field is None else v2[field])
+
+    def test_fill_hists(self):
+        rng = np.random.default_rng(0)
+        for storage in (hist.storage.Weight(), hist.storage.Double()):
+            n_weights = 3
+            hists = [self.make_hists(storage) for _ in range(n_weights)]
+            expected = [self.make_hists(storage) for _ in range(n_weights)]
+            for n, processes, max_n_jets in [(1000, [51001, 3], 8), (0, [3], 8), (5000, [900000, 3, 51001, 7], 12)]:
+                data = {
+                    "process": rng.choice(processes, size=n),
+                    "n_jets": rng.integers(0, max_n_jets, size=n).astype(np.int32),
+                }
+                weights = [rng.normal(1.0, 3.0, size=n).astype(np.float32) for _ in range(n_weights)]
+
+                # all histograms at once, or counts only
+                use_weights = isinstance(storage, hist.storage.Weight)
+                fill_hists(
+                    [h for _hists in hists for h in _hists],
+                    data,
+                    [w for w in weights for _ in range(2)] if use_weights else None,
+                )
+
+                # one by one
+                for _hists, w in zip(expected, weights):
+                    for h in _hists:
+                        fill_hist(h, dict(data, **({"weight": w} if use_weights else {})), last_edge_inclusive=True)
+
+            for _hists, _expected in zip(hists, expected):
+                for h, h_expected in zip(_hists, _expected):
+                    self.assert_hists_equal(h, h_expected)
+            self.assertEqual(sorted(hists[0][0].axes["process"]), [3, 7, 51001, 900000])
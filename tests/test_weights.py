@@ -0,0 +1,152 @@
+# coding: utf-8
+
+
+__all__ = ["ProcessIdIndexTest", "NormalizationWeightsTest"]
+
+import os
+import types
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import awkward as ak
+import hist
+import law
+
+from columnflow.util import DotDict, safe_div
+from columnflow.production.cms.pileup import pu_weight
+
+from multilepton.util import process_id_index
+from multilepton.production.selection_stats import selection_stats_store
+from multilepton.production.weights import normalized_pu_weight
+from multilepton.production.btag import normalized_btag_weights_deepjet
+
+
+class ProcessIdIndexTest(unittest.TestCase):
+
+    def test_process_id_index(self):
+        process_ids = np.array([3, 51001, 51002, 51010, 900000])
+        process_id = np.array([51002, 3, 7, 900000, 1, 51010, 900001, 51001])
+        np.testing.assert_array_equal(process_id_index(process_ids, process_id), [2, 0, 5, 4, 5, 3, 5, 1])
+        np.testing.assert_array_equal(process_id_index(process_ids[:0], process_id), np.zeros(8))
+
+
+class FakeTask(object):
+
+    dataset = "tt"
+
+
+class FakeProducer(types.SimpleNamespace):
+    """
+    Stand-in for producer instances, exposing attributes and the produced columns of dependencies.
+    """
+
+    def __getitem__(self, key):
+        return self.deps[key]
+
+
+class NormalizationWeightsTest(unittest.TestCase):
+
+    process_ids = [51001, 51002, 51003, 51010, 51020]
+    max_n_jets = 6
+    btag_names = ["btag_weight_deepjet", "btag_weight_deepjet_lf_up", "btag_weight_deepjet_hf_down"]
+    pu_names = ["pu_weight", "pu_weight_minbias_xs_up", "pu_weight_minbias_xs_down"]
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+
+        # selection hists per process (in unsorted order) and jet multiplicity
+        process_axis = hist.axis.IntCategory(self.process_ids[::-1], name="process")
+        n_jets_axis = hist.axis.IntCategory(list(range(self.max_n_jets + 1)), name="n_jets")
+        self.hists = {}
+        for name in [""] + self.pu_names:
+            h = hist.Hist(process_axis, n_jets_axis, storage=hist.storage.Weight())
+            h.view().value = rng.uniform(1.0, 2.0, size=h.shape)
+            self.hists["sum_mc_weight" + (f"_{name}" if name else "")] = h
+        for name in ["", "btag_weight_deepjet_"] + [f"{name}_" for name in self.btag_names]:
+            h = hist.Hist(process_axis, n_jets_axis, storage=hist.storage.Weight())
+            h.view().value = rng.uniform(1.0, 2.0, size=h.shape)
+            self.hists[f"sum_mc_weight_{name}selected_nob_deepjet"] = h
+        self.hists["sum_btag_weight_deepjet_selected_nob_deepjet"] = h
+
+        # pickled stats as written by MergeSelectionStats, converted into a temporary cache
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        path = os.path.join(tmp_dir.name, "hists.pickle")
+        with open(path, "wb") as f:
+            pickle.dump(self.hists, f)
+        self.inputs = {"selection_stats": {"hists": law.LocalFileTarget(path)}}
+        env = mock.patch.dict(os.environ, {"MULTILEPTON_STATS_CACHE": os.path.join(tmp_dir.name, "cache")})
+        env.start()
+        self.addCleanup(env.stop)
+        selection_stats_store.clear()
+        self.addCleanup(selection_stats_store.clear)
+
+        # events, including some with process ids not in the stats
+        n = 10000
+        counts = rng.integers(0, self.max_n_jets + 1, size=n)
+        self.events = ak.Array({
+            "process_id": rng.choice(self.process_ids + [1, 51004], size=n),
+            "Jet": ak.unflatten(ak.zip({"pt": rng.uniform(20, 100, counts.sum())}), counts),
+            **{name: rng.uniform(0.5, 1.5, size=n).astype(np.float32) for name in self.btag_names + self.pu_names},
+        })
+
+    def test_normalized_pu_weight(self):
+        inst = FakeProducer(deps={pu_weight: DotDict(produced_columns=self.pu_names)})
+        normalized_pu_weight.setup_func(inst, FakeTask(), self.inputs)
+        inst.pu_weight_names = set(self.pu_names)
+        events = normalized_pu_weight.call_func(inst, self.events)
+
+        # previous per-pid masks
+        hists = self.hists
+        get_sum = lambda pid, name="": hists["sum_mc_weight" + (f"_{name}" if name else "")][
+            {"process": hist.loc(pid)}
+        ].sum().value
+        for name in self.pu_names:
+            expected = np.ones(len(self.events), dtype=np.float32)
+            for pid in self.process_ids:
+                expected[self.events.process_id == pid] = safe_div(get_sum(pid), get_sum(pid, name))
+            expected = ak.values_astype(expected * self.events[name], np.float32)
+            np.testing.assert_array_equal(ak.to_numpy(events[f"normalized_{name}"]), ak.to_numpy(expected), name)
+
+    def test_normalized_btag_weights(self):
+        cls = normalized_btag_weights_deepjet
+        btag_weights_cls = type("btag_weights", (), {"weight_name": "btag_weight_deepjet", "tagger_name": "deepjet"})
+        inst = FakeProducer(
+            btag_weights_cls=btag_weights_cls,
+            weight_name="btag_weight_deepjet",
+            tagger_name="deepjet",
+            deps={btag_weights_cls: DotDict(produced_columns=self.btag_names + ["other_column"])},
+        )
+        cls.setup_func(inst, FakeTask(), self.inputs)
+        events = cls.call_func(inst, self.events)
+
+        # previous per-pid masks and per-pid slicing for the jet multiplicity
+        def get_sum(pid, n_jets, weight_name=""):
+            if weight_name:
+                weight_name += "_"
+            if n_jets != sum:
+                n_jets = hist.loc(n_jets)
+            key = f"sum_mc_weight_{weight_name}selected_nob_deepjet"
+            return self.hists[key][{"process": hist.loc(pid), "n_jets": n_jets}].value
+
+        for name in self.btag_names:
+            expected = np.ones(len(self.events), dtype=np.float32)
+            expected_njet = np.ones(len(self.events), dtype=np.float32)
+            for pid in self.process_ids:
+                pid_mask = self.events.process_id == pid
+                expected[pid_mask] = safe_div(get_sum(pid, sum), get_sum(pid, sum, name))
+                ratios = np.array([
+                    safe_div(get_sum(pid, n_jets), get_sum(pid, n_jets, name))
+                    for n_jets in range(self.max_n_jets + 1)
+                ])
+                expected_njet[pid_mask] = ratios[ak.to_numpy(ak.num(self.events[pid_mask].Jet.pt, axis=1))]
+            for prefix, values in [("", expected), ("njet_", expected_njet)]:
+                np.testing.assert_array_equal(
+                    ak.to_numpy(events[f"normalized_{prefix}{name}"]),
+                    ak.to_numpy(ak.values_astype(values * self.events[name], np.float32)),
+                    f"{prefix}{name}",
+                )
+        self.assertNotIn("normalized_other_column", events.fields)